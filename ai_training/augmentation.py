@@ -0,0 +1,258 @@
+# augmentation.py
+#
+# Vectorized augmentation of raw BODY_38 clips, streamed to Keras as feature
+# batches.
+#
+# Augmenter works on whole (N, T, 38, 3) keypoint batches with (N, T) ns
+# timestamps; every transform is one NumPy pass over the batch, with its random
+# parameters drawn per clip:
+#   - mirror: x negated, label remapped through MIRROR_LABELS. Joint slots
+#     are not swapped, so the clip becomes a mirror-image performer whose
+#     "right" arm is on the left of the torso. (The realtime app mirrors the
+#     other way: a left arm into right-arm geometry, kinematics.mirror_x.)
+#   - rotation: yaw (and a little pitch/roll) about the clip's mean pelvis
+#   - bone scaling: every bone lengthened or shortened around 1, propagated
+#     down the skeleton from the pelvis
+#   - time warp: frames resampled along a monotonic warp of the clip's time
+#   - speed: timestamps stretched or compressed (the same motion, faster or
+#     slower)
+#   - dropout: single keypoints and whole frames zeroed, i.e. "not tracked",
+#     which the feature kernel interpolates like a recording with gaps
+# Features are then recomputed with gesture_dataset.clip_features_batch.
+#
+# AugmentedBatches runs augmentation + features on background threads and
+# hands (X, y_onehot) batches to model.fit through bounded queues, one per
+# worker, taken in turn so that a seed reproduces the batch sequence:
+#
+#   batches = AugmentedBatches(keypoints, timestamps, y, unique_labels, Augmenter(unique_labels))
+#   model.fit(batches, steps_per_epoch=batches.steps_per_epoch, epochs=100, validation_data=(X_val, y_val))
+#   batches.close()
+
+import copy
+import queue
+import threading
+import numpy as np
+
+from gesture_dataset import FEATURE_COLUMNS, fill_missing_batch, clip_features_batch
+
+# realtime_inference_app/config.py (MIRROR_LABELS); not imported from there
+# because config.py pulls in the ZED SDK and Tk.
+MIRROR_LABELS = {
+    "left_swipe": "right_swipe",
+    "right_swipe": "left_swipe"
+}
+
+# Parent of each BODY_38 keypoint in the ZED SDK's bone list, -1 for the pelvis
+# (SKELETON_PAIRS_BODY_38 in config.py draws knees from the pelvis, skipping the hips).
+BODY_38_PARENTS = np.array([
+    -1, 0, 1, 2, 3, 4, 5, 5, 6, 7,       # pelvis, spine 1-3, neck, nose, eyes, ears
+    4, 4, 10, 11, 12, 13, 14, 15,        # clavicles, shoulders, elbows, wrists
+    0, 0, 18, 19, 20, 21, 22, 23,        # hips, knees, ankles, big toes
+    22, 23, 22, 23,                      # small toes, heels
+    16, 17, 16, 17, 16, 17, 16, 17       # hand thumb/index/middle/pinky tips
+], dtype=np.intp)
+
+
+def _bone_order(parents):
+    """Non-root joints ordered so every parent comes before its children."""
+    order, done = [], {int(np.flatnonzero(parents < 0)[0])}
+    while len(done) < len(parents):
+        for j, p in enumerate(parents):
+            if j not in done and p in done:
+                order.append(j)
+                done.add(j)
+    return np.array(order, dtype=np.intp)
+
+
+def _rotation_matrices(yaw, pitch, roll):
+    """(N, 3, 3) rotations about y (up), then x, then z; angles in radians."""
+    cy, sy = np.cos(yaw), np.sin(yaw)
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    cr, sr = np.cos(roll), np.sin(roll)
+    one, zero = np.ones_like(yaw), np.zeros_like(yaw)
+    ry = np.stack([np.stack([cy, zero, sy], -1), np.stack([zero, one, zero], -1), np.stack([-sy, zero, cy], -1)], -2)
+    rx = np.stack([np.stack([one, zero, zero], -1), np.stack([zero, cp, -sp], -1), np.stack([zero, sp, cp], -1)], -2)
+    rz = np.stack([np.stack([cr, -sr, zero], -1), np.stack([sr, cr, zero], -1), np.stack([zero, zero, one], -1)], -2)
+    return rz @ rx @ ry
+
+
+class Augmenter:
+    """
+    Random augmentation of keypoint batches. Each clip is augmented with
+    probability p (the rest pass through untouched); magnitudes are the
+    maximum deviations, drawn uniformly per clip.
+    """
+
+    def __init__(self, unique_labels, p=0.8, mirror_p=0.5, yaw_deg=15.0, tilt_deg=5.0, bone_scale=0.1,
+                 time_warp=0.3, speed=(0.8, 1.25), keypoint_dropout=0.02, frame_dropout=0.03,
+                 parents=BODY_38_PARENTS, seed=None):
+        self.p = p
+        self.mirror_p = mirror_p
+        self.yaw = np.radians(yaw_deg)
+        self.tilt = np.radians(tilt_deg)
+        self.bone_scale = bone_scale
+        self.time_warp = time_warp
+        self.speed = speed
+        self.keypoint_dropout = keypoint_dropout
+        self.frame_dropout = frame_dropout
+        self.parents = np.asarray(parents, dtype=np.intp)
+        self.bone_order = _bone_order(self.parents)
+        self.seed_seq = np.random.SeedSequence(seed)
+        self.rng = np.random.default_rng(self.seed_seq)
+        # class index -> class index of its mirror image
+        labels = list(unique_labels)
+        self.mirror_map = np.array([labels.index(MIRROR_LABELS[l]) if MIRROR_LABELS.get(l) in labels else i
+                                    for i, l in enumerate(labels)], dtype=np.intp)
+
+    def spawn(self, n):
+        """n copies with independent generators derived from this one's seed, e.g. one per thread."""
+        out = []
+        for s in self.seed_seq.spawn(n):
+            a = copy.copy(self)
+            a.seed_seq, a.rng = s, np.random.default_rng(s)
+            out.append(a)
+        return out
+
+    def __call__(self, keypoints, timestamps, y):
+        """Augmented copies of (N, T, 38, 3) keypoints, (N, T) timestamps and (N,) labels."""
+        kp = fill_missing_batch(keypoints)
+        ts = np.asarray(timestamps, dtype=np.float64).copy()
+        y = np.array(y, dtype=np.intp)
+        n = len(kp)
+        sel = self.rng.random(n) < self.p
+        if not sel.any():
+            return kp.astype(np.float32), ts.astype(np.int64), y
+        lost = np.all(kp == 0, axis=-1)  # joints never tracked in the clip stay missing
+
+        kp[sel], y[sel] = self.mirror(kp[sel], y[sel])
+        kp[sel] = self.rotate(kp[sel])
+        kp[sel] = self.scale_bones(kp[sel])
+        kp[sel], ts[sel] = self.warp_time(kp[sel], ts[sel])
+        ts[sel] = self.change_speed(ts[sel])
+        kp[lost] = 0.0
+        kp[sel] = self.dropout(kp[sel])
+        return kp.astype(np.float32), ts.astype(np.int64), y
+
+    def mirror(self, kp, y):
+        flip = self.rng.random(len(kp)) < self.mirror_p
+        kp[flip, ..., 0] *= -1.0
+        y = np.where(flip, self.mirror_map[y], y)
+        return kp, y
+
+    def rotate(self, kp):
+        n = len(kp)
+        r = _rotation_matrices(self.rng.uniform(-self.yaw, self.yaw, n), self.rng.uniform(-self.tilt, self.tilt, n),
+                               self.rng.uniform(-self.tilt, self.tilt, n))
+        center = kp[:, :, 0].mean(axis=1)[:, None, None, :]  # mean pelvis of each clip
+        return np.einsum('ntjk,nik->ntji', kp - center, r) + center
+
+    def scale_bones(self, kp):
+        n = len(kp)
+        scales = self.rng.uniform(1 - self.bone_scale, 1 + self.bone_scale, (n, 1, len(self.parents), 1))
+        out = kp.copy()
+        for j in self.bone_order:
+            p = self.parents[j]
+            out[:, :, j] = out[:, :, p] + scales[:, :, j] * (kp[:, :, j] - kp[:, :, p])
+        return out
+
+    def warp_time(self, kp, ts):
+        """Resample each clip at u(s) = s + a s (1 - s), |a| <= time_warp (monotonic for |a| < 1)."""
+        n, t = kp.shape[:2]
+        s = np.linspace(0.0, 1.0, t)
+        a = self.rng.uniform(-self.time_warp, self.time_warp, (n, 1))
+        u = (s + a * s * (1 - s)) * (t - 1)
+        i0 = np.minimum(np.floor(u).astype(np.intp), t - 2)
+        w = u - i0
+        rows = np.arange(n)[:, None]
+        kp = kp[rows, i0] * (1 - w)[..., None, None] + kp[rows, i0 + 1] * w[..., None, None]
+        ts = ts[rows, i0] * (1 - w) + ts[rows, i0 + 1] * w
+        return kp, ts
+
+    def change_speed(self, ts):
+        f = self.rng.uniform(self.speed[0], self.speed[1], (len(ts), 1))
+        return ts[:, :1] + (ts - ts[:, :1]) * f
+
+    def dropout(self, kp):
+        n, t, j = kp.shape[:3]
+        drop = self.rng.random((n, t, j)) < self.keypoint_dropout
+        drop |= (self.rng.random((n, t)) < self.frame_dropout)[..., None]
+        kp[drop] = 0.0
+        return kp
+
+
+class AugmentedBatches:
+    """
+    Endless iterator of augmented (X, y_onehot) batches for model.fit, built
+    on `workers` background threads and buffered `prefetch` batches ahead.
+    Each worker walks its own shuffled pass over the clips with its own
+    augmenter (Augmenter.spawn); batches are taken from the workers in turn,
+    so the same seeds give the same batches in the same order.
+    """
+
+    def __init__(self, keypoints, timestamps, y, unique_labels, augmenter, columns=FEATURE_COLUMNS,
+                 batch_size=32, prefetch=8, workers=2, seed=None):
+        self.keypoints = np.asarray(keypoints, dtype=np.float32)
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.y = np.asarray(y, dtype=np.intp)
+        self.n_classes = len(unique_labels)
+        self.augmenter = augmenter
+        self.columns = list(columns)
+        self.batch_size = batch_size
+        self.steps_per_epoch = int(np.ceil(len(self.y) / batch_size))
+        self.batches_built = 0
+        self._lock = threading.Lock()
+        self._queues = [queue.Queue(maxsize=max(1, -(-prefetch // workers))) for _ in range(workers)]
+        self._next = 0
+        self._stop = threading.Event()
+        seeds = np.random.SeedSequence(seed).spawn(workers)
+        self._threads = [threading.Thread(target=self._run, args=(np.random.default_rng(s), a, q),
+                                          name=f"AugmentedBatches-{i}", daemon=True)
+                         for i, (s, a, q) in enumerate(zip(seeds, augmenter.spawn(workers), self._queues))]
+        for th in self._threads:
+            th.start()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = self._queues[self._next].get()
+        self._next = (self._next + 1) % len(self._queues)
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def close(self):
+        self._stop.set()
+        for q in self._queues:  # unblock workers waiting on a full queue
+            while True:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    break
+        for th in self._threads:
+            th.join(timeout=1.0)
+
+    def make_batch(self, idx, augmenter=None):
+        kp, ts, y = (augmenter or self.augmenter)(self.keypoints[idx], self.timestamps[idx], self.y[idx])
+        X = clip_features_batch(kp, ts, self.columns)
+        return X, np.eye(self.n_classes, dtype=np.float32)[y]
+
+    def _run(self, rng, augmenter, out):
+        order, pos = rng.permutation(len(self.y)), 0
+        while not self._stop.is_set():
+            if pos >= len(order):
+                order, pos = rng.permutation(len(self.y)), 0
+            idx = order[pos:pos + self.batch_size]
+            pos += self.batch_size
+            try:
+                batch = self.make_batch(idx, augmenter)
+            except Exception as e:
+                batch = e
+            with self._lock:
+                self.batches_built += 1
+            while not self._stop.is_set():
+                try:
+                    out.put(batch, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
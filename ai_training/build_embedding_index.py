@@ -0,0 +1,87 @@
+# build_embedding_index.py
+#
+# Builds the prototype index used for open-set rejection (OPEN_SET in
+# realtime_inference_app/config.py) from the recorded dataset:
+#   - penultimate-layer embeddings of the training split
+#   - up to --per-class k-means prototypes per gesture
+#   - per-class distance thresholds calibrated on the blind-test split
+# and writes embedding_index.npz next to the model (where the realtime app
+# looks for it, like feature_columns.json).
+#
+#   python build_embedding_index.py --model models_lstm/lstm_model_best --dataset gesture_dataset.npz
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from gesture_dataset import load_dataset, blind_test_split
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "realtime_inference_app"))
+from embedding_index import PrototypeIndex, embedding_model, default_index_path
+
+
+def query_time_us(index, dim, n=2000):
+    q = np.random.default_rng(0).normal(size=(1, dim)).astype(np.float32)
+    index.class_distances(q)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        index.class_distances(q)
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the open-set prototype index for a model")
+    parser.add_argument("--model", required=True, help="saved Keras model directory")
+    parser.add_argument("--dataset", default="gesture_dataset.npz")
+    parser.add_argument("--layer", default=None, help="embedding layer name (default: the layer before the output)")
+    parser.add_argument("--per-class", type=int, default=64, help="k-means prototypes per class (0 = keep every sample)")
+    parser.add_argument("--quantile", type=float, default=0.95)
+    parser.add_argument("--slack", type=float, default=1.2)
+    parser.add_argument("--out", default=None, help="default: embedding_index.npz next to the model")
+    args = parser.parse_args(argv)
+
+    import tensorflow as tf
+
+    X, y, unique_labels, _ = load_dataset(args.dataset)
+    X_train, X_val, y_train, y_val = blind_test_split(X, y)
+    model = tf.keras.models.load_model(args.model)
+    embedder, layer = embedding_model(model, args.layer if args.layer else -2)
+
+    emb_train, _ = embedder.predict(X_train, verbose=0)
+    emb_val, probs_val = embedder.predict(X_val, verbose=0)
+    emb_train = emb_train.reshape(len(X_train), -1)
+    emb_val = emb_val.reshape(len(X_val), -1)
+
+    index = PrototypeIndex.build(emb_train, y_train, unique_labels, per_class=args.per_class or None,
+                                 calib_embeddings=emb_val, calib_labels=y_val,
+                                 quantile=args.quantile, slack=args.slack, layer=layer)
+    out = args.out or default_index_path(args.model)
+    index.save(out)
+
+    print(f"=== Embedding layer '{layer}', dim {emb_train.shape[1]}, {len(index)} prototypes ===")
+    for ci, label in enumerate(unique_labels):
+        print(f"{label:<15} prototypes {np.sum(index.labels == ci):>4}  threshold {index.thresholds[ci]:.4f}")
+
+    # How much is rejected: in-distribution blind test vs. time-shuffled
+    # windows (plausible poses, implausible motion) as an out-of-distribution proxy.
+    pred_val = np.argmax(probs_val, axis=-1)
+    _, rej_val = index.score(emb_val, pred_val)
+    rng = np.random.default_rng(0)
+    X_ood = np.stack([x[rng.permutation(len(x))] for x in X_val])
+    emb_ood, probs_ood = embedder.predict(X_ood, verbose=0)
+    _, rej_ood = index.score(emb_ood.reshape(len(X_ood), -1), np.argmax(probs_ood, axis=-1))
+    print(f"\nRejected: blind test {rej_val.mean():.1%}, time-shuffled windows {rej_ood.mean():.1%}")
+    print(f"Blind-test accuracy of accepted windows: {np.mean(pred_val[~rej_val] == y_val[~rej_val]):.3f}")
+
+    big = PrototypeIndex(np.random.default_rng(1).normal(size=(5000, emb_train.shape[1])),
+                         np.arange(5000) % len(unique_labels), unique_labels, index.thresholds)
+    print(f"Query time: {query_time_us(index, emb_train.shape[1]):.1f} us ({len(index)} prototypes), "
+          f"{query_time_us(big, emb_train.shape[1]):.1f} us (5000 prototypes)")
+    print(f"\nIndex written to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+# cascade_eval.py
+#
+# Offline evaluation of the rule-based first tier of GestureClassifier
+# (RULE_CASCADE in realtime_inference_app/config.py, rules in swipe_rules.py).
+#
+# For each (min_travel, min_clarity) setting it reports the fraction of
+# windows answered by the rules, the accuracy of each tier, the accuracy of the
+# whole cascade vs. the model alone, and the average CPU time per gesture.
+# It also prints the direction -> label mapping measured on the dataset, to
+# check RULE_DIRECTIONS against.
+#
+#   python cascade_eval.py --model models_lstm/lstm_model_best --dataset gesture_dataset.npz --blind-test
+
+import os
+import sys
+import csv
+import time
+import argparse
+import numpy as np
+
+from gesture_dataset import load_dataset, blind_test_split
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "realtime_inference_app"))
+import swipe_rules
+
+DEFAULT_TRAVELS = [0.2, 0.3, 0.4, 0.5, 0.6, 0.8]
+DEFAULT_CLARITIES = [0.5, 0.6, 0.7, 0.75, 0.8, 0.9]
+VERTICAL_ANGLE = 60
+HORIZONTAL_ANGLE = 25
+
+
+def fit_directions(X, y, cols, unique_labels):
+    """{"+x": label, ...}: dominant axis and sign of each class's mean wrist movement."""
+    move = swipe_rules.swipe_geometry(X, cols)[0]
+    move = move / (np.linalg.norm(move, axis=-1, keepdims=True) + 1e-6)
+    directions = {}
+    for i, label in enumerate(unique_labels):
+        m = move[y == i].mean(axis=0)
+        ax = int(np.argmax(np.abs(m)))
+        directions[("+" if m[ax] > 0 else "-") + swipe_rules.AXES[ax]] = label
+    return directions
+
+
+def time_per_window(fn, windows, n=200):
+    fn(windows[:1])  # warm-up
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(windows[i % len(windows)][None])
+    return (time.perf_counter() - t0) / n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rule tier vs. model tier of the classification cascade")
+    parser.add_argument("--model", required=True, help="saved Keras model directory")
+    parser.add_argument("--dataset", default="gesture_dataset.npz")
+    parser.add_argument("--blind-test", action="store_true", help="evaluate on the notebook's 20%% split only")
+    parser.add_argument("--out", default="cascade_eval.csv")
+    args = parser.parse_args(argv)
+
+    import tensorflow as tf
+
+    X, y, unique_labels, columns = load_dataset(args.dataset)
+    cols = swipe_rules.wrist_columns(columns)
+    if cols is None:
+        print("Dataset has no rel_15/rel_17 columns; re-save it with its feature columns")
+        return 1
+    directions = fit_directions(X, y, cols, unique_labels)
+    if args.blind_test:
+        _, X, _, y = blind_test_split(X, y)
+    table = swipe_rules.direction_table(directions, unique_labels)
+
+    model = tf.keras.models.load_model(args.model)
+    model_pred = np.argmax(model.predict(X, verbose=0), axis=-1)
+    model_acc = float(np.mean(model_pred == y))
+    t_model = time_per_window(lambda w: model.predict(w, verbose=0), X, n=50)
+
+    print(f"=== {len(X)} samples ===")
+    print("Measured directions (RULE_DIRECTIONS):")
+    for k, v in directions.items():
+        print(f"    \"{k}\": \"{v}\"")
+    print(f"Model only: accuracy {model_acc:.3f}, {t_model*1e3:.2f} ms per window")
+
+    rows = []
+    for travel in DEFAULT_TRAVELS:
+        for clarity in DEFAULT_CLARITIES:
+            rules = {"min_travel": travel, "min_clarity": clarity,
+                     "vertical_angle": VERTICAL_ANGLE, "horizontal_angle": HORIZONTAL_ANGLE}
+            rule_pred = swipe_rules.classify_swipes(X, cols, table, rules)
+            by_rules = rule_pred >= 0
+            cascade = np.where(by_rules, rule_pred, model_pred)
+            t_rules = time_per_window(lambda w: swipe_rules.classify_swipes(w, cols, table, rules), X)
+            frac = float(np.mean(by_rules))
+            rows.append({
+                "min_travel": travel,
+                "min_clarity": clarity,
+                "rules_fraction": frac,
+                "rules_accuracy": float(np.mean(rule_pred[by_rules] == y[by_rules])) if by_rules.any() else 0.0,
+                "model_tier_accuracy": float(np.mean(model_pred[~by_rules] == y[~by_rules])) if (~by_rules).any() else 0.0,
+                "cascade_accuracy": float(np.mean(cascade == y)),
+                "model_only_accuracy": model_acc,
+                "rules_us": t_rules * 1e6,
+                "cpu_ms_per_gesture": (t_rules + (1.0 - frac) * t_model) * 1e3,
+            })
+
+    with open(args.out, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0]))
+        w.writeheader()
+        w.writerows(rows)
+
+    print(f"\n{'travel':>6} {'clar':>5} {'rules%':>7} {'rule_acc':>8} {'model_acc':>9} {'cascade':>8} {'ms/gest':>8}")
+    for r in rows:
+        print(f"{r['min_travel']:>6.2f} {r['min_clarity']:>5.2f} {r['rules_fraction']:>7.1%} {r['rules_accuracy']:>8.3f} "
+              f"{r['model_tier_accuracy']:>9.3f} {r['cascade_accuracy']:>8.3f} {r['cpu_ms_per_gesture']:>8.3f}")
+    print(f"\nFull grid written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# early_exit_eval.py
+#
+# Offline evaluation of early ("anytime") classification, i.e. EARLY_EXIT in
+# realtime_inference_app/config.py.
+#
+# Every sample is classified from its first k frames (k = 1..7, padded with the
+# last frame exactly like GestureClassifier does), then each (min_frames,
+# confidence, margin) setting is replayed on those predictions:
+#   - the decision is taken at the first k >= min_frames whose top probability
+#     >= confidence and top1 - top2 >= margin, otherwise on the full window
+#   - accuracy of that decision, mean frames-to-decision, how often it was
+#     early, and how often an early decision disagreed with the full window
+#     (the realtime app retracts those)
+#
+#   python early_exit_eval.py --model models_lstm/lstm_model_best --dataset gesture_dataset.npz --blind-test
+#
+# gesture_dataset.npz is written by the notebook (cell after the extraction).
+
+import sys
+import csv
+import argparse
+import numpy as np
+
+from gesture_dataset import load_dataset, blind_test_split
+
+DEFAULT_CONFIDENCES = [0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.99]
+DEFAULT_MARGINS = [0.0, 0.2, 0.4, 0.5, 0.6, 0.8]
+DEFAULT_MIN_FRAMES = [1, 2, 3, 4]
+
+
+def prefix_windows(X, k):
+    """First k frames of every window, padded to full length with frame k-1."""
+    out = X.copy()
+    out[:, k:] = X[:, k-1:k]
+    return out
+
+
+def prefix_probabilities(model, X, batch_size=256):
+    """(N, T, C) class probabilities of every k-frame prefix, in one batched predict."""
+    n, t = X.shape[:2]
+    stacked = np.concatenate([prefix_windows(X, k) for k in range(1, t+1)])
+    probs = model.predict(stacked, batch_size=batch_size, verbose=0)
+    probs = probs / np.maximum(probs.sum(axis=-1, keepdims=True), 1e-12)
+    return probs.reshape(t, n, -1).transpose(1, 0, 2)
+
+
+def top_margin(probs):
+    top2 = np.sort(probs, axis=-1)[..., -2:]
+    return top2[..., 1], top2[..., 1] - top2[..., 0]
+
+
+def early_decisions(probs, confidence, margin, min_frames):
+    """
+    Replays the early-exit rule on (N, T, C) prefix probabilities. Returns the
+    decided class, frames used, early flag and retraction flag, each (N,).
+    """
+    n, t = probs.shape[:2]
+    conf, mg = top_margin(probs)
+    ok = (conf >= confidence) & (mg >= margin)
+    ok[:, :min_frames-1] = False
+    ok[:, -1] = True  # the full window always decides
+    first = np.argmax(ok, axis=1)
+    pred = np.argmax(probs[np.arange(n), first], axis=-1)
+    final = np.argmax(probs[:, -1], axis=-1)
+    early = first < t-1
+    return pred, first+1, early, early & (pred != final)
+
+
+def evaluate(probs, y, confidences, margins, min_frames_list):
+    rows = []
+    for mf in min_frames_list:
+        for c in confidences:
+            for m in margins:
+                pred, frames, early, retracted = early_decisions(probs, c, m, mf)
+                rows.append({
+                    "min_frames": mf,
+                    "confidence": c,
+                    "margin": m,
+                    "accuracy": float(np.mean(pred == y)),
+                    "mean_frames": float(np.mean(frames)),
+                    "early_rate": float(np.mean(early)),
+                    "early_accuracy": float(np.mean(pred[early] == y[early])) if early.any() else 0.0,
+                    "retraction_rate": float(np.mean(retracted)),
+                })
+    return rows
+
+
+def pareto_front(rows):
+    """Settings not beaten on both accuracy and mean frames-to-decision."""
+    front = []
+    for r in sorted(rows, key=lambda r: (r["mean_frames"], -r["accuracy"])):
+        if not front or r["accuracy"] > front[-1]["accuracy"]:
+            front.append(r)
+    return front
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Accuracy vs frames-to-decision of early classification")
+    parser.add_argument("--model", required=True, help="saved Keras model directory")
+    parser.add_argument("--dataset", default="gesture_dataset.npz")
+    parser.add_argument("--blind-test", action="store_true", help="evaluate on the notebook's 20%% split only")
+    parser.add_argument("--out", default="early_exit_eval.csv")
+    args = parser.parse_args(argv)
+
+    import tensorflow as tf
+
+    X, y, unique_labels, _ = load_dataset(args.dataset)
+    if args.blind_test:
+        _, X, _, y = blind_test_split(X, y)
+    model = tf.keras.models.load_model(args.model)
+    probs = prefix_probabilities(model, X)
+
+    print(f"=== {len(X)} samples, classes: {', '.join(unique_labels)} ===")
+    print(f"{'frames':>6} {'accuracy':>9}")
+    for k in range(probs.shape[1]):
+        print(f"{k+1:>6} {np.mean(np.argmax(probs[:, k], axis=-1) == y):>9.3f}")
+
+    rows = evaluate(probs, y, DEFAULT_CONFIDENCES, DEFAULT_MARGINS, DEFAULT_MIN_FRAMES)
+    with open(args.out, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0]))
+        w.writeheader()
+        w.writerows(rows)
+
+    print("\n=== Pareto front (accuracy vs mean frames-to-decision) ===")
+    print(f"{'min_fr':>6} {'conf':>5} {'margin':>6} {'acc':>6} {'frames':>6} {'early':>6} {'retract':>7}")
+    for r in pareto_front(rows):
+        print(f"{r['min_frames']:>6} {r['confidence']:>5.2f} {r['margin']:>6.2f} {r['accuracy']:>6.3f} "
+              f"{r['mean_frames']:>6.2f} {r['early_rate']:>6.2f} {r['retraction_rate']:>7.3f}")
+    print(f"\nFull grid written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,741 @@
+# gesture_dataset.py
+#
+# Dataset extraction from ZED_GD_4.ipynb (cells 2-4) as an importable module,
+# so the scripts in ai_training/ can rebuild or load the gesture dataset
+# without running the notebook.
+#
+#   from gesture_dataset import build_dataset, save_dataset, load_dataset
+#   X, labels, columns = build_dataset(r"D:\...\dataset_2")
+#   save_dataset("gesture_dataset.npz", X, labels, columns)
+
+import os
+import sys
+import glob
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import euclidean
+from scipy.signal import savgol_filter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "automated_dataset_recorder"))
+from keypoint_sidecar import SIDECAR_SUFFIX, read_sidecar, sidecar_path, clip_stem
+from dataset_manifest import DatasetManifest
+
+WINDOW_SIZE = 7
+# Bump when clip_features changes: features cached in the dataset manifest
+# under another version are extracted again.
+FEATURE_VERSION = 1
+
+# The 70 columns of clip_features, in its order
+FEATURE_COLUMNS = (
+    [f'rel_{j}_{a}' for j in (13, 15, 17) for a in 'xyz']
+    + ['angle_elbow', 'angular_velocity_elbow']
+    + [f'{k}_{j}_{a}' for j in (13, 15, 17) for a in 'xyz' for k in ('vel', 'acc', 'jerk')]
+    + ['speed_15', 'speed_17', 'acc_magnitude_15', 'acc_magnitude_17', 'path_length_17']
+    + ['straightness', 'planarity', 'peak_speed', 'avg_speed', 'speed_variability', 'direction_changes',
+       'vertical_extent', 'horizontal_extent', 'vertical_horizontal_ratio', 'total_displacement', 'path_length']
+    + ['wrist_end_x_rel_torso', 'wrist_end_y_rel_torso', 'wrist_end_z_rel_torso',
+       'movement_dir_x', 'movement_dir_y', 'movement_dir_z', 'horiz_vert_ratio',
+       'dominant_xy', 'dominant_yz', 'dominant_xz', 'end_right', 'end_up', 'end_forward',
+       'directional_clarity', 'angle_from_horizontal', 'angle_in_horizontal']
+)
+
+FOLDERS = {
+    'RArm_SwipeRight': 'right_swipe',
+    'RArm_SwipeLeft':  'left_swipe',
+    'RArm_SwipeUp':    'up_swipe',
+    'RArm_SwipeDown':  'down_swipe'
+}
+
+
+def interpolate_missing(df):
+    for col in df.columns:
+        if col in ['timestamp','gesture','frame_number']:
+            continue
+        df[col] = df[col].replace(0, np.nan).interpolate(method='linear').ffill().bfill()
+    return df
+
+def smooth_data(df, window=5):
+    for col in df.columns:
+        if col in ['timestamp', 'gesture', 'frame_number']:
+            continue
+        w = min(window, len(df)) if len(df)>=3 else 3
+        poly = 3
+        if w <= poly:
+            poly = w-1
+            if poly < 1:
+                continue
+        if w % 2 == 0:
+            w -= 1
+        if w < 3:
+            continue
+        df[col] = savgol_filter(df[col], w, poly)
+    return df
+
+def normalize_time(df):
+    df = df.copy()
+    df['normalized_time'] = df.groupby('gesture')['timestamp'].transform(
+        lambda x: (x - x.iloc[0]) / (x.iloc[-1] - x.iloc[0] + 1e-6))
+    return df
+
+def calculate_angle(a,b,c):
+    try:
+        ba = a - b
+        bc = c - b
+        if np.all(ba==0) or np.all(bc==0):
+            return 0
+        cos_angle = np.dot(ba, bc)/(np.linalg.norm(ba)*np.linalg.norm(bc))
+        cos_angle = np.clip(cos_angle, -1.0,1.0)
+        return np.degrees(np.arccos(cos_angle))
+    except:
+        return 0
+
+def calculate_angular_velocity(angles, timestamps):
+    return np.gradient(angles, timestamps)
+
+def extract_features(df):
+    SHOULDER, ELBOW, WRIST = 13, 15, 17
+    timestamps = df['timestamp'].values/1000.0  # to seconds?
+
+    features = pd.DataFrame(index=df.index)
+
+    # relative positions
+    for joint in [SHOULDER, ELBOW, WRIST]:
+        for axis in ['x', 'y', 'z']:
+            features[f'rel_{joint}_{axis}'] = df[f'kp{joint}_{axis}'] - df[f'kp{SHOULDER}_{axis}']
+
+    # angle at elbow
+    posS = df[[f'kp{SHOULDER}_x', f'kp{SHOULDER}_y', f'kp{SHOULDER}_z']].values
+    posE = df[[f'kp{ELBOW}_x', f'kp{ELBOW}_y', f'kp{ELBOW}_z']].values
+    posW = df[[f'kp{WRIST}_x', f'kp{WRIST}_y', f'kp{WRIST}_z']].values
+    angles = []
+    for i in range(len(df)):
+        angles.append(calculate_angle(posS[i], posE[i], posW[i]))
+    features['angle_elbow'] = angles
+    features['angular_velocity_elbow'] = calculate_angular_velocity(features['angle_elbow'].values, timestamps)
+
+    # velocity, acceleration, jerk
+    for joint in [SHOULDER, ELBOW, WRIST]:
+        p = df[[f'kp{joint}_x', f'kp{joint}_y', f'kp{joint}_z']].values
+        vel = np.zeros_like(p)
+        if len(p) > 2:
+            vel[1:-1] = (p[2:] - p[:-2]) / ((timestamps[2:] - timestamps[:-2])[:, None])
+            vel[0] = vel[1]
+            vel[-1] = vel[-2]
+        else:
+            vel = np.gradient(p, axis=0)
+        acc = np.gradient(vel, axis=0)
+        jerk = np.gradient(acc, axis=0)
+
+        for idx, axis in enumerate(['x', 'y', 'z']):
+            features[f'vel_{joint}_{axis}'] = vel[:, idx]
+            features[f'acc_{joint}_{axis}'] = acc[:, idx]
+            features[f'jerk_{joint}_{axis}'] = jerk[:, idx]
+
+    # speed wrist
+    features['speed_15'] = np.sqrt(features['vel_15_x']**2 + features['vel_15_y']**2 + features['vel_15_z']**2)
+    features['speed_17'] = np.sqrt(features['vel_17_x']**2 + features['vel_17_y']**2 + features['vel_17_z']**2)
+
+    # acc magnitude
+    features['acc_magnitude_15'] = np.sqrt(features['acc_15_x']**2 + features['acc_15_y']**2 + features['acc_15_z']**2)
+    features['acc_magnitude_17'] = np.sqrt(features['acc_17_x']**2 + features['acc_17_y']**2 + features['acc_17_z']**2)
+
+    # path length wrist
+    path_length = np.zeros(len(df))
+    for i in range(1, len(df)):
+        path_length[i] = path_length[i-1] + euclidean(posW[i], posW[i-1])
+    features['path_length_17'] = path_length
+
+    features = features.replace([np.nan, np.inf, -np.inf], 0.0)
+    return features
+
+def extract_additional_features(features):
+    wpos = np.array([features['rel_17_x'].values,
+                     features['rel_17_y'].values,
+                     features['rel_17_z'].values])
+    vel = np.array([np.gradient(wpos[0]),
+                    np.gradient(wpos[1]),
+                    np.gradient(wpos[2])])
+    disp = float(np.linalg.norm(wpos[:, -1] - wpos[:, 0]))
+    pl = float(np.sum(np.sqrt(np.sum(np.diff(wpos,axis=1)**2,axis=0))))
+    straightness = disp/pl if pl>0 else 0
+
+    cov = np.cov(wpos)
+    ev = np.linalg.eigvals(cov)
+    if ev[0] != 0:
+        planarity = float(ev[1]/ev[0])
+    else:
+        planarity = 0.0
+
+    speeds = np.sqrt(np.sum(vel**2, axis=0))
+    peak_speed = float(np.max(speeds))
+    avg_speed  = float(np.mean(speeds))
+    speed_var  = float(np.std(speeds))
+
+    direction = np.diff(np.arctan2(vel[1], vel[0]))
+    direction_changes = int(np.sum(np.abs(direction) > np.pi/4))
+
+    vert_ext  = float(np.ptp(wpos[1]))
+    horiz_ext = float(np.ptp(wpos[0]))
+    vh_ratio  = vert_ext/horiz_ext if horiz_ext>0 else 0
+
+    return {
+        'straightness': straightness,
+        'planarity': planarity,
+        'peak_speed': peak_speed,
+        'avg_speed': avg_speed,
+        'speed_variability': speed_var,
+        'direction_changes': direction_changes,
+        'vertical_extent': vert_ext,
+        'horizontal_extent': horiz_ext,
+        'vertical_horizontal_ratio': vh_ratio,
+        'total_displacement': disp,
+        'path_length': pl
+    }
+
+def extract_directional_features(df):
+    """
+    Extract directional features that better distinguish between up/down and left/right swipes
+    """
+    NECK, TORSO, SHOULDER, ELBOW, WRIST = 0, 1, 13, 15, 17  # Key joint indices
+
+    # Get the initial and final positions
+    wrist_start = df.iloc[0][[f'kp{WRIST}_x', f'kp{WRIST}_y', f'kp{WRIST}_z']].values
+    wrist_end = df.iloc[-1][[f'kp{WRIST}_x', f'kp{WRIST}_y', f'kp{WRIST}_z']].values
+    torso_pos = df.iloc[-1][[f'kp{TORSO}_x', f'kp{TORSO}_y', f'kp{TORSO}_z']].values
+    neck_pos = df.iloc[-1][[f'kp{NECK}_x', f'kp{NECK}_y', f'kp{NECK}_z']].values
+
+    features = {}
+
+    # 1. End position of wrist relative to torso (normalized)
+    wrist_to_torso_vec = wrist_end - torso_pos
+    body_height = np.linalg.norm(neck_pos - torso_pos) + 1e-6  # Avoid division by zero
+    wrist_to_torso_normalized = wrist_to_torso_vec / body_height
+
+    features['wrist_end_x_rel_torso'] = wrist_to_torso_normalized[0]
+    features['wrist_end_y_rel_torso'] = wrist_to_torso_normalized[1]
+    features['wrist_end_z_rel_torso'] = wrist_to_torso_normalized[2]
+
+    # 2. Movement direction vector (from start to end)
+    movement_vec = wrist_end - wrist_start
+    movement_dist = np.linalg.norm(movement_vec) + 1e-6
+    movement_dir = movement_vec / movement_dist
+
+    features['movement_dir_x'] = movement_dir[0]
+    features['movement_dir_y'] = movement_dir[1]
+    features['movement_dir_z'] = movement_dir[2]
+
+    # 3. Horizontal vs Vertical movement ratio
+    horizontal_movement = abs(movement_vec[0]) + abs(movement_vec[2])
+    vertical_movement = abs(movement_vec[1])
+    features['horiz_vert_ratio'] = horizontal_movement / (vertical_movement + 1e-6)
+
+    # 4. Dominant plane
+    xy_movement = abs(movement_vec[0]) + abs(movement_vec[1])
+    yz_movement = abs(movement_vec[1]) + abs(movement_vec[2])
+    xz_movement = abs(movement_vec[0]) + abs(movement_vec[2])
+
+    features['dominant_xy'] = xy_movement / (movement_dist + 1e-6)
+    features['dominant_yz'] = yz_movement / (movement_dist + 1e-6)
+    features['dominant_xz'] = xz_movement / (movement_dist + 1e-6)
+
+    # 5. Quadrant of end position (relative to start)
+    features['end_right'] = 1.0 if movement_vec[0] > 0 else 0.0
+    features['end_up'] = 1.0 if movement_vec[1] > 0 else 0.0
+    features['end_forward'] = 1.0 if movement_vec[2] > 0 else 0.0
+
+    # 6. Measure of how "clean" the directional movement is
+    # (high value = movement primarily in one direction)
+    movement_abs = np.abs(movement_vec)
+    primary_direction = np.max(movement_abs) / (np.sum(movement_abs) + 1e-6)
+    features['directional_clarity'] = primary_direction
+
+    # 7. Direction angles
+    features['angle_from_horizontal'] = np.degrees(np.arctan2(movement_vec[1],
+                                               np.sqrt(movement_vec[0]**2 + movement_vec[2]**2)))
+    features['angle_in_horizontal'] = np.degrees(np.arctan2(movement_vec[0], movement_vec[2]))
+
+    return features
+
+
+def open_svo_and_extract_dataframe(svo_path, gesture_label="unknown"):
+    """
+    Replays an SVO with body tracking and returns one row per frame
+    (frame_number, timestamp, gesture, kp{j}_{x,y,z}); dummy zeros when no
+    skeleton was found.
+    """
+    import pyzed.sl as sl
+
+    zed = sl.Camera()
+
+    init_params = sl.InitParameters()
+    init_params.set_from_svo_file(svo_path)
+    init_params.depth_mode = sl.DEPTH_MODE.ULTRA
+    init_params.coordinate_units = sl.UNIT.METER
+    init_params.coordinate_system = sl.COORDINATE_SYSTEM.RIGHT_HANDED_Y_UP
+
+    status = zed.open(init_params)
+    if status != sl.ERROR_CODE.SUCCESS:
+        print("Could not open SVO:", status)
+        return pd.DataFrame()
+
+    pt_params = sl.PositionalTrackingParameters()
+    err_pt = zed.enable_positional_tracking(pt_params)
+    if err_pt != sl.ERROR_CODE.SUCCESS:
+        print("Positional tracking not enabled:", err_pt)
+        zed.close()
+        return pd.DataFrame()
+
+    body_params = sl.BodyTrackingParameters()
+    body_params.detection_model = sl.BODY_TRACKING_MODEL.HUMAN_BODY_FAST
+    body_params.body_format = sl.BODY_FORMAT.BODY_38
+    err_body = zed.enable_body_tracking(body_params)
+    if err_body != sl.ERROR_CODE.SUCCESS:
+        print("Body tracking not enabled:", err_body)
+        zed.close()
+        return pd.DataFrame()
+
+    runtime_params = sl.RuntimeParameters()
+    body_runtime_params = sl.BodyTrackingRuntimeParameters()
+
+    nframes = zed.get_svo_number_of_frames()
+    frames_data = []
+
+    frame_number = 0
+    while True:
+        err = zed.grab(runtime_params)
+        if err != sl.ERROR_CODE.SUCCESS:
+            break
+
+        bodies = sl.Bodies()
+        zed.retrieve_bodies(bodies, body_runtime_params)
+
+        ts_ns = zed.get_timestamp(sl.TIME_REFERENCE.IMAGE).get_nanoseconds()
+
+        main_body = None
+        if bodies.body_list:
+            raw_list = []
+            for b in bodies.body_list:
+                conf_list = [1.0]*len(b.keypoint)  # placeholder if you don't have actual confidences
+                raw_list.append({
+                    "id": b.id,
+                    "keypoints": [list(kp) for kp in b.keypoint],
+                    "confidence": conf_list
+                })
+            main_body = max(raw_list, key=lambda x: sum(x["confidence"]))
+
+        row = {
+            "frame_number": frame_number,
+            "timestamp": ts_ns,
+            "gesture": gesture_label
+        }
+
+        if main_body:
+            for jidx, kp in enumerate(main_body["keypoints"]):
+                row[f'kp{jidx}_x'] = kp[0]
+                row[f'kp{jidx}_y'] = kp[1]
+                row[f'kp{jidx}_z'] = kp[2]
+        else:
+            for jidx in range(38):
+                row[f'kp{jidx}_x'] = 0.0
+                row[f'kp{jidx}_y'] = 0.0
+                row[f'kp{jidx}_z'] = 0.0
+
+        frames_data.append(row)
+
+        frame_number += 1
+
+        if zed.get_svo_position() >= (nframes - 1):
+            break
+
+    zed.close()
+
+    if not frames_data:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(frames_data)
+    df = df.sort_values("frame_number").reset_index(drop=True)
+    return df
+
+
+def sidecar_dataframe(path, gesture_label="unknown"):
+    """
+    Same rows as open_svo_and_extract_dataframe, read from a keypoint sidecar
+    recorded live by the recorder (no SVO decoding, no body tracking).
+    """
+    sc = read_sidecar(path)
+    n = len(sc["timestamps"])
+    if n == 0:
+        return pd.DataFrame()
+    kp = sc["keypoints"].reshape(n, -1)
+    cols = [f'kp{j}_{a}' for j in range(kp.shape[1] // 3) for a in 'xyz']
+    df = pd.DataFrame(kp.astype(np.float64), columns=cols)
+    df.insert(0, "gesture", gesture_label)
+    df.insert(0, "timestamp", sc["timestamps"])
+    df.insert(0, "frame_number", np.arange(n))
+    return df
+
+
+def clip_dataframe(path, gesture_label="unknown"):
+    """Frames of one clip: from its keypoint sidecar when there is one, else by replaying the SVO."""
+    if path.endswith(SIDECAR_SUFFIX):
+        return sidecar_dataframe(path, gesture_label)
+    sc = sidecar_path(path)
+    if os.path.exists(sc):
+        return sidecar_dataframe(sc, gesture_label)
+    return open_svo_and_extract_dataframe(path, gesture_label)
+
+
+def clip_paths(folder_path):
+    """One path per clip in a folder: the sidecar if it exists, else the SVO."""
+    clips = {}
+    for p in sorted(glob.glob(os.path.join(folder_path, '*.svo2'))):
+        clips[clip_stem(p)] = p
+    for p in sorted(glob.glob(os.path.join(folder_path, '*' + SIDECAR_SUFFIX))):
+        clips[clip_stem(p)] = p
+    return [clips[k] for k in sorted(clips)]
+
+
+def clip_features(df):
+    """Interpolate, smooth, normalize time and compute the 70 features of one clip."""
+    df = interpolate_missing(df)
+    df = smooth_data(df, window=3)
+    df = normalize_time(df)
+    feats = extract_features(df)
+    extra_dict = extract_additional_features(feats)
+    directional_dict = extract_directional_features(df)
+    for k,v in extra_dict.items():
+        feats[k] = v
+    for k,v in directional_dict.items():
+        feats[k] = v
+    return feats
+
+
+def fill_missing_batch(keypoints):
+    """
+    interpolate_missing for a batch: (N, T, ...) values where 0 means missing
+    are linearly interpolated along T, with the nearest valid value at the
+    ends. Series with no valid value stay 0.
+    """
+    x = np.asarray(keypoints, dtype=np.float64)
+    n, t = x.shape[:2]
+    flat = x.reshape(n, t, -1)
+    valid = flat != 0
+    idx = np.arange(t)[None, :, None]
+    prev = np.maximum.accumulate(np.where(valid, idx, -1), axis=1)
+    nxt = np.flip(np.minimum.accumulate(np.flip(np.where(valid, idx, t), axis=1), axis=1), axis=1)
+    has_prev, has_next = prev >= 0, nxt < t
+    prev, nxt = np.clip(prev, 0, t - 1), np.clip(nxt, 0, t - 1)
+    vp = np.take_along_axis(flat, prev, axis=1)
+    vn = np.take_along_axis(flat, nxt, axis=1)
+    w = (idx - prev) / np.maximum(nxt - prev, 1)
+    out = np.where(has_prev & has_next, vp + (vn - vp) * w, np.where(has_prev, vp, np.where(has_next, vn, flat)))
+    return out.reshape(x.shape)
+
+
+def _gradient_t(f, t):
+    """np.gradient(f, t) along axis 1 with a separate time axis per row (edge_order=1)."""
+    out = np.empty_like(f)
+    hs = t[:, 1:-1] - t[:, :-2]
+    hd = t[:, 2:] - t[:, 1:-1]
+    out[:, 1:-1] = (hs ** 2 * f[:, 2:] + (hd ** 2 - hs ** 2) * f[:, 1:-1] - hd ** 2 * f[:, :-2]) / (hs * hd * (hd + hs))
+    out[:, 0] = (f[:, 1] - f[:, 0]) / (t[:, 1] - t[:, 0])
+    out[:, -1] = (f[:, -1] - f[:, -2]) / (t[:, -1] - t[:, -2])
+    return out
+
+
+def clip_features_batch(keypoints, timestamps, columns=FEATURE_COLUMNS):
+    """
+    clip_features for a batch of clips in one vectorized pass.
+    keypoints: (N, T, 38, 3) BODY_38 positions, 0 where missing; timestamps:
+    (N, T) in ns; T >= 3. Returns (N, T, len(columns)) float32 in columns'
+    order. smooth_data is left out: with window 3 it fits a quadratic to 3
+    points, which reproduces its input.
+    """
+    kp = fill_missing_batch(keypoints)
+    ts = np.asarray(timestamps, dtype=np.float64) / 1000.0
+    n, t = kp.shape[:2]
+    if t < 3:
+        raise ValueError(f"clips need at least 3 frames, got {t}")
+    SHOULDER, ELBOW, WRIST = 13, 15, 17
+    f = {}
+    err = np.seterr(divide='ignore', invalid='ignore')
+    try:
+        pos = {j: kp[:, :, j] for j in (SHOULDER, ELBOW, WRIST)}
+        for j in (SHOULDER, ELBOW, WRIST):
+            rel = pos[j] - pos[SHOULDER]
+            for i, a in enumerate('xyz'):
+                f[f'rel_{j}_{a}'] = rel[..., i]
+
+        ba = pos[SHOULDER] - pos[ELBOW]
+        bc = pos[WRIST] - pos[ELBOW]
+        degenerate = np.all(ba == 0, axis=-1) | np.all(bc == 0, axis=-1)
+        cos_angle = np.clip(np.sum(ba * bc, axis=-1) / (np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1)),
+                            -1.0, 1.0)
+        angle = np.where(degenerate, 0.0, np.degrees(np.arccos(cos_angle)))
+        f['angle_elbow'] = np.nan_to_num(angle)
+        f['angular_velocity_elbow'] = _gradient_t(f['angle_elbow'], ts)
+
+        for j in (SHOULDER, ELBOW, WRIST):
+            p = pos[j]
+            vel = np.empty_like(p)
+            vel[:, 1:-1] = (p[:, 2:] - p[:, :-2]) / (ts[:, 2:] - ts[:, :-2])[..., None]
+            vel[:, 0] = vel[:, 1]
+            vel[:, -1] = vel[:, -2]
+            acc = np.gradient(vel, axis=1)
+            jerk = np.gradient(acc, axis=1)
+            for i, a in enumerate('xyz'):
+                f[f'vel_{j}_{a}'] = vel[..., i]
+                f[f'acc_{j}_{a}'] = acc[..., i]
+                f[f'jerk_{j}_{a}'] = jerk[..., i]
+        for j in (ELBOW, WRIST):
+            f[f'speed_{j}'] = np.sqrt(sum(f[f'vel_{j}_{a}'] ** 2 for a in 'xyz'))
+        for j in (ELBOW, WRIST):
+            f[f'acc_magnitude_{j}'] = np.sqrt(sum(f[f'acc_{j}_{a}'] ** 2 for a in 'xyz'))
+        steps = np.linalg.norm(np.diff(pos[WRIST], axis=1), axis=-1)
+        f['path_length_17'] = np.concatenate([np.zeros((n, 1)), np.cumsum(steps, axis=1)], axis=1)
+        for k in f:
+            f[k] = np.nan_to_num(f[k], nan=0.0, posinf=0.0, neginf=0.0)
+
+        # extract_additional_features: one value per clip
+        wpos = np.stack([f['rel_17_x'], f['rel_17_y'], f['rel_17_z']], axis=-1)  # (N, T, 3)
+        wvel = np.gradient(wpos, axis=1)
+        disp = np.linalg.norm(wpos[:, -1] - wpos[:, 0], axis=-1)
+        pl = np.sum(np.linalg.norm(np.diff(wpos, axis=1), axis=-1), axis=1)
+        centered = wpos - wpos.mean(axis=1, keepdims=True)
+        cov = np.einsum('nti,ntj->nij', centered, centered) / (t - 1)
+        ev = np.linalg.eigvals(cov).real  # same (unsorted) order as the per-clip np.linalg.eigvals
+        speeds = np.linalg.norm(wvel, axis=-1)
+        direction = np.diff(np.arctan2(wvel[..., 1], wvel[..., 0]), axis=1)
+        vert_ext = np.ptp(wpos[..., 1], axis=1)
+        horiz_ext = np.ptp(wpos[..., 0], axis=1)
+        clip = {
+            'straightness': np.where(pl > 0, disp / np.where(pl > 0, pl, 1.0), 0.0),
+            'planarity': np.where(ev[:, 0] != 0, ev[:, 1] / np.where(ev[:, 0] != 0, ev[:, 0], 1.0), 0.0),
+            'peak_speed': speeds.max(axis=1),
+            'avg_speed': speeds.mean(axis=1),
+            'speed_variability': speeds.std(axis=1),
+            'direction_changes': np.sum(np.abs(direction) > np.pi / 4, axis=1).astype(np.float64),
+            'vertical_extent': vert_ext,
+            'horizontal_extent': horiz_ext,
+            'vertical_horizontal_ratio': np.where(horiz_ext > 0, vert_ext / np.where(horiz_ext > 0, horiz_ext, 1.0), 0.0),
+            'total_displacement': disp,
+            'path_length': pl,
+        }
+
+        # extract_directional_features (index 0 is the pelvis, named NECK there)
+        wrist_start, wrist_end = kp[:, 0, WRIST], kp[:, -1, WRIST]
+        torso_pos, neck_pos = kp[:, -1, 1], kp[:, -1, 0]
+        body_height = np.linalg.norm(neck_pos - torso_pos, axis=-1) + 1e-6
+        rel_torso = (wrist_end - torso_pos) / body_height[:, None]
+        mv = wrist_end - wrist_start
+        dist = np.linalg.norm(mv, axis=-1) + 1e-6
+        mdir = mv / dist[:, None]
+        am = np.abs(mv)
+        clip.update({
+            'wrist_end_x_rel_torso': rel_torso[:, 0],
+            'wrist_end_y_rel_torso': rel_torso[:, 1],
+            'wrist_end_z_rel_torso': rel_torso[:, 2],
+            'movement_dir_x': mdir[:, 0],
+            'movement_dir_y': mdir[:, 1],
+            'movement_dir_z': mdir[:, 2],
+            'horiz_vert_ratio': (am[:, 0] + am[:, 2]) / (am[:, 1] + 1e-6),
+            'dominant_xy': (am[:, 0] + am[:, 1]) / (dist + 1e-6),
+            'dominant_yz': (am[:, 1] + am[:, 2]) / (dist + 1e-6),
+            'dominant_xz': (am[:, 0] + am[:, 2]) / (dist + 1e-6),
+            'end_right': (mv[:, 0] > 0).astype(np.float64),
+            'end_up': (mv[:, 1] > 0).astype(np.float64),
+            'end_forward': (mv[:, 2] > 0).astype(np.float64),
+            'directional_clarity': am.max(axis=-1) / (am.sum(axis=-1) + 1e-6),
+            'angle_from_horizontal': np.degrees(np.arctan2(mv[:, 1], np.sqrt(mv[:, 0] ** 2 + mv[:, 2] ** 2))),
+            'angle_in_horizontal': np.degrees(np.arctan2(mv[:, 0], mv[:, 2])),
+        })
+    finally:
+        np.seterr(**err)
+
+    out = np.empty((n, t, len(columns)), dtype=np.float32)
+    for i, col in enumerate(columns):
+        out[:, :, i] = f[col] if col in f else clip[col][:, None]
+    return out
+
+
+def clip_keypoints(df):
+    """(T, 38, 3) keypoints and (T,) timestamps of a clip dataframe."""
+    cols = [f'kp{j}_{a}' for j in range(38) for a in 'xyz']
+    return df[cols].values.astype(np.float32).reshape(len(df), 38, 3), df['timestamp'].values.astype(np.int64)
+
+
+def build_keypoint_dataset(base_dataset, folders=FOLDERS, window_size=WINDOW_SIZE, use_manifest=True):
+    """
+    Raw clips instead of features, for augmentation: keypoints
+    (num_samples, window_size, 38, 3), timestamps (num_samples, window_size)
+    in ns and labels (num_samples,).
+    """
+    manifest = DatasetManifest(base_dataset) if use_manifest else None
+    all_kp, all_ts, all_labels = [], [], []
+    for folder_name, gesture_label in folders.items():
+        if manifest is not None:
+            manifest.sync(folder_name)
+            paths = [c['path'] for c in manifest.clips(folder_name)]
+        else:
+            paths = clip_paths(os.path.join(base_dataset, folder_name))
+        print(f"=== {folder_name} ({gesture_label}): {len(paths)} clips ===")
+        for path in paths:
+            df = clip_dataframe(path, gesture_label=gesture_label)
+            if len(df) != window_size:
+                continue
+            kp, ts = clip_keypoints(df)
+            all_kp.append(kp)
+            all_ts.append(ts)
+            all_labels.append(gesture_label)
+    return (np.array(all_kp, dtype=np.float32).reshape(-1, window_size, 38, 3),
+            np.array(all_ts, dtype=np.int64).reshape(-1, window_size), np.array(all_labels))
+
+
+def save_keypoint_dataset(path, keypoints, timestamps, labels):
+    np.savez_compressed(path, keypoints=np.asarray(keypoints, dtype=np.float32),
+                        timestamps=np.asarray(timestamps, dtype=np.int64), labels=np.asarray(labels))
+
+
+def load_keypoint_dataset(path):
+    """Returns keypoints, timestamps, y (class indices) and unique_labels (sorted, as load_dataset)."""
+    data = np.load(path, allow_pickle=False)
+    labels = data["labels"].astype(str)
+    unique_labels = sorted(set(labels))
+    label_to_idx = {lab: i for i, lab in enumerate(unique_labels)}
+    y = np.array([label_to_idx[l] for l in labels])
+    return data["keypoints"].astype(np.float32), data["timestamps"].astype(np.int64), y, unique_labels
+
+
+def build_dataset(base_dataset, folders=FOLDERS, window_size=WINDOW_SIZE, use_manifest=True):
+    """
+    Extracts every clip under base_dataset/<folder> and returns
+    X (num_samples, window_size, num_features), labels (num_samples,) and the
+    feature column names. Clips with a keypoint sidecar (*.kp.npz) are read
+    from it instead of replaying their *.svo2. Clips whose length !=
+    window_size are skipped.
+
+    With use_manifest, the clips are listed from the dataset manifest
+    (base_dataset/manifest.sqlite, see automated_dataset_recorder/
+    dataset_manifest.py) and only new or changed clips are extracted; the
+    others are read from the features cached there.
+    """
+    if use_manifest:
+        return build_dataset_incremental(DatasetManifest(base_dataset), folders, window_size)
+
+    all_features = []
+    all_labels = []
+    columns = None
+
+    for folder_name, gesture_label in folders.items():
+        folder_path = os.path.join(base_dataset, folder_name)
+        svo_paths = clip_paths(folder_path)
+        n_sidecars = sum(p.endswith(SIDECAR_SUFFIX) for p in svo_paths)
+
+        print(f"=== Found {len(svo_paths)} clips in {folder_name} ({gesture_label}), {n_sidecars} with keypoint sidecars ===")
+
+        for svo_file in svo_paths:
+            print(f"Processing: {svo_file} as gesture: {gesture_label}")
+            df = clip_dataframe(svo_file, gesture_label=gesture_label)
+            if df.empty:
+                print("  -> No data extracted; skipping.")
+                continue
+
+            feats = clip_features(df)
+            if len(feats) != window_size:
+                print(f"  -> Skipping {svo_file}, frames != {window_size}: {len(feats)}")
+                continue
+
+            columns = list(feats.columns)
+            all_features.append(feats.values.astype(np.float32))
+            all_labels.append(gesture_label)
+
+    X = np.array(all_features)
+    labels = np.array(all_labels)
+    return X, labels, columns
+
+
+def build_dataset_incremental(manifest, folders=FOLDERS, window_size=WINDOW_SIZE):
+    """build_dataset from a DatasetManifest: extract what changed, reuse the rest."""
+    all_features = []
+    all_labels = []
+    columns = manifest.get_info(f"feature_columns_v{FEATURE_VERSION}")
+    columns = columns.split(",") if columns else None
+
+    for folder_name, gesture_label in folders.items():
+        manifest.sync(folder_name)
+        clips = manifest.clips(folder_name)
+        cached = 0
+        for clip in clips:
+            feats = None
+            if clip["extraction"] == "ok" and columns is not None:
+                feats = manifest.cached_features(clip["stem"], clip["checksum"], FEATURE_VERSION)
+            if feats is None and clip["extraction"] == "skipped" and clip.get("frames") not in (None, window_size):
+                continue  # wrong length last time and unchanged since
+            if feats is not None:
+                cached += 1
+            else:
+                print(f"Processing: {clip['path']} as gesture: {gesture_label}")
+                try:
+                    df = clip_dataframe(clip["path"], gesture_label=gesture_label)
+                    if df.empty:
+                        print("  -> No data extracted; skipping.")
+                        manifest.set_extraction(clip["stem"], "error")
+                        continue
+                    frame_feats = clip_features(df)
+                except Exception as e:
+                    print(f"  -> Extraction failed: {e}")
+                    manifest.set_extraction(clip["stem"], "error")
+                    continue
+                if len(frame_feats) != window_size:
+                    print(f"  -> Skipping {clip['path']}, frames != {window_size}: {len(frame_feats)}")
+                    manifest.set_extraction(clip["stem"], "skipped", frames=len(frame_feats))
+                    continue
+                if columns is None:
+                    columns = list(frame_feats.columns)
+                    manifest.set_info(f"feature_columns_v{FEATURE_VERSION}", ",".join(columns))
+                feats = frame_feats[columns].values.astype(np.float32)
+                manifest.set_extraction(clip["stem"], "ok", feats, clip["checksum"], FEATURE_VERSION,
+                                        frames=len(feats))
+            all_features.append(feats)
+            all_labels.append(gesture_label)
+        print(f"=== {folder_name} ({gesture_label}): {len(clips)} clips, {cached} from the manifest cache ===")
+
+    X = np.array(all_features)
+    labels = np.array(all_labels)
+    return X, labels, columns
+
+
+def resample_window(x, window_size=WINDOW_SIZE):
+    """Linearly resample a (T, F) clip to window_size frames."""
+    x = np.asarray(x, dtype=np.float32)
+    if len(x) == window_size:
+        return x
+    if len(x) == 1:
+        return np.repeat(x, window_size, axis=0)
+    t = np.linspace(0, len(x) - 1, window_size)
+    i = np.minimum(t.astype(int), len(x) - 2)
+    w = (t - i)[:, None]
+    return x[i] * (1 - w) + x[i + 1] * w
+
+
+def save_dataset(path, X, labels, columns=None):
+    np.savez_compressed(path, X=np.asarray(X, dtype=np.float32), labels=np.asarray(labels),
+                        columns=np.asarray(columns if columns is not None else []))
+
+
+def load_dataset(path):
+    """Returns X, y (class indices), unique_labels (sorted, as in the notebook) and feature columns."""
+    data = np.load(path, allow_pickle=False)
+    X = data["X"].astype(np.float32)
+    labels = data["labels"].astype(str)
+    columns = [str(c) for c in data["columns"]] if "columns" in data.files else []
+    unique_labels = sorted(set(labels))
+    label_to_idx = {lab: i for i, lab in enumerate(unique_labels)}
+    y = np.array([label_to_idx[l] for l in labels])
+    return X, y, unique_labels, columns
+
+
+def blind_test_split(X, y):
+    """The notebook's 80/20 stratified split: X_train, X_val, y_train, y_val."""
+    from sklearn.model_selection import train_test_split
+    return train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
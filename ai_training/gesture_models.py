@@ -0,0 +1,122 @@
+# gesture_models.py
+#
+# The three architectures of ZED_GD_4.ipynb (cell 8) as builder functions, so
+# scripts can train them outside the notebook. Defaults reproduce the notebook
+# models exactly; the keyword arguments are the knobs the notebook hard-codes.
+#
+#   from gesture_models import build_model
+#   model = build_model("lstm", seq_len=7, feature_dim=70, n_classes=4)
+
+import numpy as np
+
+ARCHITECTURES = ("lstm", "transformer", "hybrid")
+# Notebook learning rates and callbacks
+LEARNING_RATES = {"lstm": 0.001, "transformer": 0.0005, "hybrid": 0.0005}
+EPOCHS = 100
+BATCH_SIZE = 32
+PATIENCE = 15
+
+
+def positional_encoding(length, depth):
+    import tensorflow as tf
+    positions = np.arange(length)[:, np.newaxis]
+    depths = np.arange(depth)[np.newaxis, :] / depth
+    angle_rates = 1 / (10000 ** depths)
+    angle_rads = positions * angle_rates
+    pos_encoding = np.concatenate([np.sin(angle_rads), np.cos(angle_rads)], axis=-1)
+    pos_encoding = pos_encoding[..., :depth]
+    return tf.cast(pos_encoding, dtype=tf.float32)
+
+
+def _transformer_block(x, d_model, num_heads, key_dim, ff_units, dropout):
+    from tensorflow.keras.layers import Dense, Dropout, LayerNormalization, MultiHeadAttention
+    attn_out = MultiHeadAttention(num_heads=num_heads, key_dim=key_dim, value_dim=key_dim)(x, x, x)
+    x = LayerNormalization(epsilon=1e-6)(x + attn_out)
+    x = Dropout(dropout)(x)
+    ff = Dense(ff_units, activation='relu')(x)
+    ff = Dropout(dropout)(ff)
+    ff = Dense(d_model)(ff)
+    return LayerNormalization(epsilon=1e-6)(x + ff)
+
+
+def build_lstm(seq_len, feature_dim, n_classes, lstm_units=(128, 256), dense_units=128,
+               dropout=0.3, head_dropout=0.2):
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Dense, LSTM, Dropout, LayerNormalization
+    layers = []
+    for i, units in enumerate(lstm_units):
+        last = i == len(lstm_units) - 1
+        kwargs = {"input_shape": (seq_len, feature_dim)} if i == 0 else {}
+        layers += [LSTM(units, return_sequences=not last, **kwargs), LayerNormalization(), Dropout(dropout)]
+    layers += [Dense(dense_units, activation='relu'), LayerNormalization(), Dropout(head_dropout),
+               Dense(n_classes, activation='softmax')]
+    return Sequential(layers)
+
+
+def build_transformer(seq_len, feature_dim, n_classes, d_model=64, num_heads=8, key_dim=8, ff_units=128,
+                      num_blocks=2, dense_units=128, dropout=0.1, head_dropout=0.2):
+    from tensorflow.keras.models import Model
+    from tensorflow.keras.layers import Dense, Dropout, Input, LayerNormalization, GlobalAveragePooling1D
+    inputs = Input(shape=(seq_len, feature_dim))
+    x = Dense(d_model)(inputs)
+    x = x + positional_encoding(seq_len, d_model)[None]
+    for _ in range(num_blocks):
+        x = _transformer_block(x, d_model, num_heads, key_dim, ff_units, dropout)
+    x = GlobalAveragePooling1D()(x)
+    x = Dense(dense_units, activation='relu')(x)
+    x = LayerNormalization()(x)
+    x = Dropout(head_dropout)(x)
+    outputs = Dense(n_classes, activation='softmax')(x)
+    return Model(inputs=inputs, outputs=outputs)
+
+
+def build_hybrid(seq_len, feature_dim, n_classes, lstm_units=(128, 128), d_model=64, num_heads=8, key_dim=8,
+                 ff_units=128, num_blocks=1, dense_units=128, dropout=0.3, attn_dropout=0.1, head_dropout=0.2):
+    from tensorflow.keras.models import Model
+    from tensorflow.keras.layers import (Dense, LSTM, Dropout, Input, LayerNormalization,
+                                         GlobalAveragePooling1D, Concatenate)
+    inputs = Input(shape=(seq_len, feature_dim))
+
+    # LSTM branch
+    x_lstm = inputs
+    for i, units in enumerate(lstm_units):
+        x_lstm = LSTM(units, return_sequences=i < len(lstm_units) - 1)(x_lstm)
+        x_lstm = LayerNormalization()(x_lstm)
+        x_lstm = Dropout(dropout)(x_lstm)
+
+    # Transformer branch
+    trans_x = Dense(d_model)(inputs)
+    trans_x = trans_x + positional_encoding(seq_len, d_model)[None]
+    for _ in range(num_blocks):
+        trans_x = _transformer_block(trans_x, d_model, num_heads, key_dim, ff_units, attn_dropout)
+    trans_out = GlobalAveragePooling1D()(trans_x)
+    trans_out = Dropout(head_dropout)(trans_out)
+
+    combined = Concatenate()([x_lstm, trans_out])
+    x = Dense(dense_units, activation='relu')(combined)
+    x = LayerNormalization()(x)
+    x = Dropout(head_dropout)(x)
+    outputs = Dense(n_classes, activation='softmax')(x)
+    return Model(inputs=inputs, outputs=outputs)
+
+
+BUILDERS = {"lstm": build_lstm, "transformer": build_transformer, "hybrid": build_hybrid}
+
+
+def build_model(arch, seq_len, feature_dim, n_classes, learning_rate=None, **params):
+    """Compiled model of one architecture (notebook optimizer, loss and metrics)."""
+    import tensorflow as tf
+    model = BUILDERS[arch](seq_len, feature_dim, n_classes, **params)
+    model.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate or LEARNING_RATES[arch]),
+        loss='categorical_crossentropy',
+        metrics=['accuracy']
+    )
+    return model
+
+
+def notebook_callbacks(patience=PATIENCE):
+    """EarlyStopping on val_accuracy and ReduceLROnPlateau on val_loss, as in the notebook."""
+    from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
+    return [EarlyStopping(monitor='val_accuracy', patience=patience, restore_best_weights=True),
+            ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=5, min_lr=1e-5)]
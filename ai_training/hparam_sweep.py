@@ -0,0 +1,441 @@
+# hparam_sweep.py
+#
+# Hyperparameter sweep over the notebook architectures (gesture_models.py):
+# layer sizes, dropout, learning rate and batch size, drawn at random from
+# SEARCH_SPACE / TRAINING_SPACE.
+#
+# Trials train in a pool of worker processes. Every epoch each trial records
+# its best early-stopping accuracy so far in the results database; from
+# PRUNE_WARMUP epochs on, a trial whose value is below the median of the other
+# trials at the same epoch is stopped (median pruning), so bad configurations
+# free their worker early. Finished trials are scored on a held-out fold that
+# no trial trains or early-stops on, then their CPU latency is measured in one
+# quiet process afterwards (each window alone through model.predict, as
+# GestureClassifier calls it), like kfold_eval.py.
+#
+# Everything goes to <out>/sweep.sqlite (trials, per-epoch values); a sweep
+# can be stopped and continued, and several runs add to the same study.
+# Models of trials off the accuracy / p95 latency Pareto front are deleted
+# unless --keep-models. <out>/pareto_front.csv lists the front; the models
+# are in <out>/models with the label_encoder.json / feature_columns.json the
+# realtime app reads.
+#
+#   python hparam_sweep.py --dataset gesture_dataset.npz --trials 60 --workers 4 --out sweep
+#   python hparam_sweep.py --out sweep --report
+
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+from gesture_dataset import load_dataset
+from gesture_models import ARCHITECTURES, EPOCHS, BATCH_SIZE, LEARNING_RATES, build_model, notebook_callbacks
+import kfold_eval
+from kfold_eval import stratified_folds, early_stopping_split, confusion_matrices, f1_scores, measure_latency
+
+# Builder keyword arguments per architecture (the notebook values included).
+SEARCH_SPACE = {
+    "lstm": {
+        "lstm_units": [(32,), (64,), (128,), (64, 64), (64, 128), (128, 128), (128, 256)],
+        "dense_units": [32, 64, 128],
+        "dropout": [0.1, 0.2, 0.3, 0.4],
+        "head_dropout": [0.1, 0.2, 0.3]
+    },
+    "transformer": {
+        "d_model": [16, 32, 64],
+        "num_heads": [2, 4, 8],
+        "key_dim": [4, 8, 16],
+        "ff_units": [32, 64, 128],
+        "num_blocks": [1, 2],
+        "dense_units": [32, 64, 128],
+        "dropout": [0.0, 0.1, 0.2],
+        "head_dropout": [0.1, 0.2, 0.3]
+    },
+    "hybrid": {
+        "lstm_units": [(32,), (64,), (64, 64), (128, 128)],
+        "d_model": [16, 32, 64],
+        "num_heads": [2, 4, 8],
+        "key_dim": [4, 8],
+        "ff_units": [32, 64, 128],
+        "num_blocks": [1, 2],
+        "dense_units": [32, 64, 128],
+        "dropout": [0.1, 0.2, 0.3],
+        "head_dropout": [0.1, 0.2]
+    }
+}
+# Training parameters: lists are choices, ("log", low, high) is log-uniform.
+TRAINING_SPACE = {
+    "learning_rate": ("log", 1e-4, 3e-3),
+    "batch_size": [16, 32, 64]
+}
+PRUNE_WARMUP = 10      # epochs before a trial can be pruned
+PRUNE_MIN_TRIALS = 4   # other trials needed at an epoch to take a median
+LATENCY_SAMPLES = 200  # held-out windows timed per trial
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trials (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    study TEXT NOT NULL,
+    arch TEXT NOT NULL,
+    params TEXT NOT NULL,
+    training TEXT NOT NULL,
+    seed INTEGER,
+    status TEXT NOT NULL,
+    epochs INTEGER,
+    train_s REAL,
+    val_accuracy REAL,
+    accuracy REAL,
+    f1_weighted REAL,
+    f1_macro REAL,
+    params_count INTEGER,
+    latency_p50_ms REAL,
+    latency_p95_ms REAL,
+    model_path TEXT,
+    error TEXT,
+    created_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS trials_study ON trials (study, status);
+CREATE TABLE IF NOT EXISTS intermediate (
+    trial_id INTEGER NOT NULL,
+    epoch INTEGER NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (trial_id, epoch)
+);
+"""
+TRIAL_COLUMNS = ("id", "study", "arch", "params", "training", "seed", "status", "epochs", "train_s", "val_accuracy",
+                 "accuracy", "f1_weighted", "f1_macro", "params_count", "latency_p50_ms", "latency_p95_ms",
+                 "model_path", "error", "created_at", "finished_at")
+
+
+class SweepStore:
+    """
+    Results database of a sweep (one SQLite file, WAL), shared by the main
+    process and the workers; every public method is one transaction.
+    Trials go queued -> running -> complete / pruned / failed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30.0, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _transaction(self, fn, *args):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(self._db, *args)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return out
+
+    def add_trial(self, study, arch, params, training, seed):
+        """Queue a trial; returns its id, or None if the study already has this configuration."""
+        p, t = json.dumps(params, sort_keys=True), json.dumps(training, sort_keys=True)
+
+        def txn(db):
+            if db.execute("SELECT 1 FROM trials WHERE study = ? AND arch = ? AND params = ? AND training = ?",
+                          (study, arch, p, t)).fetchone():
+                return None
+            cur = db.execute("INSERT INTO trials (study, arch, params, training, seed, status, created_at) "
+                             "VALUES (?, ?, ?, ?, ?, 'queued', ?)", (study, arch, p, t, seed, time.time()))
+            return cur.lastrowid
+        return self._transaction(txn)
+
+    def update(self, trial_id, **fields):
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        self._transaction(lambda db: db.execute(f"UPDATE trials SET {cols} WHERE id = ?",
+                                                tuple(fields.values()) + (trial_id,)))
+
+    def report(self, trial_id, epoch, value):
+        self._transaction(lambda db: db.execute("INSERT OR REPLACE INTO intermediate VALUES (?, ?, ?)",
+                                                (trial_id, epoch, value)))
+
+    def others_at(self, study, trial_id, epoch):
+        """
+        Values of the study's other trials at epoch: what they reported there,
+        or their last value if they completed before reaching it.
+        """
+        def txn(db):
+            reached = db.execute(
+                "SELECT i.value FROM intermediate i JOIN trials t ON t.id = i.trial_id "
+                "WHERE t.study = ? AND i.trial_id != ? AND i.epoch = ?", (study, trial_id, epoch)).fetchall()
+            finished = db.execute(
+                "SELECT i.value FROM intermediate i JOIN trials t ON t.id = i.trial_id "
+                "WHERE t.study = ? AND t.status = 'complete' AND i.trial_id != ? "
+                "AND i.epoch = (SELECT MAX(epoch) FROM intermediate WHERE trial_id = i.trial_id) AND i.epoch < ?",
+                (study, trial_id, epoch)).fetchall()
+            return [v for (v,) in reached + finished]
+        return np.array(self._transaction(txn), dtype=np.float64)
+
+    def trials(self, study, status=None):
+        """Trials of a study as dicts (params and training decoded), in id order."""
+        def txn(db):
+            q = f"SELECT {', '.join(TRIAL_COLUMNS)} FROM trials WHERE study = ?"
+            args = (study,)
+            if status:
+                q += " AND status = ?"
+                args += (status,)
+            return db.execute(q + " ORDER BY id", args).fetchall()
+        out = []
+        for row in self._transaction(txn):
+            t = dict(zip(TRIAL_COLUMNS, row))
+            t["params"], t["training"] = json.loads(t["params"]), json.loads(t["training"])
+            out.append(t)
+        return out
+
+    def requeue_interrupted(self, study):
+        """Trials left running by a stopped sweep are queued again, their epoch values dropped."""
+        def txn(db):
+            db.execute("DELETE FROM intermediate WHERE trial_id IN "
+                       "(SELECT id FROM trials WHERE study = ? AND status IN ('queued', 'running'))", (study,))
+            db.execute("UPDATE trials SET status = 'queued' WHERE study = ? AND status = 'running'", (study,))
+        self._transaction(txn)
+
+
+# ------------------------------------------------------------------ search space
+
+def sample_config(rng, archs):
+    """(arch, builder params, training params) drawn uniformly from the search space."""
+    arch = archs[rng.integers(len(archs))]
+    params = {k: v[rng.integers(len(v))] for k, v in SEARCH_SPACE[arch].items()}
+    params = {k: list(v) if isinstance(v, tuple) else v for k, v in params.items()}
+    training = {}
+    for k, v in TRAINING_SPACE.items():
+        if isinstance(v, tuple) and v[0] == "log":
+            training[k] = float(np.exp(rng.uniform(np.log(v[1]), np.log(v[2]))))
+        else:
+            training[k] = v[rng.integers(len(v))]
+    return arch, params, training
+
+
+def notebook_config(arch):
+    """The notebook's own model of arch, as a trial configuration."""
+    return arch, {}, {"learning_rate": LEARNING_RATES[arch], "batch_size": BATCH_SIZE}
+
+
+def pareto_front(accuracy, cost):
+    """Mask of the points no other point beats on both higher accuracy and lower cost."""
+    accuracy, cost = np.asarray(accuracy, dtype=np.float64), np.asarray(cost, dtype=np.float64)
+    better_eq = (accuracy[None, :] >= accuracy[:, None]) & (cost[None, :] <= cost[:, None])
+    strictly = (accuracy[None, :] > accuracy[:, None]) | (cost[None, :] < cost[:, None])
+    return ~np.any(better_eq & strictly, axis=1)
+
+
+# ------------------------------------------------------------------ workers
+
+_STORE = {}
+
+
+def _init_worker(X, y, n_classes, threads, db_path):
+    kfold_eval._init_worker(X, y, n_classes, threads)
+    _STORE["db"] = SweepStore(db_path)
+
+
+def pruning_callback(store, study, trial_id, warmup=PRUNE_WARMUP, min_trials=PRUNE_MIN_TRIALS):
+    """Keras callback: records the best val_accuracy so far each epoch and stops below-median trials."""
+    import tensorflow as tf
+
+    class MedianPruning(tf.keras.callbacks.Callback):
+        def __init__(self):
+            super().__init__()
+            self.best = 0.0
+            self.pruned_at = None
+
+        def on_epoch_end(self, epoch, logs=None):
+            self.best = max(self.best, float((logs or {}).get("val_accuracy", 0.0)))
+            store.report(trial_id, epoch, self.best)
+            if epoch + 1 < warmup:
+                return
+            others = store.others_at(study, trial_id, epoch)
+            if len(others) >= min_trials and self.best < np.median(others):
+                self.pruned_at = epoch + 1
+                self.model.stop_training = True
+
+    return MedianPruning()
+
+
+def run_trial(trial_id, study, arch, params, training, train_idx, holdout_idx, epochs, model_path, seed):
+    """Train one configuration; writes its outcome to the store and returns it."""
+    import tensorflow as tf
+    store = _STORE["db"]
+    X, y, n_classes = kfold_eval._DATA["X"], kfold_eval._DATA["y"], kfold_eval._DATA["n_classes"]
+    store.update(trial_id, status="running")
+    try:
+        tf.keras.utils.set_random_seed(seed)
+        es = early_stopping_split(y[train_idx], seed=seed)
+        fit_idx, es_idx = train_idx[~es], train_idx[es]
+        onehot = np.eye(n_classes, dtype=np.float32)
+        model = build_model(arch, X.shape[1], X.shape[2], n_classes, learning_rate=training["learning_rate"],
+                            **params)
+        pruning = pruning_callback(store, study, trial_id)
+        start = time.time()
+        history = model.fit(X[fit_idx], onehot[y[fit_idx]], validation_data=(X[es_idx], onehot[y[es_idx]]),
+                            epochs=epochs, batch_size=training["batch_size"],
+                            callbacks=notebook_callbacks() + [pruning], verbose=0)
+        fields = {"epochs": len(history.history["loss"]), "train_s": time.time() - start,
+                  "val_accuracy": pruning.best, "params_count": model.count_params(), "finished_at": time.time()}
+        if pruning.pruned_at is not None:
+            fields["status"] = "pruned"
+        else:
+            pred = model.predict(X[holdout_idx], verbose=0).argmax(axis=-1)
+            conf = confusion_matrices(y[holdout_idx], pred, n_classes)
+            _, f1w, f1m = f1_scores(conf)
+            model.save(model_path)
+            fields.update(status="complete", accuracy=float(np.trace(conf) / len(holdout_idx)),
+                          f1_weighted=float(f1w), f1_macro=float(f1m), model_path=model_path)
+    except Exception as e:
+        fields = {"status": "failed", "error": f"{type(e).__name__}: {e}", "finished_at": time.time()}
+    store.update(trial_id, **fields)
+    return dict(fields, id=trial_id, arch=arch)
+
+
+# ------------------------------------------------------------------ main
+
+def write_front(out_dir, trials):
+    """pareto_front.csv of the completed, timed trials; returns the front (ordered by latency)."""
+    timed = [t for t in trials if t["latency_p95_ms"] is not None and t["accuracy"] is not None]
+    if not timed:
+        return []
+    mask = pareto_front([t["accuracy"] for t in timed], [t["latency_p95_ms"] for t in timed])
+    front = sorted((t for t, m in zip(timed, mask) if m), key=lambda t: t["latency_p95_ms"])
+    with open(os.path.join(out_dir, "pareto_front.csv"), "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["trial", "arch", "accuracy", "f1_macro", "latency_p50_ms", "latency_p95_ms", "params_count",
+                    "epochs", "learning_rate", "batch_size", "params", "model_path"])
+        for t in front:
+            w.writerow([t["id"], t["arch"], f"{t['accuracy']:.4f}", f"{t['f1_macro']:.4f}",
+                        f"{t['latency_p50_ms']:.2f}", f"{t['latency_p95_ms']:.2f}", t["params_count"], t["epochs"],
+                        f"{t['training']['learning_rate']:.2e}", t["training"]["batch_size"],
+                        json.dumps(t["params"]), t["model_path"]])
+    return front
+
+
+def print_report(store, study, front):
+    trials = store.trials(study)
+    counts = {}
+    for t in trials:
+        counts[t["status"]] = counts.get(t["status"], 0) + 1
+    epochs = [t["epochs"] for t in trials if t["status"] == "pruned" and t["epochs"]]
+    print(f"\n=== study {study}: " + ", ".join(f"{c} {s}" for s, c in sorted(counts.items()))
+          + (f" (pruned after {np.mean(epochs):.0f} epochs on average)" if epochs else "") + " ===")
+    print(f"{'trial':>5s} {'arch':12s} {'accuracy':>8s} {'F1 macro':>8s} {'p50/p95 ms':>12s} {'params':>9s}  config")
+    for t in front:
+        print(f"{t['id']:5d} {t['arch']:12s} {t['accuracy']:8.4f} {t['f1_macro']:8.4f} "
+              f"{t['latency_p50_ms']:5.2f}/{t['latency_p95_ms']:<6.2f} {t['params_count']:9d}  "
+              f"lr {t['training']['learning_rate']:.1e}, batch {t['training']['batch_size']}, "
+              + ", ".join(f"{k} {v}" for k, v in sorted(t["params"].items())))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hyperparameter sweep of the gesture models")
+    parser.add_argument("--dataset", default="gesture_dataset.npz")
+    parser.add_argument("--out", default="sweep")
+    parser.add_argument("--study", default=None, help="name of the study in the database (default: dataset name)")
+    parser.add_argument("--archs", nargs="+", choices=ARCHITECTURES, default=list(ARCHITECTURES))
+    parser.add_argument("--trials", type=int, default=30, help="new trials to run")
+    parser.add_argument("--workers", type=int, default=max(1, min(4, (os.cpu_count() or 2) // 2)))
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--folds", type=int, default=5, help="one stratified fold of this many is held out")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-baseline", action="store_true", help="do not include the notebook configurations")
+    parser.add_argument("--keep-models", action="store_true", help="keep the models of trials off the front")
+    parser.add_argument("--report", action="store_true", help="only print the front of the database")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    study = args.study or os.path.splitext(os.path.basename(args.dataset))[0]
+    store = SweepStore(os.path.join(args.out, "sweep.sqlite"))
+    if args.report:
+        print_report(store, study, write_front(args.out, store.trials(study, "complete")))
+        return 0
+
+    X, y, unique_labels, columns = load_dataset(args.dataset)
+    n_classes = len(unique_labels)
+    holdout = stratified_folds(y, args.folds, args.seed) == 0
+    train_idx, holdout_idx = np.flatnonzero(~holdout), np.flatnonzero(holdout)
+    model_dir = os.path.join(args.out, "models")
+    os.makedirs(model_dir, exist_ok=True)
+    with open(os.path.join(model_dir, "label_encoder.json"), "w") as f:
+        json.dump({str(i): label for i, label in enumerate(unique_labels)}, f)
+    if columns:
+        with open(os.path.join(model_dir, "feature_columns.json"), "w") as f:
+            json.dump(columns, f)
+
+    # Interrupted trials first, then the notebook models (once per study), then random draws.
+    store.requeue_interrupted(study)
+    existing = len(store.trials(study))
+    configs = [] if args.no_baseline else [notebook_config(a) for a in args.archs]
+    rng = np.random.default_rng(args.seed + existing)
+    new = 0
+    for _ in range(100 * args.trials):  # draws already in the study are skipped
+        if new == args.trials:
+            break
+        arch, params, training = configs.pop(0) if configs else sample_config(rng, args.archs)
+        if store.add_trial(study, arch, params, training, args.seed + existing + new) is not None:
+            new += 1
+    pending = {t["id"]: t for t in store.trials(study, "queued")}
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    print(f"=== study {study}: {len(y)} samples ({len(holdout_idx)} held out), {len(pending)} trials, "
+          f"{args.workers} workers x {threads} threads ===")
+
+    ctx = mp.get_context("spawn")  # TensorFlow does not survive fork
+    wall = time.time()
+    with ProcessPoolExecutor(args.workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(X, y, n_classes, threads, store.path)) as pool:
+        jobs = [pool.submit(run_trial, t["id"], study, t["arch"], t["params"], t["training"], train_idx, holdout_idx,
+                            args.epochs, os.path.join(model_dir, f"trial_{t['id']}"), t["seed"])
+                for t in pending.values()]
+        for job in as_completed(jobs):
+            r = job.result()
+            if r["status"] == "complete":
+                print(f"trial {r['id']:4d} {r['arch']:12s} {r['epochs']:4d} epochs, accuracy {r['accuracy']:.4f}")
+            elif r["status"] == "pruned":
+                print(f"trial {r['id']:4d} {r['arch']:12s} pruned after {r['epochs']} epochs")
+            else:
+                print(f"trial {r['id']:4d} {r['arch']:12s} failed: {r['error']}")
+    print(f"Training: {time.time() - wall:.0f} s wall")
+
+    # Latency on a quiet machine: one process, one model at a time.
+    untimed = [t for t in store.trials(study, "complete") if t["latency_p95_ms"] is None
+               and t["model_path"] and os.path.exists(t["model_path"])]
+    sample = np.random.default_rng(args.seed).permutation(holdout_idx)[:LATENCY_SAMPLES]
+    with ProcessPoolExecutor(1, mp_context=ctx, initializer=kfold_eval._init_worker,
+                             initargs=(X, y, n_classes, 0)) as pool:
+        for t in untimed:
+            lat = pool.submit(measure_latency, t["model_path"], sample).result()
+            store.update(t["id"], latency_p50_ms=float(np.percentile(lat, 50)),
+                         latency_p95_ms=float(np.percentile(lat, 95)))
+
+    front = write_front(args.out, store.trials(study, "complete"))
+    if not args.keep_models:
+        keep = {t["id"] for t in front}
+        for t in store.trials(study, "complete"):
+            if t["id"] not in keep and t["model_path"]:
+                shutil.rmtree(t["model_path"], ignore_errors=True)
+                store.update(t["id"], model_path=None)
+    print_report(store, study, front)
+    print(f"\nResults in {store.path}, front in {os.path.join(args.out, 'pareto_front.csv')}")
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+# kfold_eval.py
+#
+# Stratified k-fold training and evaluation of the notebook architectures
+# (LSTM, Transformer, Hybrid), with every (model, fold) job trained in a pool
+# of worker processes.
+#
+# Unlike the notebook, whose "test" set is its validation set, each fold's test
+# clips are never seen during training: early stopping uses a stratified
+# slice of the training folds. Every clip is predicted exactly once, by the
+# models of the fold that held it out.
+#
+# Latency is measured after training, in one process with nothing else
+# running: each test window alone through model.predict, as GestureClassifier
+# calls it.
+#
+# Outputs in --out:
+#   prediction_analysis.csv     the notebook's columns (<model>_pred, _correct,
+#                               _confidence, true_label_idx, true_label,
+#                               <model>_pred_label) for every clip, then fold,
+#                               sample_idx and <model>_latency_ms
+#   kfold_summary.csv           per model and fold: accuracy, weighted/macro F1,
+#                               epochs, training time, parameters, latency p50/p95
+#   confusion_<model>.csv       confusion matrix summed over the folds
+#   confidence_distribution.csv per model, true class and correctness: counts
+#                               of predicted-class confidence in 10 bins
+#
+#   python kfold_eval.py --dataset gesture_dataset.npz --folds 5 --workers 3
+
+import os
+import sys
+import csv
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+from gesture_dataset import load_dataset
+from gesture_models import ARCHITECTURES, EPOCHS, BATCH_SIZE, build_model, notebook_callbacks
+
+CONFIDENCE_BINS = 10
+
+
+def stratified_folds(y, k, seed=42):
+    """(N,) fold number of each sample: samples shuffled, grouped by class and dealt round-robin over the k folds."""
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(y))
+    order = order[np.argsort(y[order], kind="stable")]
+    folds = np.empty(len(y), dtype=np.intp)
+    folds[order] = np.arange(len(y)) % k
+    return folds
+
+
+def early_stopping_split(y, fraction=0.15, seed=0):
+    """Boolean mask of a stratified validation slice of the training samples."""
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(y))
+    order = order[np.argsort(y[order], kind="stable")]
+    rank = np.arange(len(y)) - np.searchsorted(y[order], y[order])
+    counts = np.bincount(y)
+    mask = np.zeros(len(y), dtype=bool)
+    mask[order] = rank < np.maximum(1, np.round(counts[y[order]] * fraction)).astype(int)
+    return mask
+
+
+# ------------------------------------------------------------------ reporting
+
+def confusion_matrices(y_true, y_pred, n_classes):
+    """(..., C, C) confusion matrices of (..., N) label arrays, rows = true class."""
+    y_true = np.broadcast_to(y_true, np.shape(y_pred))
+    lead = y_pred.shape[:-1]
+    flat = (np.arange(int(np.prod(lead)))[:, None] * n_classes * n_classes
+            + y_true.reshape(-1, y_true.shape[-1]) * n_classes + y_pred.reshape(-1, y_pred.shape[-1]))
+    counts = np.bincount(flat.ravel(), minlength=int(np.prod(lead)) * n_classes * n_classes)
+    return counts.reshape(lead + (n_classes, n_classes))
+
+
+def f1_scores(conf):
+    """Per-class, weighted (by support, as sklearn average='weighted') and macro F1 of (..., C, C) matrices."""
+    conf = conf.astype(np.float64)
+    tp = np.diagonal(conf, axis1=-2, axis2=-1)
+    support = conf.sum(axis=-1)
+    predicted = conf.sum(axis=-2)
+    denom = support + predicted
+    per_class = np.divide(2 * tp, denom, out=np.zeros_like(tp), where=denom > 0)
+    weighted = (per_class * support).sum(axis=-1) / np.maximum(support.sum(axis=-1), 1)
+    return per_class, weighted, per_class.mean(axis=-1)
+
+
+def confidence_histograms(conf, y_true, correct, n_classes, bins=CONFIDENCE_BINS):
+    """(C, 2, bins) counts of confidences by true class, correctness (0 wrong, 1 right) and bin."""
+    b = np.minimum((np.asarray(conf) * bins).astype(np.intp), bins - 1)
+    flat = (np.asarray(y_true) * 2 + np.asarray(correct, dtype=np.intp)) * bins + b
+    return np.bincount(flat, minlength=n_classes * 2 * bins).reshape(n_classes, 2, bins)
+
+
+# ------------------------------------------------------------------ workers
+
+_DATA = {}
+
+
+def _init_worker(X, y, n_classes, threads):
+    import tensorflow as tf
+    if threads:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    _DATA.update(X=X, y=y, n_classes=n_classes)
+
+
+def train_fold(arch, fold, train_idx, test_idx, epochs, batch_size, model_path, seed):
+    """Train one architecture on one fold; returns its test probabilities and training stats."""
+    import tensorflow as tf
+    tf.keras.utils.set_random_seed(seed)
+    X, y, n_classes = _DATA["X"], _DATA["y"], _DATA["n_classes"]
+    es = early_stopping_split(y[train_idx], seed=seed)
+    fit_idx, es_idx = train_idx[~es], train_idx[es]
+    onehot = np.eye(n_classes, dtype=np.float32)
+    model = build_model(arch, X.shape[1], X.shape[2], n_classes)
+    start = time.time()
+    history = model.fit(X[fit_idx], onehot[y[fit_idx]], validation_data=(X[es_idx], onehot[y[es_idx]]),
+                        epochs=epochs, batch_size=batch_size, callbacks=notebook_callbacks(), verbose=0)
+    train_s = time.time() - start
+    probs = model.predict(X[test_idx], verbose=0)
+    model.save(model_path)
+    return {"arch": arch, "fold": fold, "test_idx": test_idx, "probs": probs, "train_s": train_s,
+            "epochs": len(history.history["loss"]), "params": model.count_params(), "model_path": model_path}
+
+
+def measure_latency(model_path, test_idx, warmup=5):
+    """Per-window model.predict latency (ms) of the test samples, one window at a time."""
+    import tensorflow as tf
+    X = _DATA["X"]
+    model = tf.keras.models.load_model(model_path)
+    for i in range(warmup):
+        model.predict(X[test_idx[i % len(test_idx)]][None], verbose=0)
+    out = np.empty(len(test_idx))
+    for k, i in enumerate(test_idx):
+        t0 = time.perf_counter()
+        model.predict(X[i][None], verbose=0)
+        out[k] = (time.perf_counter() - t0) * 1000
+    return out
+
+
+# ------------------------------------------------------------------ main
+
+def write_reports(out_dir, models, y, unique_labels, folds, probs, latency, runs):
+    n_classes = len(unique_labels)
+    pred = probs.argmax(axis=-1)                                      # (M, N)
+    conf = np.take_along_axis(probs, pred[..., None], axis=-1)[..., 0]
+    correct = pred == y
+
+    # prediction_analysis.csv (notebook columns first)
+    cols, data = [], []
+    for i, m in enumerate(models):
+        cols += [f"{m}_pred", f"{m}_correct", f"{m}_confidence"]
+        data += [pred[i], correct[i], conf[i]]
+    cols += ["true_label_idx", "true_label"]
+    labels = np.asarray(unique_labels)
+    data += [y, labels[y]]
+    for i, m in enumerate(models):
+        cols.append(f"{m}_pred_label")
+        data.append(labels[pred[i]])
+    cols += ["fold", "sample_idx"] + [f"{m}_latency_ms" for m in models]
+    data += [folds, np.arange(len(y))] + [latency[i] for i in range(len(models))]
+    with open(os.path.join(out_dir, "prediction_analysis.csv"), "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(cols)
+        w.writerows(zip(*[c.tolist() for c in data]))
+
+    # per model and fold, from one (M, K, C, C) confusion tensor
+    k = folds.max() + 1
+    fold_mask = folds[None, :] == np.arange(k)[:, None]               # (K, N)
+    fold_pred = np.where(fold_mask[None], pred[:, None, :], n_classes)  # out-of-fold -> dummy class
+    conf_mk = confusion_matrices(np.where(fold_mask, y, n_classes)[None], fold_pred, n_classes + 1)
+    conf_mk = conf_mk[..., :n_classes, :n_classes]
+    acc_mk = np.trace(conf_mk, axis1=-2, axis2=-1) / np.maximum(conf_mk.sum(axis=(-2, -1)), 1)
+    _, f1w_mk, f1m_mk = f1_scores(conf_mk)
+    lat = np.where(fold_mask[None], latency[:, None, :], np.nan)
+    lat_p50, lat_p95 = np.nanpercentile(lat, 50, axis=-1), np.nanpercentile(lat, 95, axis=-1)
+    with open(os.path.join(out_dir, "kfold_summary.csv"), "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["model", "fold", "accuracy", "f1_weighted", "f1_macro", "epochs", "train_s", "params",
+                    "latency_p50_ms", "latency_p95_ms"])
+        for i, m in enumerate(models):
+            for j in range(k):
+                r = runs[(m, j)]
+                w.writerow([m, j, f"{acc_mk[i, j]:.4f}", f"{f1w_mk[i, j]:.4f}", f"{f1m_mk[i, j]:.4f}", r["epochs"],
+                            f"{r['train_s']:.1f}", r["params"], f"{lat_p50[i, j]:.2f}", f"{lat_p95[i, j]:.2f}"])
+
+    conf_m = conf_mk.sum(axis=1)
+    for i, m in enumerate(models):
+        with open(os.path.join(out_dir, f"confusion_{m}.csv"), "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["true\\pred"] + list(unique_labels))
+            for c, row in enumerate(conf_m[i]):
+                w.writerow([unique_labels[c]] + row.tolist())
+
+    with open(os.path.join(out_dir, "confidence_distribution.csv"), "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["model", "true_label", "correct", "bin_low", "bin_high", "count"])
+        for i, m in enumerate(models):
+            hist = confidence_histograms(conf[i], y, correct[i], n_classes)
+            for c in range(n_classes):
+                for ok in (1, 0):
+                    for b in range(CONFIDENCE_BINS):
+                        w.writerow([m, unique_labels[c], bool(ok), b / CONFIDENCE_BINS, (b + 1) / CONFIDENCE_BINS,
+                                    int(hist[c, ok, b])])
+
+    per_class, f1w, f1m = f1_scores(conf_m)
+    print(f"\n{'model':12s} {'accuracy':>16s} {'F1 (weighted)':>14s} {'F1 (macro)':>11s} "
+          f"{'latency p50/p95':>16s} {'params':>9s}")
+    for i, m in enumerate(models):
+        print(f"{m:12s} {acc_mk[i].mean():8.4f} ± {acc_mk[i].std():.4f} {f1w[i]:14.4f} {f1m[i]:11.4f} "
+              f"{np.percentile(latency[i], 50):7.2f}/{np.percentile(latency[i], 95):.2f} ms "
+              f"{runs[(m, 0)]['params']:9d}")
+        print("    per-class F1: " + ", ".join(f"{l} {v:.3f}" for l, v in zip(unique_labels, per_class[i])))
+        mean_conf = [conf[i][(y == c) & correct[i]].mean() if ((y == c) & correct[i]).any() else float("nan")
+                     for c in range(n_classes)]
+        print("    mean confidence when right: " + ", ".join(f"{l} {v:.3f}" for l, v in zip(unique_labels, mean_conf)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parallel stratified k-fold evaluation of the gesture models")
+    parser.add_argument("--dataset", default="gesture_dataset.npz")
+    parser.add_argument("--models", nargs="+", choices=ARCHITECTURES, default=list(ARCHITECTURES))
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=max(1, min(4, (os.cpu_count() or 2) // 2)))
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="kfold_eval")
+    parser.add_argument("--keep-models", action="store_true", help="keep each fold's model in <out>/models")
+    args = parser.parse_args(argv)
+
+    X, y, unique_labels, _ = load_dataset(args.dataset)
+    n_classes = len(unique_labels)
+    folds = stratified_folds(y, args.folds, args.seed)
+    os.makedirs(args.out, exist_ok=True)
+    model_dir = os.path.join(args.out, "models") if args.keep_models else tempfile.mkdtemp(prefix="kfold_")
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    print(f"=== {len(y)} samples, {args.folds} folds, {len(args.models)} models, "
+          f"{args.workers} workers x {threads} threads ===")
+
+    ctx = mp.get_context("spawn")  # TensorFlow does not survive fork
+    runs = {}
+    wall = time.time()
+    try:
+        with ProcessPoolExecutor(args.workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(X, y, n_classes, threads)) as pool:
+            jobs = [pool.submit(train_fold, m, j, np.flatnonzero(folds != j), np.flatnonzero(folds == j),
+                                args.epochs, args.batch_size, os.path.join(model_dir, f"{m}_fold{j}"),
+                                args.seed + j)
+                    for m in args.models for j in range(args.folds)]
+            for job in as_completed(jobs):
+                r = job.result()
+                runs[(r["arch"], r["fold"])] = r
+                print(f"{r['arch']:12s} fold {r['fold']}: {r['epochs']} epochs in {r['train_s']:.0f} s, "
+                      f"accuracy {np.mean(r['probs'].argmax(-1) == y[r['test_idx']]):.4f}")
+        train_wall = time.time() - wall
+        serial = sum(r["train_s"] for r in runs.values())
+        print(f"Training: {train_wall:.0f} s wall for {serial:.0f} s of training ({serial / train_wall:.1f}x)")
+
+        # Latency on a quiet machine: one process, one model at a time.
+        probs = np.zeros((len(args.models), len(y), n_classes), dtype=np.float32)
+        latency = np.zeros((len(args.models), len(y)))
+        with ProcessPoolExecutor(1, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(X, y, n_classes, 0)) as pool:
+            for i, m in enumerate(args.models):
+                for j in range(args.folds):
+                    r = runs[(m, j)]
+                    probs[i, r["test_idx"]] = r["probs"]
+                    latency[i, r["test_idx"]] = pool.submit(measure_latency, r["model_path"], r["test_idx"]).result()
+    finally:
+        if not args.keep_models:
+            shutil.rmtree(model_dir, ignore_errors=True)
+
+    write_reports(args.out, args.models, y, unique_labels, folds, probs, latency, runs)
+    print(f"\nReports written to {args.out}/ ({time.time() - wall:.0f} s total)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# register_gesture.py
+#
+# Adds a gesture to a trained model without retraining it. A handful of clips
+# recorded with the automated dataset recorder are embedded with the frozen
+# model (penultimate layer) and stored in gesture_registry.npz next to the
+# model, either as prototypes (default) or, with --head, together with a
+# small softmax head over the frozen embeddings of every class, trained in
+# seconds. A running realtime app with GESTURE_REGISTRY enabled picks the
+# file up without a restart.
+#
+#   python register_gesture.py --model models_lstm/lstm_model_best --name circle --svo-dir datasets/RArm_Circle
+#   python register_gesture.py --model models_lstm/lstm_model_best --name circle --svo-dir datasets/RArm_Circle --head --dataset gesture_dataset.npz
+#   python register_gesture.py --model models_lstm/lstm_model_best --remove circle
+#   python register_gesture.py --model models_lstm/lstm_model_best --list
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+from gesture_dataset import (
+    WINDOW_SIZE, clip_dataframe, clip_paths, clip_features, resample_window, load_dataset, blind_test_split
+)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "realtime_inference_app"))
+from embedding_index import PrototypeIndex, embedding_model, default_index_path
+from gesture_registry import GestureRegistry, default_registry_path
+
+
+def clip_windows(svo_paths, columns=None, window_size=WINDOW_SIZE):
+    """(N, window_size, F) feature windows of the given clips, in the model's column order."""
+    windows = []
+    for path in svo_paths:
+        df = clip_dataframe(path)
+        if df.empty:
+            print(f"  -> No data extracted from {path}; skipping.")
+            continue
+        feats = clip_features(df)
+        if columns:
+            feats = feats.reindex(columns=columns, fill_value=0.0)
+        windows.append(resample_window(feats.values, window_size))
+    return np.array(windows, dtype=np.float32)
+
+
+def base_embeddings(embedder, args):
+    # Embeddings of the trained classes for the head: the dataset's training
+    # split if given, else the prototypes of the open-set index.
+    if args.dataset:
+        X, y, unique_labels, _ = load_dataset(args.dataset)
+        X_train, _, y_train, _ = blind_test_split(X, y)
+        emb, _ = embedder.predict(X_train, verbose=0)
+        return emb.reshape(len(X_train), -1), y_train, unique_labels
+    index = PrototypeIndex.load(default_index_path(args.model))
+    return index.prototypes, index.labels, index.class_labels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Register a new gesture with a trained model (no retraining)")
+    parser.add_argument("--model", required=True, help="saved Keras model directory")
+    parser.add_argument("--name", help="name of the gesture to register")
+    parser.add_argument("--svo-dir", help="folder of recorded clips of the gesture (*.svo2 or keypoint sidecars *.kp.npz)")
+    parser.add_argument("--head", action="store_true", help="also train a softmax head over all classes")
+    parser.add_argument("--dataset", default=None, help="gesture_dataset.npz for the head (default: embedding_index.npz prototypes)")
+    parser.add_argument("--slack", type=float, default=1.5, help="threshold = max leave-one-out distance * slack")
+    parser.add_argument("--registry", default=None, help="default: gesture_registry.npz next to the model")
+    parser.add_argument("--remove", metavar="NAME", help="unregister a gesture")
+    parser.add_argument("--list", action="store_true")
+    args = parser.parse_args(argv)
+
+    path = args.registry or default_registry_path(args.model)
+    registry = GestureRegistry.load(path) if os.path.exists(path) else GestureRegistry()
+
+    if args.list:
+        for gi, name in enumerate(registry.names):
+            print(f"{name:<15} examples {np.sum(registry.labels == gi):>3}  threshold {registry.thresholds[gi]:.4f}")
+        print(f"head: {', '.join(registry.head_labels) if registry.head_labels else 'none'}")
+        return 0
+    if args.remove:
+        if not registry.remove(args.remove):
+            print(f"{args.remove} is not registered")
+            return 1
+        registry.save(path)
+        print(f"Removed {args.remove}; registry written to {path}")
+        return 0
+    if not args.name or not args.svo_dir:
+        parser.error("--name and --svo-dir are required to register a gesture")
+
+    import tensorflow as tf
+
+    t0 = time.perf_counter()
+    model = tf.keras.models.load_model(args.model)
+    embedder, layer = embedding_model(model, registry.layer or -2)
+    if registry.layer not in (None, layer):
+        parser.error(f"registry uses layer '{registry.layer}', model has '{layer}'")
+    registry.layer = layer
+    columns_path = os.path.join(os.path.dirname(args.model), "feature_columns.json")
+    columns = json.load(open(columns_path)) if os.path.exists(columns_path) else None
+    t_load = time.perf_counter()
+
+    svo_paths = clip_paths(args.svo_dir)
+    print(f"=== {len(svo_paths)} clips of '{args.name}' in {args.svo_dir} ===")
+    X = clip_windows(svo_paths, columns)
+    if len(X) == 0:
+        print("No usable clips")
+        return 1
+    t_extract = time.perf_counter()
+
+    emb, probs = embedder.predict(X, verbose=0)
+    threshold = registry.add(args.name, emb.reshape(len(X), -1), slack=args.slack)
+    t_embed = time.perf_counter()
+    print(f"{len(X)} examples, threshold {threshold:.4f} (cosine distance)")
+    print("Model's current predictions for them:", np.bincount(np.argmax(probs, axis=-1)).tolist())
+
+    if args.head:
+        be, bl, names = base_embeddings(embedder, args)
+        acc = registry.train_head(be, bl, names)
+        print(f"Head over {len(registry.head_labels)} classes, training accuracy {acc:.3f}")
+    elif registry.head_labels:
+        print("Existing head dropped (does not cover the new gesture); rerun with --head to retrain it")
+        registry.head_labels, registry.head_w, registry.head_b = [], None, None
+    t_head = time.perf_counter()
+
+    registry.save(path)
+    print(f"\nOnboarding time: {t_head - t_load:.1f} s (extract {t_extract - t_load:.1f} s, "
+          f"embed {t_embed - t_extract:.2f} s, head {t_head - t_embed:.2f} s; model load {t_load - t0:.1f} s)")
+    print(f"Registered: {', '.join(registry.names)}")
+    print(f"Registry written to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
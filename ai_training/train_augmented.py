@@ -0,0 +1,143 @@
+# train_augmented.py
+#
+# Trains one of the notebook architectures on augmented clips streamed from
+# AugmentedBatches (augmentation.py) instead of the fixed feature array.
+#
+# Needs the raw keypoints of the clips, written once with --build:
+#   python train_augmented.py --build D:\...\dataset_2 --keypoints gesture_keypoints.npz
+# then:
+#   python train_augmented.py --keypoints gesture_keypoints.npz --arch lstm --out models_lstm_aug
+#
+# Validation uses the notebook's 80/20 stratified split of the un-augmented
+# clips, so the accuracy is comparable with the notebook's models. The best
+# attempt is saved as <out>/<arch>_model_best with its history,
+# feature_columns.json and label_encoder.json (what the realtime app reads).
+# --bench only measures how fast batches are produced vs. consumed by fit.
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+from gesture_dataset import (
+    FOLDERS, FEATURE_COLUMNS, build_keypoint_dataset, save_keypoint_dataset, load_keypoint_dataset,
+    clip_features_batch
+)
+from augmentation import Augmenter, AugmentedBatches
+from gesture_models import ARCHITECTURES, EPOCHS, BATCH_SIZE, build_model, notebook_callbacks
+
+
+def split_indices(y):
+    """Indices of the notebook's blind_test_split (test_size=0.2, random_state=42, stratified)."""
+    from sklearn.model_selection import train_test_split
+    idx = np.arange(len(y))
+    return train_test_split(idx, test_size=0.2, random_state=42, stratify=y)
+
+
+def bench(batches, model, workers, steps=50):
+    """Time to build one augmented batch on one thread vs. one training step on it."""
+    idx = np.arange(min(batches.batch_size, len(batches.y)))
+    X, Y = batches.make_batch(idx)
+    t0 = time.perf_counter()
+    for _ in range(steps):
+        batches.make_batch(idx)
+    build = (time.perf_counter() - t0) / steps
+    model.train_on_batch(X, Y)
+    t0 = time.perf_counter()
+    for _ in range(steps):
+        model.train_on_batch(X, Y)
+    train = (time.perf_counter() - t0) / steps
+    print(f"augment + features: {build * 1000:.2f} ms per batch of {len(idx)} (one thread), "
+          f"train step: {train * 1000:.2f} ms")
+    print("augmentation keeps up with fit" if build / workers < train else
+          f"augmentation is the bottleneck: use more than {workers} --workers")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train a gesture model on streamed augmented clips")
+    parser.add_argument("--keypoints", default="gesture_keypoints.npz", help="raw clip dataset (see --build)")
+    parser.add_argument("--build", metavar="DATASET_DIR", help="extract the raw clips of DATASET_DIR to --keypoints first")
+    parser.add_argument("--arch", choices=ARCHITECTURES, default="lstm")
+    parser.add_argument("--out", default=None, help="default: models_<arch>_aug")
+    parser.add_argument("--attempts", type=int, default=1, help="random restarts (the notebook uses 10)")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=2, help="augmentation threads")
+    parser.add_argument("--prefetch", type=int, default=8, help="batches buffered ahead of fit")
+    parser.add_argument("--mirror-p", type=float, default=0.5)
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.build:
+        kp, ts, labels = build_keypoint_dataset(args.build, FOLDERS)
+        save_keypoint_dataset(args.keypoints, kp, ts, labels)
+        print(f"Saved {len(labels)} clips to {args.keypoints}")
+
+    import tensorflow as tf
+
+    keypoints, timestamps, y, unique_labels = load_keypoint_dataset(args.keypoints)
+    train_idx, val_idx = split_indices(y)
+    X_val = clip_features_batch(keypoints[val_idx], timestamps[val_idx])
+    y_val = tf.keras.utils.to_categorical(y[val_idx], len(unique_labels))
+    seq_len, feature_dim = X_val.shape[1:]
+    print(f"=== {len(train_idx)} training clips (augmented), {len(val_idx)} validation clips, "
+          f"classes {unique_labels} ===")
+
+    augmenter = Augmenter(unique_labels, mirror_p=args.mirror_p, seed=args.seed)
+    batches = AugmentedBatches(keypoints[train_idx], timestamps[train_idx], y[train_idx], unique_labels, augmenter,
+                               batch_size=args.batch_size, prefetch=args.prefetch, workers=args.workers,
+                               seed=args.seed)
+    out_dir = args.out or f"models_{args.arch}_aug"
+    try:
+        if args.bench:
+            bench(batches, build_model(args.arch, seq_len, feature_dim, len(unique_labels)), args.workers)
+            return 0
+
+        os.makedirs(out_dir, exist_ok=True)
+        best_val_acc = -1.0
+        for attempt in range(args.attempts):
+            model = build_model(args.arch, seq_len, feature_dim, len(unique_labels))
+            start = time.time()
+            history = model.fit(batches, steps_per_epoch=batches.steps_per_epoch, epochs=args.epochs,
+                                validation_data=(X_val, y_val), callbacks=notebook_callbacks(), verbose=2)
+            training_time = time.time() - start
+            val_acc = max(history.history['val_accuracy'])
+            print(f"Attempt {attempt + 1}/{args.attempts}: best val_accuracy {val_acc:.4f} "
+                  f"({training_time:.0f} s, {batches.batches_built} batches built)")
+            if val_acc <= best_val_acc:
+                continue
+            best_val_acc = val_acc
+            model.save(os.path.join(out_dir, f"{args.arch}_model_best"))
+            with open(os.path.join(out_dir, f"{args.arch}_history_best.json"), "w") as f:
+                json.dump({
+                    'accuracy': [float(v) for v in history.history['accuracy']],
+                    'val_accuracy': [float(v) for v in history.history['val_accuracy']],
+                    'loss': [float(v) for v in history.history['loss']],
+                    'val_loss': [float(v) for v in history.history['val_loss']],
+                    'best_val_accuracy': float(val_acc),
+                    'best_attempt': attempt + 1,
+                    'training_time': training_time,
+                    'params_count': model.count_params(),
+                    'augmentation': {
+                        'p': augmenter.p, 'mirror_p': augmenter.mirror_p,
+                        'yaw_deg': float(np.degrees(augmenter.yaw)), 'tilt_deg': float(np.degrees(augmenter.tilt)),
+                        'bone_scale': augmenter.bone_scale, 'time_warp': augmenter.time_warp,
+                        'speed': list(augmenter.speed), 'keypoint_dropout': augmenter.keypoint_dropout,
+                        'frame_dropout': augmenter.frame_dropout
+                    }
+                }, f, indent=2)
+            with open(os.path.join(out_dir, "feature_columns.json"), "w") as f:
+                json.dump(list(FEATURE_COLUMNS), f)
+            with open(os.path.join(out_dir, "label_encoder.json"), "w") as f:
+                json.dump({str(i): label for i, label in enumerate(unique_labels)}, f)
+        print(f"Best validation accuracy: {best_val_acc:.4f} -> {out_dir}")
+    finally:
+        batches.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
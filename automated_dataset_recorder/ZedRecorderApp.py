@@ -1,7 +1,5 @@
 import os
 import sys
-import time
-import threading
 import json
 from datetime import datetime
 import pygame
@@ -10,9 +8,31 @@ from tkinter import ttk, messagebox, simpledialog
 from ttkthemes import ThemedTk
 
 import pyzed.sl as sl
-import cv2
 from PIL import Image, ImageTk
 
+from capture_engine import CaptureEngine, svo_frame_count
+from keypoint_sidecar import sidecar_path
+from dataset_manifest import DatasetManifest
+from session_capture import MotionSegmenter, ClipWriter, LEFT_WRIST, RIGHT_WRIST
+
+CAMERA_FPS = 30
+FRAMES_PER_CLIP = 7        # the training notebook expects exactly 7 frames per clip
+COUNTDOWN_STEP_MS = 400
+UI_POLL_MS = 15
+
+# What each clip produces: (SVO, keypoints, session). With keypoints, body
+# tracking runs live (same settings as the training extraction) and a
+# keypoint sidecar is written. A session records one continuous stream and
+# cuts a clip out of it at every motion onset (session_capture.py), with no
+# countdown between repetitions; its SVO (optional) covers the whole session.
+OUTPUT_MODES = {
+    "SVO": (True, False, False),
+    "SVO + Keypoints": (True, True, False),
+    "Keypoints only": (False, True, False),
+    "Session (keypoints)": (False, True, True),
+    "Session (SVO + keypoints)": (True, True, True)
+}
+
 class ZedRecorderApp:
     def __init__(self, root):
         self.root = root
@@ -40,7 +60,9 @@ class ZedRecorderApp:
         self.camera = sl.Camera()
         self.init_params = sl.InitParameters()
         self.init_params.camera_resolution = sl.RESOLUTION.HD1080
+        self.init_params.camera_fps = CAMERA_FPS
         self.init_params.depth_mode = sl.DEPTH_MODE.NONE
+        self.engine = None
 
         # Recording state
         self.recording = False
@@ -49,8 +71,11 @@ class ZedRecorderApp:
         self.current_gesture = ""
         self.current_body_part = ""
 
-        # For checking IMU sensor
-        self.sensors_data = sl.SensorsData()
+        # Per-clip UI (countdown window) while a clip is in progress
+        self.clip_ui = None
+
+        # Clip ids and saved clips are tracked in datasets/manifest.sqlite
+        self.manifest = DatasetManifest("datasets")
 
         self.setup_ui()
 
@@ -111,13 +136,19 @@ class ZedRecorderApp:
         self.record_count = Spinbox(main_frame, from_=1, to=1000)
         self.record_count.grid(row=3, column=1, sticky=EW)
 
+        # Output
+        ttk.Label(main_frame, text="Output:").grid(row=4, column=0, sticky=W)
+        self.output_mode = ttk.Combobox(main_frame, values=list(OUTPUT_MODES), state="readonly")
+        self.output_mode.grid(row=4, column=1, sticky=EW)
+        self.output_mode.set("SVO")
+
         # Start Button
         self.start_btn = ttk.Button(main_frame, text="Start Recording", command=self.start_recording)
-        self.start_btn.grid(row=4, column=0, columnspan=2, pady=20)
+        self.start_btn.grid(row=5, column=0, columnspan=2, pady=20)
 
         # Status Label
         self.status_label = ttk.Label(main_frame, text="Ready")
-        self.status_label.grid(row=5, column=0, columnspan=2)
+        self.status_label.grid(row=6, column=0, columnspan=2)
 
         # Grid config so second column expands if window is resized
         main_frame.columnconfigure(1, weight=1)
@@ -143,8 +174,9 @@ class ZedRecorderApp:
                 self.gesture_type.set(new_gesture)
 
     def start_recording(self):
-        """Initialize camera and start the main recording loop."""
-        if not self.initialize_camera():
+        """Initialize camera, start the capture engine and the first recording."""
+        self.save_svo, self.save_keypoints, session = OUTPUT_MODES[self.output_mode.get()]
+        if not self.initialize_camera(body_tracking=self.save_keypoints):
             return
 
         # Construct a short name for the body part
@@ -156,8 +188,62 @@ class ZedRecorderApp:
         self.current_count = 0
         self.recording = True
 
+        self.engine = CaptureEngine(self.camera, fps=CAMERA_FPS, body_tracking=self.save_keypoints,
+                                    meta={"label": f"{self.current_body_part}_{self.current_gesture}",
+                                          "depth_mode": "ULTRA", "units": "METER",
+                                          "coordinate_system": "RIGHT_HANDED_Y_UP",
+                                          "body_model": "HUMAN_BODY_FAST", "body_format": "BODY_38"})
+        self.engine.start()
         self.start_btn.config(state=DISABLED)
-        self.record_loop()
+        if session:
+            self.start_session()
+        else:
+            self.record_loop()
+
+    def start_session(self):
+        """
+        Continuous recording: the capture engine cuts a clip at every motion
+        onset of the selected side's wrist and a background writer saves it,
+        until the requested number of clips is reached or Escape is pressed.
+        """
+        svo_path = None
+        if self.save_svo:
+            session_dir = os.path.join("datasets", f"{self.current_body_part}_{self.current_gesture}", "sessions")
+            os.makedirs(session_dir, exist_ok=True)
+            svo_path = os.path.join(session_dir, f"SB_{self.current_body_part}_{self.current_gesture}_session_"
+                                                 f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.svo2")
+        wrist = LEFT_WRIST if self.body_side.get().startswith("L") else RIGHT_WRIST
+        segmenter = MotionSegmenter(fps=CAMERA_FPS, clip_frames=FRAMES_PER_CLIP, wrist=wrist)
+        self.writer = ClipWriter(lambda: sidecar_path(self.get_next_filename()),
+                                 on_saved=lambda path, meta: self.manifest.record_clip(
+                                     sidecar=path, frames=meta["frames"], duration=meta["duration"],
+                                     dropped=meta["dropped"]))
+
+        window = Toplevel(self.root)
+        window.attributes("-fullscreen", True)
+        canvas = Canvas(window, bg="black")
+        canvas.pack(fill=BOTH, expand=True)
+        screen_width = window.winfo_screenwidth()
+        screen_height = window.winfo_screenheight()
+        count_label = canvas.create_text(screen_width // 2, screen_height // 2, font=("Arial", 100),
+                                         fill="white", text=f"0/{self.total_records}")
+        log_label = canvas.create_text(screen_width // 2, screen_height - 100, font=("Arial", 20), fill="white",
+                                       text="Raise the arm, hold, do the gesture, lower the arm; repeat (Esc to stop)")
+        preview_label = Label(canvas, bg="black")
+        canvas.create_window(screen_width - 220, screen_height - 180, anchor=NW, window=preview_label)
+        bar = canvas.create_rectangle(0, 0, 0, screen_height, fill="green")
+        canvas.tag_lower(bar)
+        window.bind("<Escape>", lambda e: self.engine.stop_session())
+
+        self.clip_ui = {
+            "window": window, "canvas": canvas, "countdown": count_label, "log": log_label,
+            "preview": preview_label, "bar": bar, "width": screen_width, "height": screen_height,
+            "session": True
+        }
+        self.play_sound("beep")
+        self.engine.start_session(segmenter, self.writer, svo_path=svo_path, max_clips=self.total_records,
+                                  meta={"side": self.body_side.get()})
+        self.poll_engine()
 
     def record_loop(self):
         """Keeps track of how many recordings have been done and handles stopping."""
@@ -167,24 +253,27 @@ class ZedRecorderApp:
 
         self.current_count += 1
         self.status_label.config(text=f"Recording {self.current_count}/{self.total_records}")
-        self.root.update()
-
-        # Perform a single recording in a separate thread so UI remains responsive
-        recording_thread = threading.Thread(target=self.perform_single_recording)
-        recording_thread.start()
+        self.wait_for_imu(tries=5)
 
-    def perform_single_recording(self):
+    def wait_for_imu(self, tries):
         """
-        3-second countdown, then record exactly 7 frames for the SVO.
-        No hidden frames. 
+        Check (without blocking the UI) that the IMU returns data once the
+        capture engine has grabbed a few frames; show an error screen if not.
         """
-        # 1) Attempt to see if IMU is working: if no data after a few tries, show error.
-        if not self.check_imu_working():
+        if self.engine.imu_ok:
+            self.perform_single_recording()
+        elif tries > 0:
+            self.root.after(200, self.wait_for_imu, tries - 1)
+        else:
             self.show_sensor_error_screen()
-            self.recording = False
-            return
+            self.stop_recording()
+            self.status_label.config(text="IMU sensor not returning data")
 
-        # 2) Standard countdown + 7 frames
+    def perform_single_recording(self):
+        """
+        Countdown (driven by the Tk event loop), then record exactly
+        FRAMES_PER_CLIP frames for the SVO through the capture engine.
+        """
         countdown_window = Toplevel(self.root)
         countdown_window.attributes("-fullscreen", True)
 
@@ -216,7 +305,7 @@ class ZedRecorderApp:
             window=preview_label
         )
 
-        wave_count_label = canvas.create_text(
+        canvas.create_text(
             10,
             screen_height - 10,
             font=("Arial", 20),
@@ -224,108 +313,121 @@ class ZedRecorderApp:
             anchor=SW,
             text=f"{self.current_count}/{self.total_records}"
         )
+        bar = canvas.create_rectangle(0, 0, 0, screen_height, fill="green")
+        canvas.tag_lower(bar)
 
-        # 3-second countdown (no recording yet)
-        for i in range(3, 0, -1):
-            canvas.itemconfig(countdown_label, text=str(i))
+        self.clip_ui = {
+            "window": countdown_window, "canvas": canvas, "countdown": countdown_label,
+            "log": log_label, "preview": preview_label, "bar": bar, "width": screen_width,
+            "height": screen_height
+        }
+        self.poll_engine()
+        self.countdown_step(3)
+
+    def countdown_step(self, i):
+        """One countdown tick; the last one hands the clip to the capture engine."""
+        ui = self.clip_ui
+        if i > 0:
+            ui["canvas"].itemconfig(ui["countdown"], text=str(i))
+            ui["canvas"].itemconfig(ui["log"], text=f"Get ready... {i}")
             self.play_sound("countdown")
-            canvas.itemconfig(log_label, text=f"Get ready... {i}")
-            canvas.update()
-
-            # Grab 1 frame for preview
-            if self.camera.grab() == sl.ERROR_CODE.SUCCESS:
-                zed_mat = sl.Mat()
-                self.camera.retrieve_image(zed_mat, sl.VIEW.LEFT)
-                frame = zed_mat.get_data()
-                self.update_preview_label(preview_label, frame, 200, 160)
-
-            time.sleep(0.4)
-
-        # Start recording
-        filename = self.get_next_filename()
-        # specify 30 fps if you want. Or remove that arg to rely on the default
-        recording_param = sl.RecordingParameters(filename, sl.SVO_COMPRESSION_MODE.H264, 30)
-        err = self.camera.enable_recording(recording_param)
-        if err != sl.ERROR_CODE.SUCCESS:
-            print(f"Error enabling recording: {err}")
-            countdown_window.destroy()
-            self.record_loop()
+            self.root.after(COUNTDOWN_STEP_MS, self.countdown_step, i - 1)
             return
-
-        # Now record exactly 7 frames
-        canvas.itemconfig(countdown_label, text="GO!")
-        canvas.itemconfig(log_label, text="Recording now...")
+        filename = self.get_next_filename()
+        ui["canvas"].itemconfig(ui["countdown"], text="GO!")
+        ui["canvas"].itemconfig(ui["log"], text="Recording now...")
         self.play_sound("beep")
-        canvas.update()
-
-        self.record_visible_frames_with_progress(8, canvas, log_label, preview_label)
+        self.engine.capture(filename if self.save_svo else None, FRAMES_PER_CLIP,
+                            keypoints_path=sidecar_path(filename) if self.save_keypoints else None)
 
-        self.camera.disable_recording()
-
-        canvas.itemconfig(countdown_label, text="Saving...")
-        canvas.itemconfig(log_label, text="Finalizing file...")
-        canvas.update()
-
-        if self.check_svo_save_success(filename):
-            canvas.itemconfig(log_label, text="Save successful!")
-        else:
-            canvas.itemconfig(log_label, text="Save failed or incomplete.")
-
-        time.sleep(0.4)
-        countdown_window.destroy()
-
-        self.record_loop()
-
-    def record_visible_frames_with_progress(self, num_frames, canvas, log_label, preview_label):
-        """Record exactly `num_frames` with progress bar and preview."""
-        screen_width = self.root.winfo_screenwidth()
-        screen_height = self.root.winfo_screenheight()
-        bar = canvas.create_rectangle(0, 0, 0, screen_height, fill="green")
-        canvas.tag_lower(bar)
+    def poll_engine(self):
+        """Show the engine's latest preview and apply its progress/result events."""
+        ui = self.clip_ui
+        if ui is None:
+            return
+        frame = self.engine.latest_preview()
+        if frame is not None and frame is not ui.get("shown"):
+            ui["shown"] = frame
+            self.update_preview_label(ui["preview"], frame)
+        for event in self.engine.events():
+            if event[0] == "clip":
+                _, n = event
+                ui["canvas"].itemconfig(ui["countdown"], text=f"{n}/{self.total_records}")
+                ui["canvas"].itemconfig(ui["log"], text=f"Clip {n} captured ({self.writer.saved} saved)")
+                ui["canvas"].coords(ui["bar"], 0, 0, int(n / self.total_records * ui["width"]), ui["height"])
+                self.play_sound("countdown")
+            elif event[0] == "done" and ui.get("session"):
+                self.finish_session(event[1])
+                return
+            elif event[0] == "progress":
+                _, done, total = event
+                ui["canvas"].itemconfig(ui["log"], text=f"Recording frame {done}/{total}")
+                ui["canvas"].coords(ui["bar"], 0, 0, int(done / total * ui["width"]), ui["height"])
+            elif event[0] == "done":
+                self.finish_clip(event[1])
+                return
+        self.root.after(UI_POLL_MS, self.poll_engine)
+
+    def finish_clip(self, result):
+        """Verify the saved clip, report it, then move on to the next recording."""
+        ui = self.clip_ui
+        ui["canvas"].itemconfig(ui["countdown"], text="Saving...")
+        ok = result.ok
+        if ok and result.filename:
+            ok = self.check_svo_save_success(result.filename, result.requested)
+        if ok and result.keypoints_path:
+            ok = os.path.exists(result.keypoints_path)
+        self.manifest.record_clip(svo=result.filename, sidecar=result.keypoints_path, frames=result.frames,
+                                  duration=result.duration, dropped=result.dropped, ok=ok)
+        status = "Save successful!" if ok else "Save failed or incomplete."
+        ui["canvas"].itemconfig(ui["log"], text=f"{status} ({result.summary()})")
+        print(f"{result.filename or result.keypoints_path}: {result.summary()}")
+
+        def close():
+            ui["window"].destroy()
+            self.clip_ui = None
+            self.record_loop()
+        self.root.after(COUNTDOWN_STEP_MS, close)
+
+    def finish_session(self, result):
+        """Wait for the background writer (polled, the UI stays live), report the session and release the camera."""
+        ui = self.clip_ui
+        if self.writer.pending:
+            ui["canvas"].itemconfig(ui["countdown"], text="Saving...")
+            ui["canvas"].itemconfig(ui["log"], text=f"Saving {self.writer.pending} clip(s)...")
+            self.root.after(COUNTDOWN_STEP_MS // 4, self.finish_session, result)
+            return
+        self.writer.close()
+        summary = f"{result.summary()}, {self.writer.saved} saved"
+        if self.writer.failed:
+            summary += f", {self.writer.failed} failed"
+        print(f"Session: {summary}")
+        ui["canvas"].itemconfig(ui["countdown"], text="Done")
+        ui["canvas"].itemconfig(ui["log"], text=summary)
+
+        def close():
+            ui["window"].destroy()
+            self.clip_ui = None
+            self.stop_recording()
+            self.status_label.config(text=f"Session complete: {summary}")
+        self.root.after(1500, close)
 
-        for i in range(num_frames):
-            if self.camera.grab() == sl.ERROR_CODE.SUCCESS:
-                zed_mat = sl.Mat()
-                self.camera.retrieve_image(zed_mat, sl.VIEW.LEFT)
-                frame = zed_mat.get_data()
-
-                self.update_preview_label(preview_label, frame, 200, 160)
-                canvas.itemconfig(log_label, text=f"Recording frame {i + 1}/{num_frames}")
-                progress = int((i + 1) / num_frames * screen_width)
-                canvas.coords(bar, 0, 0, progress, screen_height)
-                canvas.update()
-
-            time.sleep(0.1)
-
-    def update_preview_label(self, preview_label, frame, target_width=200, target_height=160):
-        """Update the preview window with new frame."""
-        small_frame = cv2.resize(frame, (target_width, target_height))
-        small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGRA2RGB)
-        img = Image.fromarray(small_frame)
+    def update_preview_label(self, preview_label, frame):
+        """Update the preview window with an RGB frame from the capture engine."""
+        img = Image.fromarray(frame)
         imgtk = ImageTk.PhotoImage(image=img)
         preview_label.config(image=imgtk)
         preview_label.image = imgtk
 
-    def check_svo_save_success(self, filename):
-        """Verify SVO file was saved correctly."""
-        return os.path.exists(filename) and os.path.getsize(filename) > 0
+    def check_svo_save_success(self, filename, expected_frames=None):
+        """Verify SVO file was saved correctly (and holds expected_frames frames, if given)."""
+        if not (os.path.exists(filename) and os.path.getsize(filename) > 0):
+            return False
+        return expected_frames is None or svo_frame_count(filename) == expected_frames
 
     def get_next_filename(self):
-        """Generate filename for new recording."""
-        base_dir = os.path.join("datasets", f"{self.current_body_part}_{self.current_gesture}")
-        os.makedirs(base_dir, exist_ok=True)
-
-        existing_files = [
-            f for f in os.listdir(base_dir)
-            if f.startswith(f"SB_{self.current_body_part}_{self.current_gesture}")
-        ]
-        max_num = max([int(f.split("_")[-1].split(".")[0]) for f in existing_files]) if existing_files else 0
-        next_num = max_num + 1
-
-        return os.path.join(
-            base_dir,
-            f"SB_{self.current_body_part}_{self.current_gesture}_{next_num:09d}.svo2"
-        )
+        """Reserve the next clip id in the dataset manifest and return its SVO filename."""
+        return self.manifest.allocate(f"{self.current_body_part}_{self.current_gesture}")
 
     def play_sound(self, sound_type):
         """Play appropriate sound effect."""
@@ -337,28 +439,35 @@ class ZedRecorderApp:
         except Exception as e:
             print(f"Sound error ({sound_type}): {e}")
 
-    def initialize_camera(self):
-        """Attempt to open the ZED camera."""
+    def initialize_camera(self, body_tracking=False):
+        """
+        Attempt to open the ZED camera. With body_tracking, depth, positional
+        and body tracking are set up as the training extraction replays SVOs
+        (ULTRA depth, meters, right-handed Y up, HUMAN_BODY_FAST, BODY_38).
+        """
+        if body_tracking:
+            self.init_params.depth_mode = sl.DEPTH_MODE.ULTRA
+            self.init_params.coordinate_units = sl.UNIT.METER
+            self.init_params.coordinate_system = sl.COORDINATE_SYSTEM.RIGHT_HANDED_Y_UP
+        else:
+            self.init_params.depth_mode = sl.DEPTH_MODE.NONE
         status = self.camera.open(self.init_params)
         if status != sl.ERROR_CODE.SUCCESS:
             messagebox.showerror("Camera Error", f"Failed to open camera: {status}")
             return False
+        if body_tracking:
+            status = self.camera.enable_positional_tracking(sl.PositionalTrackingParameters())
+            if status == sl.ERROR_CODE.SUCCESS:
+                body_params = sl.BodyTrackingParameters()
+                body_params.detection_model = sl.BODY_TRACKING_MODEL.HUMAN_BODY_FAST
+                body_params.body_format = sl.BODY_FORMAT.BODY_38
+                status = self.camera.enable_body_tracking(body_params)
+            if status != sl.ERROR_CODE.SUCCESS:
+                messagebox.showerror("Camera Error", f"Failed to start body tracking: {status}")
+                self.camera.close()
+                return False
         return True
 
-    def check_imu_working(self, tries=5):
-        """
-        Attempt up to 'tries' times to see if the IMU returns a non-zero timestamp.
-        If each attempt fails, we assume sensor is not working.
-        """
-        for _ in range(tries):
-            if self.camera.grab() == sl.ERROR_CODE.SUCCESS:
-                self.camera.get_sensors_data(self.sensors_data, sl.TIME_REFERENCE.CURRENT)
-                imu_data = self.sensors_data.get_imu_data()
-                if imu_data.timestamp.get_microseconds() > 0:
-                    return True
-            time.sleep(0.2)
-        return False
-
     def show_sensor_error_screen(self):
         """Display a permanent error message about IMU sensor not returning data."""
         error_window = Toplevel(self.root)
@@ -372,6 +481,9 @@ class ZedRecorderApp:
     def stop_recording(self):
         """Cleanup resources after recording."""
         self.recording = False
+        if self.engine is not None:
+            self.engine.stop()
+            self.engine = None
         self.camera.close()
         self.start_btn.config(state=NORMAL)
         self.status_label.config(text="Recording Complete!!")
@@ -0,0 +1,309 @@
+import os
+import time
+import queue
+import threading
+import traceback
+
+import pyzed.sl as sl
+import cv2
+
+from keypoint_sidecar import SidecarBuffer, SidecarRing
+
+
+class CaptureResult:
+    """Outcome of one clip: frames written, camera timestamps and dropped frames."""
+
+    def __init__(self, filename, requested, keypoints_path=None):
+        self.filename = filename               # SVO, or None when only keypoints are kept
+        self.keypoints_path = keypoints_path   # keypoint sidecar, or None
+        self.requested = requested
+        self.frames = 0
+        self.timestamps = []   # image timestamps (s) of the recorded frames
+        self.dropped = 0       # camera frames missed between recorded frames
+        self.grab_errors = 0
+        self.error = None
+
+    @property
+    def duration(self):
+        return self.timestamps[-1] - self.timestamps[0] if len(self.timestamps) > 1 else 0.0
+
+    @property
+    def ok(self):
+        return self.error is None and self.frames == self.requested
+
+    def summary(self):
+        if self.error:
+            return f"Failed: {self.error}"
+        txt = f"{self.frames}/{self.requested} frames in {self.duration * 1000:.0f} ms"
+        if self.dropped:
+            txt += f", {self.dropped} dropped"
+        return txt
+
+
+class SessionResult:
+    """Outcome of a continuous session: frames grabbed and clips cut from it."""
+
+    def __init__(self, svo_path=None):
+        self.svo_path = svo_path
+        self.frames = 0
+        self.clips = 0
+        self.dropped = 0
+        self.grab_errors = 0
+        self.error = None
+        self.started = time.time()
+        self.ended = None
+
+    def summary(self):
+        if self.error:
+            return f"Failed: {self.error}"
+        minutes = max((self.ended or time.time()) - self.started, 1e-6) / 60
+        txt = f"{self.clips} clips from {self.frames} frames ({self.clips / minutes:.1f} clips/min)"
+        if self.dropped:
+            txt += f", {self.dropped} dropped"
+        return txt
+
+
+class CaptureEngine:
+    """
+    Owns the camera's grab loop on a dedicated thread.
+
+    The thread grabs continuously at the camera's own rate (grab() blocks until
+    the next frame, nothing sleeps) and keeps the latest preview, downscaled
+    and converted on the capture thread, for the UI to pick up. capture()
+    queues a clip: recording is enabled at the next frame boundary and
+    disabled after exactly num_frames successful grabs, so the SVO holds
+    exactly num_frames frames. Gaps between consecutive image timestamps
+    longer than 1.5 frame periods are counted as dropped frames.
+
+    With body_tracking (the camera must have body tracking enabled), the
+    BODY_38 keypoints of every clip frame are retrieved live and written to a
+    keypoint sidecar (keypoint_sidecar.py) next to the SVO, or instead of it.
+
+    The UI never touches the camera: it polls events() and latest_preview()
+    from the Tk event loop (root.after).
+    """
+
+    def __init__(self, camera, fps=30, preview_size=(200, 160), preview_fps=15, body_tracking=False, meta=None):
+        self.camera = camera
+        self.body_tracking = body_tracking
+        self.meta = meta or {}             # stored in each keypoint sidecar
+        self.bodies = sl.Bodies()          # reused for every retrieve
+        self.body_runtime = sl.BodyTrackingRuntimeParameters()
+        self.fps = fps
+        self.period = 1.0 / fps
+        self.preview_size = preview_size
+        self.preview_period = 1.0 / preview_fps
+        self.runtime = sl.RuntimeParameters()
+        self.image = sl.Mat()              # reused for every retrieve
+        self.sensors_data = sl.SensorsData()
+        self.frames_grabbed = 0
+        self.last_ts_ns = 0
+        self.imu_ok = None                 # None until the first frame
+        self._preview = None
+        self._preview_ts = 0.0
+        self._lock = threading.Lock()
+        self._jobs = queue.Queue()
+        self._events = queue.Queue()
+        self._running = False
+        self._session_stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="CaptureEngine", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def capture(self, filename, num_frames, keypoints_path=None, compression=sl.SVO_COMPRESSION_MODE.H264):
+        """
+        Queue a clip of exactly num_frames frames to the SVO filename (None:
+        no SVO) and/or the keypoint sidecar keypoints_path (needs
+        body_tracking). Progress and the result arrive through events().
+        """
+        if keypoints_path and not self.body_tracking:
+            raise ValueError("keypoint capture needs an engine with body_tracking")
+        result = CaptureResult(filename, num_frames, keypoints_path)
+        self._jobs.put((self._record, result, (keypoints_path, compression)))
+
+    def start_session(self, segmenter, writer, svo_path=None, max_clips=None, meta=None):
+        """
+        Record continuously (needs body_tracking): every frame's keypoints go
+        into a ring buffer, segmenter (session_capture.MotionSegmenter) cuts
+        clips out of it and writer (session_capture.ClipWriter) saves them in
+        the background. svo_path also records the whole session to one SVO;
+        each clip's sidecar then names the SVO and its frame range. Runs
+        until stop_session() or max_clips clips; emits ("clip", n_clips)
+        events and ("done", SessionResult).
+        """
+        if not self.body_tracking:
+            raise ValueError("session recording needs an engine with body_tracking")
+        self._session_stop.clear()
+        self._jobs.put((self._session, SessionResult(svo_path), (segmenter, writer, max_clips, meta or {})))
+
+    def stop_session(self):
+        self._session_stop.set()
+
+    def events(self):
+        """
+        Pending ("progress", done, total) and ("done", CaptureResult) events,
+        oldest first. Every queued job ends with exactly one "done", with
+        result.error set if it failed.
+        """
+        out = []
+        while True:
+            try:
+                out.append(self._events.get_nowait())
+            except queue.Empty:
+                return out
+
+    def latest_preview(self):
+        """Most recent RGB preview frame (preview_size), or None."""
+        with self._lock:
+            return self._preview
+
+    def _grab(self):
+        if self.camera.grab(self.runtime) != sl.ERROR_CODE.SUCCESS:
+            return None
+        self.frames_grabbed += 1
+        self.last_ts_ns = self.camera.get_timestamp(sl.TIME_REFERENCE.IMAGE).get_nanoseconds()
+        ts = self.last_ts_ns * 1e-9
+        if self.imu_ok is not True:
+            self.camera.get_sensors_data(self.sensors_data, sl.TIME_REFERENCE.CURRENT)
+            self.imu_ok = self.sensors_data.get_imu_data().timestamp.get_microseconds() > 0
+        if ts - self._preview_ts >= self.preview_period:
+            self._preview_ts = ts
+            self.camera.retrieve_image(self.image, sl.VIEW.LEFT)
+            small = cv2.resize(self.image.get_data(), self.preview_size)
+            small = cv2.cvtColor(small, cv2.COLOR_BGRA2RGB)
+            with self._lock:
+                self._preview = small
+        return ts
+
+    def _record(self, result, keypoints_path, compression):
+        filename, num_frames = result.filename, result.requested
+        sidecar = SidecarBuffer(num_frames) if keypoints_path else None
+        if filename:
+            params = sl.RecordingParameters(filename, compression, self.fps)
+            err = self.camera.enable_recording(params)
+            if err != sl.ERROR_CODE.SUCCESS:
+                result.error = f"enable_recording: {err}"
+                return
+        try:
+            # Every successful grab while recording is one SVO frame.
+            while result.frames < num_frames and self._running:
+                ts = self._grab()
+                if ts is None:
+                    result.grab_errors += 1
+                    if result.grab_errors > self.fps:  # a second's worth of failures in a row
+                        result.error = "camera stopped delivering frames"
+                        break
+                    continue
+                result.grab_errors = 0
+                if result.timestamps:
+                    gap = ts - result.timestamps[-1]
+                    if gap > 1.5 * self.period:
+                        result.dropped += int(round(gap / self.period)) - 1
+                if sidecar is not None:
+                    self.camera.retrieve_bodies(self.bodies, self.body_runtime)
+                    sidecar.add(self.last_ts_ns, self.bodies)
+                result.timestamps.append(ts)
+                result.frames += 1
+                self._events.put(("progress", result.frames, num_frames))
+        finally:
+            if filename:
+                self.camera.disable_recording()
+        if result.error is None and result.frames < num_frames:
+            result.error = "stopped before the clip was complete"
+        if sidecar is not None and result.error is None:
+            try:
+                sidecar.save(keypoints_path, dict(self.meta, fps=self.fps, dropped=result.dropped,
+                                                  svo=os.path.basename(filename) if filename else None))
+            except OSError as e:
+                result.error = f"keypoint sidecar: {e}"
+
+    def _session(self, result, segmenter, writer, max_clips, meta):
+        svo_path = result.svo_path
+        result.started = time.time()
+        ring = SidecarRing(max(4 * self.fps, 4 * segmenter.clip_frames))
+        prev_ts = None
+        if svo_path:
+            params = sl.RecordingParameters(svo_path, sl.SVO_COMPRESSION_MODE.H264, self.fps)
+            err = self.camera.enable_recording(params)
+            if err != sl.ERROR_CODE.SUCCESS:
+                result.error = f"enable_recording: {err}"
+                return
+        try:
+            while self._running and not self._session_stop.is_set():
+                ts = self._grab()
+                if ts is None:
+                    result.grab_errors += 1
+                    if result.grab_errors > self.fps:
+                        result.error = "camera stopped delivering frames"
+                        break
+                    continue
+                result.grab_errors = 0
+                if prev_ts is not None and ts - prev_ts > 1.5 * self.period:
+                    result.dropped += int(round((ts - prev_ts) / self.period)) - 1
+                prev_ts = ts
+                self.camera.retrieve_bodies(self.bodies, self.body_runtime)
+                ring.add(self.last_ts_ns, self.bodies)
+                index = result.frames
+                result.frames += 1
+                keypoints, confidence, has_body = ring.frame(index)
+                for start, end in segmenter.update(index, ts, keypoints, has_body, confidence):
+                    clip = ring.clip(start, end)
+                    clip_ts = clip.timestamps[:clip.count] * 1e-9
+                    gaps = clip_ts[1:] - clip_ts[:-1]
+                    clip_meta = dict(self.meta)
+                    clip_meta.update(meta)
+                    clip_meta.update(fps=self.fps, session_frames=[start, end], frames=clip.count,
+                                     duration=float(clip_ts[-1] - clip_ts[0]),
+                                     dropped=sum(int(round(g / self.period)) - 1 for g in gaps
+                                                 if g > 1.5 * self.period))
+                    if svo_path:
+                        clip_meta.update(svo=os.path.basename(svo_path), svo_start=start, svo_end=end)
+                    writer.write(clip, clip_meta)
+                    result.clips += 1
+                    self._events.put(("clip", result.clips))
+                if max_clips and result.clips >= max_clips:
+                    break
+        finally:
+            if svo_path:
+                self.camera.disable_recording()
+            result.ended = time.time()
+
+    def _run(self):
+        while self._running:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                if self._grab() is None:
+                    time.sleep(self.period / 4)
+                continue
+            fn, result, args = job
+            try:
+                fn(result, *args)
+            except Exception as e:
+                # SDK or disk error: report it, or the UI waits for this job forever.
+                traceback.print_exc()
+                result.error = f"{type(e).__name__}: {e}"
+            self._events.put(("done", result))
+
+
+def svo_frame_count(filename):
+    """Number of frames in an SVO file, or -1 if it cannot be opened."""
+    init = sl.InitParameters()
+    init.set_from_svo_file(filename)
+    init.depth_mode = sl.DEPTH_MODE.NONE
+    cam = sl.Camera()
+    if cam.open(init) != sl.ERROR_CODE.SUCCESS:
+        return -1
+    try:
+        return cam.get_svo_number_of_frames()
+    finally:
+        cam.close()
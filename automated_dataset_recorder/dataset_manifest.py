@@ -0,0 +1,324 @@
+"""
+Dataset manifest: one SQLite file (datasets/manifest.sqlite) indexing every
+clip of a dataset directory, so nothing has to list or parse directories.
+
+    counters   next clip id per "<body part>_<gesture>" label (O(1) allocation)
+    clips      one row per clip: label, body part, gesture, id, SVO and/or
+               keypoint sidecar (paths relative to the dataset root), frame
+               count, duration, dropped frames, SHA-1 checksum, file size and
+               mtime, status (reserved / recorded / failed / missing) and
+               extraction status (None / ok / skipped / error)
+    features   extracted feature window of a clip, tagged with the checksum
+               and feature version it was computed from
+
+The recorder allocates a clip id before recording and marks the clip
+recorded (with its checksum) once it is saved; each is a single transaction.
+The training pipeline (ai_training/gesture_dataset.py) sync()s the folders it
+reads, re-extracts only clips whose checksum or feature version changed and
+reads everything else from the features table.
+
+Clips recorded before the manifest existed are picked up by sync(), and the
+first allocation of a label starts after the highest id found on disk.
+"""
+import os
+import re
+import time
+import glob
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+from keypoint_sidecar import SIDECAR_SUFFIX, clip_stem
+
+MANIFEST_NAME = "manifest.sqlite"
+CLIP_PATTERN = re.compile(r"^SB_(?P<label>.+)_(?P<id>\d+)$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    label TEXT PRIMARY KEY,
+    next_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS clips (
+    stem TEXT PRIMARY KEY,
+    label TEXT NOT NULL,
+    body_part TEXT,
+    gesture TEXT,
+    clip_id INTEGER,
+    svo TEXT,
+    sidecar TEXT,
+    frames INTEGER,
+    duration REAL,
+    dropped INTEGER,
+    checksum TEXT,
+    size INTEGER,
+    mtime REAL,
+    status TEXT NOT NULL,
+    extraction TEXT,
+    recorded_at REAL,
+    extracted_at REAL
+);
+CREATE INDEX IF NOT EXISTS clips_label ON clips (label, status);
+CREATE TABLE IF NOT EXISTS features (
+    stem TEXT PRIMARY KEY,
+    checksum TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    shape TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS info (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def file_checksum(path, chunk=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def split_label(label):
+    """("RArm", "SwipeRight") from "RArm_SwipeRight" (gesture None without an underscore)."""
+    part, _, gesture = label.partition("_")
+    return part, gesture or None
+
+
+class DatasetManifest:
+    """
+    Manifest of the dataset rooted at `root`. Safe to share between threads
+    (the recorder's UI and clip writer); every public method is one
+    transaction.
+    """
+
+    def __init__(self, root, filename=MANIFEST_NAME):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.path = os.path.join(root, filename)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _transaction(self, fn, *args):
+        # BEGIN IMMEDIATE takes the write lock up front, so two processes
+        # (recorder and a training run) never allocate the same id.
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(self._db, *args)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return out
+
+    def _rel(self, path):
+        return os.path.relpath(path, self.root) if path else None
+
+    def _abs(self, rel):
+        return os.path.join(self.root, rel) if rel else None
+
+    # ------------------------------------------------------------------ recorder
+
+    def allocate(self, label, extension=".svo2"):
+        """
+        Reserve the next clip id of label ("<body part>_<gesture>") and return
+        its path, datasets/<label>/SB_<label>_<id:09d><extension>.
+        """
+        folder = os.path.join(self.root, label)
+        os.makedirs(folder, exist_ok=True)
+
+        def txn(db):
+            row = db.execute("SELECT next_id FROM counters WHERE label = ?", (label,)).fetchone()
+            if row is None:
+                clip_id = self._highest_id(db, label, folder) + 1
+            else:
+                clip_id = row[0]
+            db.execute("INSERT OR REPLACE INTO counters (label, next_id) VALUES (?, ?)", (label, clip_id + 1))
+            stem = f"SB_{label}_{clip_id:09d}"
+            part, gesture = split_label(label)
+            db.execute("INSERT OR REPLACE INTO clips (stem, label, body_part, gesture, clip_id, status) "
+                       "VALUES (?, ?, ?, ?, ?, 'reserved')", (stem, label, part, gesture, clip_id))
+            return os.path.join(folder, stem + extension)
+        return self._transaction(txn)
+
+    @staticmethod
+    def _highest_id(db, label, folder):
+        # Only runs once per label: clips recorded before the manifest existed.
+        best = db.execute("SELECT MAX(clip_id) FROM clips WHERE label = ?", (label,)).fetchone()[0] or 0
+        for name in os.listdir(folder):
+            m = CLIP_PATTERN.match(clip_stem(name))
+            if m and m.group("label") == label:
+                best = max(best, int(m.group("id")))
+        return best
+
+    def record_clip(self, svo=None, sidecar=None, frames=None, duration=None, dropped=None, ok=True):
+        """
+        Mark a clip saved (ok) or failed. svo and/or sidecar are its files;
+        the checksum is taken from the sidecar when there is one (the file
+        training reads), else from the SVO.
+        """
+        main = sidecar or svo
+        stem = clip_stem(main)
+        m = CLIP_PATTERN.match(stem)
+        label = m.group("label") if m else os.path.basename(os.path.dirname(os.path.abspath(main)))
+        part, gesture = split_label(label)
+        checksum = size = mtime = None
+        if os.path.exists(main):
+            st = os.stat(main)
+            size, mtime = st.st_size, st.st_mtime
+            if ok:
+                checksum = file_checksum(main)
+
+        def txn(db):
+            db.execute("INSERT OR REPLACE INTO clips (stem, label, body_part, gesture, clip_id, svo, sidecar, frames, "
+                       "duration, dropped, checksum, size, mtime, status, extraction, recorded_at) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NULL, ?)",
+                       (stem, label, part, gesture, int(m.group("id")) if m else None,
+                        self._rel(svo), self._rel(sidecar), frames, duration, dropped, checksum, size, mtime,
+                        "recorded" if ok else "failed", time.time()))
+        self._transaction(txn)
+
+    # ------------------------------------------------------------------ training
+
+    def sync(self, label):
+        """
+        Bring the rows of one label folder in line with the disk: new files are
+        added, changed files (size or mtime) re-checksummed and queued for
+        extraction again, deleted ones
+        marked missing. Unchanged files are not read. Returns the number of
+        rows added or updated.
+        """
+        folder = os.path.join(self.root, label)
+        on_disk = {}
+        for p in glob.glob(os.path.join(folder, "*.svo2")) + glob.glob(os.path.join(folder, "*" + SIDECAR_SUFFIX)):
+            stem = clip_stem(p)
+            entry = on_disk.setdefault(stem, {"svo": None, "sidecar": None})
+            entry["sidecar" if p.endswith(SIDECAR_SUFFIX) else "svo"] = p
+
+        with self._lock:
+            rows = {r[0]: r[1:] for r in self._db.execute(
+                "SELECT stem, svo, sidecar, size, mtime, status FROM clips WHERE label = ?", (label,))}
+
+        updates = []
+        for stem, files in on_disk.items():
+            main = files["sidecar"] or files["svo"]
+            st = os.stat(main)
+            row = rows.get(stem)
+            # Failed clips stay failed until their file changes.
+            if (row is not None and row[4] in ("recorded", "failed") and row[0] == self._rel(files["svo"])
+                    and row[1] == self._rel(files["sidecar"]) and row[2] == st.st_size and row[3] == st.st_mtime):
+                continue
+            m = CLIP_PATTERN.match(stem)
+            updates.append((stem, int(m.group("id")) if m else None, self._rel(files["svo"]),
+                            self._rel(files["sidecar"]), file_checksum(main), st.st_size, st.st_mtime))
+        missing = [s for s, r in rows.items() if s not in on_disk and r[4] in ("recorded", "reserved")]
+        part, gesture = split_label(label)
+
+        def txn(db):
+            for stem, clip_id, svo, sidecar, checksum, size, mtime in updates:
+                if db.execute("SELECT 1 FROM clips WHERE stem = ?", (stem,)).fetchone():
+                    db.execute("UPDATE clips SET svo = ?, sidecar = ?, checksum = ?, size = ?, mtime = ?, "
+                               "status = 'recorded', extraction = NULL WHERE stem = ?", (svo, sidecar, checksum, size, mtime, stem))
+                else:
+                    db.execute("INSERT INTO clips (stem, label, body_part, gesture, clip_id, svo, sidecar, checksum, "
+                               "size, mtime, status, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'recorded', ?)",
+                               (stem, label, part, gesture, clip_id, svo, sidecar, checksum, size, mtime, mtime))
+            for stem in missing:
+                db.execute("UPDATE clips SET status = 'missing' WHERE stem = ?", (stem,))
+        if updates or missing:
+            self._transaction(txn)
+        return len(updates) + len(missing)
+
+    def clips(self, label=None, status="recorded"):
+        """Rows (dicts, absolute paths) of the clips of a label (all labels if None), in id order."""
+        sql = "SELECT * FROM clips WHERE status = ?"
+        args = [status]
+        if label is not None:
+            sql += " AND label = ?"
+            args.append(label)
+        with self._lock:
+            cur = self._db.execute(sql + " ORDER BY label, clip_id, stem", args)
+            names = [d[0] for d in cur.description]
+            rows = [dict(zip(names, r)) for r in cur.fetchall()]
+        for r in rows:
+            r["svo"], r["sidecar"] = self._abs(r["svo"]), self._abs(r["sidecar"])
+            r["path"] = r["sidecar"] or r["svo"]
+        return rows
+
+    def cached_features(self, stem, checksum, version):
+        """Feature window extracted from this exact clip content and feature version, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT shape, data FROM features WHERE stem = ? AND checksum = ? AND version = ?",
+                                   (stem, checksum, version)).fetchone()
+        if row is None:
+            return None
+        shape = tuple(int(s) for s in row[0].split(","))
+        return np.frombuffer(row[1], dtype=np.float32).reshape(shape)
+
+    def set_extraction(self, stem, status, features=None, checksum=None, version=None, frames=None):
+        """Record an extraction outcome (ok / skipped / error) and, for ok, the features."""
+        def txn(db):
+            db.execute("UPDATE clips SET extraction = ?, extracted_at = ?, frames = COALESCE(?, frames) "
+                       "WHERE stem = ?", (status, time.time(), frames, stem))
+            if features is not None:
+                f = np.ascontiguousarray(features, dtype=np.float32)
+                db.execute("INSERT OR REPLACE INTO features (stem, checksum, version, shape, data) "
+                           "VALUES (?, ?, ?, ?, ?)",
+                           (stem, checksum, version, ",".join(map(str, f.shape)), sqlite3.Binary(f.tobytes())))
+            else:
+                db.execute("DELETE FROM features WHERE stem = ?", (stem,))
+        self._transaction(txn)
+
+    def set_info(self, key, value):
+        self._transaction(lambda db: db.execute("INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)",
+                                                (key, value)))
+
+    def get_info(self, key, default=None):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def stats(self):
+        """Per label: clips, total frames, mean duration, dropped frames, extracted/failed counts."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT label, COUNT(*), SUM(frames), AVG(duration), SUM(dropped), "
+                "SUM(extraction = 'ok'), SUM(extraction IN ('skipped', 'error')) "
+                "FROM clips WHERE status = 'recorded' GROUP BY label ORDER BY label").fetchall()
+            failed = dict(self._db.execute(
+                "SELECT label, COUNT(*) FROM clips WHERE status = 'failed' GROUP BY label").fetchall())
+        return {r[0]: {"clips": r[1], "frames": r[2] or 0, "mean_duration": r[3], "dropped": r[4] or 0,
+                       "extracted": r[5] or 0, "not_extracted": r[1] - (r[5] or 0) - (r[6] or 0),
+                       "rejected": r[6] or 0, "failed": failed.get(r[0], 0)} for r in rows}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Dataset manifest statistics")
+    parser.add_argument("root", nargs="?", default="datasets", help="dataset directory")
+    parser.add_argument("--sync", action="store_true", help="index the label folders on disk first")
+    args = parser.parse_args()
+
+    manifest = DatasetManifest(args.root)
+    if args.sync:
+        for name in sorted(os.listdir(args.root)):
+            if os.path.isdir(os.path.join(args.root, name)):
+                n = manifest.sync(name)
+                if n:
+                    print(f"{name}: {n} clips indexed")
+    print(f"{'label':24s} {'clips':>6s} {'frames':>7s} {'dur ms':>7s} {'dropped':>7s} {'extracted':>9s} {'failed':>6s}")
+    for label, s in manifest.stats().items():
+        dur = f"{s['mean_duration'] * 1000:.0f}" if s["mean_duration"] is not None else "-"
+        print(f"{label:24s} {s['clips']:6d} {s['frames']:7d} {dur:>7s} {s['dropped']:7d} "
+              f"{s['extracted']:9d} {s['failed']:6d}")
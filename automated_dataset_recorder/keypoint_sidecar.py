@@ -0,0 +1,131 @@
+"""
+Keypoint sidecar files written by the recorder next to (or instead of) an SVO.
+
+One compressed .npz per clip, holding what the training pipeline would get
+from replaying the SVO with body tracking (open_svo_and_extract_dataframe in
+ai_training/gesture_dataset.py), so extraction can skip SVO decoding:
+
+    timestamps   (T,)        int64, image timestamps in ns
+    keypoints    (T, 38, 3)  float32, BODY_38 keypoints of the main body (m, Y up)
+    confidence   (T, 38)     float32, keypoint confidences (0 when missing)
+    body_id      (T,)        int32, tracking id of the main body, -1 if none
+    meta         ()          JSON string: format version, label, camera settings
+
+The main body is the first body of the frame, the one the SVO extraction
+picks. Only numpy is needed to read them.
+"""
+import os
+import json
+import numpy as np
+
+SIDECAR_SUFFIX = ".kp.npz"
+FORMAT_VERSION = 1
+NUM_KEYPOINTS = 38
+
+
+def sidecar_path(svo_path):
+    """Sidecar file name for an SVO (same directory and stem)."""
+    return os.path.splitext(svo_path)[0] + SIDECAR_SUFFIX
+
+
+def clip_stem(path):
+    """Clip name without directory and extension (.svo2 or .kp.npz)."""
+    name = os.path.basename(path)
+    if name.endswith(SIDECAR_SUFFIX):
+        return name[:-len(SIDECAR_SUFFIX)]
+    return os.path.splitext(name)[0]
+
+
+class SidecarBuffer:
+    """Preallocated per-clip arrays filled frame by frame on the capture thread."""
+
+    def __init__(self, num_frames):
+        self.timestamps = np.zeros(num_frames, dtype=np.int64)
+        self.keypoints = np.zeros((num_frames, NUM_KEYPOINTS, 3), dtype=np.float32)
+        self.confidence = np.zeros((num_frames, NUM_KEYPOINTS), dtype=np.float32)
+        self.body_id = np.full(num_frames, -1, dtype=np.int32)
+        self.count = 0
+
+    def add(self, ts_ns, bodies):
+        """Append one frame from an sl.Bodies (first body, as the SVO extraction picks)."""
+        i = self.count
+        self.timestamps[i] = ts_ns
+        self.keypoints[i] = 0.0
+        self.confidence[i] = 0.0
+        self.body_id[i] = -1
+        if bodies.body_list:
+            b = bodies.body_list[0]
+            kp = np.asarray(b.keypoint, dtype=np.float32).reshape(-1, 3)[:NUM_KEYPOINTS]
+            self.keypoints[i, :len(kp)] = np.nan_to_num(kp)
+            conf = getattr(b, "keypoint_confidence", None)
+            if conf is not None and len(conf):
+                c = np.asarray(conf, dtype=np.float32).reshape(-1)[:NUM_KEYPOINTS]
+                self.confidence[i, :len(c)] = np.nan_to_num(c)
+            else:
+                self.confidence[i] = 1.0
+            self.body_id[i] = b.id
+        self.count += 1
+
+    def save(self, path, meta=None):
+        n = self.count
+        write_sidecar(path, self.timestamps[:n], self.keypoints[:n], self.confidence[:n], self.body_id[:n], meta)
+
+
+class SidecarRing(SidecarBuffer):
+    """
+    The last `capacity` frames of a continuous session, addressed by absolute
+    frame index (frames added so far - 1 is the newest).
+    """
+
+    def __init__(self, capacity):
+        super().__init__(capacity)
+        self.capacity = capacity
+        self.total = 0
+
+    def add(self, ts_ns, bodies):
+        self.count = self.total % self.capacity
+        super().add(ts_ns, bodies)
+        self.total += 1
+        self.count = min(self.total, self.capacity)
+
+    def frame(self, index):
+        """(38, 3) keypoints and (38,) confidences at absolute frame index, and whether a body was tracked."""
+        i = index % self.capacity
+        return self.keypoints[i], self.confidence[i], self.body_id[i] >= 0
+
+    def timestamp(self, index):
+        return self.timestamps[index % self.capacity]
+
+    def clip(self, start, end):
+        """SidecarBuffer with the frames [start, end) (absolute indices, still in the ring)."""
+        if start < self.total - self.capacity or end > self.total or start >= end:
+            raise IndexError(f"frames {start}-{end} not in the ring ({self.total - self.count}-{self.total})")
+        idx = np.arange(start, end) % self.capacity
+        out = SidecarBuffer(end - start)
+        out.timestamps[:] = self.timestamps[idx]
+        out.keypoints[:] = self.keypoints[idx]
+        out.confidence[:] = self.confidence[idx]
+        out.body_id[:] = self.body_id[idx]
+        out.count = end - start
+        return out
+
+
+def write_sidecar(path, timestamps, keypoints, confidence, body_id, meta=None):
+    meta = dict(meta or {}, format=FORMAT_VERSION)
+    tmp = path + ".tmp.npz"
+    np.savez_compressed(tmp, timestamps=np.asarray(timestamps, dtype=np.int64),
+                        keypoints=np.asarray(keypoints, dtype=np.float32),
+                        confidence=np.asarray(confidence, dtype=np.float32),
+                        body_id=np.asarray(body_id, dtype=np.int32),
+                        meta=np.asarray(json.dumps(meta)))
+    os.replace(tmp, path)
+
+
+def read_sidecar(path):
+    """Dict with the arrays above and meta as a dict."""
+    with np.load(path, allow_pickle=False) as data:
+        out = {k: data[k] for k in ("timestamps", "keypoints", "confidence", "body_id")}
+        out["meta"] = json.loads(str(data["meta"]))
+    if out["meta"].get("format", 0) > FORMAT_VERSION:
+        raise ValueError(f"{path}: sidecar format {out['meta']['format']} is newer than {FORMAT_VERSION}")
+    return out
@@ -0,0 +1,202 @@
+"""
+Continuous session recording: one long stream, cut into labelled clips.
+
+MotionSegmenter finds gesture repetitions in the live keypoints with the
+stages of the realtime recognizer (GestureProcessor), simplified for one
+known arm: first the ready pose (arm extended towards the camera, same
+extension / torso angle / forward tests and thresholds) held still for
+ready_pose_frames frames, then motion onset of the exponentially smoothed
+wrist: speed above min_velocity, or a jump of spike_ratio over the previous
+frame's speed once it is above min_velocity / 2 (so jitter at rest is never
+a spike), held for onset_frames frames. Each onset yields one clip of
+clip_frames frames starting pre_roll frames before the first moving frame.
+The next onset needs the arm out of the ready pose for rest_frames frames
+(lowered) and a new ready pose, so one repetition gives one clip: neither
+raising the arm nor lowering it from the end of the gesture is cut.
+
+ClipWriter saves the clips (keypoint sidecars) on a background thread so
+the capture thread never waits for the disk.
+"""
+import queue
+import threading
+import traceback
+import numpy as np
+
+# Defaults from realtime_inference_app/config.py (STAGE_THRESHOLDS, READY_POSE_THRESHOLDS)
+MIN_VELOCITY = 0.15        # m/s
+VELOCITY_SPIKE_RATIO = 3.0
+ONSET_FRAMES = 3           # motion_detect_frames
+READY_POSE_FRAMES = 5
+ARM_EXTENSION_RATIO = 0.65
+TORSO_ARM_ANGLE = (80.0, 130.0)
+MIN_FORWARD_DOT = 0.5
+
+PELVIS = 0
+LEFT_WRIST = 16
+RIGHT_WRIST = 17
+# Shoulder, elbow and wrist of each arm, by wrist.
+ARMS = {LEFT_WRIST: (12, 14, 16), RIGHT_WRIST: (13, 15, 17)}
+# Towards the camera in the recorder's frame (RIGHT_HANDED_Y_UP).
+FORWARD = (0.0, 0.0, 1.0)
+
+
+class MotionSegmenter:
+    """Online ready pose + motion-onset segmentation of one arm."""
+
+    def __init__(self, fps=30, clip_frames=7, wrist=RIGHT_WRIST, min_velocity=MIN_VELOCITY,
+                 spike_ratio=VELOCITY_SPIKE_RATIO, onset_frames=ONSET_FRAMES, pre_roll=1, rest_frames=10,
+                 ready_pose_frames=READY_POSE_FRAMES, smoothing=0.5, forward=FORWARD):
+        self.fps = fps
+        self.clip_frames = clip_frames
+        self.wrist = wrist
+        self.arm = ARMS[wrist]
+        self.min_velocity = min_velocity
+        self.spike_ratio = spike_ratio
+        self.onset_frames = onset_frames
+        self.pre_roll = pre_roll
+        self.rest_frames = rest_frames
+        self.ready_pose_frames = ready_pose_frames
+        self.smoothing = smoothing     # weight of the new wrist position in the EMA
+        self.forward = np.asarray(forward, dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        self.smooth = None     # smoothed wrist position
+        self.last_ts = None
+        self.last_speed = 0.0
+        self.moving_run = 0
+        self.ready_run = 0
+        self.away_run = self.rest_frames
+        self.rested = True     # out of the ready pose long enough since the last onset
+        self.armed = False     # ready pose held, waiting for the onset
+        self.pending = []      # (start, end) clips waiting for their last frame
+        self.onsets = 0
+
+    def is_ready(self, keypoints):
+        """Ready-pose test (kinematics.arm_pose_metrics) on (38, 3) keypoints."""
+        s, e, w = (keypoints[j].astype(np.float64) for j in self.arm)
+        arm = w - s
+        al = np.linalg.norm(arm)
+        d_arm = np.linalg.norm(e - s) + np.linalg.norm(w - e)
+        torso = s - keypoints[PELVIS]
+        tl = np.linalg.norm(torso)
+        if al < 1e-6 or d_arm < 1e-6 or tl < 1e-6:
+            return False
+        deg = np.degrees(np.arccos(np.clip(np.dot(torso, arm) / (tl * al), -1.0, 1.0)))
+        return bool(al / d_arm >= ARM_EXTENSION_RATIO and TORSO_ARM_ANGLE[0] <= deg <= TORSO_ARM_ANGLE[1]
+                    and np.dot(arm, self.forward) / al > MIN_FORWARD_DOT)
+
+    def is_moving(self, speed):
+        return speed > self.min_velocity or (
+            self.last_speed > 0 and speed > self.last_speed * self.spike_ratio and speed > self.min_velocity / 2)
+
+    def update(self, index, ts, keypoints, has_body, confidence=None):
+        """
+        Feed frame `index`: (38, 3) keypoints in m (Y up), timestamp in s and
+        optionally (38,) confidences (0 = missing). Returns the clips
+        [start, end) whose last frame has now arrived.
+        """
+        keypoints = np.asarray(keypoints)
+        joints = (PELVIS,) + self.arm
+        valid = has_body and bool(np.isfinite(keypoints[list(joints)]).all())
+        if valid and confidence is not None:
+            valid = bool(np.all(np.asarray(confidence)[list(joints)] > 0))
+
+        speed = 0.0
+        if valid:
+            pos = keypoints[self.wrist].astype(np.float64)
+            if self.smooth is None:
+                self.smooth = pos
+            else:
+                prev = self.smooth
+                self.smooth = prev + self.smoothing * (pos - prev)
+                if ts > self.last_ts:
+                    speed = float(np.linalg.norm(self.smooth - prev)) / (ts - self.last_ts)
+            self.last_ts = ts
+        else:
+            self.smooth = None
+        moving = valid and self.is_moving(speed)
+        ready = valid and self.is_ready(keypoints)
+        self.last_speed = speed
+
+        self.moving_run = self.moving_run + 1 if moving else 0
+        if ready:
+            self.away_run = 0
+        else:
+            self.away_run += 1
+            if self.away_run >= self.rest_frames:
+                self.rested = True
+                self.armed = False
+        # Ready pose held still, after the arm was lowered since the last clip.
+        self.ready_run = self.ready_run + 1 if ready and not moving and self.rested else 0
+        if self.ready_run >= self.ready_pose_frames:
+            self.armed = True
+
+        if self.armed and self.moving_run == self.onset_frames:
+            first = index - self.onset_frames + 1
+            start = max(0, first - self.pre_roll)
+            self.pending.append((start, start + self.clip_frames))
+            self.onsets += 1
+            self.armed = False
+            self.rested = False
+            self.ready_run = 0
+
+        done = [c for c in self.pending if c[1] <= index + 1]
+        self.pending = [c for c in self.pending if c[1] > index + 1]
+        return done
+
+
+class ClipWriter:
+    """
+    Background writer: write(buffer, meta) queues a clip; the thread asks
+    allocate_path() for its file name, saves it and calls on_saved(path, meta)
+    (or on_error(exception, meta)).
+    """
+
+    def __init__(self, allocate_path, on_saved=None, on_error=None, max_pending=256):
+        self.allocate_path = allocate_path
+        self.on_saved = on_saved
+        self.on_error = on_error
+        self.saved = 0
+        self.failed = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="ClipWriter", daemon=True)
+        self._thread.start()
+
+    def write(self, buffer, meta):
+        with self._lock:
+            self._pending += 1
+        self._queue.put((buffer, meta))
+
+    def close(self, timeout=10.0):
+        """Finish the queued clips and stop the thread."""
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+
+    @property
+    def pending(self):
+        """Clips queued or being saved."""
+        return self._pending
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            buffer, meta = item
+            try:
+                path = self.allocate_path()
+                buffer.save(path, meta)
+                self.saved += 1
+                if self.on_saved:
+                    self.on_saved(path, meta)
+            except Exception as e:
+                self.failed += 1
+                traceback.print_exc()
+                if self.on_error:
+                    self.on_error(e, meta)
+            finally:
+                with self._lock:
+                    self._pending -= 1
@@ -0,0 +1,369 @@
+# benchmarks.py
+
+from config import (
+    DEBUG, BODY_REGIONS, SKELETON_PAIRS_BODY_38, MODEL_PATH, JOINT_FILTER
+)
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from body_data import BodyDataBuffer, NUM_KEYPOINTS
+from joint_filter import OneEuroFilterBank
+from skeleton_overlay import SkeletonOverlay
+from skeleton_synth import SyntheticSkeletons
+
+
+###############################################################################
+# Microbenchmarks for the realtime pipeline.
+#
+#   python benchmarks.py              # run everything
+#   python benchmarks.py keypoints    # run one benchmark
+#   python benchmarks.py load         # whole pipeline, 10 synthetic bodies at 120 FPS
+#   python benchmarks.py segmenter    # dataset session segmentation: one clip per repetition
+###############################################################################
+class _FakeBody:
+    def __init__(self, rng, body_id):
+        self.id = body_id
+        self.keypoint = rng.normal(0.0, 0.5, (NUM_KEYPOINTS, 3)).astype(np.float32)
+        self.keypoint[rng.random(NUM_KEYPOINTS) < 0.1] = np.nan
+        self.keypoint_confidence = rng.uniform(40, 100, NUM_KEYPOINTS).astype(np.float32)
+        # A person-sized cloud of image points somewhere in a 1080p frame.
+        self.keypoint_2d = (rng.uniform((200, 200), (1720, 880)) +
+                            rng.normal(0.0, 80.0, (NUM_KEYPOINTS, 2))).astype(np.float32)
+
+
+class _FakeBodies:
+    def __init__(self, n_bodies, seed=0):
+        rng = np.random.default_rng(seed)
+        self.is_new = True
+        self.body_list = [_FakeBody(rng, i) for i in range(n_bodies)]
+
+
+def _legacy_extract_keypoints(bodies, region):
+    # The per-point Python loop InferenceThread.extract_keypoints used before
+    # BodyDataBuffer, kept here as the baseline.
+    idxs = BODY_REGIONS[region]
+    kpts = np.zeros(len(idxs)*3, dtype=np.float32)
+    fullk = np.zeros(38*3, dtype=np.float32)
+    if bodies.is_new and bodies.body_list and len(bodies.body_list) > 0:
+        b = bodies.body_list[0]
+        for i, j in enumerate(idxs):
+            if j < len(b.keypoint):
+                p = b.keypoint[j]
+                if not np.all(np.abs(p) < 0.001):
+                    kpts[i*3:(i+1)*3] = p
+        for i2 in range(len(b.keypoint)):
+            p2 = b.keypoint[i2]
+            if not np.all(np.abs(p2) < 0.001):
+                fullk[i2*3:(i2+1)*3] = p2
+    return kpts, fullk
+
+
+def _time_per_call(fn, n_iter):
+    fn()  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(n_iter):
+        fn()
+    return (time.perf_counter() - t0) / n_iter * 1e6
+
+
+def bench_keypoints(n_iter=2000):
+    """Keypoint ingestion: legacy loop (first body only) vs BodyDataBuffer (all bodies)."""
+    print("== keypoint extraction (us per frame) ==")
+    print(f"{'bodies':>7} {'region':>10} {'legacy':>10} {'vectorized':>11}")
+    for n_bodies in (1, 4, 10):
+        bodies = _FakeBodies(n_bodies)
+        buf = BodyDataBuffer(max_bodies=max(n_bodies, 1))
+        for region in ("right_arm", "full_body"):
+            legacy = _time_per_call(lambda: _legacy_extract_keypoints(bodies, region), n_iter)
+
+            def vectorized():
+                buf.update(bodies)
+                buf.full_body(0)
+                return buf.region_keypoints(region, 0)
+
+            vec = _time_per_call(vectorized, n_iter)
+            print(f"{n_bodies:>7} {region:>10} {legacy:>10.1f} {vec:>11.1f}")
+
+
+def _swipe_signal(fps, seconds, noise, seed=0):
+    # Wrist x at rest with sensor noise, swiping 0.5 m in 0.3 s every 2 s.
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(fps*seconds)) / fps
+    phase = (t % 2.0) - 1.0
+    ramp = np.clip(phase / 0.3, 0.0, 1.0)
+    truth = 0.5 * (3*ramp**2 - 2*ramp**3) * (((t // 2.0) % 2) * -2 + 1) + 0.5 * ((t // 2.0) % 2)
+    return t, truth, truth + rng.normal(0.0, noise, len(t))
+
+
+def _crossing(t, y, level, rising):
+    # First time y crosses level, linearly interpolated between frames.
+    d = (y - level) if rising else (level - y)
+    i = int(np.argmax(d >= 0))
+    if i == 0:
+        return t[0]
+    return t[i-1] + (t[i] - t[i-1]) * (-d[i-1]) / (d[i] - d[i-1])
+
+
+def _lag_and_jitter(t, truth, out):
+    # Jitter: RMS error while the wrist is at rest. Lag: mean delay of the
+    # 50% crossing of each swipe.
+    phase = (t % 2.0) - 1.0
+    rest = (phase < -0.2) & (t > 1.0)
+    jitter = np.sqrt(np.mean((out[rest] - truth[rest])**2)) * 1000
+    lags = []
+    for start in np.arange(1.0, t[-1] - 1.0, 2.0):
+        w = (t >= start) & (t < start + 1.0)
+        lo, hi = truth[w][0], truth[w][-1]
+        mid = (lo + hi) / 2
+        lags.append(_crossing(t[w], out[w], mid, hi > lo) - _crossing(t[w], truth[w], mid, hi > lo))
+    return jitter, np.mean(lags) * 1000
+
+
+def bench_filter(n_iter=2000):
+    """One-Euro filter bank: per-frame cost vs joints/bodies, and lag/jitter vs the old EMA."""
+    print("== joint filter update (us per frame) ==")
+    print(f"{'bodies':>7} {'joints':>7} {'one-euro':>9}")
+    for n_bodies in (1, 4, 10):
+        for n_joints in (3, NUM_KEYPOINTS):
+            bank = OneEuroFilterBank(max_bodies=n_bodies, n_joints=n_joints, units_per_m=1.0)
+            rng = np.random.default_rng(0)
+            x = rng.normal(0.0, 0.5, (n_bodies, n_joints, 3)).astype(np.float32)
+            valid = np.ones((n_bodies, n_joints), dtype=bool)
+            ids = np.arange(n_bodies)
+            clock = [0.0]
+
+            def step():
+                clock[0] += 1.0 / 30
+                bank.update(x, valid, ids, clock[0])
+
+            print(f"{n_bodies:>7} {n_joints:>7} {_time_per_call(step, n_iter):>9.1f}")
+
+    print("\n== swipe tracking at 30 FPS, 5 mm noise ==")
+    print(f"{'filter':>12} {'jitter_mm':>10} {'lag_ms':>7}")
+    t, truth, noisy = _swipe_signal(30, 40, 0.005)
+    ema = np.zeros_like(noisy)
+    last = noisy[0]
+    for i, v in enumerate(noisy):
+        last = 0.3*last + 0.7*v
+        ema[i] = last
+    def one_euro(signal, units_per_m):
+        bank = OneEuroFilterBank(max_bodies=1, n_joints=1, units_per_m=units_per_m)
+        out = np.zeros_like(signal)
+        x = np.zeros((1, 1, 3), dtype=np.float32)
+        valid = np.ones((1, 1), dtype=bool)
+        ids = np.zeros(1, dtype=np.int64)
+        for i, v in enumerate(signal):
+            x[0, 0, 0] = v
+            out[i] = bank.update(x, valid, ids, t[i])[0][0, 0, 0]
+        return out
+
+    euro = one_euro(noisy, 1.0)
+    # The same swipes in the camera's units with the configured filter, back in metres.
+    unit = JOINT_FILTER["units_per_m"]
+    camera = one_euro(noisy * unit, unit) / unit
+    for name, out in (("raw", noisy), ("ema 0.3", ema), ("one-euro", euro), ("camera units", camera)):
+        jitter, lag = _lag_and_jitter(t, truth, out)
+        print(f"{name:>12} {jitter:>10.2f} {lag:>7.1f}")
+
+
+def _legacy_skeleton_preview(frame, bodies, scale):
+    # Per-bone / per-joint drawing on the full-resolution copy, then resize:
+    # the loop we used to enable in InferenceThread, kept as the baseline.
+    import cv2
+    disp = frame.copy()
+    for b in bodies.body_list:
+        kp = b.keypoint_2d
+        for i, j in SKELETON_PAIRS_BODY_38:
+            if np.isfinite(b.keypoint[i]).all() and np.isfinite(b.keypoint[j]).all():
+                cv2.line(disp, (int(kp[i][0]), int(kp[i][1])), (int(kp[j][0]), int(kp[j][1])), (0, 255, 255), 2)
+        for k in range(NUM_KEYPOINTS):
+            if np.isfinite(b.keypoint[k]).all():
+                cv2.circle(disp, (int(kp[k][0]), int(kp[k][1])), 4, (0, 0, 255), -1)
+    return cv2.resize(disp, (0, 0), fx=scale, fy=scale)
+
+
+def bench_overlay(n_iter=200, scale=0.25):
+    """Skeleton preview of a 1080p frame: per-bone loop at full resolution vs SkeletonOverlay."""
+    print(f"== skeleton preview, 1080p -> x{scale} (us per frame) ==")
+    print(f"{'bodies':>7} {'legacy':>10} {'overlay':>10} {'image only':>11}")
+    frame = np.random.default_rng(0).integers(0, 255, (1080, 1920, 3), dtype=np.uint8)
+    overlay = SkeletonOverlay(scale)
+    for n_bodies in (1, 4, 10):
+        bodies = _FakeBodies(n_bodies)
+        buf = BodyDataBuffer(max_bodies=n_bodies)
+        buf.update(bodies)
+        legacy = _time_per_call(lambda: _legacy_skeleton_preview(frame, bodies, scale), n_iter)
+        vec = _time_per_call(lambda: overlay.render(frame, buf), n_iter)
+        bare = _time_per_call(lambda: overlay.render(frame, None), n_iter)
+        print(f"{n_bodies:>7} {legacy:>10.0f} {vec:>10.0f} {bare:>11.0f}")
+
+
+def bench_load(n_bodies=10, fps=120, seconds=20.0, region="full_body"):
+    """
+    Whole tracking/processing path at n_bodies x fps on synthetic skeletons
+    (skeleton_synth.py): BodyDataBuffer, OneEuroFilterBank, one
+    GestureProcessor per body and GestureClassifier on every capture. Uses
+    the model at MODEL_PATH, or cpu_tune's stand-in LSTM if it is missing.
+    """
+    import tensorflow as tf
+    from gesture_processor import GestureProcessor
+    from gesture_classifier import GestureClassifier
+    from cpu_tune import _stand_in_model
+    model = tf.keras.models.load_model(MODEL_PATH) if os.path.exists(MODEL_PATH) else _stand_in_model()
+    classifier = GestureClassifier(model)
+    classifier.classify_gesture([np.zeros(model.input_shape[-1], dtype=np.float32)])  # warm-up
+
+    n_frames = int(fps * seconds)
+    # In the camera's units, as ZedFrameSource delivers them.
+    unit = JOINT_FILTER["units_per_m"]
+    synth = SyntheticSkeletons(n_bodies=n_bodies, fps=fps, unit=unit, seed=0)
+    clock = [0.0]
+
+    def generate():
+        clock[0] += 1.0 / fps
+        synth(0, clock[0])
+
+    gen = _time_per_call(generate, 500)
+    synth = SyntheticSkeletons(n_bodies=n_bodies, fps=fps, unit=unit, seed=0)
+    source = synth.source(n_frames)
+    buf = BodyDataBuffer(max_bodies=n_bodies)
+    bank = OneEuroFilterBank(max_bodies=n_bodies)
+    processors = {}
+    cost = np.zeros(n_frames)
+    classify = []
+    events = {}
+    k = 0
+    while source.grab():
+        t0 = time.perf_counter()
+        ts = source.timestamp()
+        n = buf.update(source.retrieve_bodies())
+        bank.apply(buf, ts)
+        for i in range(n):
+            p = processors.get(buf.ids[i])
+            if p is None:
+                p = processors[buf.ids[i]] = GestureProcessor(region=region)
+            p.full_body_kpts = buf.full_body(i)
+            r, _ = p.process_frame(buf.region_keypoints(region, i), ts, buf.region_velocities(region, i))
+            if r:
+                events[r["event"]] = events.get(r["event"], 0) + 1
+                if r["event"] in ("capture_complete", "capture_timeout"):
+                    t1 = time.perf_counter()
+                    classifier.classify_gesture(r["frames"])
+                    classify.append(time.perf_counter() - t1)
+        cost[k] = time.perf_counter() - t0
+        k += 1
+
+    budget = 1000.0 / fps
+    ms = cost * 1000
+    swipes = sum(1 for _, _, kind in synth.schedule(0.0, seconds) if kind.endswith("_swipe"))
+    print(f"== load: {n_bodies} bodies at {fps} FPS, {n_frames} frames, region {region} ==")
+    print(f"skeleton generator: {gen:.0f} us per frame ({budget * 1000 / gen:.0f}x realtime)")
+    print(f"pipeline: mean {ms.mean():.2f} ms, p95 {np.percentile(ms, 95):.2f} ms, max {ms.max():.2f} ms "
+          f"per frame; budget {budget:.2f} ms ({budget / ms.mean():.1f}x realtime, "
+          f"{np.mean(ms > budget):.1%} of frames over)")
+    if classify:
+        c = np.array(classify) * 1000
+        print(f"classify_gesture: {len(c)} calls, mean {c.mean():.2f} ms, p95 {np.percentile(c, 95):.2f} ms")
+    print(f"swipes performed: {swipes}; events: "
+          + ", ".join(f"{e} {c}" for e, c in sorted(events.items())))
+
+
+def bench_recorder(n_frames=5400, fps=30, chunk_frames=900):
+    """Session recorder: cost of frame() on the inference thread (target < 0.5 ms) and size on disk."""
+    import shutil
+    import tempfile
+    from session_recorder import SessionRecorder, SessionReader
+    print(f"== session recorder, {n_frames} frames at {fps} FPS, chunks of {chunk_frames} ==")
+    print(f"{'bodies':>7} {'mean_us':>8} {'p99_us':>7} {'max_us':>7} {'MB/h':>7} {'dropped':>8} {'read_ms':>8}")
+    features = np.random.default_rng(0).normal(size=70).astype(np.float32)
+    for n_bodies in (1, 10):
+        synth = SyntheticSkeletons(n_bodies=n_bodies, fps=fps, seed=0)
+        buf = BodyDataBuffer(max_bodies=n_bodies)
+        d = tempfile.mkdtemp(prefix="session_bench_")
+        rec = SessionRecorder(directory=d, bodies=n_bodies, chunk_frames=chunk_frames)
+        rec.start()
+        cost = np.zeros(n_frames)
+        states = ("WAITING", "READY", "CAPTURING", "CLASSIFYING")
+        for i in range(n_frames):
+            ts = i / fps
+            buf.update(synth(i, ts))
+            t0 = time.perf_counter()
+            rec.frame(i, ts, buf, features, states[(i // 60) % 4])
+            if i % 90 == 0:
+                rec.prediction(i, ts, "final", np.full(4, 0.25), 0, 0.25, "model")
+            cost[i] = time.perf_counter() - t0
+        rec.stop()
+        st = rec.stats()
+        reader = SessionReader(rec.path)
+        t0 = time.perf_counter()
+        reader.chunk_at((n_frames // 2) / fps)
+        read = (time.perf_counter() - t0) * 1000
+        us = cost * 1e6
+        mb_h = st["bytes"] / 1e6 * 3600 * fps / n_frames
+        print(f"{n_bodies:>7} {us.mean():>8.1f} {np.percentile(us, 99):>7.1f} {us.max():>7.1f} {mb_h:>7.0f} "
+              f"{st['dropped']:>8} {read:>8.1f}")
+        shutil.rmtree(d, ignore_errors=True)
+
+
+def bench_segmenter(repetitions=9, fps=30, jitters=(0.0, 0.002, 0.004)):
+    """
+    Session segmentation (automated_dataset_recorder/session_capture.py) on
+    synthetic sessions: every swipe repetition must give exactly one clip,
+    and that clip must cover the swipe rather than the arm being raised.
+    """
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "automated_dataset_recorder"))
+    from session_capture import MotionSegmenter
+    print(f"== session segmenter, {repetitions} repetitions per swipe at {fps} FPS ==")
+    print(f"{'swipe':>12} {'jitter_mm':>10} {'clips':>6} {'on_swipe':>9} {'moving':>7}")
+    failed = 0
+    for kind in ("left_swipe", "right_swipe", "up_swipe", "down_swipe"):
+        for jitter in jitters:
+            synth = SyntheticSkeletons(n_bodies=1, fps=fps, kinds=(kind,), jitter=jitter, dropout=0.0, seed=0)
+            synth.offset[:] = 0.0
+            seg = MotionSegmenter(fps=fps)
+            clips, moving = [], 0
+            for i in range(int(repetitions * synth.cycle_s * fps)):
+                ts = i / fps
+                body = synth(i, ts).body_list[0]
+                # Camera IMAGE frame (y down, z away) -> the recorder's RIGHT_HANDED_Y_UP.
+                kp = body.keypoint * np.array([1.0, -1.0, -1.0], dtype=np.float32)
+                clips += seg.update(i, ts, kp, True)
+                moving += seg.moving_run > 0
+            # Clip start within the cycle; the swipe starts at synth.swipe_start.
+            phase = np.array([(start / fps) % synth.cycle_s for start, _ in clips])
+            on_swipe = int(np.sum(np.abs(phase - synth.swipe_start) < synth.swipe_s))
+            ok = len(clips) == on_swipe == repetitions
+            failed += not ok
+            print(f"{kind:>12} {jitter * 1000:>10.0f} {len(clips):>6} {on_swipe:>9} "
+                  f"{moving / (i + 1):>7.0%}{'' if ok else '  MISMATCH'}")
+    print("one clip per repetition" if not failed else f"{failed} session(s) without one clip per repetition")
+
+
+BENCHMARKS = {
+    "keypoints": bench_keypoints,
+    "filter": bench_filter,
+    "overlay": bench_overlay,
+    "load": bench_load,
+    "recorder": bench_recorder,
+    "segmenter": bench_segmenter,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Realtime pipeline microbenchmarks")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    args = parser.parse_args(argv)
+    unknown = [n for n in args.names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    for name in (args.names or list(BENCHMARKS)):
+        BENCHMARKS[name]()
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
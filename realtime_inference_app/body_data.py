@@ -0,0 +1,111 @@
+# body_data.py
+
+from config import (
+    DEBUG, BODY_REGIONS, MAX_TRACKED_BODIES
+)
+import numpy as np
+
+NUM_KEYPOINTS = 38  # BODY_38
+MISSING_EPS = 0.001
+
+
+###############################################################################
+# BodyDataBuffer: body-data ingestion layer.
+#
+# Converts every body of an sl.Bodies into a (38, 3) keypoint array (and a
+# (38,) confidence array and (38, 2) image keypoints when the SDK provides
+# them) with one copy per body,
+# masks missing keypoints for all bodies at once, and serves region slices
+# from preallocated buffers. Nothing is allocated per frame.
+#
+# Arrays returned by full_body() / region_keypoints() are views into the
+# buffers and are overwritten by the next update(); copy them if you keep
+# them across frames.
+###############################################################################
+class BodyDataBuffer:
+    def __init__(self, max_bodies=MAX_TRACKED_BODIES):
+        self.max_bodies = max_bodies
+        self.keypoints = np.zeros((max_bodies, NUM_KEYPOINTS, 3), dtype=np.float32)
+        self.confidences = np.zeros((max_bodies, NUM_KEYPOINTS), dtype=np.float32)
+        self.keypoints_2d = np.zeros((max_bodies, NUM_KEYPOINTS, 2), dtype=np.float32)  # camera pixels
+        self.has_2d = np.zeros(max_bodies, dtype=bool)
+        self.valid = np.zeros((max_bodies, NUM_KEYPOINTS), dtype=bool)
+        self.velocities = np.zeros((max_bodies, NUM_KEYPOINTS, 3), dtype=np.float32)  # set by joint_filter
+        self.ids = np.full(max_bodies, -1, dtype=np.int64)
+        self.count = 0
+        self._region_idx = {r: np.asarray(j, dtype=np.intp) for r, j in BODY_REGIONS.items()}
+        self._region_out = {r: np.zeros((len(j), 3), dtype=np.float32) for r, j in BODY_REGIONS.items()}
+        self._region_vel = {r: np.zeros((len(j), 3), dtype=np.float32) for r, j in BODY_REGIONS.items()}
+        self._tmp = np.zeros((max_bodies, NUM_KEYPOINTS, 3), dtype=bool)
+        self._ftmp = np.zeros((max_bodies, NUM_KEYPOINTS, 3), dtype=np.float32)
+
+    def update(self, bodies):
+        """Refresh the buffers from an sl.Bodies. Returns the number of bodies."""
+        if not (bodies.is_new and bodies.body_list):
+            self.count = 0
+            return 0
+        n = 0
+        for b in bodies.body_list[:self.max_bodies]:
+            self._fill(n, b)
+            n += 1
+        self.count = n
+        self._mask(n)
+        return n
+
+    def _fill(self, i, body):
+        kp = np.asarray(body.keypoint, dtype=np.float32).reshape(-1, 3)
+        k = min(len(kp), NUM_KEYPOINTS)
+        self.keypoints[i, :k] = kp[:k]
+        if k < NUM_KEYPOINTS:
+            self.keypoints[i, k:] = 0.0
+        conf = getattr(body, "keypoint_confidence", None)
+        if conf is not None and len(conf):
+            conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+            c = min(len(conf), NUM_KEYPOINTS)
+            self.confidences[i, :c] = conf[:c]
+            self.confidences[i, c:] = 0.0
+        else:
+            self.confidences[i] = 1.0
+        kp2 = getattr(body, "keypoint_2d", None)
+        self.has_2d[i] = kp2 is not None and len(kp2) > 0
+        if self.has_2d[i]:
+            kp2 = np.asarray(kp2, dtype=np.float32).reshape(-1, 2)
+            k2 = min(len(kp2), NUM_KEYPOINTS)
+            self.keypoints_2d[i, :k2] = kp2[:k2]
+            self.keypoints_2d[i, k2:] = -1.0
+        self.ids[i] = getattr(body, "id", i)
+
+    def _mask(self, n):
+        # A keypoint is missing if any coordinate is NaN/inf or all are ~0.
+        kp = self.keypoints[:n]
+        tmp = self._tmp[:n]
+        np.isfinite(kp, out=tmp)
+        finite = tmp.all(axis=2)
+        np.nan_to_num(kp, copy=False)
+        np.greater_equal(np.abs(kp, out=self._ftmp[:n]), MISSING_EPS, out=tmp)
+        self.valid[:n] = finite & tmp.any(axis=2)
+        kp[~self.valid[:n]] = 0.0
+        np.nan_to_num(self.confidences[:n], copy=False)
+        self.confidences[:n][~self.valid[:n]] = 0.0
+
+    def full_body(self, body=0):
+        """Flat (38*3,) keypoints of one body."""
+        return self.keypoints[body].reshape(-1)
+
+    def region_keypoints(self, region, body=0):
+        """Flat (len(region)*3,) keypoints of one body, zeros if there is no such body."""
+        out = self._region_out[region]
+        if body is None or body >= self.count:
+            out.fill(0.0)
+        else:
+            np.take(self.keypoints[body], self._region_idx[region], axis=0, out=out)
+        return out.reshape(-1)
+
+    def region_velocities(self, region, body=0):
+        """(len(region), 3) joint velocities of one body, zeros if there is no such body."""
+        out = self._region_vel[region]
+        if body is None or body >= self.count:
+            out.fill(0.0)
+        else:
+            np.take(self.velocities[body], self._region_idx[region], axis=0, out=out)
+        return out
@@ -29,7 +29,49 @@ MODEL_PATH = r"D:\user\Documents\PLENG\Realtime_Inference\models\models_03\model
 WINDOW_SIZE = 7  # Was 6, now 7 frames
 FEATURE_DIM = 70 # Was 54, now 70 features
 
+# Runtime model hot-swap (see model_swap.py): another model directory (with
+# its feature_columns.json and label_encoder.json) is loaded, validated and
+# warmed up in the background, then swapped in between frames.
+MODEL_SWAP = {
+    "warmup_runs": 3,
+    "validation_dataset": None,      # optional gesture_dataset.npz to score the new model on
+    "min_accuracy": 0.0,             # reject the new model below this accuracy on it
+    "require_mapped_columns": False  # reject models with feature columns the realtime extractor does not compute
+}
+
 CAMERA_FPS = 30
+MAX_TRACKED_BODIES = 10  # per-body keypoint buffers preallocated in body_data.py
+
+# CPU layout (see cpu_layout.py): thread pools and CPU affinity per pipeline
+# stage, applied at startup before TensorFlow initialises. Stages: "process"
+# (whole process), "zed" (SDK threads, created when the camera opens), "tf"
+# (TensorFlow pools, created when the model loads), "inference"
+# (InferenceThread), "ui" (Tk / control thread). Zero / -1 / missing stages
+# keep the library defaults. "python cpu_tune.py" benchmarks candidate
+# layouts on this machine and writes the best one to CPU_LAYOUT_PATH, which
+# overrides CPU_LAYOUT. Example for an 8-core box:
+#   {"tf_intra_op": 2, "tf_inter_op": 1, "cv2_threads": 1,
+#    "affinity": {"ui": [0, 1], "zed": [2, 3, 4], "inference": [5], "tf": [6, 7]}}
+CPU_LAYOUT = {
+    "tf_intra_op": 0,
+    "tf_inter_op": 0,
+    "cv2_threads": -1,
+    "affinity": {}
+}
+CPU_LAYOUT_PATH = "cpu_layout.json"
+
+# Out-of-process inference (see inference_worker.py): the model runs in a
+# worker process; feature windows and predictions go through a shared-memory
+# ring of slots, only slot indices cross the pipe. A crashed or hung worker
+# is restarted and the request retried once.
+INFERENCE_WORKER = {
+    "enabled": False,
+    "slots": 8,              # ring buffer slots (requests in flight)
+    "max_batch": 16,         # windows per slot; larger batches are split
+    "timeout_s": 5.0,        # a request taking longer counts as a hung worker
+    "start_timeout_s": 120.0,
+    "max_restarts": 10
+}
 
 BODY_REGIONS = {
     "right_arm": [13, 15, 17],
@@ -37,10 +79,58 @@ BODY_REGIONS = {
     "full_body": list(range(38))
 }
 
+# Shoulder, elbow, wrist of each arm. The model was trained on the right arm;
+# mirrored arms have x negated before feature extraction so the same model
+# serves them, and their predictions are mapped back through MIRROR_LABELS.
+ARM_CHAINS = {
+    "right": [13, 15, 17],
+    "left": [12, 14, 16]
+}
+REGION_ARMS = {
+    "right_arm": ["right"],
+    "left_arm": ["left"],
+    "full_body": ["right", "left"]
+}
+MIRRORED_ARMS = ["left"]
+MIRROR_LABELS = {
+    "left_swipe": "right_swipe",
+    "right_swipe": "left_swipe"
+}
+
+# One-Euro jitter filter over all joints of all bodies (see joint_filter.py),
+# run on camera timestamps. Replaces GestureProcessor's fixed exponential
+# smoothing; velocities come from the filter's smoothed derivative.
+# min_cutoff (Hz): smoothing at rest; beta: how fast the cutoff opens with
+# joint speed, per m/s. units_per_m: camera units per metre; ZedFrameSource
+# leaves coordinate_units at the SDK default, millimetres, so speeds are
+# divided by 1000 before beta applies.
+# "python benchmarks.py filter" prints the lag/jitter trade-off.
+JOINT_FILTER = {
+    "enabled": True,
+    "min_cutoff": 1.0,
+    "beta": 10.0,
+    "d_cutoff": 1.0,
+    "units_per_m": 1000.0
+}
+
+# The threshold dicts below are the defaults of the live-reloadable pipeline
+# configuration (see runtime_config.py): values in PIPELINE_CONFIG_PATH
+# override them while the app runs, e.g.
+#   {"stages": {"gesture_cooldown": 1.5}, "ready_pose": {"arm_extension_ratio": 0.6}}
+# Entries nothing reads (runtime_config.NO_EFFECT: MOTION_THRESHOLDS,
+# ready_frames_required, min/high_confidence, sliding_window_consistency) are
+# rejected there. classification.confidence_threshold is the accept/reject
+# threshold of every final classification.
+PIPELINE_CONFIG_PATH = "pipeline_config.json"
+PIPELINE_CONFIG_POLL_S = 1.0
+
 READY_POSE_THRESHOLDS = {
     "arm_extension_ratio": 0.65,
     "wrist_pelvis_angle": 70,
-    "ready_frames_required": 4
+    "ready_frames_required": 4,
+    "min_torso_arm_angle": 80,
+    "max_torso_arm_angle": 130,
+    "min_forward_dot": 0.5
 }
 MOTION_THRESHOLDS = {
     "wrist_velocity": 0.15,
@@ -54,6 +144,130 @@ CLASSIFICATION_THRESHOLDS = {
     "diversity_penalty": 0.0,
     "window_consistency": 3
 }
+# GestureProcessor state machine
+STAGE_THRESHOLDS = {
+    "ready_pose_frames": 5,
+    "motion_detect_frames": 3,
+    "max_capture_frames": 10,
+    "min_velocity": 0.15,
+    "velocity_spike_ratio": 3.0,
+    "min_confidence": 0.7,
+    "high_confidence": 0.85,
+    "sliding_window_consistency": 3,
+    "gesture_cooldown": 1.0,      # s between a gesture and the next ready pose
+    "ready_settle_s": 1.0,        # s after the ready pose before motion counts
+    "ready_timeout_s": 3.0        # s in ready pose without motion before reset
+}
+# Rule-based first tier of GestureClassifier (see swipe_rules.py): a window
+# whose wrist movement is long and clearly along one axis is labelled from its
+# direction without running the model; everything else goes to the model.
+# RULE_DIRECTIONS is in the frame of the feature vectors the classifier gets;
+# ai_training/cascade_eval.py prints the mapping measured on the dataset.
+RULE_CASCADE = {
+    "enabled": False,
+    "min_travel": 0.5,        # wrist start->end distance / arm length
+    "min_clarity": 0.75,      # max(|d|)/sum(|d|), the notebook's directional_clarity
+    "vertical_angle": 60,     # |angle_from_horizontal| >= this for up/down
+    "horizontal_angle": 25,   # |angle_from_horizontal| <= this for left/right
+    "confidence": 0.95,       # confidence reported for rule decisions
+    "audit_every": 20         # also run the model on every Nth rule decision (0 = never)
+}
+RULE_DIRECTIONS = {
+    "+x": "right_swipe",
+    "-x": "left_swipe",
+    "+y": "up_swipe",
+    "-y": "down_swipe"
+}
+
+# Open-set rejection (see embedding_index.py): windows whose penultimate-layer
+# embedding is too far from every prototype of the predicted class are
+# rejected as unknown motion. The index is built by
+# ai_training/build_embedding_index.py.
+OPEN_SET = {
+    "enabled": False,
+    "index_path": None,      # default: embedding_index.npz next to MODEL_PATH
+    "threshold_scale": 1.0   # >1 rejects less, <1 rejects more
+}
+
+# Few-shot gesture registry (see gesture_registry.py): gestures added with
+# ai_training/register_gesture.py from a handful of recorded clips, without
+# retraining. The running recognizer reloads the registry file when it
+# changes (checked every poll_s seconds).
+GESTURE_REGISTRY = {
+    "enabled": False,
+    "path": None,            # default: gesture_registry.npz next to MODEL_PATH
+    "poll_s": 2.0
+}
+
+# Early ("anytime") classification: while capturing, the partial window is
+# classified on every frame from min_frames on, and a provisional result is
+# shown as soon as its confidence and top1-top2 margin reach these thresholds.
+# It is confirmed or retracted when the full window is classified.
+# ai_training/early_exit_eval.py measures the accuracy / latency trade-off.
+EARLY_EXIT = {
+    "enabled": False,
+    "min_frames": 3,
+    "confidence": 0.9,
+    "margin": 0.5
+}
+
+# Opt-in span tracer (see tracer.py). Dumps are Chrome trace-event JSON files
+# that open in chrome://tracing or ui.perfetto.dev.
+TRACE_ENABLED = False
+TRACE_BUFFER_SIZE = 20000  # spans kept in the ring buffer
+TRACE_SPIKE_MS = 50.0      # a frame slower than this triggers an automatic dump
+TRACE_DIR = "traces"
+
+# Event log (see event_log.py): in-memory ring buffer + rotating JSONL files.
+LOG_CAPACITY = 2000
+LOG_DIR = "logs"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_VIEW_LINES = 200   # lines kept in the Tk log console
+LOG_REFRESH_MS = 100   # Tk log console refresh period
+
+# Production session recorder (see session_recorder.py), off by default:
+# keypoints, feature frames, state transitions and classifier probabilities
+# of every processed frame, appended to compressed chunk files with an index.
+SESSION_RECORDER = {
+    "enabled": False,
+    "dir": "sessions",
+    "bodies": 1,             # bodies recorded per frame (the first is the one classified)
+    "chunk_frames": 900,     # frames per chunk (30 s at 30 FPS)
+    "buffers": 4,            # chunks in memory at most; frames are dropped while all wait for the writer
+    "compress_level": 3      # zlib level
+}
+
+# Latency accounting (see latency.py)
+LATENCY_WINDOW = 300       # frames / events in the rolling summary
+LATENCY_SUMMARY_S = 10.0   # seconds between summary log lines (0 = never)
+
+# Load shedding (see load_shedding.py): when the per-frame busy time stays
+# above the frame budget, InferenceThread degrades one level at a time, in this
+# order: stop camera preview, early-exit predictions only every
+# early_exit_every capture frames (skipped when EARLY_EXIT is off), UI metrics
+# only every metrics_every frames, bodies retrieved and processed only every
+# processing_every frames while no gesture is under way (body tracking itself
+# still runs in every grab). Levels
+# are restored one at a time when the cost drops back below recover * budget.
+LOAD_SHEDDING = {
+    "enabled": True,
+    "budget_ms": None,       # default: one camera frame period
+    "overload": 0.9,         # shed when the smoothed cost exceeds overload * budget ...
+    "up_frames": 5,          # ... for this many consecutive frames
+    "recover": 0.6,          # restore when below recover * budget ...
+    "down_frames": 90,       # ... for this many consecutive frames
+    "settle_frames": 15,     # frames to wait after a level change before the next
+    "alpha": 0.1,            # smoothing of the per-frame cost
+    "early_exit_every": 3,
+    "metrics_every": 5,
+    "processing_every": 2
+}
+
+# Headless daemon (see headless_app.py)
+HEADLESS_CONFIG_PATH = "headless_config.json"
+CONTROL_HOST = "127.0.0.1"
+CONTROL_PORT = 8765
 
 SKELETON_PAIRS_BODY_38 = [
     # Torso/spine
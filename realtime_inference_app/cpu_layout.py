@@ -0,0 +1,223 @@
+# cpu_layout.py
+
+from config import (
+    DEBUG, CPU_LAYOUT, CPU_LAYOUT_PATH
+)
+import os
+import sys
+import json
+import copy
+import threading
+import traceback
+from contextlib import contextmanager
+
+STAGES = ["process", "zed", "tf", "inference", "ui"]
+
+_active = None   # layout applied by apply()
+
+
+###############################################################################
+# CPU layout: thread-pool sizes and CPU affinity per pipeline stage.
+#
+# apply() sizes TensorFlow's intra/inter-op pools and OpenCV's pool and pins
+# the whole process; it has to run before TensorFlow executes anything. Each
+# stage is then pinned from the thread that runs it (pin) or, for threads
+# created by a library, around the call that creates them (pinned): new
+# threads inherit the affinity of the thread that starts them, so the ZED SDK
+# threads follow "zed" when the camera is opened under pinned("zed") and
+# TensorFlow's pools follow "tf" when the model is loaded under pinned("tf").
+# Thread affinity uses sched_setaffinity on Linux and SetThreadAffinityMask
+# on Windows; elsewhere pinning is skipped.
+###############################################################################
+def cpu_topology():
+    logical = os.cpu_count() or 1
+    if hasattr(os, "sched_getaffinity"):
+        allowed = sorted(os.sched_getaffinity(0))
+    else:
+        allowed = list(range(logical))
+    physical = None
+    try:
+        import psutil
+        physical = psutil.cpu_count(logical=False)
+    except ImportError:
+        pass
+    return {"logical": logical, "physical": physical, "allowed": allowed}
+
+
+def load_layout(path=CPU_LAYOUT_PATH):
+    """CPU_LAYOUT overridden by the JSON file at path (if it exists). Raises ValueError if invalid."""
+    layout = copy.deepcopy(CPU_LAYOUT)
+    layout["source"] = "config.py"
+    if path and os.path.exists(path):
+        with open(path, "r") as f:
+            layout.update(json.load(f))
+        layout["source"] = path
+    validate_layout(layout)
+    return layout
+
+
+def validate_layout(layout):
+    allowed = set(cpu_topology()["allowed"])
+    errors = []
+    for k in ("tf_intra_op", "tf_inter_op"):
+        if not isinstance(layout.get(k), int) or layout[k] < 0:
+            errors.append(f"{k}: expected an int >= 0")
+    if not isinstance(layout.get("cv2_threads"), int) or layout["cv2_threads"] < -1:
+        errors.append("cv2_threads: expected an int >= -1")
+    for stage, cpus in layout.get("affinity", {}).items():
+        if stage not in STAGES:
+            errors.append(f"affinity.{stage}: unknown stage (expected {', '.join(STAGES)})")
+        elif not cpus or not all(isinstance(c, int) and c in allowed for c in cpus):
+            errors.append(f"affinity.{stage}: expected a list of CPUs from {sorted(allowed)}")
+    if errors:
+        raise ValueError("; ".join(errors))
+
+
+def _mask(cpus):
+    m = 0
+    for c in cpus:
+        m |= 1 << c
+    return m
+
+
+def _cpus(mask):
+    return [c for c in range(mask.bit_length()) if mask >> c & 1]
+
+
+def set_thread_affinity(cpus):
+    """Pin the calling thread to cpus; returns its previous CPUs, or None if unsupported."""
+    if hasattr(os, "sched_setaffinity"):
+        tid = threading.get_native_id()
+        prev = sorted(os.sched_getaffinity(tid))
+        os.sched_setaffinity(tid, cpus)
+        return prev
+    if sys.platform == "win32":
+        import ctypes
+        k32 = ctypes.windll.kernel32
+        k32.SetThreadAffinityMask.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        k32.SetThreadAffinityMask.restype = ctypes.c_size_t
+        prev = k32.SetThreadAffinityMask(k32.GetCurrentThread(), _mask(cpus))
+        if not prev:
+            raise OSError(f"SetThreadAffinityMask failed ({ctypes.GetLastError()})")
+        return _cpus(prev)
+    return None
+
+
+def set_process_affinity(cpus):
+    if hasattr(os, "sched_setaffinity"):
+        # Per thread on Linux: every thread that already exists.
+        for tid in os.listdir("/proc/self/task"):
+            try:
+                os.sched_setaffinity(int(tid), cpus)
+            except OSError:
+                pass
+        return True
+    if sys.platform == "win32":
+        import ctypes
+        k32 = ctypes.windll.kernel32
+        k32.SetProcessAffinityMask.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        return bool(k32.SetProcessAffinityMask(k32.GetCurrentProcess(), _mask(cpus)))
+    return False
+
+
+def apply(layout=None, path=CPU_LAYOUT_PATH):
+    """
+    Apply a layout (default: load_layout(path), or CPU_LAYOUT if that file is
+    invalid) to this process. Returns the layout with an "errors" list for the
+    settings that could not be applied.
+    """
+    global _active
+    errors = []
+    if layout is None:
+        try:
+            layout = load_layout(path)
+        except (OSError, ValueError) as e:
+            errors.append(f"{path}: {e}")
+            layout = dict(copy.deepcopy(CPU_LAYOUT), source="config.py")
+    layout = copy.deepcopy(layout)
+    try:
+        import tensorflow as tf
+        if layout["tf_intra_op"]:
+            tf.config.threading.set_intra_op_parallelism_threads(layout["tf_intra_op"])
+        if layout["tf_inter_op"]:
+            tf.config.threading.set_inter_op_parallelism_threads(layout["tf_inter_op"])
+    except Exception as e:  # RuntimeError once TensorFlow is initialised
+        errors.append(f"tensorflow: {e}")
+    if layout["cv2_threads"] >= 0:
+        try:
+            import cv2
+            cv2.setNumThreads(layout["cv2_threads"])
+        except Exception as e:
+            errors.append(f"cv2: {e}")
+    cpus = layout.get("affinity", {}).get("process")
+    if cpus:
+        try:
+            if not set_process_affinity(cpus):
+                errors.append("process affinity not supported on this platform")
+        except OSError as e:
+            errors.append(f"process affinity: {e}")
+    layout["errors"] = errors
+    _active = layout
+    return layout
+
+
+def active():
+    return _active
+
+
+def pin(stage):
+    """Pin the calling thread to the active layout's CPUs for stage. Returns the CPUs, or None."""
+    cpus = (_active or {}).get("affinity", {}).get(stage)
+    if not cpus:
+        return None
+    try:
+        set_thread_affinity(cpus)
+        return cpus
+    except OSError:
+        if DEBUG:
+            traceback.print_exc()
+        return None
+
+
+@contextmanager
+def pinned(stage):
+    """Run a block (and the threads it starts) on stage's CPUs, then restore the calling thread."""
+    cpus = (_active or {}).get("affinity", {}).get(stage)
+    prev = None
+    if cpus:
+        try:
+            prev = set_thread_affinity(cpus)
+        except OSError:
+            if DEBUG:
+                traceback.print_exc()
+    try:
+        yield cpus
+    finally:
+        if prev:
+            set_thread_affinity(prev)
+
+
+def _ranges(cpus):
+    out, start = [], None
+    for i, c in enumerate(cpus):
+        if start is None:
+            start = c
+        if i + 1 == len(cpus) or cpus[i + 1] != c + 1:
+            out.append(str(start) if start == c else f"{start}-{c}")
+            start = None
+    return ",".join(out)
+
+
+def describe(layout=None):
+    layout = layout or _active or load_layout()
+    tf_pool = lambda n: str(n) if n > 0 else "default"
+    parts = [f"tf intra {tf_pool(layout['tf_intra_op'])} / inter {tf_pool(layout['tf_inter_op'])}",
+             f"cv2 threads {layout['cv2_threads'] if layout['cv2_threads'] >= 0 else 'default'}"]
+    for stage in STAGES:
+        cpus = layout.get("affinity", {}).get(stage)
+        if cpus:
+            parts.append(f"{stage} cpus {_ranges(sorted(cpus))}")
+    txt = ", ".join(parts) + f" ({layout.get('source', 'custom')})"
+    if layout.get("errors"):
+        txt += " - not applied: " + "; ".join(layout["errors"])
+    return txt
@@ -0,0 +1,151 @@
+# cpu_tune.py
+
+from config import (
+    DEBUG, MODEL_PATH, WINDOW_SIZE, FEATURE_DIM, CAMERA_FPS, CPU_LAYOUT_PATH
+)
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+import numpy as np
+
+import cpu_layout
+
+
+###############################################################################
+# Autotuning of the CPU layout (see cpu_layout.py).
+#
+#   python cpu_tune.py                 # benchmark candidates, write the best to CPU_LAYOUT_PATH
+#   python cpu_tune.py --dry-run       # only print the table
+#
+# TensorFlow's pool sizes cannot change once it has initialised, so every
+# candidate runs in a fresh process (--worker). A worker reproduces the
+# pipeline's contention at the camera rate: a stand-in for the ZED SDK
+# (matrix products on the "zed" CPUs), a preview thread (1080p resize and
+# colour conversion with OpenCV on the "ui" CPUs) and the inference loop
+# (one model.predict of a window per frame on the "inference" CPUs). The
+# candidate with the lowest p95 inference latency wins.
+###############################################################################
+def candidate_layouts(allowed):
+    n = len(allowed)
+    cands = [{"name": "default", "tf_intra_op": 0, "tf_inter_op": 0, "cv2_threads": -1, "affinity": {}}]
+    for intra in (1, 2, 4):
+        if intra > max(1, n // 2):
+            continue
+        cands.append({"name": f"pools intra {intra}", "tf_intra_op": intra, "tf_inter_op": 1,
+                      "cv2_threads": 1, "affinity": {}})
+        if n >= intra + 3:
+            # TF pools on the last CPUs, the inference thread just before
+            # them, the UI on the first CPU and the SDK on the rest.
+            tf_cpus = allowed[n - intra:]
+            inf_cpus = [allowed[n - intra - 1]]
+            ui_cpus = [allowed[0]]
+            zed_cpus = allowed[1:n - intra - 1]
+            cands.append({"name": f"pinned intra {intra}", "tf_intra_op": intra, "tf_inter_op": 1, "cv2_threads": 1,
+                          "affinity": {"ui": ui_cpus, "zed": zed_cpus, "inference": inf_cpus, "tf": tf_cpus}})
+    return cands
+
+
+def _stand_in_model():
+    import tensorflow as tf
+    return tf.keras.Sequential([
+        tf.keras.layers.Input((WINDOW_SIZE, FEATURE_DIM)),
+        tf.keras.layers.LSTM(64, return_sequences=True),
+        tf.keras.layers.LSTM(32),
+        tf.keras.layers.Dense(32, activation="relu"),
+        tf.keras.layers.Dense(4, activation="softmax")
+    ])
+
+
+def run_worker(layout, n_frames, model_path):
+    layout = cpu_layout.apply(layout)
+    import tensorflow as tf
+    import cv2
+    with cpu_layout.pinned("tf"):
+        model = tf.keras.models.load_model(model_path) if model_path and os.path.exists(model_path) else _stand_in_model()
+        x = np.zeros((1,) + tuple(model.input_shape[1:]), dtype=np.float32)
+        model.predict(x, verbose=0)
+    stop = threading.Event()
+
+    def zed_load():
+        with cpu_layout.pinned("zed"):
+            a = np.random.default_rng(0).normal(size=(256, 256)).astype(np.float32)
+            while not stop.is_set():
+                a = np.tanh(a @ a)
+                time.sleep(0.002)
+
+    def preview_load():
+        cpu_layout.pin("ui")
+        img = np.random.default_rng(1).integers(0, 255, (1080, 1920, 3), dtype=np.uint8)
+        while not stop.is_set():
+            cv2.cvtColor(cv2.resize(img, (192, 108)), cv2.COLOR_BGR2RGB)
+            time.sleep(1.0 / CAMERA_FPS)
+
+    threads = [threading.Thread(target=zed_load, daemon=True), threading.Thread(target=preview_load, daemon=True)]
+    for t in threads:
+        t.start()
+    cpu_layout.pin("inference")
+    lat = np.zeros(n_frames)
+    period = 1.0 / CAMERA_FPS
+    next_t = time.perf_counter()
+    for i in range(n_frames):
+        now = time.perf_counter()
+        if next_t > now:
+            time.sleep(next_t - now)
+        next_t += period
+        t0 = time.perf_counter()
+        model.predict(x, verbose=0)
+        lat[i] = (time.perf_counter() - t0) * 1000
+    stop.set()
+    return {"p50": float(np.percentile(lat, 50)), "p95": float(np.percentile(lat, 95)),
+            "max": float(lat.max()), "errors": layout["errors"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pick the CPU layout with the lowest inference tail latency")
+    parser.add_argument("--frames", type=int, default=150, help="frames per candidate")
+    parser.add_argument("--model", default=MODEL_PATH, help="model to benchmark (a stand-in LSTM if missing)")
+    parser.add_argument("--out", default=CPU_LAYOUT_PATH)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_worker(json.loads(args.worker), args.frames, args.model)))
+        return 0
+
+    topo = cpu_layout.cpu_topology()
+    print(f"CPUs: {topo['logical']} logical, {topo['physical'] or '?'} physical, allowed {topo['allowed']}")
+    results = []
+    for cand in candidate_layouts(topo["allowed"]):
+        layout = {k: v for k, v in cand.items() if k != "name"}
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", json.dumps(layout),
+                               "--frames", str(args.frames), "--model", args.model or ""],
+                              capture_output=True, text=True)
+        try:
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            print(f"{cand['name']:<20} failed: {proc.stderr.strip().splitlines()[-1:] or proc.returncode}")
+            continue
+        results.append((r["p95"], r["p50"], cand, r))
+        note = f"  ({'; '.join(r['errors'])})" if r["errors"] else ""
+        print(f"{cand['name']:<20} p50 {r['p50']:6.2f} ms  p95 {r['p95']:6.2f} ms  max {r['max']:6.2f} ms  "
+              f"{cpu_layout.describe(dict(layout, source='candidate'))}{note}")
+    if not results:
+        print("No candidate completed")
+        return 1
+    best = min(results, key=lambda r: (r[0], r[1]))
+    layout = {k: v for k, v in best[2].items() if k != "name"}
+    print(f"\nBest: {best[2]['name']} (p95 {best[0]:.2f} ms)")
+    if not args.dry_run:
+        with open(args.out, "w") as f:
+            json.dump(layout, f, indent=2)
+        print(f"Layout written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# embedding_index.py
+#
+# Penultimate-layer embeddings and a prototype nearest-neighbour index for
+# open-set rejection. Only needs numpy at import time (TensorFlow is imported
+# when an embedding model is built) so ai_training/build_embedding_index.py
+# can share it.
+
+import os
+import numpy as np
+
+INDEX_FILE = "embedding_index.npz"
+
+
+def embedding_model(model, layer=-2):
+    """
+    Keras model returning [embedding, class probabilities] in one forward pass;
+    the embedding is the output of `layer` (index or name, default: the layer
+    before the classification head).
+    """
+    if hasattr(model, "embedding_model"):  # inference_worker.RemoteModel
+        return model.embedding_model(layer)
+    import tensorflow as tf
+    emb_layer = model.get_layer(layer) if isinstance(layer, str) else model.layers[layer]
+    return tf.keras.Model(model.inputs, [emb_layer.output, model.output]), emb_layer.name
+
+
+def _normalize(x):
+    x = np.asarray(x, dtype=np.float32)
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), 1e-12)
+
+
+def kmeans(x, k, n_iter=20, seed=0):
+    """Plain Lloyd's k-means on (N, D) rows; returns (min(k, N), D) centroids."""
+    if len(x) <= k:
+        return x.copy()
+    rng = np.random.default_rng(seed)
+    c = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(n_iter):
+        d = (x*x).sum(1)[:, None] - 2.0 * x @ c.T + (c*c).sum(1)[None, :]
+        a = np.argmin(d, axis=1)
+        for j in range(k):
+            m = a == j
+            if m.any():
+                c[j] = x[m].mean(axis=0)
+    return c
+
+
+###############################################################################
+# PrototypeIndex: class prototypes in embedding space.
+#
+# Embeddings and prototypes are L2-normalised, so one (N, D) x (D, P) matrix
+# product gives every cosine distance; the minimum per class is a
+# np.minimum.reduceat over the class-sorted prototype columns. A window is
+# out-of-distribution when its distance to the nearest prototype of the
+# predicted class exceeds that class's threshold.
+###############################################################################
+class PrototypeIndex:
+    def __init__(self, prototypes, labels, class_labels, thresholds, layer=None):
+        order = np.argsort(labels, kind="stable")
+        self.prototypes = _normalize(prototypes)[order]
+        self.labels = np.asarray(labels, dtype=np.intp)[order]
+        self.class_labels = list(class_labels)
+        self.thresholds = np.asarray(thresholds, dtype=np.float32)
+        self.layer = layer
+        self._reindex()
+
+    def _reindex(self):
+        self._pt = np.ascontiguousarray(self.prototypes.T)
+        present = np.unique(self.labels)
+        self._starts = np.searchsorted(self.labels, present)
+        self._present = present
+
+    def __len__(self):
+        return len(self.prototypes)
+
+    def class_distances(self, emb):
+        """(N, C) cosine distance from each embedding to the nearest prototype of each class (inf if none)."""
+        e = _normalize(np.atleast_2d(emb))
+        d = 1.0 - e @ self._pt
+        out = np.full((len(e), len(self.class_labels)), np.inf, dtype=np.float32)
+        out[:, self._present] = np.minimum.reduceat(d, self._starts, axis=1)
+        return out
+
+    def score(self, emb, predicted, scale=1.0):
+        """
+        Distance to the nearest prototype of the predicted class(es) and whether
+        it is beyond the class threshold times scale: (distance (N,), rejected (N,)).
+        """
+        predicted = np.atleast_1d(predicted)
+        d = self.class_distances(emb)[np.arange(len(predicted)), predicted]
+        return d, d > self.thresholds[predicted] * scale
+
+    def add(self, prototypes, class_name, threshold):
+        """Add prototypes of a (possibly new) class; returns its class index."""
+        if class_name not in self.class_labels:
+            self.class_labels.append(class_name)
+            self.thresholds = np.append(self.thresholds, np.float32(threshold))
+        ci = self.class_labels.index(class_name)
+        self.thresholds[ci] = threshold
+        labels = np.concatenate([self.labels, np.full(len(prototypes), ci, dtype=np.intp)])
+        protos = np.concatenate([self.prototypes, _normalize(prototypes)])
+        order = np.argsort(labels, kind="stable")
+        self.prototypes, self.labels = protos[order], labels[order]
+        self._reindex()
+        return ci
+
+    @classmethod
+    def build(cls, embeddings, labels, class_labels, per_class=64, calib_embeddings=None,
+              calib_labels=None, quantile=0.95, slack=1.2, layer=None):
+        """
+        Prototypes: up to per_class k-means centroids of each class's embeddings
+        (all of them if per_class is None). Thresholds: the given quantile of
+        calibration samples' distance to their own class, times slack; without
+        calibration data, leave-one-out distances of the training embeddings.
+        """
+        embeddings = _normalize(embeddings)
+        labels = np.asarray(labels)
+        protos, plabels = [], []
+        for ci in range(len(class_labels)):
+            x = embeddings[labels == ci]
+            if len(x) == 0:
+                continue
+            p = x if per_class is None else kmeans(x, per_class, seed=ci)
+            protos.append(p)
+            plabels.append(np.full(len(p), ci, dtype=np.intp))
+        index = cls(np.concatenate(protos), np.concatenate(plabels), class_labels,
+                    np.full(len(class_labels), np.inf, dtype=np.float32), layer)
+        if calib_embeddings is not None and len(calib_embeddings):
+            d = index.class_distances(calib_embeddings)[np.arange(len(calib_labels)), calib_labels]
+            cl = np.asarray(calib_labels)
+        else:
+            d, cl = leave_one_out_distances(embeddings, labels), labels
+        for ci in range(len(class_labels)):
+            m = cl == ci
+            if m.any():
+                index.thresholds[ci] = np.quantile(d[m], quantile) * slack
+        return index
+
+    def save(self, path):
+        np.savez_compressed(path, prototypes=self.prototypes, labels=self.labels,
+                            class_labels=np.asarray(self.class_labels), thresholds=self.thresholds,
+                            layer=np.asarray(self.layer if self.layer is not None else ""))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        layer = str(data["layer"]) or None
+        return cls(data["prototypes"], data["labels"], [str(c) for c in data["class_labels"]],
+                   data["thresholds"], layer)
+
+
+def leave_one_out_distances(embeddings, labels):
+    """Distance of each (normalised) embedding to its nearest other sample of the same class."""
+    d = 1.0 - embeddings @ embeddings.T
+    np.fill_diagonal(d, np.inf)
+    d[labels[:, None] != labels[None, :]] = np.inf
+    return d.min(axis=1)
+
+
+def default_index_path(model_path):
+    return os.path.join(os.path.dirname(model_path), INDEX_FILE)
@@ -0,0 +1,147 @@
+# event_log.py
+
+from config import (
+    DEBUG, LOG_CAPACITY, LOG_DIR, LOG_MAX_BYTES, LOG_BACKUP_COUNT
+)
+import os
+import time
+import json
+import queue
+import threading
+import traceback
+from collections import deque
+
+
+###############################################################################
+# EventLog: bounded, thread-safe event log.
+#
+# log() only appends to a fixed-size ring buffer and a bounded write queue,
+# so it is cheap to call from the inference thread. A background writer
+# thread drains the queue into rotating JSONL files. Views (the Tk console,
+# the headless control socket) poll entries_since() at their own pace.
+###############################################################################
+class EventLog:
+    def __init__(self, capacity=LOG_CAPACITY, log_dir=LOG_DIR, filename="events.jsonl",
+                 max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+        self.entries = deque(maxlen=capacity)
+        self.seq = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.listeners = []
+        self.writer = None
+        if log_dir:
+            self.writer = RotatingJsonlWriter(os.path.join(log_dir, filename), max_bytes, backup_count)
+            self.writer.start()
+
+    def log(self, message, level="info", **fields):
+        entry = {"t": time.time(), "level": level, "msg": message}
+        if fields:
+            entry.update(fields)
+        with self.lock:
+            self.seq += 1
+            entry["seq"] = self.seq
+            self.entries.append(entry)
+        if self.writer and not self.writer.put(entry):
+            self.dropped += 1
+        for cb in list(self.listeners):
+            try:
+                cb(entry)
+            except:
+                if DEBUG:
+                    traceback.print_exc()
+        return entry
+
+    def entries_since(self, seq, limit=None):
+        """Entries with a sequence number above `seq` (oldest first), and the newest seq."""
+        with self.lock:
+            last = self.seq
+            if seq >= last:
+                return [], last
+            # seq numbers are contiguous, so the new entries are simply the tail
+            n = min(last - seq, len(self.entries))
+            if limit is not None:
+                n = min(n, limit)
+            new = [self.entries[-i] for i in range(n, 0, -1)]
+        return new, last
+
+    def tail(self, n):
+        with self.lock:
+            return list(self.entries)[-n:]
+
+    def add_listener(self, cb):
+        self.listeners.append(cb)
+
+    def remove_listener(self, cb):
+        if cb in self.listeners:
+            self.listeners.remove(cb)
+
+    def close(self):
+        if self.writer:
+            self.writer.stop()
+
+
+def format_entry(entry):
+    return f"[{time.strftime('%H:%M:%S', time.localtime(entry['t']))}] {entry['msg']}"
+
+
+class RotatingJsonlWriter(threading.Thread):
+    def __init__(self, path, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT, queue_size=10000):
+        super().__init__(name="EventLogWriter", daemon=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.running = True
+        self.f = None
+
+    def put(self, entry):
+        try:
+            self.queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            return False
+
+    def run(self):
+        try:
+            d = os.path.dirname(self.path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            self.f = open(self.path, "a", encoding="utf-8")
+            while self.running or not self.queue.empty():
+                try:
+                    entry = self.queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                batch = [entry]
+                while len(batch) < 256:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                self.f.write("".join(json.dumps(e, default=str) + "\n" for e in batch))
+                self.f.flush()
+                if self.max_bytes and self.f.tell() >= self.max_bytes:
+                    self._rotate()
+        except:
+            if DEBUG:
+                traceback.print_exc()
+        finally:
+            if self.f:
+                self.f.close()
+
+    def _rotate(self):
+        self.f.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.f = open(self.path, "a", encoding="utf-8")
+
+    def stop(self, timeout=2.0):
+        self.running = False
+        if self.is_alive():
+            self.join(timeout=timeout)
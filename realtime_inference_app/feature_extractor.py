@@ -20,6 +20,21 @@ from ttkthemes import ThemedTk
 from PIL import Image, ImageTk
 from scipy.spatial.distance import euclidean
 
+from tracer import traced
+
+# Columns computed by FeatureExtractor.extract_features_batch; every other
+# column of the 70 is 0 for a single frame. Keep the vel/acc blocks contiguous.
+KERNEL_COLUMNS = (
+    [f"rel_{j}_{ax}" for j in [15,17] for ax in ["x","y","z"]]
+    + ["angle_elbow"]
+    + [f"vel_{j}_{ax}" for j in [13,15,17] for ax in ["x","y","z"]]
+    + [f"acc_{j}_{ax}" for j in [13,15,17] for ax in ["x","y","z"]]
+    + ["speed_15","speed_17","acc_magnitude_15","acc_magnitude_17",
+       "peak_speed","avg_speed","vertical_extent","horizontal_extent",
+       "vertical_horizontal_ratio","total_displacement","path_length"]
+)
+KERNEL_INDEX = {col: i for i, col in enumerate(KERNEL_COLUMNS)}
+
 
 ###############################################################################
 # FeatureExtractor: Now produces 70 features EXACTLY as in your training code
@@ -33,14 +48,14 @@ from scipy.spatial.distance import euclidean
 # training code used 7 frames at once. We'll emulate it enough to fill 70 cols.
 ###############################################################################
 class FeatureExtractor:
-    def __init__(self, feature_dim=FEATURE_DIM):
+    def __init__(self, feature_dim=FEATURE_DIM, model_path=MODEL_PATH):
         self.feature_dim = feature_dim
         self.feature_columns = None
         self.class_labels = ["left_swipe", "right_swipe", "up_swipe", "down_swipe"]
         self.debug_count = 0
 
         try:
-            feature_columns_path = os.path.join(os.path.dirname(MODEL_PATH), 'feature_columns.json')
+            feature_columns_path = os.path.join(os.path.dirname(model_path), 'feature_columns.json')
             if os.path.exists(feature_columns_path):
                 with open(feature_columns_path, 'r') as f:
                     self.feature_columns = json.load(f)
@@ -77,7 +92,7 @@ class FeatureExtractor:
 
         # Load label encoder if present
         try:
-            label_encoder_path = os.path.join(os.path.dirname(MODEL_PATH), 'label_encoder.json')
+            label_encoder_path = os.path.join(os.path.dirname(model_path), 'label_encoder.json')
             if os.path.exists(label_encoder_path):
                 with open(label_encoder_path, 'r') as f:
                     label_data = json.load(f)
@@ -98,153 +113,114 @@ class FeatureExtractor:
         except:
             pass
 
+        self._map_kernel_columns()
+
+    @traced("FeatureExtractor.extract_features")
     def extract_features(self, keypoints, velocity_data=None, acc_data=None):
         """
         Single-frame approach that tries to fill all 70 columns. 
         Because real training code used a 7-frame sequence, this is
         a partial approximation. We'll fill them enough so it's shaped (70,).
         """
-        features = {}
-        for c in self.feature_columns:
-            features[c] = 0.0
-
         try:
             # Extract shoulder=13, elbow=15, wrist=17
             if len(keypoints)==9:
-                # (shoulder, elbow, wrist)
-                shoulder = keypoints[0:3]
-                elbow    = keypoints[3:6]
-                wrist    = keypoints[6:9]
+                chain = np.asarray(keypoints, dtype=np.float32).reshape(1,3,3)
             elif len(keypoints)>=18*3:
-                shoulder = keypoints[13*3:13*3+3]
-                elbow    = keypoints[15*3:15*3+3]
-                wrist    = keypoints[17*3:17*3+3]
-            else:
-                return self._build_feature_vector(features)
-
-            # Flip x
-            shoulder_mod = shoulder.copy()
-            elbow_mod    = elbow.copy()
-            wrist_mod    = wrist.copy()
-            shoulder_mod[0] = -shoulder_mod[0]
-            elbow_mod[0]    = -elbow_mod[0]
-            wrist_mod[0]    = -wrist_mod[0]
-
-            # relative
-            rel_elbow = elbow_mod - shoulder_mod
-            rel_wrist = wrist_mod - shoulder_mod
-            features["rel_13_x"] = 0
-            features["rel_13_y"] = 0
-            features["rel_13_z"] = 0
-            features["rel_15_x"] = rel_elbow[0]
-            features["rel_15_y"] = rel_elbow[1]
-            features["rel_15_z"] = rel_elbow[2]
-            features["rel_17_x"] = rel_wrist[0]
-            features["rel_17_y"] = rel_wrist[1]
-            features["rel_17_z"] = rel_wrist[2]
-
-            # angle elbow
-            a_vec = rel_elbow
-            b_vec = wrist_mod - elbow_mod
-            angle_elbow = 0.0
-            if np.linalg.norm(a_vec)>0 and np.linalg.norm(b_vec)>0:
-                cos_ = np.dot(a_vec,b_vec)/(np.linalg.norm(a_vec)*np.linalg.norm(b_vec))
-                cos_ = np.clip(cos_, -1.0, 1.0)
-                angle_elbow = np.arccos(cos_)
-            features["angle_elbow"] = angle_elbow
-            features["angular_velocity_elbow"] = 0.0
-
-            # velocity,acc,jerk for (13,15,17) single-frame => fill 0 except if velocity_data provided
-            if velocity_data:
-                for joint,vel in velocity_data.items():
-                    vx,vy,vz = -vel[0], vel[1], vel[2]
-                    features[f"vel_{joint}_x"] = vx
-                    features[f"vel_{joint}_y"] = vy
-                    features[f"vel_{joint}_z"] = vz
-            # acceleration
-            if acc_data:
-                for joint,acc in acc_data.items():
-                    ax,ay,az = -acc[0], acc[1], acc[2]
-                    features[f"acc_{joint}_x"] = ax
-                    features[f"acc_{joint}_y"] = ay
-                    features[f"acc_{joint}_z"] = az
-
-            # jerk => fill 0
-            for j in [13,15,17]:
-                for ax in ["x","y","z"]:
-                    features[f"jerk_{j}_{ax}"]=0.0
-
-            # speed_15, speed_17, acc_magnitude_15, acc_magnitude_17
-            # if velocity_data or acc_data is present
-            if velocity_data and (15 in velocity_data):
-                v15 = np.array([-velocity_data[15][0], velocity_data[15][1], velocity_data[15][2]])
-                features["speed_15"] = np.linalg.norm(v15)
-            else:
-                features["speed_15"]=0.0
-            if velocity_data and (17 in velocity_data):
-                v17 = np.array([-velocity_data[17][0], velocity_data[17][1], velocity_data[17][2]])
-                features["speed_17"] = np.linalg.norm(v17)
+                kp = np.asarray(keypoints, dtype=np.float32).reshape(-1,3)
+                chain = kp[[13,15,17]].reshape(1,3,3)
             else:
-                features["speed_17"]=0.0
-
-            if acc_data and (15 in acc_data):
-                a15 = np.array([-acc_data[15][0], acc_data[15][1], acc_data[15][2]])
-                features["acc_magnitude_15"]= np.linalg.norm(a15)
-            else:
-                features["acc_magnitude_15"]=0.0
-            if acc_data and (17 in acc_data):
-                a17 = np.array([-acc_data[17][0], acc_data[17][1], acc_data[17][2]])
-                features["acc_magnitude_17"]= np.linalg.norm(a17)
-            else:
-                features["acc_magnitude_17"]=0.0
-
-            # path_length_17 => for single frame, set 0
-            features["path_length_17"]=0.0
-
-            # Additional 11
-            # "straightness", "planarity", "peak_speed", "avg_speed", "speed_variability",
-            # "direction_changes", "vertical_extent","horizontal_extent","vertical_horizontal_ratio",
-            # "total_displacement","path_length"
-            features["straightness"]=0.0
-            features["planarity"]=0.0
-            features["peak_speed"]= features["speed_17"]
-            features["avg_speed"] = features["speed_17"]
-            features["speed_variability"]=0.0
-            features["direction_changes"]=0.0
-            features["vertical_extent"]= abs(rel_wrist[1])
-            horiz = np.sqrt(rel_wrist[0]**2 + rel_wrist[2]**2)
-            features["horizontal_extent"] = horiz
-            if horiz>1e-6:
-                features["vertical_horizontal_ratio"]= features["vertical_extent"]/horiz
-            else:
-                features["vertical_horizontal_ratio"]=0.0
-            features["total_displacement"]= np.linalg.norm(rel_wrist)
-            # path_length => elbow->wrist + shoulder->elbow
-            features["path_length"] = np.linalg.norm(rel_elbow) + np.linalg.norm(wrist_mod - elbow_mod)
-
-            # 16 directional
-            features["wrist_end_x_rel_torso"]=0.0
-            features["wrist_end_y_rel_torso"]=0.0
-            features["wrist_end_z_rel_torso"]=0.0
-            features["movement_dir_x"]=0.0
-            features["movement_dir_y"]=0.0
-            features["movement_dir_z"]=0.0
-            features["horiz_vert_ratio"]=0.0
-            features["dominant_xy"]=0.0
-            features["dominant_yz"]=0.0
-            features["dominant_xz"]=0.0
-            features["end_right"]=0.0
-            features["end_up"]=0.0
-            features["end_forward"]=0.0
-            features["directional_clarity"]=0.0
-            features["angle_from_horizontal"]=0.0
-            features["angle_in_horizontal"]=0.0
-
+                return self._build_feature_vector({})
+            vel = self._joint_dict_to_chain(velocity_data)
+            acc = self._joint_dict_to_chain(acc_data)
+            return self.extract_features_batch(chain, vel, acc)[0]
         except:
             if DEBUG:
                 traceback.print_exc()
-
-        return self._build_feature_vector(features)
+            return self._build_feature_vector({})
+
+    def _joint_dict_to_chain(self, data):
+        if not data:
+            return None
+        arr = np.zeros((1,3,3), dtype=np.float32)
+        for k,j in enumerate([13,15,17]):
+            if j in data:
+                arr[0,k] = data[j]
+        return arr
+
+    @traced("FeatureExtractor.extract_features_batch")
+    def extract_features_batch(self, chains, velocities=None, accelerations=None):
+        """
+        Vectorized extract_features for several arms at once.
+        chains: (A,3,3) shoulder/elbow/wrist positions in the model (right-arm)
+        frame; velocities/accelerations: (A,3,3) for the same joints, or None.
+        Returns (A, feature_dim) float32.
+        """
+        chains = np.asarray(chains, dtype=np.float32)
+        n = chains.shape[0]
+        k = np.zeros((n, len(KERNEL_COLUMNS)), dtype=np.float32)
+        c = KERNEL_INDEX
+
+        # Flip x
+        p = chains.copy()
+        p[...,0] = -p[...,0]
+        shoulder, elbow, wrist = p[:,0], p[:,1], p[:,2]
+
+        # relative (rel_13 is always 0)
+        rel_elbow = elbow - shoulder
+        rel_wrist = wrist - shoulder
+        k[:, c["rel_15_x"]:c["rel_15_x"]+3] = rel_elbow
+        k[:, c["rel_17_x"]:c["rel_17_x"]+3] = rel_wrist
+
+        # angle elbow
+        fore = wrist - elbow
+        na = np.linalg.norm(rel_elbow, axis=1)
+        nb = np.linalg.norm(fore, axis=1)
+        ok = (na>0) & (nb>0)
+        cos_ = np.clip(np.sum(rel_elbow*fore, axis=1)/np.where(ok, na*nb, 1.0), -1.0, 1.0)
+        k[:, c["angle_elbow"]] = np.where(ok, np.arccos(cos_), 0.0)
+
+        # velocity, acceleration (x flipped); jerk stays 0 for a single frame
+        if velocities is not None:
+            v = np.asarray(velocities, dtype=np.float32).copy()
+            v[...,0] = -v[...,0]
+            k[:, c["vel_13_x"]:c["vel_13_x"]+9] = v.reshape(n, 9)
+            speed = np.linalg.norm(v, axis=2)
+            k[:, c["speed_15"]] = speed[:,1]
+            k[:, c["speed_17"]] = speed[:,2]
+            k[:, c["peak_speed"]] = speed[:,2]
+            k[:, c["avg_speed"]] = speed[:,2]
+        if accelerations is not None:
+            a = np.asarray(accelerations, dtype=np.float32).copy()
+            a[...,0] = -a[...,0]
+            k[:, c["acc_13_x"]:c["acc_13_x"]+9] = a.reshape(n, 9)
+            amag = np.linalg.norm(a, axis=2)
+            k[:, c["acc_magnitude_15"]] = amag[:,1]
+            k[:, c["acc_magnitude_17"]] = amag[:,2]
+
+        # extents of the wrist relative to the shoulder
+        vert = np.abs(rel_wrist[:,1])
+        horiz = np.sqrt(rel_wrist[:,0]**2 + rel_wrist[:,2]**2)
+        k[:, c["vertical_extent"]] = vert
+        k[:, c["horizontal_extent"]] = horiz
+        k[:, c["vertical_horizontal_ratio"]] = np.where(horiz>1e-6, vert/np.where(horiz>1e-6, horiz, 1.0), 0.0)
+        k[:, c["total_displacement"]] = np.linalg.norm(rel_wrist, axis=1)
+        # path_length => shoulder->elbow + elbow->wrist
+        k[:, c["path_length"]] = na + nb
+
+        out = np.zeros((n, self.feature_dim), dtype=np.float32)
+        out[:, self._kernel_dst] = k[:, self._kernel_src]
+        return np.nan_to_num(out, nan=0.0, posinf=0.0, neginf=0.0, copy=False)
+
+    def _map_kernel_columns(self):
+        # Where each kernel output lands in this model's feature_columns order.
+        src, dst = [], []
+        for i, col in enumerate((self.feature_columns or [])[:self.feature_dim]):
+            if col in KERNEL_INDEX:
+                src.append(KERNEL_INDEX[col])
+                dst.append(i)
+        self._kernel_src = np.array(src, dtype=np.intp)
+        self._kernel_dst = np.array(dst, dtype=np.intp)
 
     def _build_feature_vector(self, features_dict):
         vec = np.zeros(self.feature_dim, dtype=np.float32)
@@ -0,0 +1,156 @@
+# frame_source.py
+
+from config import (
+    DEBUG, CAMERA_FPS
+)
+import time
+import pyzed.sl as sl
+
+
+###############################################################################
+# Frame sources for InferenceThread.
+#
+# A source delivers frames one at a time:
+#   grab()            -> True when a new frame is available
+#   timestamp()       -> capture time of that frame (seconds, image timestamp)
+#   now()             -> current time on the same clock as timestamp()
+#   retrieve_image()  -> BGR image of the frame, or None
+#   retrieve_bodies() -> an sl.Bodies-like object (is_new, body_list)
+#   intrinsics()      -> (fx, fy, cx, cy), optional, for projecting keypoints
+#   exhausted         -> True once the source has no more frames to give
+#
+# ZedFrameSource wraps the camera. SyntheticFrameSource produces timestamps
+# (with optional dropped/duplicated frames) and bodies from a callback, so
+# the pipeline and its latency accounting can run without a camera.
+###############################################################################
+class ZedFrameSource:
+    def __init__(self, fps=CAMERA_FPS):
+        self.fps = fps
+        self.zed = sl.Camera()
+        self.runtime = sl.RuntimeParameters()
+        self.body_runtime = sl.BodyTrackingRuntimeParameters()
+        self.bodies = sl.Bodies()
+        self.image = sl.Mat()
+        self.exhausted = False
+
+    def open(self):
+        """Open the camera with body tracking. Returns an error message, or None."""
+        init = sl.InitParameters()
+        init.camera_resolution = sl.RESOLUTION.HD1080
+        init.camera_fps = self.fps
+        init.depth_mode = sl.DEPTH_MODE.ULTRA
+        s = self.zed.open(init)
+        if s != sl.ERROR_CODE.SUCCESS:
+            return f"Camera initialization failed: {s}"
+        tparam = sl.PositionalTrackingParameters()
+        st2 = self.zed.enable_positional_tracking(tparam)
+        if st2 != sl.ERROR_CODE.SUCCESS:
+            return f"Positional tracking error: {st2}"
+        bparam = sl.BodyTrackingParameters()
+        bparam.detection_model = sl.BODY_TRACKING_MODEL.HUMAN_BODY_FAST
+        bparam.body_format = sl.BODY_FORMAT.BODY_38
+        st3 = self.zed.enable_body_tracking(bparam)
+        if st3 != sl.ERROR_CODE.SUCCESS:
+            return f"Body tracking error: {st3}"
+        return None
+
+    def grab(self):
+        return self.zed.grab(self.runtime) == sl.ERROR_CODE.SUCCESS
+
+    def timestamp(self):
+        return self.zed.get_timestamp(sl.TIME_REFERENCE.IMAGE).get_nanoseconds()*1e-9
+
+    def now(self):
+        return self.zed.get_timestamp(sl.TIME_REFERENCE.CURRENT).get_nanoseconds()*1e-9
+
+    def intrinsics(self):
+        """(fx, fy, cx, cy) of the left camera at the capture resolution."""
+        cam = self.zed.get_camera_information().camera_configuration.calibration_parameters.left_cam
+        return cam.fx, cam.fy, cam.cx, cam.cy
+
+    def retrieve_image(self):
+        self.zed.retrieve_image(self.image, sl.VIEW.LEFT)
+        return self.image.get_data()[:,:,:3]
+
+    def retrieve_bodies(self):
+        self.zed.retrieve_bodies(self.bodies, self.body_runtime)
+        return self.bodies
+
+    def close(self):
+        self.zed.close()
+
+
+class _NoBodies:
+    is_new = True
+    body_list = []
+
+
+class SyntheticFrameSource:
+    """
+    Frames at a fixed rate on a simulated clock. bodies_fn(index, timestamp)
+    returns the bodies of each frame. Every drop_every-th frame is skipped and
+    every duplicate_every-th frame repeats the previous timestamp (0 = never).
+    Each frame reaches grab() capture_delay seconds after its timestamp; from
+    then on now() advances with the real time spent processing it. With
+    realtime=True, grab() also sleeps to keep the frame rate.
+    """
+    def __init__(self, fps=CAMERA_FPS, bodies_fn=None, n_frames=None, start=0.0,
+                 capture_delay=0.0, drop_every=0, duplicate_every=0, realtime=False):
+        self.fps = fps
+        self.bodies_fn = bodies_fn
+        self.n_frames = n_frames
+        self.start = start
+        self.capture_delay = capture_delay
+        self.drop_every = drop_every
+        self.duplicate_every = duplicate_every
+        self.realtime = realtime
+        self.exhausted = False
+        self.index = -1      # frame slot on the camera clock
+        self.grabbed = 0     # frames delivered
+        self._ts = start
+        self._grab_wall = 0.0
+        self._grab_clock = start
+        self._next_wall = None
+
+    def open(self):
+        return None
+
+    def grab(self):
+        if self.n_frames is not None and self.grabbed >= self.n_frames:
+            self.exhausted = True
+            return False
+        self.grabbed += 1
+        if self.duplicate_every and self.grabbed % self.duplicate_every == 0 and self.index >= 0:
+            pass  # same timestamp as the previous frame
+        else:
+            self.index += 1
+            if self.drop_every and (self.index+1) % self.drop_every == 0:
+                self.index += 1
+            self._ts = self.start + self.index / self.fps
+        if self.realtime:
+            now = time.perf_counter()
+            if self._next_wall is None:
+                self._next_wall = now
+            if self._next_wall > now:
+                time.sleep(self._next_wall - now)
+            self._next_wall += 1.0 / self.fps
+        self._grab_wall = time.perf_counter()
+        self._grab_clock = self._ts + self.capture_delay
+        return True
+
+    def timestamp(self):
+        return self._ts
+
+    def now(self):
+        return self._grab_clock + (time.perf_counter() - self._grab_wall)
+
+    def retrieve_image(self):
+        return None
+
+    def retrieve_bodies(self):
+        if self.bodies_fn is None:
+            return _NoBodies()
+        return self.bodies_fn(self.index, self._ts)
+
+    def close(self):
+        pass
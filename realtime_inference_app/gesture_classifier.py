@@ -1,7 +1,8 @@
 # gesture_classifier.py
 
 from config import (
-    DEBUG, CLASSIFICATION_THRESHOLDS, WINDOW_SIZE
+    DEBUG, MODEL_PATH, WINDOW_SIZE, RULE_CASCADE, RULE_DIRECTIONS,
+    OPEN_SET, GESTURE_REGISTRY
 )
 import os
 import sys
@@ -20,46 +21,105 @@ from ttkthemes import ThemedTk
 from PIL import Image, ImageTk
 from scipy.spatial.distance import euclidean
 
+from tracer import traced, tracer
+import swipe_rules
+from embedding_index import PrototypeIndex, embedding_model, default_index_path
+from gesture_registry import GestureRegistry, default_registry_path
+from runtime_config import PipelineConfig
+
 class GestureClassifier:
-    def __init__(self, model, window_size=WINDOW_SIZE, class_labels=None):
+    # Everything that belongs to the loaded model; swapped as a whole by
+    # set_model_state (see model_swap.py).
+    MODEL_ATTRS = ("model", "model_path", "window_size", "class_labels", "base_labels", "rule_cols",
+                   "rule_table", "embedder", "base_index", "index", "registry", "registry_path", "registry_mtime")
+
+    def __init__(self, model, window_size=WINDOW_SIZE, class_labels=None, feature_columns=None, model_path=MODEL_PATH,
+                 config=None):
         self.model = model
+        self.config = config or PipelineConfig.from_overrides()
+        self.model_path = model_path
         self.window_size = window_size
         self.last_prediction = None
         self.last_confidence = 0
+        self.last_probabilities = None  # model output of the last classification (None for rule decisions)
         self.class_labels = class_labels or ["left_swipe", "right_swipe", "up_swipe", "down_swipe"]
+        self.base_labels = list(self.class_labels)
+        # Rule-based first tier (RULE_CASCADE); needs the rel_15/rel_17 columns.
+        self.rule_cols = swipe_rules.wrist_columns(feature_columns) if feature_columns else None
+        self.rule_table = swipe_rules.direction_table(RULE_DIRECTIONS, self.class_labels)
+        self.tier_counts = {"rules": 0, "model": 0}
+        self.audit = {"checked": 0, "agreed": 0}
+        self.last_tier = None
+        # Open-set rejection (OPEN_SET): embedding model + prototype index.
+        self.embedder = None
+        self.base_index = None
+        self.index = None
+        self.last_embedding = None
+        self.last_open_set = None
+        # Few-shot registered gestures (GESTURE_REGISTRY), merged into self.index.
+        self.registry = None
+        self.registry_path = GESTURE_REGISTRY["path"] or default_registry_path(model_path)
+        self.registry_mtime = None
+        if OPEN_SET["enabled"]:
+            self.load_index(OPEN_SET["index_path"] or default_index_path(model_path))
+        if GESTURE_REGISTRY["enabled"]:
+            self.refresh_registry()
+
+    def _window_input(self, frames):
+        # We want exactly 7 frames, each 70D => shape (1,7,70).
+        if len(frames)<self.window_size:
+            pad = [frames[-1]]*(self.window_size-len(frames))
+            inp = frames+pad
+        elif len(frames)>self.window_size:
+            m = len(frames)//2
+            s = max(0, m-self.window_size//2)
+            inp = frames[s:s+self.window_size]
+        else:
+            inp = frames
+        arr = np.array(inp)  # shape (7,70)
+        return np.expand_dims(arr,0)  # shape (1,7,70)
+
+    def _corrected(self, preds):
+        # if you want the direction reweighting from your original code,
+        # we can skip or do partial
+        c_preds = preds.copy()
+        if np.sum(c_preds)>0:
+            c_preds/=np.sum(c_preds)
+
+        if self.last_prediction is not None:
+            if np.argmax(c_preds)==self.last_prediction:
+                c_preds[self.last_prediction]*= self.config.classification.diversity_penalty
+                if np.sum(c_preds)>0:
+                    c_preds/=np.sum(c_preds)
+        return c_preds
 
+    @traced("GestureClassifier.classify_gesture")
     def classify_gesture(self, frames):
         if not frames or len(frames)<1:
             return None,0
+        self.last_probabilities = None
         try:
-            # We want exactly 7 frames, each 70D => shape (7,70).
-            if len(frames)<self.window_size:
-                pad = [frames[-1]]*(self.window_size-len(frames))
-                inp = frames+pad
-            elif len(frames)>self.window_size:
-                m = len(frames)//2
-                s = max(0, m-self.window_size//2)
-                inp = frames[s:s+self.window_size]
-            else:
-                inp = frames
-
-            arr = np.array(inp)  # shape (7,70)
-            arr = np.expand_dims(arr,0)  # shape (1,7,70)
-            preds = self.model.predict(arr,verbose=0)[0]
-            # if you want the direction reweighting from your original code,
-            # we can skip or do partial
-            c_preds = preds.copy()
-            if np.sum(c_preds)>0:
-                c_preds/=np.sum(c_preds)
+            ridx = self._rule_tier(frames)
+            if ridx is not None:
+                self.tier_counts["rules"] += 1
+                self.last_tier = "rules"
+                self.last_open_set = None
+                self._audit_rules(frames, ridx)
+                self.last_prediction= ridx
+                self.last_confidence= RULE_CASCADE["confidence"]
+                return ridx, self.last_confidence
 
-            if self.last_prediction is not None:
-                if np.argmax(c_preds)==self.last_prediction:
-                    c_preds[self.last_prediction]*= CLASSIFICATION_THRESHOLDS["diversity_penalty"]
-                    if np.sum(c_preds)>0:
-                        c_preds/=np.sum(c_preds)
+            self.tier_counts["model"] += 1
+            self.last_tier = "model"
+            preds = self._predict(self._window_input(frames))
+            c_preds = self._corrected(preds)
 
             idx = np.argmax(c_preds)
             conf = c_preds[idx]
+            m = self._registry_match()
+            if m is not None:
+                idx, conf = m
+            self._open_set(idx)
             self.last_prediction= idx
             self.last_confidence= conf
             return idx, conf
@@ -68,6 +128,185 @@ class GestureClassifier:
                 traceback.print_exc()
             return None,0
 
+    @traced("GestureClassifier.classify_partial")
+    def classify_partial(self, frames):
+        """
+        Provisional prediction on a window that is still being captured:
+        (idx, confidence, top1-top2 margin). Same padding and correction as
+        classify_gesture, but last_prediction is left untouched.
+        """
+        if not frames:
+            return None,0,0
+        self.last_probabilities = None
+        try:
+            ridx = self._rule_tier(frames)
+            if ridx is not None:
+                return ridx, RULE_CASCADE["confidence"], RULE_CASCADE["confidence"]
+            preds = self._predict(self._window_input(frames))
+            c_preds = self._corrected(preds)
+            idx = np.argmax(c_preds)
+            m = self._registry_match()
+            if m is not None:
+                # A registered gesture has no model output to take a margin from.
+                return (m[0],0,0) if self._open_set(m[0])["rejected"] else (m[0],m[1],m[1])
+            if self._open_set(idx)["rejected"]:
+                return idx,0,0
+            top2 = np.sort(c_preds)[-2:]
+            return idx, c_preds[idx], top2[-1]-top2[0]
+        except:
+            if DEBUG:
+                traceback.print_exc()
+            return None,0,0
+
+    def _predict(self, arr):
+        # Class probabilities for a (1,T,F) window; with an embedding index the
+        # penultimate-layer embedding comes out of the same forward pass.
+        with tracer.span("model.predict"):
+            if self.embedder is None:
+                self.last_probabilities = self.model.predict(arr,verbose=0)[0]
+                return self.last_probabilities
+            emb, preds = self.embedder.predict(arr,verbose=0)
+        self.last_embedding = emb[0]
+        self.last_probabilities = preds[0]
+        return preds[0]
+
+    def _open_set(self, idx):
+        # Distance of the last embedding to the predicted class's prototypes.
+        self.last_open_set = {"distance": 0.0, "threshold": 0.0, "rejected": False}
+        if not OPEN_SET["enabled"] or self.index is None or self.last_embedding is None or idx >= len(self.index.thresholds):
+            return self.last_open_set
+        with tracer.span("open_set.query"):
+            d, rej = self.index.score(self.last_embedding, idx, OPEN_SET["threshold_scale"])
+        self.last_open_set = {
+            "distance": float(d[0]),
+            "threshold": float(self.index.thresholds[idx]*OPEN_SET["threshold_scale"]),
+            "rejected": bool(rej[0])
+        }
+        return self.last_open_set
+
+    def load_index(self, path):
+        """Load a prototype index and build the matching embedding model. Returns True on success."""
+        try:
+            index = PrototypeIndex.load(path)
+            self.embedder, _ = embedding_model(self.model, index.layer or -2)
+            self.base_index = self.index = index
+            if self.registry is not None:
+                self.index = self.registry.merged_index(index, self.base_labels)
+            return True
+        except:
+            if DEBUG:
+                traceback.print_exc()
+            return False
+
+    def refresh_registry(self):
+        """
+        (Re)load the gesture registry if its file changed since the last call.
+        Registered gestures are appended to class_labels and to the prototype
+        index. Returns True when a new registry was loaded.
+        """
+        try:
+            mtime = os.path.getmtime(self.registry_path) if os.path.exists(self.registry_path) else None
+            if mtime == self.registry_mtime:
+                return False
+            self.registry_mtime = mtime
+            if mtime is None:
+                self.registry = None
+                self.index = self.base_index
+                self.class_labels = list(self.base_labels)
+                return True
+            registry = GestureRegistry.load(self.registry_path)
+            if self.embedder is None:
+                self.embedder, _ = embedding_model(self.model, registry.layer or -2)
+            if registry.prototypes is None:
+                index = self.base_index
+            else:
+                index = registry.merged_index(self.base_index, self.base_labels)
+            # Swapped in together, between two classifications.
+            self.registry, self.index = registry, index
+            self.class_labels = list(index.class_labels) if index is not None else list(self.base_labels)
+            return True
+        except:
+            if DEBUG:
+                traceback.print_exc()
+            return False
+
+    def _registry_match(self):
+        # (idx, confidence) of a registered gesture for the last embedding, or
+        # None to keep the model's prediction. With a trained head the head
+        # decides between every class; otherwise the nearest registered class
+        # wins if it is within its threshold and closer than any base prototype.
+        if self.registry is None or self.registry.prototypes is None or self.last_embedding is None:
+            return None
+        with tracer.span("registry.match"):
+            probs = self.registry.head_probs(self.last_embedding)
+            if probs is not None:
+                j = int(np.argmax(probs[0]))
+                name = self.registry.head_labels[j]
+                if name in self.registry.names:
+                    return self.class_labels.index(name), float(probs[0][j])
+                return None
+            d = self.index.class_distances(self.last_embedding)[0]
+            nb = len(self.base_labels)
+            j = nb + int(np.argmin(d[nb:]))
+            if d[j] > self.index.thresholds[j] or d[j] >= d[:nb].min(initial=np.inf):
+                return None
+        # 1.0 on a prototype, 0.5 at the threshold.
+        return j, float(1.0 - 0.5*d[j]/max(self.index.thresholds[j], 1e-6))
+
+    def embed(self, frames):
+        """Penultimate-layer embedding of a window (None without an embedding model)."""
+        if self.embedder is None or not frames:
+            return None
+        self._predict(self._window_input(frames))
+        return self.last_embedding
+
+    def apply_config(self, config):
+        """Switch to another PipelineConfig; call between classifications."""
+        self.config = config
+
+    def model_state(self):
+        return {k: getattr(self, k) for k in self.MODEL_ATTRS}
+
+    def set_model_state(self, state):
+        """Switch to another model's state (from model_state() of this or another classifier)."""
+        for k in self.MODEL_ATTRS:
+            setattr(self, k, state[k])
+        self.last_prediction = None
+        self.last_confidence = 0
+        self.last_probabilities = None
+        self.last_embedding = None
+        self.last_open_set = None
+
+    def _rule_tier(self, frames):
+        # First tier of the cascade: class index from the wrist's movement
+        # over the whole capture, or None if the model has to decide.
+        if not RULE_CASCADE["enabled"] or self.rule_cols is None:
+            return None
+        with tracer.span("rules"):
+            idx = swipe_rules.classify_swipes(np.asarray(frames)[None], self.rule_cols, self.rule_table, RULE_CASCADE)[0]
+        return int(idx) if idx >= 0 else None
+
+    def _audit_rules(self, frames, ridx):
+        # Running the model on a sample of rule decisions estimates the rule
+        # tier's accuracy (agreement with the model) in production.
+        every = RULE_CASCADE["audit_every"]
+        if not every or self.tier_counts["rules"] % every:
+            return
+        preds = self._predict(self._window_input(frames))
+        self.audit["checked"] += 1
+        self.audit["agreed"] += int(np.argmax(preds)==ridx)
+
+    def cascade_stats(self):
+        total = self.tier_counts["rules"] + self.tier_counts["model"]
+        checked = self.audit["checked"]
+        return {
+            "rules": self.tier_counts["rules"],
+            "model": self.tier_counts["model"],
+            "rules_fraction": self.tier_counts["rules"]/total if total else 0.0,
+            "audited": checked,
+            "rule_agreement": self.audit["agreed"]/checked if checked else None
+        }
+
     def _analyze_primary_direction(self, frames):
         try:
             vx,vy,vz= 0,0,0
@@ -80,12 +319,14 @@ class GestureClassifier:
                 traceback.print_exc()
             return "unknown"
 
-    def sliding_window_classify(self, frames, window_size=WINDOW_SIZE):
+    @traced("GestureClassifier.sliding_window_classify")
+    def sliding_window_classify(self, frames, window_size=None, max_windows=5):
         # Same as original
+        window_size = window_size or self.window_size
         if len(frames)< window_size:
             return self.classify_gesture(frames)
         results = {"predictions":[],"confidences":[],"probabilities":[],"corrected_probabilities":[]}
-        nwin= min(5,len(frames)-window_size+1)
+        nwin= min(max_windows,len(frames)-window_size+1)
         for i in range(nwin):
             w= frames[i:i+window_size]
             a= np.array(w)
@@ -96,7 +337,7 @@ class GestureClassifier:
                 corr/=np.sum(corr)
             if self.last_prediction is not None:
                 if np.argmax(corr)==self.last_prediction:
-                    corr[self.last_prediction]*=CLASSIFICATION_THRESHOLDS["diversity_penalty"]
+                    corr[self.last_prediction]*=self.config.classification.diversity_penalty
                     if np.sum(corr)>0:
                         corr/=np.sum(corr)
             cidx= np.argmax(corr)
@@ -106,12 +347,14 @@ class GestureClassifier:
             results["probabilities"].append(raw)
             results["corrected_probabilities"].append(corr)
         if results["predictions"]:
+            self.last_probabilities = np.mean(results["probabilities"], axis=0)
             pc={}
             for p in results["predictions"]:
                 pc[p]= pc.get(p,0)+1
             mp= max(pc, key= pc.get)
             rc= [c for p,c in zip(results["predictions"], results["confidences"]) if p==mp]
             avgc= np.mean(rc)
-            if avgc>= CLASSIFICATION_THRESHOLDS["confidence_threshold"] and pc[mp]>= CLASSIFICATION_THRESHOLDS["window_consistency"]:
+            ct = self.config.classification
+            if avgc>= ct.confidence_threshold and pc[mp]>= ct.window_consistency:
                 return mp, avgc
         return None,0
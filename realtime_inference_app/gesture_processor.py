@@ -1,8 +1,7 @@
 # gesture_processor.py
 
 from config import (
-    DEBUG, BODY_REGIONS, READY_POSE_THRESHOLDS, MOTION_THRESHOLDS, 
-    CLASSIFICATION_THRESHOLDS, WINDOW_SIZE
+    DEBUG, BODY_REGIONS, WINDOW_SIZE, EARLY_EXIT, MODEL_PATH
 )
 import os
 import sys
@@ -23,6 +22,9 @@ from scipy.spatial.distance import euclidean
 
 # Import your FeatureExtractor from feature_extractor.py
 from feature_extractor import FeatureExtractor
+from tracer import traced
+import kinematics
+from runtime_config import PipelineConfig
 
 class GestureProcessor:
     STATE_WAITING = "WAITING"
@@ -30,26 +32,21 @@ class GestureProcessor:
     STATE_CAPTURING = "CAPTURING"
     STATE_CLASSIFYING = "CLASSIFYING"
 
-    def __init__(self, smoothing_alpha=0.3):
+    def __init__(self, smoothing_alpha=0.3, region="right_arm", config=None, model_path=MODEL_PATH):
         self.state = self.STATE_WAITING
+        self.config = config or PipelineConfig.from_overrides()
         self.smoothing_alpha = smoothing_alpha
+        self.region = None
         self.last_valid_kpts = np.zeros(9, dtype=np.float32)
         self.last_kpts = None
         self.prev_kpts = None
         self.last_time = None
         self.prev_time = None
-        self.feature_extractor = FeatureExtractor()
-
-        self.stage_thresholds = {
-            "ready_pose_frames": 5,
-            "motion_detect_frames": 3,
-            "max_capture_frames": 10,
-            "min_velocity": 0.15,
-            "velocity_spike_ratio": 3.0,
-            "min_confidence": 0.7,
-            "high_confidence": 0.85,
-            "sliding_window_consistency": 3
-        }
+        self.full_body_kpts = None
+        self.active_arm = None
+        self.candidate_arm = 0
+        self.feature_extractor = FeatureExtractor(model_path=model_path)  # labels/columns of the model in use
+        self.last_features = None  # feature frame of the last processed frame
 
         self.stage_counters = {"ready_pose": 0, "motion_detect": 0, "gesture_capture": 0}
         self.body_detected = False
@@ -70,7 +67,6 @@ class GestureProcessor:
         self.wrist_pelvis_angle = 0
         self.ready_pose_timestamp = 0
         self.last_gesture_timestamp = 0
-        self.gesture_cooldown = 1.0
         self.ready_frame_count = 0
         self.max_ready_frames = 10
         self.frame_buffer = []
@@ -78,6 +74,22 @@ class GestureProcessor:
         self.frame_count = 0
         self.torso_arm_angle = 0.0
         self.forward_dot = 0.0
+        self.set_region(region)
+
+    def apply_config(self, config):
+        """Switch to another PipelineConfig; call between frames."""
+        self.config = config
+
+    def set_region(self, region):
+        if region == self.region:
+            return
+        self.region = region
+        self.region_joints = BODY_REGIONS[region]
+        self.arm_names, self.arm_idx, self.arm_mirrored = kinematics.arm_layout(region)
+        self.last_valid_kpts = np.zeros(len(self.region_joints)*3, dtype=np.float32)
+        self.last_kpts = None
+        self.last_time = None
+        self._reset_state()
 
     def _reset_state(self):
         self.state = self.STATE_WAITING
@@ -91,59 +103,53 @@ class GestureProcessor:
         self.velocity_values.clear()
         self.acceleration_history.clear()
         self.ready_pose_timestamp = 0
+        self.active_arm = None
 
-    def _detect_ready_pose(self, current_kpts):
-        if getattr(self, "full_body_kpts", None) is None or len(self.full_body_kpts) < 3:
-            return False
-        pelvis = self.full_body_kpts[0:3]
-        shoulder = current_kpts[0:3]
-        elbow = current_kpts[3:6]
-        wrist = current_kpts[6:9]
-        ua = elbow - shoulder
-        fa = wrist - elbow
-        d_sw = np.linalg.norm(wrist - shoulder)
-        d_arm = np.linalg.norm(ua) + np.linalg.norm(fa)
-        if d_arm > 1e-6:
-            self.arm_extension_ratio = d_sw/d_arm
-        else:
-            self.arm_extension_ratio = 0.0
-        torso_vec = shoulder - pelvis
-        arm_vec = wrist - shoulder
-        tl = np.linalg.norm(torso_vec)
-        al = np.linalg.norm(arm_vec)
-        if tl > 1e-6 and al > 1e-6:
-            c = np.dot(torso_vec, arm_vec)/(tl*al)
-            c = np.clip(c, -1.0, 1.0)
-            deg = np.degrees(np.arccos(c))
-        else:
-            deg = 0.0
-        angle_ok = (80 <= deg <= 130)
-        fv = np.array([0,0,-1], dtype=np.float32)
-        if al > 1e-6:
-            av = arm_vec/al
-            fdot = np.dot(av, fv)
-        else:
-            fdot = 0.0
-        in_front = (fdot > 0.5)
-        self.wrist_pelvis_angle = 0
-        self.torso_arm_angle = deg
-        self.forward_dot = fdot
-        ready_ext = (self.arm_extension_ratio >= 0.65)
-        return (ready_ext and angle_ok and in_front)
+    def _detect_ready_pose(self, chains):
+        """Ready-pose test for every arm at once. chains: (A,3,3) in the model frame."""
+        n = len(chains)
+        if getattr(self, "full_body_kpts", None) is None or len(self.full_body_kpts) < 3 or n == 0:
+            z = np.zeros(n)
+            return np.zeros(n, dtype=bool), z, z, z
+        pelvis = kinematics.mirror_x(np.tile(self.full_body_kpts[0:3], (n, 1)), self.arm_mirrored)
+        ext, deg, fdot = kinematics.arm_pose_metrics(chains, pelvis)
+        rp = self.config.ready_pose
+        angle_ok = (rp.min_torso_arm_angle <= deg) & (deg <= rp.max_torso_arm_angle)
+        in_front = (fdot > rp.min_forward_dot)
+        ready_ext = (ext >= rp.arm_extension_ratio)
+        return (ready_ext & angle_ok & in_front), ext, deg, fdot
+
+    def _select_arm(self, ready, ext):
+        # Keep the arm that started a gesture until the state machine resets;
+        # otherwise follow the most extended arm, preferring arms in ready pose.
+        if self.active_arm is not None and self.state != self.STATE_WAITING:
+            return self.active_arm
+        if np.any(ready):
+            return int(np.argmax(np.where(ready, ext, -1.0)))
+        return int(np.argmax(ext))
 
     def _detect_motion(self, velocities):
         wv = np.linalg.norm(velocities.get(17, np.zeros(3)))
         self.velocity_history.append(wv)
         self.velocity_values.append(wv)
+        st = self.config.stages
         c = [
-            wv > self.stage_thresholds["min_velocity"],
-            len(self.velocity_values) >= 2 and self.velocity_values[-1] > self.velocity_values[-2]*self.stage_thresholds["velocity_spike_ratio"]
+            wv > st.min_velocity,
+            len(self.velocity_values) >= 2 and self.velocity_values[-1] > self.velocity_values[-2]*st.velocity_spike_ratio
         ]
         return any(c)
 
-    def process_frame(self, current_kpts, timestamp):
+    @traced("GestureProcessor.process_frame")
+    def process_frame(self, current_kpts, timestamp, velocities=None):
+        """
+        current_kpts: flat region keypoints; timestamp in seconds. When
+        velocities ((J,3) for the region joints) is given, the keypoints are
+        taken as already filtered (joint_filter.py) and the fixed exponential
+        smoothing and finite differences are skipped.
+        """
         try:
             self.frame_count += 1
+            self.last_features = None
             current_kpts = np.nan_to_num(current_kpts)
             has_body = not np.all(np.abs(current_kpts) < 0.001)
             if not has_body:
@@ -154,24 +160,41 @@ class GestureProcessor:
                 return None, {}
             self.no_body_counter = 0
             self.body_detected = True
-            if len(current_kpts) != 9:
+            if len(current_kpts) != len(self.region_joints)*3 or len(self.arm_names) == 0:
                 return None, {}
-            smooth = 0.3*self.last_valid_kpts + 0.7*current_kpts
-            self.last_valid_kpts = smooth
-            velocities = {}
-            accelerations = {}
-            if self.last_kpts is not None and self.last_time is not None:
+            if velocities is not None:
+                joints = current_kpts.reshape(-1,3)
+            else:
+                a = self.smoothing_alpha
+                smooth = a*self.last_valid_kpts + (1.0-a)*current_kpts
+                self.last_valid_kpts = smooth
+                joints = smooth.reshape(-1,3)
+            chains = kinematics.arm_chains(joints, self.arm_idx, self.arm_mirrored)
+            vel_chains = None
+            if velocities is not None:
+                vel_chains = kinematics.arm_chains(np.asarray(velocities).reshape(-1,3), self.arm_idx, self.arm_mirrored)
+            elif self.last_kpts is not None and self.last_time is not None:
                 dt = timestamp - self.last_time
                 if dt>0:
-                    for j,idx in enumerate([0,3,6]):
-                        jid = [13,15,17][j]
-                        v = (current_kpts[idx:idx+3]-self.last_kpts[idx:idx+3])/dt
-                        velocities[jid] = v
-                    self.motion_detected = self._detect_motion(velocities)
-            is_ready_pose = self._detect_ready_pose(smooth)
-            # EXTRACT 70 features for 1 frame
-            feats = self.feature_extractor.extract_features(smooth, velocities, accelerations)
+                    vel = kinematics.joint_velocities(current_kpts.reshape(-1,3), self.last_kpts.reshape(-1,3), dt)
+                    vel_chains = kinematics.arm_chains(vel, self.arm_idx, self.arm_mirrored)
+            ready, ext, deg, fdot = self._detect_ready_pose(chains)
+            arm = self._select_arm(ready, ext)
+            if vel_chains is not None:
+                arm_vel = {jid: vel_chains[arm, k] for k, jid in enumerate([13,15,17])}
+                self.motion_detected = self._detect_motion(arm_vel)
+            is_ready_pose = bool(ready[arm])
+            self.arm_extension_ratio = float(ext[arm])
+            self.wrist_pelvis_angle = 0
+            self.torso_arm_angle = float(deg[arm])
+            self.forward_dot = float(fdot[arm])
+            self.candidate_arm = arm
+            # EXTRACT 70 features for every tracked arm in one pass
+            feats = self.feature_extractor.extract_features_batch(chains, vel_chains)[arm]
+            self.last_features = feats
             result = self._update_state_machine(is_ready_pose, feats, timestamp)
+            if result:
+                result["config_version"] = self.config.version
             st = {
                 "state": self.state,
                 "ready_pose": is_ready_pose,
@@ -181,7 +204,8 @@ class GestureProcessor:
                 "torso_arm_angle": self.torso_arm_angle,
                 "forward_dot": self.forward_dot,
                 "buffer_frames": len(self.frame_buffer),
-                "velocity": self.velocity_values[-1] if self.velocity_values else 0
+                "velocity": self.velocity_values[-1] if self.velocity_values else 0,
+                "arm": self.arm_names[arm]
             }
             self.last_kpts = current_kpts.copy()
             self.last_time = timestamp
@@ -192,43 +216,54 @@ class GestureProcessor:
             return None, {"state": "ERROR"}
 
     def _update_state_machine(self, is_ready_pose, feats, t):
+        st = self.config.stages
         if self.state == self.STATE_WAITING:
             if is_ready_pose:
                 self.stage_counters["ready_pose"] += 1
-                if self.stage_counters["ready_pose"]>= self.stage_thresholds["ready_pose_frames"]:
-                    if t - self.last_gesture_timestamp>= self.gesture_cooldown:
+                if self.stage_counters["ready_pose"]>= st.ready_pose_frames:
+                    if t - self.last_gesture_timestamp>= st.gesture_cooldown:
                         self.state = self.STATE_READY
+                        self.active_arm = self.candidate_arm
                         self.ready_pose_timestamp = t
                         self.frame_buffer.clear()
-                        return {"event":"ready_pose_detected"}
+                        return self._arm_event({"event":"ready_pose_detected"})
             else:
                 self.stage_counters["ready_pose"] = 0
             return None
         elif self.state == self.STATE_READY:
-            if t - self.ready_pose_timestamp<1.0:
+            if t - self.ready_pose_timestamp<st.ready_settle_s:
                 return None
             if self.motion_detected:
                 self.stage_counters["motion_detect"] +=1
-                if self.stage_counters["motion_detect"]>=self.stage_thresholds["motion_detect_frames"]:
+                if self.stage_counters["motion_detect"]>=st.motion_detect_frames:
                     self.state = self.STATE_CAPTURING
                     self.frame_buffer = [feats]
-                    return {"event":"motion_detected"}
+                    return self._arm_event({"event":"motion_detected"})
             else:
                 self.stage_counters["motion_detect"]=0
-            if t - self.ready_pose_timestamp>3.0:
+            if t - self.ready_pose_timestamp>st.ready_timeout_s:
                 self._reset_state()
                 return {"event":"ready_pose_timeout"}
             return None
         elif self.state==self.STATE_CAPTURING:
             self.frame_buffer.append(feats)
-            if len(self.frame_buffer)<=self.stage_thresholds["max_capture_frames"]:
-                pass
-            if len(self.frame_buffer)== self.stage_thresholds["max_capture_frames"]:
+            # >= rather than ==: max_capture_frames may shrink mid-capture on a config reload.
+            if len(self.frame_buffer)>= st.max_capture_frames:
                 self.state= self.STATE_CLASSIFYING
-                return {"event":"capture_complete","frames":self.frame_buffer}
+                return self._arm_event({"event":"capture_complete","frames":self.frame_buffer})
+            if EARLY_EXIT["enabled"] and len(self.frame_buffer)>= EARLY_EXIT["min_frames"]:
+                return self._arm_event({"event":"capture_progress","frames":self.frame_buffer})
             return None
         elif self.state==self.STATE_CLASSIFYING:
             self.last_gesture_timestamp= t
             self._reset_state()
             return None
         return None
+
+    def _arm_event(self, ev):
+        # Which arm produced the event, and whether its features were mirrored
+        # (the classifier's label must then be mapped back).
+        if self.active_arm is not None:
+            ev["arm"] = self.arm_names[self.active_arm]
+            ev["mirrored"] = bool(self.arm_mirrored[self.active_arm])
+        return ev
@@ -0,0 +1,133 @@
+# gesture_registry.py
+#
+# Gestures added after training, without retraining the model: each one is a
+# set of prototypes in the model's penultimate-layer embedding space (see
+# embedding_index.py), optionally with a small softmax head over the frozen
+# embeddings of every class. Numpy only, shared with
+# ai_training/register_gesture.py.
+
+import os
+import numpy as np
+
+from embedding_index import PrototypeIndex, leave_one_out_distances, _normalize
+
+REGISTRY_FILE = "gesture_registry.npz"
+DEFAULT_THRESHOLD = 0.1   # cosine distance, used when there are too few examples to calibrate
+
+
+class GestureRegistry:
+    def __init__(self, layer=None):
+        self.layer = layer
+        self.names = []
+        self.thresholds = np.zeros(0, dtype=np.float32)
+        self.prototypes = None
+        self.labels = np.zeros(0, dtype=np.intp)
+        self.head_labels = []
+        self.head_w = None
+        self.head_b = None
+
+    def add(self, name, embeddings, slack=1.5):
+        """Register (or replace) a gesture from the embeddings of its examples."""
+        self.remove(name)
+        e = _normalize(np.asarray(embeddings).reshape(len(embeddings), -1))
+        if len(e) >= 3:
+            threshold = float(np.max(leave_one_out_distances(e, np.zeros(len(e)))) * slack)
+        else:
+            threshold = DEFAULT_THRESHOLD
+        self.names.append(name)
+        self.thresholds = np.append(self.thresholds, np.float32(threshold))
+        gi = len(self.names) - 1
+        self.prototypes = e if self.prototypes is None else np.concatenate([self.prototypes, e])
+        self.labels = np.concatenate([self.labels, np.full(len(e), gi, dtype=np.intp)])
+        return threshold
+
+    def remove(self, name):
+        if name not in self.names:
+            return False
+        gi = self.names.index(name)
+        keep = self.labels != gi
+        self.prototypes = self.prototypes[keep]
+        self.labels = self.labels[keep]
+        self.labels[self.labels > gi] -= 1
+        del self.names[gi]
+        self.thresholds = np.delete(self.thresholds, gi)
+        if self.head_labels and name in self.head_labels:
+            self.head_labels, self.head_w, self.head_b = [], None, None
+        return True
+
+    def train_head(self, base_embeddings, base_labels, base_names, epochs=300, lr=0.5, l2=1e-3, seed=0):
+        """
+        Softmax regression on frozen embeddings over the base classes plus
+        every registered gesture (full-batch gradient descent; a few seconds at
+        most for a few thousand examples).
+        """
+        x = np.concatenate([_normalize(np.asarray(base_embeddings).reshape(len(base_embeddings), -1)), self.prototypes])
+        y = np.concatenate([np.asarray(base_labels, dtype=np.intp), self.labels + len(base_names)])
+        k = len(base_names) + len(self.names)
+        rng = np.random.default_rng(seed)
+        w = rng.normal(0.0, 0.01, (x.shape[1], k)).astype(np.float32)
+        b = np.zeros(k, dtype=np.float32)
+        onehot = np.eye(k, dtype=np.float32)[y]
+        # Balance classes: a handful of new examples vs. hundreds of base ones.
+        cw = (len(y) / (k * np.maximum(np.bincount(y, minlength=k), 1)))[y][:, None]
+        for _ in range(epochs):
+            p = _softmax(x @ w + b)
+            g = (p - onehot) * cw / len(x)
+            w -= lr * (x.T @ g + l2 * w)
+            b -= lr * g.sum(axis=0)
+        self.head_labels = list(base_names) + list(self.names)
+        self.head_w, self.head_b = w, b
+        return float(np.mean(np.argmax(x @ w + b, axis=1) == y))
+
+    def head_probs(self, emb):
+        """(N, len(head_labels)) class probabilities from the head, or None without one."""
+        if self.head_w is None:
+            return None
+        return _softmax(_normalize(np.atleast_2d(emb)) @ self.head_w + self.head_b)
+
+    def merged_index(self, base_index, base_names):
+        """PrototypeIndex over the base classes (if there is a base index) plus every registered gesture."""
+        if base_index is not None:
+            index = PrototypeIndex(base_index.prototypes, base_index.labels, base_index.class_labels,
+                                   base_index.thresholds.copy(), base_index.layer)
+        else:
+            dim = self.prototypes.shape[1]
+            index = PrototypeIndex(np.zeros((0, dim), dtype=np.float32), np.zeros(0, dtype=np.intp),
+                                   list(base_names), np.full(len(base_names), np.inf, dtype=np.float32), self.layer)
+        for gi, name in enumerate(self.names):
+            index.add(self.prototypes[self.labels == gi], name, self.thresholds[gi])
+        return index
+
+    def save(self, path):
+        # Write then rename, so a running recognizer never reads half a file.
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, layer=np.asarray(self.layer or ""), names=np.asarray(self.names),
+                            thresholds=self.thresholds,
+                            prototypes=self.prototypes if self.prototypes is not None else np.zeros((0, 0), np.float32),
+                            labels=self.labels, head_labels=np.asarray(self.head_labels),
+                            head_w=self.head_w if self.head_w is not None else np.zeros((0, 0), np.float32),
+                            head_b=self.head_b if self.head_b is not None else np.zeros(0, np.float32))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        reg = cls(str(data["layer"]) or None)
+        reg.names = [str(n) for n in data["names"]]
+        reg.thresholds = data["thresholds"].astype(np.float32)
+        reg.prototypes = data["prototypes"].astype(np.float32) if data["prototypes"].size else None
+        reg.labels = data["labels"].astype(np.intp)
+        reg.head_labels = [str(n) for n in data["head_labels"]]
+        if data["head_w"].size:
+            reg.head_w, reg.head_b = data["head_w"], data["head_b"]
+        return reg
+
+
+def _softmax(z):
+    z = z - z.max(axis=-1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+def default_registry_path(model_path):
+    return os.path.join(os.path.dirname(model_path), REGISTRY_FILE)
@@ -0,0 +1,331 @@
+# headless_app.py
+
+from config import (
+    DEBUG, MODEL_PATH, BODY_REGIONS, HEADLESS_CONFIG_PATH, CONTROL_HOST,
+    CONTROL_PORT, LOG_DIR, PIPELINE_CONFIG_PATH, CPU_LAYOUT_PATH
+)
+import os
+import sys
+import time
+import json
+import queue
+import signal
+import argparse
+import threading
+import traceback
+import socketserver
+import tensorflow as tf
+import pygame
+import cv2
+
+from gesture_processor import GestureProcessor
+from gesture_classifier import GestureClassifier
+from inference_thread import InferenceThread, InferenceCallbacks
+from event_log import EventLog, format_entry
+from tracer import tracer
+import cpu_layout
+import inference_worker
+
+
+###############################################################################
+# Headless daemon: runs the recognizer without Tk or camera preview.
+#
+#   python headless_app.py --config headless_config.json
+#
+# The JSON config overrides DEFAULT_HEADLESS_CONFIG. The daemon is controlled
+# over a local TCP socket with one command per line, either as JSON
+# ({"cmd": "region", "value": "left_arm"}) or as plain text ("region left_arm"):
+#
+#   status                 current state, last result, thread health
+#   reset                  reset the gesture state machine
+#   region <name>          switch body region
+#   model [path]           load, validate and swap in another model (no path:
+#                          current model and swap status)
+#   rollback               swap back to the previous model
+#   config                 pipeline configuration in use (edit the
+#                          pipeline_config file to change it live)
+#   snapshot <path.jpg>    save the next camera frame (the only image retrieval)
+#   log [n]                last n log entries
+#   dump_trace             write a trace file (tracing must be enabled)
+#   subscribe [level]      keep the connection open and stream log entries
+#                          (level "result" streams recognized gestures only)
+#   stop                   shut the daemon down
+###############################################################################
+DEFAULT_HEADLESS_CONFIG = {
+    "model_path": MODEL_PATH,
+    "region": "right_arm",
+    "control_host": CONTROL_HOST,
+    "control_port": CONTROL_PORT,
+    "log_dir": LOG_DIR,
+    "pipeline_config": PIPELINE_CONFIG_PATH,
+    "cpu_layout": CPU_LAYOUT_PATH,
+    "sounds": False,
+    "echo_log": True,
+    "trace": False
+}
+
+
+def load_headless_config(path):
+    cfg = dict(DEFAULT_HEADLESS_CONFIG)
+    if path and os.path.exists(path):
+        with open(path, "r") as f:
+            cfg.update(json.load(f))
+    if cfg["region"] not in BODY_REGIONS:
+        raise ValueError(f"Unknown region '{cfg['region']}', expected one of {list(BODY_REGIONS)}")
+    return cfg
+
+
+class HeadlessApp(InferenceCallbacks):
+    def __init__(self, cfg, processor):
+        self.cfg = cfg
+        self.processor = processor
+        self.event_log = EventLog(log_dir=cfg["log_dir"])
+        self.region = cfg["region"]
+        self.status = {}
+        self.last_result = None
+        self.snapshot_path = None
+        self.sounds = {}
+        if cfg["echo_log"]:
+            self.event_log.add_listener(lambda e: print(format_entry(e), flush=True))
+        if cfg["sounds"]:
+            try:
+                pygame.mixer.init()
+                for stype, fn in {"ready": "ready.wav", "success": "success.wav", "error": "error.wav"}.items():
+                    if os.path.exists(fn):
+                        self.sounds[stype] = pygame.mixer.Sound(fn)
+            except:
+                self.sounds = {}
+
+    @property
+    def preview_enabled(self):
+        return self.snapshot_path is not None
+
+    def log(self, message, **fields):
+        self.event_log.log(message, **fields)
+
+    def update_ui(self, st):
+        status = dict(st)
+        status["body_detected"] = self.processor.body_detected
+        self.status = status
+
+    def update_camera_preview(self, frame):
+        path, self.snapshot_path = self.snapshot_path, None
+        if path:
+            ok = cv2.imwrite(path, frame)
+            self.log(f"Snapshot saved to {path}" if ok else f"Snapshot failed: {path}")
+
+    def get_selected_region(self):
+        return self.region
+
+    def show_gesture_result(self, g, c, second=None):
+        self.last_result = {"t": time.time(), "gesture": g, "confidence": float(c), "second": second}
+        self.event_log.log(f"RESULT: {g.upper()} ({float(c):.2f})", level="result",
+                           gesture=g, confidence=float(c), second=second)
+
+    def play_sound(self, st="success"):
+        if st in self.sounds:
+            try:
+                self.sounds[st].play()
+            except:
+                pass
+
+
+class ControlHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            line = raw.decode("utf-8", "replace").strip()
+            if not line:
+                continue
+            try:
+                req = parse_command(line)
+            except ValueError as e:
+                self._send({"ok": False, "error": str(e)})
+                continue
+            if req["cmd"] == "subscribe":
+                self._stream(req.get("value"))
+                return
+            self._send(self.server.recognizer.handle_command(req))
+
+    def _send(self, obj):
+        self.wfile.write((json.dumps(obj, default=_json_default) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def _stream(self, level=None):
+        q = queue.Queue(maxsize=1000)
+
+        def listener(entry):
+            if level is None or entry.get("level") == level:
+                try:
+                    q.put_nowait(entry)
+                except queue.Full:
+                    pass
+
+        log = self.server.recognizer.app.event_log
+        log.add_listener(listener)
+        try:
+            self._send({"ok": True, "subscribed": level or "all"})
+            while not self.server.recognizer.stop_event.is_set():
+                try:
+                    self._send(q.get(timeout=0.5))
+                except queue.Empty:
+                    continue
+        except OSError:
+            pass  # client went away
+        finally:
+            log.remove_listener(listener)
+
+
+class ControlServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, recognizer):
+        super().__init__(address, ControlHandler)
+        self.recognizer = recognizer
+
+
+def _json_default(o):
+    # numpy scalars in the processor status dict
+    return o.item() if hasattr(o, "item") else str(o)
+
+
+def parse_command(line):
+    if line.startswith("{"):
+        try:
+            req = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        if not isinstance(req, dict) or "cmd" not in req:
+            raise ValueError("JSON command needs a 'cmd' field")
+        return req
+    parts = line.split(None, 1)
+    req = {"cmd": parts[0].lower()}
+    if len(parts) > 1:
+        req["value"] = parts[1]
+    return req
+
+
+class HeadlessDaemon:
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.stop_event = threading.Event()
+        if cfg["trace"]:
+            tracer.enable()
+        cpu_layout.apply(path=cfg["cpu_layout"])  # before TensorFlow initialises
+        with cpu_layout.pinned("tf"):
+            self.model = inference_worker.load_model(cfg["model_path"])
+        cpu_layout.pin("ui")
+        self.processor = GestureProcessor(model_path=cfg["model_path"])
+        self.classifier = GestureClassifier(self.model, class_labels=self.processor.feature_extractor.class_labels,
+                                            feature_columns=self.processor.feature_extractor.feature_columns,
+                                            model_path=cfg["model_path"])
+        self.app = HeadlessApp(cfg, self.processor)
+        self.inference_thread = InferenceThread(self.model, self.processor, self.classifier, self.app,
+                                                config_path=cfg["pipeline_config"])
+        self.server = None
+
+    def handle_command(self, req):
+        cmd = req.get("cmd")
+        val = req.get("value")
+        try:
+            if cmd == "status":
+                return {
+                    "ok": True,
+                    "running": self.inference_thread.is_alive(),
+                    "region": self.app.region,
+                    "status": self.app.status,
+                    "last_result": self.app.last_result,
+                    "cascade": self.classifier.cascade_stats(),
+                    "latency": self.inference_thread.latency.summary(),
+                    "model": self.inference_thread.models.status(),
+                    "config": self.inference_thread.config_watcher.status(),
+                    "load_shedding": self.inference_thread.shedder.stats(),
+                    "cpu_layout": cpu_layout.describe(),
+                    "inference_worker": self.classifier.model.stats() if hasattr(self.classifier.model, "stats") else None,
+                    "log_dropped": self.app.event_log.dropped
+                }
+            if cmd == "reset":
+                self.processor._reset_state()
+                self.app.log("Processor state reset")
+                return {"ok": True}
+            if cmd == "region":
+                if val not in BODY_REGIONS:
+                    return {"ok": False, "error": f"Unknown region '{val}'", "regions": list(BODY_REGIONS)}
+                self.app.region = val
+                self.app.log(f"Region set to {val}")
+                return {"ok": True, "region": val}
+            if cmd == "model":
+                if not val:
+                    return {"ok": True, "model": self.inference_thread.models.status()}
+                if not self.inference_thread.models.request(val):
+                    return {"ok": False, "error": "A model is already loading"}
+                self.app.log(f"Loading model {val}")
+                return {"ok": True, "loading": val}
+            if cmd == "rollback":
+                if not self.inference_thread.models.rollback():
+                    return {"ok": False, "error": "No previous model to roll back to"}
+                return {"ok": True, "rollback_to": self.inference_thread.models.previous.path}
+            if cmd == "config":
+                return {"ok": True, "config": self.processor.config.to_dict(),
+                        "error": self.inference_thread.config_watcher.error}
+            if cmd == "snapshot":
+                self.app.snapshot_path = val or f"snapshot_{time.strftime('%Y%m%d_%H%M%S')}.jpg"
+                return {"ok": True, "path": self.app.snapshot_path}
+            if cmd == "log":
+                n = int(val) if val else 50
+                return {"ok": True, "entries": self.app.event_log.tail(n)}
+            if cmd == "dump_trace":
+                if not tracer.enabled:
+                    return {"ok": False, "error": "Tracing is disabled (set \"trace\": true)"}
+                return {"ok": True, "path": tracer.dump()}
+            if cmd == "stop":
+                self.stop_event.set()
+                return {"ok": True}
+            return {"ok": False, "error": f"Unknown command '{cmd}'"}
+        except Exception as e:
+            if DEBUG:
+                traceback.print_exc()
+            return {"ok": False, "error": str(e)}
+
+    def run(self):
+        if not self.inference_thread.running:
+            self.app.log("Camera could not be initialised, exiting")
+            self.app.event_log.close()
+            return 1
+        self.inference_thread.start()
+        address = (self.cfg["control_host"], int(self.cfg["control_port"]))
+        self.server = ControlServer(address, self)
+        threading.Thread(target=self.server.serve_forever, name="ControlServer", daemon=True).start()
+        self.app.log(f"Headless recognizer running, control socket on {address[0]}:{address[1]}")
+        try:
+            while not self.stop_event.wait(0.5):
+                if not self.inference_thread.is_alive():
+                    self.app.log("Inference thread exited")
+                    break
+        finally:
+            self.shutdown()
+        return 0
+
+    def shutdown(self):
+        self.stop_event.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        self.inference_thread.stop()
+        if self.inference_thread.is_alive():
+            self.inference_thread.join(timeout=2.0)
+        self.app.event_log.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless realtime gesture recognizer")
+    parser.add_argument("--config", default=HEADLESS_CONFIG_PATH, help="JSON config file")
+    args = parser.parse_args(argv)
+    daemon = HeadlessDaemon(load_headless_config(args.config))
+    signal.signal(signal.SIGINT, lambda *a: daemon.stop_event.set())
+    signal.signal(signal.SIGTERM, lambda *a: daemon.stop_event.set())
+    return daemon.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,8 @@
 # inference_thread.py
 
 from config import (
-    DEBUG, BODY_REGIONS, SKELETON_PAIRS_BODY_38
+    DEBUG, BODY_REGIONS, SKELETON_PAIRS_BODY_38, EARLY_EXIT, RULE_CASCADE, JOINT_FILTER,
+    LATENCY_SUMMARY_S, GESTURE_REGISTRY, PIPELINE_CONFIG_PATH, SESSION_RECORDER
 )
 import os
 import sys
@@ -25,155 +26,362 @@ from scipy.spatial.distance import euclidean
 from gesture_processor import GestureProcessor
 # And the GestureClassifier reference for its usage in the thread (if needed):
 from gesture_classifier import GestureClassifier
+from tracer import tracer
+from body_data import BodyDataBuffer
+from joint_filter import OneEuroFilterBank
+from frame_source import ZedFrameSource
+from latency import LatencyMonitor, FrameStamps, format_breakdown, format_summary
+from kinematics import mirror_label
+from model_swap import ModelSwapper
+from runtime_config import ConfigWatcher
+from load_shedding import LoadShedder
+from skeleton_overlay import SkeletonOverlay
+from session_recorder import SessionRecorder
+import cpu_layout
+
+class InferenceCallbacks:
+    """
+    What InferenceThread needs from its host application. GestureRecognitionApp
+    implements it with Tk widgets; HeadlessApp (headless_app.py) without any UI.
+    update_camera_preview is only called (and the image only retrieved from the
+    camera) while preview_enabled is true. Keyword fields passed to log() (e.g.
+    an event's latency breakdown) are kept with the event log entry.
+    """
+    preview_enabled = False
+
+    def log(self, message, **fields):
+        pass
+
+    def update_ui(self, st):
+        pass
+
+    def update_camera_preview(self, frame):
+        pass
+
+    def get_selected_region(self):
+        return "right_arm"
+
+    def show_gesture_result(self, g, c, second=None):
+        pass
+
+    def play_sound(self, st="success"):
+        pass
+
 
 class InferenceThread(threading.Thread):
-    def __init__(self, model, processor, classifier, app):
+    def __init__(self, model, processor, classifier, app, source=None, config_path=PIPELINE_CONFIG_PATH):
         super().__init__()
         self.model = model
         self.processor = processor
         self.classifier = classifier
         self.app = app
         self.running = True
-        self.zed = None
+        self.body_data = BodyDataBuffer()
+        self.joint_filter = OneEuroFilterBank() if JOINT_FILTER["enabled"] else None
+        self.latency = LatencyMonitor()
+        self.stamps = FrameStamps()
         self.image_scale = 0.1
         self.small_image_scale = 0.1
+        self.skeleton_image_scale = 0.25
+        self.overlay = SkeletonOverlay(self.image_scale)
         self.last_gesture_time = 0
         self.cooldown_time = 1.0
-        self.zed = sl.Camera()
-        init = sl.InitParameters()
-        init.camera_resolution = sl.RESOLUTION.HD1080
-        init.camera_fps = 30
-        init.depth_mode = sl.DEPTH_MODE.ULTRA
-        s = self.zed.open(init)
-        if s != sl.ERROR_CODE.SUCCESS:
-            self.app.log(f"Camera initialization failed: {s}")
-            self.running = False
-            return
-        tparam = sl.PositionalTrackingParameters()
-        st2 = self.zed.enable_positional_tracking(tparam)
-        if st2 != sl.ERROR_CODE.SUCCESS:
-            self.app.log(f"Positional tracking error: {st2}")
-            self.running = False
-            return
-        bparam = sl.BodyTrackingParameters()
-        bparam.detection_model = sl.BODY_TRACKING_MODEL.HUMAN_BODY_FAST
-        bparam.body_format = sl.BODY_FORMAT.BODY_38
-        st3 = self.zed.enable_body_tracking(bparam)
-        if st3 != sl.ERROR_CODE.SUCCESS:
-            self.app.log(f"Body tracking error: {st3}")
+        self.provisional = None  # early result awaiting confirmation
+        self.models = ModelSwapper(classifier, processor, app.log)
+        self.shedder = LoadShedder()
+        self.startup = 0         # frames skipped while tracking settles
+        self.last_state = None
+        self.config_watcher = ConfigWatcher(config_path)
+        self.reload_config()
+        self.recorder = SessionRecorder() if SESSION_RECORDER["enabled"] else None
+        self.source = source or ZedFrameSource()
+        with cpu_layout.pinned("zed"):  # SDK threads inherit this affinity
+            err = self.source.open()
+        if err:
+            self.app.log(err)
             self.running = False
-            return
-        self.skeleton_image_scale = 0.25
+        elif hasattr(self.source, "intrinsics"):
+            self.overlay.set_intrinsics(*self.source.intrinsics())
 
     def run(self):
         if not self.running:
             return
-        runtime = sl.RuntimeParameters()
-        body_runtime = sl.BodyTrackingRuntimeParameters()
-        bodies = sl.Bodies()
-        image = sl.Mat()
-        skeleton_mat = sl.Mat()
+        fs = self.stamps
         frame_count = 0
-        startup = 0
+        next_summary = time.time() + LATENCY_SUMMARY_S
+        next_registry = time.time() + GESTURE_REGISTRY["poll_s"]
+        cpu_layout.pin("inference")
+        if cpu_layout.active() is not None:
+            self.app.log(f"CPU layout: {cpu_layout.describe()}", cpu_layout=cpu_layout.active())
         self.app.log("Inference thread started")
+        if self.recorder is not None:
+            path = self.recorder.start({"model_path": self.classifier.model_path,
+                                        "class_labels": list(self.classifier.class_labels),
+                                        "feature_columns": self.processor.feature_extractor.feature_columns})
+            self.app.log(f"Recording session to {path}", session=path)
         try:
             while self.running:
-                err = self.zed.grab(runtime)
-                if err == sl.ERROR_CODE.SUCCESS:
+                with tracer.span("zed.grab"):
+                    ok = self.source.grab()
+                if ok:
+                    t0 = time.perf_counter()
                     frame_count += 1
-                    self.zed.retrieve_image(image, sl.VIEW.LEFT)
-                    frm = image.get_data()[:,:,:3]
-                    self.app.update_camera_preview(frm)
-                    self.zed.retrieve_bodies(bodies, body_runtime)
-                    region = self.app.get_selected_region()
-                    kpts = self.extract_keypoints(bodies, region)
-                    # self.draw_skeleton_view(bodies)  # (Commented in original)
-                    if startup<8:
-                        startup+=1
-                        continue
-                    ts = time.time()
-                    r,st = self.processor.process_frame(kpts, ts)
-                    self.app.update_ui(st)
-                    if r:
-                        e = r.get("event")
-                        if e=="ready_pose_detected":
-                            self.app.log("Ready pose detected")
-                            self.app.play_sound("ready")
-                        elif e=="frames_collected":
-                            f = r.get("frames",[])
-                            if f:
-                                self.app.log(f"Collected {len(f)} frames for sliding window analysis")
-                                ci,co = self.classifier.sliding_window_classify(f)
-                                if ci is not None:
-                                    name = self.processor.feature_extractor.class_labels[ci]
-                                    self.app.log(f"SLIDING WINDOW RESULT: {name.upper()} ({co:.2f})")
-                                    self.app.show_gesture_result(name,co)
-                                    self.app.play_sound("success")
-                                    self.last_gesture_time = time.time()
-                                else:
-                                    self.app.log("No consistent gesture detected in sliding windows")
-                            else:
-                                self.app.log("No frames collected for analysis")
-                        elif e=="ready_pose_broken":
-                            self.app.log("Ready pose broken")
-                        elif e=="motion_detected":
-                            self.app.log("Motion detected - capturing gesture")
-                        elif e in ["capture_complete","capture_timeout"]:
-                            f = r.get("frames",[])
-                            self.app.log(f"Gesture captured ({len(f)} frames) - classifying...")
-                            ct = time.time()
-                            if ct - self.last_gesture_time>= self.cooldown_time:
-                                ci,co = self.classifier.classify_gesture(f)
-                                if ci is not None:
-                                    gname = self.processor.feature_extractor.class_labels[ci]
-                                    if co>=0.5:
-                                        self.app.log(f"GESTURE RECOGNIZED: {gname.upper()} ({co:.2f})")
-                                        self.app.show_gesture_result(gname,co)
-                                        self.app.play_sound("success")
-                                    else:
-                                        self.app.log(f"Gesture unclear: {gname} (low confidence: {co:.2f})")
-                                        self.app.show_gesture_result("UNCLEAR",co,gname)
-                                        self.app.play_sound("error")
-                                    self.last_gesture_time=ct
-                                else:
-                                    self.app.log("Classification failed")
-                                    self.app.show_gesture_result("ERROR",0)
-                time.sleep(0.001)
+                    fs.index = frame_count
+                    fs.cam_ts = ts = self.source.timestamp()
+                    fs.grabbed = self.source.now()
+                    if self.latency.check_timestamp(ts):
+                        with tracer.span("frame", root=True, frame=frame_count):
+                            self.process_grabbed(frame_count, ts, t0)
+                    # else: same image as the previous frame; only the housekeeping below runs
+                elif self.source.exhausted:
+                    break
+                else:
+                    time.sleep(0.001)  # no frame available; grab() returned at once
+                if LATENCY_SUMMARY_S and time.time()>= next_summary:
+                    next_summary = time.time() + LATENCY_SUMMARY_S
+                    s = self.latency.summary()
+                    self.app.log(format_summary(s), latency_summary=s)
+                self.reload_config()
+                # A loaded model goes live between frames, never mid-capture.
+                if self.models.apply_pending(busy=self.processor.state==self.processor.STATE_CAPTURING):
+                    self.model = self.classifier.model
+                if GESTURE_REGISTRY["enabled"] and time.time()>= next_registry:
+                    # Hot-load newly registered gestures between two frames.
+                    next_registry = time.time() + GESTURE_REGISTRY["poll_s"]
+                    if self.classifier.refresh_registry():
+                        names = self.classifier.registry.names if self.classifier.registry else []
+                        self.app.log(f"Gesture registry loaded: {', '.join(names) or 'empty'}", registered=names)
+                if ok:
+                    self.frame_cost(t0)
         except:
             if DEBUG:
                 traceback.print_exc()
         finally:
-            if self.zed:
-                self.zed.close()
+            self.source.close()
+            if self.recorder is not None:
+                self.recorder.stop()
+                rs = self.recorder.stats()
+                self.app.log(f"Session recorded: {rs['frames']} frames in {rs['chunks']} chunks ({rs['bytes']/1e6:.1f} MB), {rs['dropped']} dropped",
+                             session=rs)
+            if RULE_CASCADE["enabled"]:
+                cs = self.classifier.cascade_stats()
+                agree = f"{cs['rule_agreement']:.2f}" if cs["rule_agreement"] is not None else "n/a"
+                self.app.log(f"Cascade: {cs['rules']} by rules ({cs['rules_fraction']:.0%}), {cs['model']} by model, rule/model agreement {agree} over {cs['audited']} audits")
             self.app.log("Inference thread stopped")
 
-    # def draw_skeleton_view(self, bodies):
-    #     # (As in original code, commented out in your snippet)
-    #     pass
+    def process_grabbed(self, frame_count, ts, t0):
+        # One camera frame, stage by stage, each stage's time reported to the
+        # load shedder; what is shed depends on its level.
+        fs = self.stamps
+        shed = self.shedder
+        # Only pay for image retrieval when someone displays it.
+        frm = None
+        if getattr(self.app, "preview_enabled", True) and shed.preview:
+            with tracer.span("retrieve_image"):
+                frm = self.source.retrieve_image()
+        t1 = time.perf_counter()
+        shed.add("preview", t1-t0)
+        # Frames are only skipped while idle (waiting, no ready pose building
+        # up): the processor's frame-count thresholds and the capture window
+        # assume every frame.
+        p = self.processor
+        idle = p.state==p.STATE_WAITING and p.stage_counters["ready_pose"]==0
+        if idle and not shed.processing_due(frame_count):
+            return
+        with tracer.span("retrieve_bodies"):
+            bodies = self.source.retrieve_bodies()
+        fs.bodies = self.source.now()
+        region = self.app.get_selected_region()
+        with tracer.span("extract_keypoints"):
+            kpts = self.extract_keypoints(bodies, region, ts)
+        t2 = time.perf_counter()
+        shed.add("tracking", t2-t1)
+        if frm is not None:
+            # After tracking, so the skeleton drawn is this frame's.
+            with tracer.span("update_camera_preview"):
+                self.app.update_camera_preview(frm)
+            t_prev = time.perf_counter()
+            shed.add("preview", t_prev-t2)
+            t2 = t_prev
+        if self.startup<8:
+            self.startup+=1
+            return
+        vel = self.body_data.region_velocities(region, 0) if self.joint_filter is not None else None
+        self.processor.set_region(region)
+        r,st = self.processor.process_frame(kpts, ts, vel)
+        if self.recorder is not None:
+            self.record_frame(frame_count, ts, st, r)
+        fs.processed = self.source.now()
+        self.latency.frame_done(fs)
+        t3 = time.perf_counter()
+        shed.add("processing", t3-t2)
+        if shed.metrics_due(frame_count) or st.get("state")!=self.last_state:
+            with tracer.span("update_ui"):
+                self.app.update_ui(st)
+            self.last_state = st.get("state")
+        t4 = time.perf_counter()
+        shed.add("ui", t4-t3)
+        if r:
+            self.handle_event(r)
+            shed.add("events", time.perf_counter()-t4)
+
+    def record_frame(self, frame_count, ts, st, r):
+        try:
+            self.recorder.frame(frame_count, ts, self.body_data, self.processor.last_features,
+                                st.get("state"), r.get("event") if r else None)
+        except:
+            if DEBUG:
+                traceback.print_exc()
+
+    def record_prediction(self, kind, ci, co):
+        # Classifier result of the current frame, with its probabilities.
+        if self.recorder is None:
+            return
+        try:
+            self.recorder.prediction(self.stamps.index, self.stamps.cam_ts, kind, self.classifier.last_probabilities,
+                                     ci, co, self.classifier.last_tier)
+        except:
+            if DEBUG:
+                traceback.print_exc()
+
+    def frame_cost(self, t0):
+        # Busy time of the frame grabbed at t0, up to the next grab.
+        level = self.shedder.frame_done(time.perf_counter()-t0)
+        if level is not None:
+            s = self.shedder.stats()
+            self.app.log(f"Load shedding level {level} ({s['name']}): frame cost {s['cost_ms']:.1f} ms, budget {s['budget_ms']:.1f} ms",
+                         load_shedding=s)
+
+    def handle_event(self, r):
+        e = r.get("event")
+        if e=="ready_pose_detected":
+            self.app.log("Ready pose detected")
+            self.app.play_sound("ready")
+        elif e=="frames_collected":
+            f = r.get("frames",[])
+            if f:
+                self.app.log(f"Collected {len(f)} frames for sliding window analysis")
+                ci,co = self.classifier.sliding_window_classify(f)
+                self.record_prediction("window", ci, co)
+                if ci is not None:
+                    name = self.label_name(ci, r)
+                    self.app.log(f"SLIDING WINDOW RESULT: {name.upper()} ({co:.2f})")
+                    self.app.show_gesture_result(name,co)
+                    self.app.play_sound("success")
+                    self.last_gesture_time = time.time()
+                else:
+                    self.app.log("No consistent gesture detected in sliding windows")
+            else:
+                self.app.log("No frames collected for analysis")
+        elif e=="ready_pose_broken":
+            self.app.log("Ready pose broken")
+        elif e=="motion_detected":
+            self.provisional = None
+            self.app.log("Motion detected - capturing gesture")
+        elif e=="capture_progress":
+            if (self.provisional is None and time.time() - self.last_gesture_time>= self.cooldown_time
+                    and self.shedder.early_exit_due(len(r.get("frames",[])))):
+                self.early_classify(r)
+        elif e in ["capture_complete","capture_timeout"]:
+            t0 = self.source.now()
+            f = r.get("frames",[])
+            self.app.log(f"Gesture captured ({len(f)} frames) - classifying...")
+            ct = time.time()
+            early, self.provisional = self.provisional, None
+            if ct - self.last_gesture_time>= self.cooldown_time:
+                ci,co = self.classifier.classify_gesture(f)
+                self.record_prediction("final", ci, co)
+                if ci is not None:
+                    gname = self.label_name(ci, r)
+                    threshold = self.classifier.config.classification.confidence_threshold
+                    os_ = self.classifier.last_open_set
+                    if os_ and os_["rejected"]:
+                        if early is not None:
+                            self.app.log(f"EARLY RESULT RETRACTED: {early['name'].upper()}")
+                        self.app.show_gesture_result("UNKNOWN",co,gname)
+                        self.app.play_sound("error")
+                        lat = self.event_latency(t0)
+                        self.app.log(f"Unknown motion rejected: closest {gname} (distance {os_['distance']:.3f} > {os_['threshold']:.3f}) - {format_breakdown(lat)}",
+                                     latency=lat, config_version=r.get("config_version"), open_set=os_)
+                    elif early is not None and co>=threshold and gname==early["name"]:
+                        self.app.show_gesture_result(gname,co)
+                        lat = self.event_latency(t0)
+                        self.app.log(f"EARLY RESULT CONFIRMED: {gname.upper()} ({co:.2f}) - {format_breakdown(lat)}", latency=lat, config_version=r.get("config_version"))
+                    elif co>=threshold:
+                        if early is not None:
+                            self.app.log(f"EARLY RESULT RETRACTED: {early['name'].upper()} -> {gname.upper()}")
+                        self.app.show_gesture_result(gname,co)
+                        self.app.play_sound("success")
+                        lat = self.event_latency(t0)
+                        self.app.log(f"GESTURE RECOGNIZED: {gname.upper()} ({co:.2f}, {self.classifier.last_tier}) - {format_breakdown(lat)}", latency=lat, config_version=r.get("config_version"))
+                    else:
+                        if early is not None:
+                            self.app.log(f"EARLY RESULT RETRACTED: {early['name'].upper()}")
+                        self.app.show_gesture_result("UNCLEAR",co,gname)
+                        self.app.play_sound("error")
+                        lat = self.event_latency(t0)
+                        self.app.log(f"Gesture unclear: {gname} (low confidence: {co:.2f}) - {format_breakdown(lat)}", latency=lat, config_version=r.get("config_version"))
+                    self.last_gesture_time=ct
+                else:
+                    self.app.log("Classification failed")
+                    self.app.show_gesture_result("ERROR",0)
+
+    def early_classify(self, r):
+        # Provisional result from a partial capture window (EARLY_EXIT).
+        t0 = self.source.now()
+        f = r.get("frames",[])
+        ci,co,mg = self.classifier.classify_partial(f)
+        self.record_prediction("early", ci, co)
+        if ci is None or co< EARLY_EXIT["confidence"] or mg< EARLY_EXIT["margin"]:
+            return
+        name = self.label_name(ci, r)
+        self.provisional = {"name": name, "confidence": co, "frames": len(f)}
+        self.app.show_gesture_result(name,co)
+        self.app.play_sound("success")
+        lat = self.event_latency(t0)
+        self.app.log(f"EARLY RESULT: {name.upper()} ({co:.2f}, margin {mg:.2f}, {len(f)} frames) - {format_breakdown(lat)}", latency=lat, config_version=r.get("config_version"))
+
+    def reload_config(self):
+        # New pipeline configuration from the watched file, applied between frames.
+        try:
+            cfg = self.config_watcher.poll()
+        except ValueError as e:
+            self.app.log(f"Pipeline config rejected, keeping version {self.config_watcher.current.version}: {e}",
+                         config_error=str(e))
+            return
+        if cfg is None:
+            return
+        self.processor.apply_config(cfg)
+        self.classifier.apply_config(cfg)
+        self.app.log(f"Pipeline config version {cfg.version} applied ({cfg.source})", config_version=cfg.version)
+
+    def event_latency(self, started):
+        # Breakdown from the image timestamp of the current frame to now.
+        return self.latency.event_breakdown(self.stamps, started, self.source.now())
+
+    def label_name(self, ci, r):
+        name = self.classifier.class_labels[ci]
+        return mirror_label(name, r.get("mirrored", False))
+
+    def draw_skeleton_view(self, frame):
+        """The preview at display resolution with the skeletons of all tracked bodies (see skeleton_overlay.py)."""
+        with tracer.span("draw_skeleton_view"):
+            return self.overlay.render(frame, self.body_data)
 
-    def extract_keypoints(self, bodies, region):
+    def extract_keypoints(self, bodies, region, ts=None):
         try:
-            idxs = BODY_REGIONS[region]
-            kpts = np.zeros(len(idxs)*3,dtype=np.float32)
-            fullk = np.zeros(38*3,dtype=np.float32)
-            if bodies.is_new and bodies.body_list and len(bodies.body_list)>0:
-                b = bodies.body_list[0]
-                for i,j in enumerate(idxs):
-                    if j<len(b.keypoint):
-                        p = b.keypoint[j]
-                        if not np.all(np.abs(p)<0.001):
-                            kpts[i*3:(i+1)*3] = p
-                for i2 in range(len(b.keypoint)):
-                    p2 = b.keypoint[i2]
-                    if not np.all(np.abs(p2)<0.001):
-                        fullk[i2*3:(i2+1)*3] = p2
-                self.processor.full_body_kpts = fullk.copy()
-                self.app.frame_count = (self.app.frame_count+1) if hasattr(self.app,"frame_count") else 1
-            return kpts
+            n = self.body_data.update(bodies)
+            if n==0:
+                return self.body_data.region_keypoints(region, None)
+            if self.joint_filter is not None and ts is not None:
+                self.joint_filter.apply(self.body_data, ts)
+            self.processor.full_body_kpts = self.body_data.full_body(0)
+            self.app.frame_count = (self.app.frame_count+1) if hasattr(self.app,"frame_count") else 1
+            return self.body_data.region_keypoints(region, 0)
         except:
             if DEBUG:
                 traceback.print_exc()
-            return np.zeros(len(idxs)*3, dtype=np.float32)
+            return np.zeros(len(BODY_REGIONS[region])*3, dtype=np.float32)
 
     def stop(self):
         self.running = False
@@ -0,0 +1,420 @@
+# inference_worker.py
+
+from config import (
+    DEBUG, MODEL_PATH, INFERENCE_WORKER
+)
+import os
+import sys
+import time
+import argparse
+import threading
+import weakref
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+EMBED_CAPACITY = 1024  # floats per window reserved for an embedding
+
+
+class WorkerFailure(RuntimeError):
+    """The worker process died, hung or closed its pipe."""
+
+
+###############################################################################
+# Worker process: loads the model, attaches to the shared-memory ring and
+# answers requests. Requests are tuples over a Pipe:
+#   ("attach", shm_name, slots, max_batch)
+#   ("predict", seq, slot, n, with_embedding) -> ("done", seq) | ("error", seq, msg)
+#   ("embed", seq, layer)                     -> ("embed", seq, dim, layer_name)
+#   ("echo", seq)                             -> ("done", seq)   (transport only)
+#   ("crash",)                                   exits at once (tests restarts)
+#   ("stop",)
+###############################################################################
+def _views(buf, slots, max_batch, in_shape, n_out):
+    inp = np.ndarray((slots, max_batch) + tuple(in_shape), dtype=np.float32, buffer=buf)
+    out = np.ndarray((slots, max_batch, n_out + EMBED_CAPACITY), dtype=np.float32, buffer=buf, offset=inp.nbytes)
+    return inp, out
+
+
+def _ring_bytes(slots, max_batch, in_shape, n_out):
+    return 4 * slots * max_batch * (int(np.prod(in_shape)) + n_out + EMBED_CAPACITY)
+
+
+def _worker_main(conn, model_path):
+    import tensorflow as tf
+    import cpu_layout
+    from embedding_index import embedding_model
+    try:
+        cpu_layout.apply()
+        cpu_layout.pin("tf")
+        model = tf.keras.models.load_model(model_path)
+        in_shape = tuple(model.input_shape[1:])
+        n_out = model.output_shape[-1]
+        conn.send(("ready", tuple(model.input_shape), tuple(model.output_shape), os.getpid()))
+    except Exception as e:
+        conn.send(("error", None, f"{type(e).__name__}: {e}"))
+        return
+    shm = inp = out = None
+    embedder = None
+    try:
+        while True:
+            msg = conn.recv()
+            kind = msg[0]
+            if kind == "predict":
+                _, seq, slot, n, with_emb = msg
+                try:
+                    x = inp[slot, :n]
+                    if with_emb:
+                        emb, probs = embedder.predict(x, verbose=0)
+                        emb = emb.reshape(n, -1)
+                        out[slot, :n, n_out:n_out+emb.shape[1]] = emb
+                    else:
+                        probs = model.predict(x, verbose=0)
+                    out[slot, :n, :n_out] = probs
+                    conn.send(("done", seq))
+                except Exception as e:
+                    conn.send(("error", seq, f"{type(e).__name__}: {e}"))
+            elif kind == "echo":
+                conn.send(("done", msg[1]))
+            elif kind == "attach":
+                _, name, slots, max_batch = msg
+                shm = shared_memory.SharedMemory(name=name)
+                inp, out = _views(shm.buf, slots, max_batch, in_shape, n_out)
+                conn.send(("attached",))
+            elif kind == "embed":
+                _, seq, layer = msg
+                try:
+                    embedder, name = embedding_model(model, layer)
+                    dim = int(np.prod(embedder.output_shape[0][1:]))
+                    if dim > EMBED_CAPACITY:
+                        raise ValueError(f"embedding of {dim} floats exceeds the slot capacity ({EMBED_CAPACITY})")
+                    conn.send(("embed", seq, dim, name))
+                except Exception as e:
+                    embedder = None
+                    conn.send(("error", seq, f"{type(e).__name__}: {e}"))
+            elif kind == "crash":
+                os._exit(3)
+            elif kind == "stop":
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        inp = out = None
+        if shm is not None:
+            shm.close()
+
+
+###############################################################################
+# RemoteModel: a Keras-model stand-in backed by the worker process.
+#
+# predict(x) and input_shape / output_shape behave like the Keras model's, so
+# GestureClassifier and model_swap.py use it unchanged; embedding_model()
+# (embedding_index.py) asks the worker to build the embedding model instead.
+# Windows are written straight into a ring slot of the shared memory block
+# and predictions read back from it; only (seq, slot, n) tuples cross the
+# pipe. submit() / result() let several requests be in flight (one per slot).
+# A dead, hung (timeout_s) or disconnected worker is restarted on the same
+# shared memory and the request retried once; model errors are raised as is.
+###############################################################################
+class RemoteModel:
+    def __init__(self, model_path=MODEL_PATH, settings=INFERENCE_WORKER):
+        self.model_path = model_path
+        self.settings = settings
+        self.slots = settings["slots"]
+        self.max_batch = settings["max_batch"]
+        self._ctx = mp.get_context("spawn")
+        self._lock = threading.RLock()
+        self._seq = 0
+        self._next_slot = 0
+        self._busy = {}       # slot -> seq in flight
+        self._replies = {}    # seq -> reply not collected yet
+        self._slot_of = {}    # seq -> (slot, n, with_embedding)
+        self.proc = None
+        self.conn = None
+        self.shm = None
+        self._handles = {}    # current worker, for the finalizer
+        self.input_shape = None
+        self.output_shape = None
+        self.embed_layer = None
+        self.embed_dim = 0
+        self.requests = 0
+        self.restarts = 0
+        self.last_error = None
+        self._start()
+
+    def _start(self):
+        parent, child = self._ctx.Pipe()
+        self.proc = self._ctx.Process(target=_worker_main, args=(child, self.model_path),
+                                      name="InferenceWorker", daemon=True)
+        self.proc.start()
+        child.close()
+        self.conn = parent
+        self._handles["proc"], self._handles["conn"] = self.proc, parent
+        try:
+            msg = self._recv(self.settings["start_timeout_s"])
+        except WorkerFailure as e:
+            self._kill()
+            raise RuntimeError(f"Inference worker did not start (exit code {self.proc.exitcode}): {e}")
+        if msg[0] != "ready":
+            self._kill()
+            raise RuntimeError(f"Inference worker could not load {self.model_path}: {msg[2]}")
+        _, in_shape, out_shape, self.pid = msg
+        if self.shm is None:
+            self.input_shape, self.output_shape = in_shape, out_shape
+            n_out = out_shape[-1]
+            self.shm = shared_memory.SharedMemory(create=True, size=_ring_bytes(self.slots, self.max_batch, in_shape[1:], n_out))
+            self._inp, self._out = _views(self.shm.buf, self.slots, self.max_batch, in_shape[1:], n_out)
+            self._finalizer = weakref.finalize(self, _release, self.shm, self._handles)
+        elif (in_shape, out_shape) != (self.input_shape, self.output_shape):
+            self._kill()
+            raise RuntimeError(f"Restarted worker has shapes {in_shape} -> {out_shape}, expected {self.input_shape} -> {self.output_shape}")
+        self.conn.send(("attach", self.shm.name, self.slots, self.max_batch))
+        self._recv(self.settings["start_timeout_s"])
+        if self.embed_layer is not None:
+            self._configure_embedding(self.embed_layer)
+
+    def _recv(self, timeout):
+        try:
+            if not self.conn.poll(timeout):
+                raise WorkerFailure(f"no reply within {timeout:.1f} s")
+            return self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise WorkerFailure(f"worker pipe closed ({e})")
+
+    def _kill(self):
+        if self.proc is not None and self.proc.is_alive():
+            self.proc.kill()
+        if self.proc is not None:
+            self.proc.join(timeout=5.0)
+        if self.conn is not None:
+            self.conn.close()
+
+    def restart(self, reason=""):
+        with self._lock:
+            self.last_error = reason
+            if self.restarts >= self.settings["max_restarts"]:
+                raise RuntimeError(f"Inference worker failed {self.restarts} times, giving up: {reason}")
+            self.restarts += 1
+            self._kill()
+            self._busy.clear()
+            self._replies.clear()
+            self._slot_of.clear()
+            self._start()
+
+    def submit(self, x, with_embedding=False):
+        """Copy up to max_batch windows into the next free slot and send the request. Returns a ticket."""
+        x = np.asarray(x, dtype=np.float32)
+        n = len(x)
+        if n > self.max_batch:
+            raise ValueError(f"batch of {n} > max_batch {self.max_batch}; use predict()")
+        with self._lock:
+            slot = self._next_slot
+            if slot in self._busy:
+                self._collect(self._busy[slot])  # ring full: wait for the oldest request in it
+            self._next_slot = (slot + 1) % self.slots
+            self._seq += 1
+            seq = self._seq
+            self._inp[slot, :n] = x
+            try:
+                self.conn.send(("predict", seq, slot, n, with_embedding))
+            except (OSError, ValueError) as e:
+                raise WorkerFailure(f"worker pipe closed ({e})")
+            self._busy[slot] = seq
+            self._slot_of[seq] = (slot, n, with_embedding)
+            self.requests += 1
+            return seq
+
+    def _collect(self, seq):
+        # Read replies until seq's arrives; others are kept for their callers.
+        while seq not in self._replies:
+            reply = self._recv(self.settings["timeout_s"])
+            self._replies[reply[1]] = reply
+        return self._replies.pop(seq)
+
+    def result(self, ticket):
+        """Probabilities (n, C), or [embeddings (n, E), probabilities] for an embedding request."""
+        with self._lock:
+            reply = self._collect(ticket)
+            slot, n, with_emb = self._slot_of.pop(ticket)
+            if self._busy.get(slot) == ticket:
+                del self._busy[slot]
+            if reply[0] == "error":
+                raise RuntimeError(f"Inference worker: {reply[2]}")
+            c = self.output_shape[-1]
+            probs = self._out[slot, :n, :c].copy()
+            if with_emb:
+                return [self._out[slot, :n, c:c+self.embed_dim].copy(), probs]
+            return probs
+
+    def predict(self, x, verbose=0, with_embedding=False):
+        x = np.asarray(x, dtype=np.float32)
+        for attempt in (0, 1):
+            try:
+                with self._lock:
+                    tickets = [self.submit(x[i:i+self.max_batch], with_embedding)
+                               for i in range(0, len(x), self.max_batch)]
+                    parts = [self.result(t) for t in tickets]
+                break
+            except WorkerFailure as e:
+                self.restart(str(e))  # also after the retry: never leave a hung worker behind
+                if attempt:
+                    raise
+        if with_embedding:
+            return [np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])]
+        return np.concatenate(parts)
+
+    def _configure_embedding(self, layer):
+        with self._lock:
+            self._seq += 1
+            self.conn.send(("embed", self._seq, layer))
+            reply = self._collect(self._seq)
+            if reply[0] == "error":
+                raise RuntimeError(f"Inference worker: {reply[2]}")
+            _, _, self.embed_dim, name = reply
+            self.embed_layer = layer
+            return name
+
+    def embedding_model(self, layer=-2):
+        """Same contract as embedding_index.embedding_model: (model returning [embedding, probs], layer name)."""
+        return _RemoteEmbedder(self), self._configure_embedding(layer)
+
+    def echo(self):
+        """Round trip without inference (transport overhead)."""
+        with self._lock:
+            self._seq += 1
+            self.conn.send(("echo", self._seq))
+            self._collect(self._seq)
+
+    def crash(self):
+        """Make the worker exit (for testing the restart path)."""
+        with self._lock:
+            self.conn.send(("crash",))
+            self.proc.join(timeout=5.0)
+
+    def stats(self):
+        return {"pid": self.pid, "alive": self.proc.is_alive(), "requests": self.requests,
+                "restarts": self.restarts, "last_error": self.last_error}
+
+    def close(self):
+        with self._lock:
+            try:
+                self.conn.send(("stop",))
+                self.proc.join(timeout=2.0)
+            except (OSError, ValueError):
+                pass
+            self._kill()
+            self._inp = self._out = None
+            self._finalizer()
+
+
+class _RemoteEmbedder:
+    def __init__(self, remote):
+        self.remote = remote
+
+    def predict(self, x, verbose=0):
+        return self.remote.predict(x, with_embedding=True)
+
+
+def _release(shm, handles):
+    # Closing the pipe makes the worker exit; kill it if it is stuck.
+    try:
+        handles["conn"].close()
+        handles["proc"].join(timeout=2.0)
+        if handles["proc"].is_alive():
+            handles["proc"].kill()
+    except (OSError, ValueError, AssertionError):
+        pass
+    try:
+        shm.unlink()
+        shm.close()
+    except (OSError, BufferError):
+        pass
+
+
+def load_model(model_path=MODEL_PATH):
+    """The model to run: a RemoteModel when INFERENCE_WORKER is enabled, else the Keras model in-process."""
+    if INFERENCE_WORKER["enabled"]:
+        return RemoteModel(model_path)
+    import tensorflow as tf
+    return tf.keras.models.load_model(model_path)
+
+
+###############################################################################
+# Benchmark: round trip through the worker vs. in-process predict, paced at
+# the camera rate, with a Python thread keeping the main process busy (the
+# Tk loop / feature extraction stand-in that contends for the GIL).
+#
+#   python inference_worker.py --bench [--model PATH] [--frames 300]
+###############################################################################
+def _paced(fn, fps, n_frames):
+    lat = np.zeros(n_frames)
+    period = 1.0 / fps
+    next_t = time.perf_counter()
+    for i in range(n_frames):
+        now = time.perf_counter()
+        if next_t > now:
+            time.sleep(next_t - now)
+        next_t += period
+        t0 = time.perf_counter()
+        fn()
+        lat[i] = (time.perf_counter() - t0) * 1000
+    return lat
+
+
+def _gil_load(stop):
+    x = 0
+    while not stop.is_set():
+        for i in range(2000):
+            x += i * i
+
+
+def bench(model_path, n_frames=300, fps_list=(30, 60)):
+    import tempfile
+    import tensorflow as tf
+    if not model_path or not os.path.exists(model_path):
+        from cpu_tune import _stand_in_model
+        model_path = os.path.join(tempfile.mkdtemp(), "stand_in.h5")
+        _stand_in_model().save(model_path)
+        print(f"Model not found, benchmarking a stand-in LSTM ({model_path})")
+    local = tf.keras.models.load_model(model_path)
+    remote = RemoteModel(model_path)
+    x = np.random.default_rng(0).normal(size=(1,) + tuple(local.input_shape[1:])).astype(np.float32)
+    local.predict(x, verbose=0)
+    remote.predict(x)
+    diff = float(np.abs(local.predict(x, verbose=0) - remote.predict(x)).max())
+    print(f"max |in-process - worker| = {diff:.2e}")
+    print(f"{'mode':<24}{'fps':>5}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    for busy in (False, True):
+        stop = threading.Event()
+        if busy:
+            threading.Thread(target=_gil_load, args=(stop,), daemon=True).start()
+        tag = " + busy main" if busy else ""
+        for fps in fps_list:
+            for name, fn in (("in-process" + tag, lambda: local.predict(x, verbose=0)),
+                             ("worker" + tag, lambda: remote.predict(x)),
+                             ("transport only" + tag, remote.echo)):
+                lat = _paced(fn, fps, n_frames)
+                print(f"{name:<24}{fps:>5}{np.percentile(lat, 50):>9.2f}{np.percentile(lat, 95):>9.2f}{lat.max():>9.2f}")
+        stop.set()
+    t0 = time.perf_counter()
+    remote.crash()
+    remote.predict(x)
+    print(f"Worker crash -> restarted and answered in {(time.perf_counter() - t0):.1f} s ({remote.stats()['restarts']} restart)")
+    remote.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Out-of-process inference worker")
+    parser.add_argument("--bench", action="store_true", help="round trip vs. in-process predict at 30 and 60 FPS")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--frames", type=int, default=300)
+    args = parser.parse_args(argv)
+    if args.bench:
+        bench(args.model, args.frames)
+        return 0
+    parser.print_help()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
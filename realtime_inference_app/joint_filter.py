@@ -0,0 +1,100 @@
+# joint_filter.py
+
+from config import (
+    DEBUG, JOINT_FILTER, MAX_TRACKED_BODIES
+)
+import numpy as np
+
+from body_data import NUM_KEYPOINTS
+
+
+###############################################################################
+# OneEuroFilterBank: adaptive jitter filter for every joint of every body.
+#
+# One-Euro filter (Casiez et al. 2012) per coordinate: a low-pass whose cutoff
+# rises with the joint's speed, so the skeleton is steady at rest and lags
+# little during a swipe. All (bodies, joints, 3) values are updated with one
+# set of NumPy operations per frame, on the camera timestamps, so the cost does
+# not depend on how many joints or bodies are tracked (up to max_bodies).
+#
+# apply() filters a BodyDataBuffer in place and fills its velocities with the
+# filter's smoothed derivative (camera units per second of camera time). beta
+# is per m/s whatever the camera units; units_per_m converts. A body slot
+# whose id changes, or a joint that goes missing, restarts from the raw value.
+###############################################################################
+class OneEuroFilterBank:
+    def __init__(self, max_bodies=MAX_TRACKED_BODIES, n_joints=NUM_KEYPOINTS,
+                 min_cutoff=JOINT_FILTER["min_cutoff"], beta=JOINT_FILTER["beta"],
+                 d_cutoff=JOINT_FILTER["d_cutoff"], units_per_m=JOINT_FILTER["units_per_m"]):
+        self.min_cutoff = min_cutoff
+        self.beta = beta / units_per_m  # per camera unit / s
+        self.d_cutoff = d_cutoff
+        shape = (max_bodies, n_joints, 3)
+        self.x = np.zeros(shape, dtype=np.float32)      # filtered positions
+        self.dx = np.zeros(shape, dtype=np.float32)     # filtered derivative
+        self.active = np.zeros(shape[:2], dtype=bool)   # joint has filter state
+        self.ids = np.full(max_bodies, -1, dtype=np.int64)
+        self.t = np.zeros(max_bodies, dtype=np.float64)
+        self._raw_dx = np.zeros(shape, dtype=np.float32)
+        self._speed = np.zeros(shape[:2], dtype=np.float32)
+        self._a = np.zeros(shape[:2] + (1,), dtype=np.float32)
+
+    def reset(self):
+        self.active.fill(False)
+        self.ids.fill(-1)
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        # Smoothing factor of a first-order low-pass at `cutoff` Hz.
+        tau = 1.0 / (2.0 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def update(self, x, valid, ids, t):
+        """
+        One step for n bodies: x (n, J, 3) raw positions, valid (n, J), ids (n,),
+        t camera time in seconds. Returns filtered positions and derivative
+        (views, valid until the next update).
+        """
+        n = len(x)
+        fx, fdx, act = self.x[:n], self.dx[:n], self.active[:n]
+
+        # New person in a slot, or first frame: start over.
+        act[self.ids[:n] != ids] = False
+        self.ids[:n] = ids
+        dt = (t - self.t[:n]).astype(np.float32)
+        # Duplicate or out-of-order timestamps: keep the last output.
+        stale = dt <= 0.0
+        dt[stale] = 1.0
+        self.t[:n] = np.where(stale, self.t[:n], t)
+
+        fresh = valid & ~act
+        keep = act & valid & ~stale[:, None]
+
+        a_d = self._alpha(self.d_cutoff, dt)[:, None, None]
+        raw_dx = self._raw_dx[:n]
+        np.subtract(x, fx, out=raw_dx)
+        raw_dx /= dt[:, None, None]
+        edx = fdx + a_d * (raw_dx - fdx)
+        speed = np.sqrt(np.sum(edx * edx, axis=-1), out=self._speed[:n])
+        a = self._a[:n]
+        a[..., 0] = self._alpha(self.min_cutoff + self.beta * speed, dt[:, None])
+        ex = fx + a * (x - fx)
+
+        np.copyto(fx, ex, where=keep[..., None])
+        np.copyto(fdx, edx, where=keep[..., None])
+        np.copyto(fx, x, where=fresh[..., None])
+        np.copyto(fdx, 0.0, where=fresh[..., None])
+        act[:] = valid
+        np.copyto(fx, 0.0, where=~valid[..., None])
+        np.copyto(fdx, 0.0, where=~valid[..., None])
+        return fx, fdx
+
+    def apply(self, buf, t):
+        """Filter the bodies of a BodyDataBuffer in place at camera time t (seconds)."""
+        n = buf.count
+        if n == 0:
+            return 0
+        fx, fdx = self.update(buf.keypoints[:n], buf.valid[:n], buf.ids[:n], t)
+        buf.keypoints[:n] = fx
+        buf.velocities[:n] = fdx
+        return n
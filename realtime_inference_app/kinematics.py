@@ -0,0 +1,74 @@
+# kinematics.py
+
+from config import (
+    BODY_REGIONS, ARM_CHAINS, REGION_ARMS, MIRRORED_ARMS, MIRROR_LABELS
+)
+import numpy as np
+
+FORWARD = np.array([0.0, 0.0, -1.0], dtype=np.float32)
+
+
+###############################################################################
+# Vectorized kinematics over arbitrary joint sets.
+#
+# A region's keypoints are handled as a (J, 3) array. Arms are gathered from
+# it as (A, 3, 3) shoulder/elbow/wrist chains, so every arm of a person is
+# processed in one batched pass. Mirrored arms are returned in the model's
+# (right-arm) frame by negating x.
+###############################################################################
+def arm_layout(region):
+    """
+    Arms tracked for a region: their names, an (A, 3) array of indices into
+    the region's joint list, and an (A,) mirrored flag.
+    """
+    joints = list(BODY_REGIONS[region])
+    names = [a for a in REGION_ARMS.get(region, []) if all(j in joints for j in ARM_CHAINS[a])]
+    idx = np.array([[joints.index(j) for j in ARM_CHAINS[a]] for a in names], dtype=np.intp).reshape(-1, 3)
+    mirrored = np.array([a in MIRRORED_ARMS for a in names], dtype=bool)
+    return names, idx, mirrored
+
+
+def mirror_x(points, mirrored):
+    """Copy of points (A, ..., 3) with x negated for the arms flagged in mirrored (A,)."""
+    out = np.array(points, dtype=np.float32)
+    out[mirrored, ..., 0] *= -1.0
+    return out
+
+
+def mirror_label(label, mirrored):
+    return MIRROR_LABELS.get(label, label) if mirrored else label
+
+
+def joint_velocities(current, previous, dt):
+    """Per-joint finite-difference velocity of (J, 3) positions."""
+    return (current - previous) / dt
+
+
+def arm_chains(joints_xyz, idx, mirrored):
+    """(J, 3) region joints -> (A, 3, 3) shoulder/elbow/wrist chains in the model frame."""
+    return mirror_x(joints_xyz[idx], mirrored)
+
+
+def _norm(v):
+    return np.sqrt(np.sum(v * v, axis=-1))
+
+
+def arm_pose_metrics(chains, pelvis):
+    """
+    Ready-pose metrics for (A, 3, 3) chains and (A, 3) pelvis positions:
+    extension ratio, torso-arm angle in degrees and forward dot, each (A,).
+    """
+    s, e, w = chains[:, 0], chains[:, 1], chains[:, 2]
+    arm = w - s
+    al = _norm(arm)
+    d_arm = _norm(e - s) + _norm(w - e)
+    ext = np.where(d_arm > 1e-6, al / np.where(d_arm > 1e-6, d_arm, 1.0), 0.0)
+
+    torso = s - pelvis
+    tl = _norm(torso)
+    ok = (tl > 1e-6) & (al > 1e-6)
+    c = np.clip(np.sum(torso * arm, axis=-1) / np.where(ok, tl * al, 1.0), -1.0, 1.0)
+    deg = np.where(ok, np.degrees(np.arccos(c)), 0.0)
+
+    fdot = np.where(al > 1e-6, (arm @ FORWARD) / np.where(al > 1e-6, al, 1.0), 0.0)
+    return ext, deg, fdot
@@ -0,0 +1,142 @@
+# latency.py
+
+from config import (
+    DEBUG, CAMERA_FPS, LATENCY_WINDOW
+)
+import numpy as np
+
+FRAME_STAGES = ["capture", "tracking", "processing", "total"]
+EVENT_STAGES = ["capture", "tracking", "processing", "queue", "inference", "total"]
+
+
+class FrameStamps:
+    """
+    Times of one frame through the pipeline, all on the frame source's clock
+    (seconds): cam_ts is the image timestamp, grabbed when grab() returned,
+    bodies when body tracking results were retrieved, processed when
+    GestureProcessor was done with the frame.
+    """
+    __slots__ = ("index", "cam_ts", "grabbed", "bodies", "processed")
+
+    def __init__(self):
+        self.index = 0
+        self.cam_ts = self.grabbed = self.bodies = self.processed = 0.0
+
+
+###############################################################################
+# LatencyMonitor: photon-to-event latency accounting.
+#
+# Per frame it checks the image timestamp against the previous one (a gap of
+# more than one frame period counts the missing frames as dropped, a repeated
+# timestamp counts as duplicated) and records the capture / tracking /
+# processing split. Gesture events get a full breakdown from the image
+# timestamp of the frame that completed them. Both go into fixed-size ring
+# buffers; summary() gives rolling percentiles over them.
+###############################################################################
+class LatencyMonitor:
+    def __init__(self, fps=CAMERA_FPS, window=LATENCY_WINDOW):
+        self.period = 1.0 / fps
+        self.frames = 0      # frames processed
+        self.received = 0    # distinct frames delivered by the source
+        self.dropped = 0
+        self.duplicated = 0
+        self.last_ts = None
+        self._frame_ms = np.zeros((window, len(FRAME_STAGES)))
+        self._frame_ts = np.zeros(window)
+        self._frame_pos = 0
+        self._frame_n = 0
+        self._event_ms = np.zeros((window, len(EVENT_STAGES)))
+        self._event_pos = 0
+        self._event_n = 0
+
+    def check_timestamp(self, cam_ts):
+        """Count gaps before this frame. Returns False for a duplicated frame."""
+        last, self.last_ts = self.last_ts, cam_ts
+        if last is None:
+            self.received += 1
+            return True
+        gap = cam_ts - last
+        if gap < 0.5 * self.period:
+            self.duplicated += 1
+            self.last_ts = last
+            return False
+        self.received += 1
+        missing = int(round(gap / self.period)) - 1
+        if missing > 0:
+            self.dropped += missing
+        return True
+
+    def frame_done(self, s):
+        i = self._frame_pos
+        row = self._frame_ms[i]
+        row[0] = s.grabbed - s.cam_ts
+        row[1] = s.bodies - s.grabbed
+        row[2] = s.processed - s.bodies
+        row[3] = s.processed - s.cam_ts
+        row *= 1000.0
+        self._frame_ts[i] = s.cam_ts
+        self._frame_pos = (i + 1) % len(self._frame_ms)
+        self._frame_n = min(self._frame_n + 1, len(self._frame_ms))
+        self.frames += 1
+
+    def event_breakdown(self, s, started, finished):
+        """
+        Latency of an event emitted while handling frame s: started / finished
+        bracket its handling (classification, UI, sound). Returns ms per stage.
+        """
+        i = self._event_pos
+        row = self._event_ms[i]
+        row[0] = s.grabbed - s.cam_ts
+        row[1] = s.bodies - s.grabbed
+        row[2] = s.processed - s.bodies
+        row[3] = started - s.processed
+        row[4] = finished - started
+        row[5] = finished - s.cam_ts
+        row *= 1000.0
+        self._event_pos = (i + 1) % len(self._event_ms)
+        self._event_n = min(self._event_n + 1, len(self._event_ms))
+        out = {k: round(float(v), 2) for k, v in zip(EVENT_STAGES, row)}
+        out["frame"] = s.index
+        out["cam_ts"] = s.cam_ts
+        return out
+
+    @staticmethod
+    def _percentiles(samples, stages):
+        if len(samples) == 0:
+            return {}
+        p = np.percentile(samples, [50, 95], axis=0)
+        mx = samples.max(axis=0)
+        return {k: {"p50": round(float(p[0, j]), 2), "p95": round(float(p[1, j]), 2), "max": round(float(mx[j]), 2)}
+                for j, k in enumerate(stages)}
+
+    def summary(self):
+        n = self._frame_n
+        ts = self._frame_ts[:n]
+        fps = (n - 1) / (ts.max() - ts.min()) if n > 1 and ts.max() > ts.min() else 0.0
+        seen = self.received + self.dropped
+        return {
+            "frames": self.frames,
+            "received": self.received,
+            "dropped": self.dropped,
+            "duplicated": self.duplicated,
+            "drop_rate": self.dropped / seen if seen else 0.0,
+            "fps": round(fps, 2),
+            "frame_ms": self._percentiles(self._frame_ms[:n], FRAME_STAGES),
+            "event_ms": self._percentiles(self._event_ms[:self._event_n], EVENT_STAGES),
+        }
+
+
+def format_breakdown(lat):
+    parts = ", ".join(f"{k} {lat[k]:.0f}" for k in EVENT_STAGES[:-1])
+    return f"{lat['total']:.0f} ms ({parts})"
+
+
+def format_summary(s):
+    f = s["frame_ms"].get("total")
+    e = s["event_ms"].get("total")
+    txt = f"Latency: {s['fps']:.1f} fps, dropped {s['dropped']} ({s['drop_rate']:.1%}), duplicated {s['duplicated']}"
+    if f:
+        txt += f", frame p50/p95 {f['p50']:.0f}/{f['p95']:.0f} ms"
+    if e:
+        txt += f", event p50/p95 {e['p50']:.0f}/{e['p95']:.0f} ms"
+    return txt
@@ -0,0 +1,120 @@
+# load_shedding.py
+
+from config import (
+    DEBUG, CAMERA_FPS, LOAD_SHEDDING, EARLY_EXIT
+)
+
+SHED_LEVELS = ["full", "no_preview", "reduced_early_exit", "no_metrics", "reduced_processing"]
+
+
+###############################################################################
+# LoadShedder: keeps the per-frame work inside the frame budget.
+#
+# InferenceThread reports the time spent in each stage of a frame (add) and
+# the frame's total busy time, i.e. everything between grab() returning and
+# the next grab() (frame_done). The busy time is smoothed; when it stays
+# above overload * budget the level goes up by one, when it stays below
+# recover * budget it goes down by one, with settle_frames in between so the
+# effect of a change shows before the next one. Each level keeps the ones
+# below it: gesture detection itself is never shed, visuals go first.
+#   1 no_preview          camera preview not retrieved or drawn
+#   2 reduced_early_exit  provisional EARLY_EXIT predictions during a capture
+#                         only every early_exit_every frames (the final
+#                         classification is unchanged); skipped when
+#                         EARLY_EXIT is off, as it would shed nothing
+#   3 no_metrics          UI status/metrics refreshed every metrics_every frames
+#   4 reduced_processing  while idle (processor WAITING, no ready pose being
+#                         counted), bodies retrieved, filtered and processed
+#                         every processing_every frames. From the first ready
+#                         frame to the end of the capture every frame is
+#                         processed, so frame counts and the capture window
+#                         keep their timing. The SDK still runs body tracking
+#                         inside every grab(); only our own work goes down.
+###############################################################################
+class LoadShedder:
+    def __init__(self, fps=CAMERA_FPS, settings=LOAD_SHEDDING):
+        self.settings = settings
+        self.enabled = settings["enabled"]
+        self.budget_ms = settings["budget_ms"] or 1000.0 / fps
+        self.level = 0
+        self.cost_ms = None       # smoothed busy time per frame
+        self.stage_ms = {}        # smoothed time per stage
+        self._frame = {}
+        self._over = 0
+        self._under = 0
+        self._settle = 0
+        self.frames = 0
+        self.transitions = 0
+        self.frames_at_level = [0] * len(SHED_LEVELS)
+
+    def add(self, stage, seconds):
+        self._frame[stage] = self._frame.get(stage, 0.0) + seconds * 1000.0
+
+    def frame_done(self, busy_s):
+        """Account one frame. Returns the new level when it changed, else None."""
+        a = self.settings["alpha"]
+        busy_ms = busy_s * 1000.0
+        self.cost_ms = busy_ms if self.cost_ms is None else self.cost_ms + a * (busy_ms - self.cost_ms)
+        for k in set(self.stage_ms) | set(self._frame):
+            v = self._frame.get(k, 0.0)
+            self.stage_ms[k] = self.stage_ms[k] + a * (v - self.stage_ms[k]) if k in self.stage_ms else v
+        self._frame.clear()
+        self.frames += 1
+        self.frames_at_level[self.level] += 1
+        return self._adjust() if self.enabled else None
+
+    def _adjust(self):
+        s = self.settings
+        if self._settle > 0:
+            self._settle -= 1
+            return None
+        if self.cost_ms > s["overload"] * self.budget_ms:
+            self._over, self._under = self._over + 1, 0
+        elif self.cost_ms < s["recover"] * self.budget_ms:
+            self._over, self._under = 0, self._under + 1
+        else:
+            self._over = self._under = 0
+        if self._over >= s["up_frames"] and self.level < len(SHED_LEVELS) - 1:
+            return self._set_level(self._step(self.level, 1))
+        if self._under >= s["down_frames"] and self.level > 0:
+            return self._set_level(self._step(self.level, -1))
+        return None
+
+    @staticmethod
+    def _step(level, d):
+        level += d
+        if level == 2 and not EARLY_EXIT["enabled"]:
+            level += d
+        return level
+
+    def _set_level(self, level):
+        self.level = level
+        self._over = self._under = 0
+        self._settle = self.settings["settle_frames"]
+        self.transitions += 1
+        return level
+
+    @property
+    def preview(self):
+        return self.level < 1
+
+    def early_exit_due(self, n_frames):
+        # n_frames: frames captured so far; the first partial window always runs.
+        return self.level < 2 or (n_frames - EARLY_EXIT["min_frames"]) % self.settings["early_exit_every"] == 0
+
+    def metrics_due(self, frame_index):
+        return self.level < 3 or frame_index % self.settings["metrics_every"] == 0
+
+    def processing_due(self, frame_index):
+        return self.level < 4 or frame_index % self.settings["processing_every"] == 0
+
+    def stats(self):
+        return {
+            "level": self.level,
+            "name": SHED_LEVELS[self.level],
+            "cost_ms": round(self.cost_ms, 2) if self.cost_ms is not None else None,
+            "budget_ms": round(self.budget_ms, 2),
+            "stage_ms": {k: round(v, 2) for k, v in self.stage_ms.items()},
+            "transitions": self.transitions,
+            "frames_at_level": dict(zip(SHED_LEVELS, self.frames_at_level))
+        }
@@ -1,7 +1,8 @@
 # main_app.py
 
 from config import (
-    DEBUG, WINDOW_SIZE, BODY_REGIONS, READY_POSE_THRESHOLDS, MODEL_PATH
+    DEBUG, WINDOW_SIZE, BODY_REGIONS, MODEL_PATH,
+    LOG_VIEW_LINES, LOG_REFRESH_MS
 )
 import os
 import sys
@@ -16,7 +17,7 @@ import cv2
 from collections import deque
 import traceback
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext, font
+from tkinter import ttk, messagebox, scrolledtext, font, filedialog
 from ttkthemes import ThemedTk
 from PIL import Image, ImageTk
 from scipy.spatial.distance import euclidean
@@ -24,14 +25,23 @@ from scipy.spatial.distance import euclidean
 from gesture_processor import GestureProcessor
 from gesture_classifier import GestureClassifier
 from inference_thread import InferenceThread
+from tracer import tracer
+from event_log import EventLog, format_entry
+import cpu_layout
+import inference_worker
 
 
 class GestureRecognitionApp:
+    preview_enabled= True
+
     def __init__(self, root, model):
         self.root= root
         self.model= model
+        self.event_log= EventLog()
+        self.log_view_seq= 0
         self.processor= GestureProcessor()
-        self.classifier= GestureClassifier(model)
+        self.classifier= GestureClassifier(model, class_labels=self.processor.feature_extractor.class_labels,
+                                           feature_columns=self.processor.feature_extractor.feature_columns)
         self.inference_thread= None
         self.sounds= {}
         self.sound_initialized= False
@@ -59,6 +69,7 @@ class GestureRecognitionApp:
         except:
             self.sound_initialized= False
         self.setup_ui()
+        self.refresh_log_view()
         self.start_inference()
 
     def setup_ui(self):
@@ -185,6 +196,10 @@ class GestureRecognitionApp:
         bf3.pack(pady=10)
         ttk.Button(bf3,text="Reset",command=self.reset_processor).pack(side="left",padx=5)
         ttk.Button(bf3,text="Clear Log",command=self.clear_log).pack(side="left",padx=5)
+        ttk.Button(bf3,text="Load Model",command=self.load_model_dialog).pack(side="left",padx=5)
+        ttk.Button(bf3,text="Rollback",command=self.rollback_model).pack(side="left",padx=5)
+        if tracer.enabled:
+            ttk.Button(bf3,text="Dump Trace",command=self.dump_trace).pack(side="left",padx=5)
         ttk.Button(bf3,text="Quit",command=self.on_closing).pack(side="left",padx=5)
 
         log_frame= ttk.LabelFrame(self.root,text="Log")
@@ -236,44 +251,54 @@ class GestureRecognitionApp:
             if DEBUG:
                 traceback.print_exc()
 
+    def draw_guides(self, img, s):
+        # Static part of the preview (angle guides), drawn once per display
+        # size; SkeletonOverlay caches it and copies it onto every frame.
+        h,w= img.shape[:2]
+        px= lambda v: int(v*s)
+        cx,cy= w//2, h-px(100)
+        ll= px(150)
+        cv2.line(img,(cx,cy),(cx,cy-ll),(150,150,150),1)
+        cv2.putText(img,"0°",(cx+px(5),cy-ll),cv2.FONT_HERSHEY_SIMPLEX,0.5*s,(150,150,150),1)
+        import math
+        a45= math.radians(45)
+        ex= int(cx + math.sin(a45)* ll)
+        ey= int(cy - math.cos(a45)* ll)
+        cv2.line(img,(cx,cy),(ex,ey),(100,100,255),1)
+        cv2.putText(img,"45°",(ex+px(5),ey),cv2.FONT_HERSHEY_SIMPLEX,0.5*s,(100,100,255),1)
+        a70= math.radians(70)
+        ex2= int(cx+ math.sin(a70)* ll)
+        ey2= int(cy- math.cos(a70)* ll)
+        cv2.line(img,(cx,cy),(ex2,ey2),(0,255,0),max(1,px(2)))
+        cv2.putText(img,"70° (threshold)",(ex2-px(45),ey2-px(10)),cv2.FONT_HERSHEY_SIMPLEX,0.5*s,(0,255,0),1)
+        cv2.line(img,(cx,cy),(cx+ll,cy),(255,255,0),1)
+        cv2.putText(img,"90°",(cx+ll+px(5),cy),cv2.FONT_HERSHEY_SIMPLEX,0.5*s,(255,255,0),1)
+        cv2.putText(img,"Hold arm horizontally for Ready Pose",(w//2-px(200),h-px(30)),cv2.FONT_HERSHEY_SIMPLEX,0.7*s,(255,255,255),max(1,px(2)))
+
     def update_camera_preview(self, frame):
+        # Everything is drawn at display resolution into the overlay's
+        # reused buffer (camera image, guides, skeletons, then the text).
         try:
-            h,w= frame.shape[:2]
-            disp= frame.copy()
+            it= self.inference_thread
+            disp= it.draw_skeleton_view(frame)
+            s= it.overlay.scale
+            px= lambda v: int(v*s)
+            h,w= disp.shape[:2]
             st= self.big_state_label.cget("text")
             isr= (self.ready_label.cget("text")=="Yes")
             ang= float(self.wpa_label.cget("text").replace("°",""))
-            cv2.putText(disp,f"State: {st}",(10,30),cv2.FONT_HERSHEY_SIMPLEX,0.7,(0,255,0),2)
-            ac= (0,255,0) if ang>= READY_POSE_THRESHOLDS["wrist_pelvis_angle"] else (0,0,255)
-            cv2.putText(disp,f"Horizontal Angle: {ang:.1f}°",(10,60),cv2.FONT_HERSHEY_SIMPLEX,0.7,ac,2)
+            cv2.putText(disp,f"State: {st}",(px(10),px(30)),cv2.FONT_HERSHEY_SIMPLEX,0.7*s,(0,255,0),max(1,px(2)))
+            ac= (0,255,0) if ang>= self.processor.config.ready_pose.wrist_pelvis_angle else (0,0,255)
+            cv2.putText(disp,f"Horizontal Angle: {ang:.1f}°",(px(10),px(60)),cv2.FONT_HERSHEY_SIMPLEX,0.7*s,ac,max(1,px(2)))
             rt= "READY POSE DETECTED" if isr else "Extend arm horizontally"
             rc= (0,255,0) if isr else (0,0,255)
-            cv2.putText(disp,rt,(w//2-150,30),cv2.FONT_HERSHEY_SIMPLEX,0.7,rc,2)
-            cx,cy= w//2, h-100
-            ll= 150
-            cv2.line(disp,(cx,cy),(cx,cy-ll),(150,150,150),1)
-            cv2.putText(disp,"0°",(cx+5,cy-ll),cv2.FONT_HERSHEY_SIMPLEX,0.5,(150,150,150),1)
-            import math
-            a45= math.radians(45)
-            ex= int(cx + math.sin(a45)* ll)
-            ey= int(cy - math.cos(a45)* ll)
-            cv2.line(disp,(cx,cy),(ex,ey),(100,100,255),1)
-            cv2.putText(disp,"45°",(ex+5,ey),cv2.FONT_HERSHEY_SIMPLEX,0.5,(100,100,255),1)
-            a70= math.radians(70)
-            ex2= int(cx+ math.sin(a70)* ll)
-            ey2= int(cy- math.cos(a70)* ll)
-            cv2.line(disp,(cx,cy),(ex2,ey2),(0,255,0),2)
-            cv2.putText(disp,"70° (threshold)",(ex2-45,ey2-10),cv2.FONT_HERSHEY_SIMPLEX,0.5,(0,255,0),1)
-            cv2.line(disp,(cx,cy),(cx+ll,cy),(255,255,0),1)
-            cv2.putText(disp,"90°",(cx+ll+5,cy),cv2.FONT_HERSHEY_SIMPLEX,0.5,(255,255,0),1)
-            cv2.putText(disp,"Hold arm horizontally for Ready Pose",(w//2-200,h-30),cv2.FONT_HERSHEY_SIMPLEX,0.7,(255,255,255),2)
-            mainf= cv2.resize(disp,(0,0),fx=self.inference_thread.image_scale,fy=self.inference_thread.image_scale)
+            cv2.putText(disp,rt,(w//2-px(150),px(30)),cv2.FONT_HERSHEY_SIMPLEX,0.7*s,rc,max(1,px(2)))
             from PIL import Image, ImageTk
-            mim= Image.fromarray(cv2.cvtColor(mainf, cv2.COLOR_BGR2RGB))
+            mim= Image.fromarray(it.overlay.to_rgb())
             mtk= ImageTk.PhotoImage(image=mim)
             self.preview_label.config(image=mtk)
             self.preview_label.image= mtk
-            sf= cv2.resize(frame,(0,0),fx=self.inference_thread.small_image_scale,fy=self.inference_thread.small_image_scale)
+            sf= cv2.resize(frame,(0,0),fx=it.small_image_scale,fy=it.small_image_scale)
             sim= Image.fromarray(cv2.cvtColor(sf, cv2.COLOR_BGR2RGB))
             simtk= ImageTk.PhotoImage(image=sim)
             self.small_preview_label.config(image=simtk)
@@ -317,17 +342,52 @@ class GestureRecognitionApp:
         self.processor._reset_state()
         self.log("Processor state reset")
 
+    def load_model_dialog(self):
+        # The model loads in the background and is swapped in between frames.
+        path= filedialog.askdirectory(title="Select saved model directory")
+        if not path or not self.inference_thread:
+            return
+        if self.inference_thread.models.request(path):
+            self.log(f"Loading model {path}")
+        else:
+            self.log("A model is already loading")
+
+    def rollback_model(self):
+        if self.inference_thread and self.inference_thread.models.rollback():
+            self.log(f"Rolling back to {self.inference_thread.models.previous.path}")
+        else:
+            self.log("No previous model to roll back to")
+
+    def dump_trace(self):
+        path= tracer.dump()
+        self.log(f"Trace written to {path}")
+
     def get_selected_region(self):
         return self.region_var.get()
 
     def start_inference(self):
         self.inference_thread= InferenceThread(self.model,self.processor,self.classifier,self)
+        self.inference_thread.overlay.add_static_layer("guides", self.draw_guides)
         self.inference_thread.daemon= True
         self.inference_thread.start()
 
-    def log(self, message):
-        self.log_console.insert("end",f"[{time.strftime('%H:%M:%S')}] {message}\n")
-        self.log_console.see("end")
+    def log(self, message, **fields):
+        # Safe to call from any thread: the console is refreshed from the Tk loop.
+        self.event_log.log(message, **fields)
+
+    def refresh_log_view(self):
+        try:
+            new,self.log_view_seq= self.event_log.entries_since(self.log_view_seq,limit=LOG_VIEW_LINES)
+            if new:
+                self.log_console.insert("end","".join(format_entry(e)+"\n" for e in new))
+                lines= int(self.log_console.index("end-1c").split(".")[0])
+                if lines>LOG_VIEW_LINES:
+                    self.log_console.delete("1.0",f"{lines-LOG_VIEW_LINES}.0")
+                self.log_console.see("end")
+        except:
+            if DEBUG:
+                traceback.print_exc()
+        self.root.after(LOG_REFRESH_MS,self.refresh_log_view)
 
     def log_debug(self, message):
         if DEBUG:
@@ -335,25 +395,30 @@ class GestureRecognitionApp:
 
     def clear_log(self):
         self.log_console.delete("1.0","end")
+        self.log_view_seq= self.event_log.seq
         self.log("Log cleared")
 
     def on_closing(self):
         if self.inference_thread:
             self.inference_thread.stop()
             self.inference_thread.join(timeout=1.0)
+        self.event_log.close()
         self.root.destroy()
 
 
 def load_model():
     try:
-        m= tf.keras.models.load_model(MODEL_PATH)
+        m= inference_worker.load_model(MODEL_PATH)
         return m
     except Exception as e:
         messagebox.showerror("Error",f"Failed to load model: {e}")
         sys.exit(1)
 
 if __name__=="__main__":
+    cpu_layout.apply()  # before TensorFlow initialises
     root= ThemedTk(theme="equilux")
-    model= load_model()
+    with cpu_layout.pinned("tf"):
+        model= load_model()
+    cpu_layout.pin("ui")
     app= GestureRecognitionApp(root, model)
     root.mainloop()
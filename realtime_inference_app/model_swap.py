@@ -0,0 +1,198 @@
+# model_swap.py
+
+from config import (
+    DEBUG, WINDOW_SIZE, MODEL_SWAP
+)
+import os
+import time
+import threading
+import numpy as np
+import tensorflow as tf
+import traceback
+
+from feature_extractor import FeatureExtractor, KERNEL_INDEX
+from gesture_classifier import GestureClassifier
+import inference_worker
+
+
+class ModelBundle:
+    """
+    A loaded model and everything that depends on it: the classifier's model
+    state (GestureClassifier.model_state), the FeatureExtractor for its
+    feature_columns.json and its window size.
+    """
+    def __init__(self, path, classifier_state, feature_extractor, window_size, info=None):
+        self.path = path
+        self.classifier_state = classifier_state
+        self.feature_extractor = feature_extractor
+        self.window_size = window_size
+        self.info = info or {"path": path}
+
+
+def load_bundle(path):
+    """
+    Load, validate and warm up the model at path. Raises ValueError when the
+    model does not fit the pipeline or fails validation.
+    """
+    t0 = time.perf_counter()
+    model_dir = os.path.dirname(path)
+    for fn in ("feature_columns.json", "label_encoder.json"):
+        if not os.path.exists(os.path.join(model_dir, fn)):
+            raise ValueError(f"{fn} not found next to the model")
+    model = inference_worker.load_model(path)
+    t_load = time.perf_counter()
+
+    shape = model.input_shape
+    if not isinstance(shape, tuple) or len(shape) != 3:
+        raise ValueError(f"expected one input of shape (batch, frames, features), got {shape}")
+    window_size = shape[1] or WINDOW_SIZE
+    n_features = shape[2]
+    n_classes = model.output_shape[-1]
+    fe = FeatureExtractor(feature_dim=n_features, model_path=path)
+    cols = fe.feature_columns or []
+    if len(cols) != n_features or len(set(cols)) != len(cols):
+        raise ValueError(f"feature_columns.json has {len(cols)} columns ({len(set(cols))} distinct), model expects {n_features}")
+    if len(fe.class_labels) != n_classes or len(set(fe.class_labels)) != n_classes:
+        raise ValueError(f"label_encoder.json has {len(fe.class_labels)} labels, model outputs {n_classes} classes")
+    unmapped = [c for c in cols if c not in KERNEL_INDEX]
+    if unmapped and MODEL_SWAP["require_mapped_columns"]:
+        raise ValueError(f"{len(unmapped)} feature columns are not computed in realtime: {', '.join(unmapped[:5])}")
+
+    classifier = GestureClassifier(model, window_size, list(fe.class_labels), cols, model_path=path)
+
+    # The first predict builds the graph; warm-up keeps that off the live path.
+    x = np.zeros((1, window_size, n_features), dtype=np.float32)
+    times = []
+    for _ in range(max(1, MODEL_SWAP["warmup_runs"])):
+        t = time.perf_counter()
+        out = classifier._predict(x)
+        times.append((time.perf_counter() - t) * 1000)
+    if out.shape != (n_classes,) or not np.all(np.isfinite(out)) or abs(float(np.sum(out)) - 1.0) > 1e-3:
+        raise ValueError("model output is not a probability distribution over its classes")
+
+    accuracy = None
+    if MODEL_SWAP["validation_dataset"]:
+        data = np.load(MODEL_SWAP["validation_dataset"], allow_pickle=False)
+        X, labels = data["X"].astype(np.float32), data["labels"].astype(str)
+        if X.shape[1:] != (window_size, n_features):
+            raise ValueError(f"validation windows are {X.shape[1:]}, model expects {(window_size, n_features)}")
+        known = np.isin(labels, fe.class_labels)
+        pred = np.argmax(model.predict(X[known], verbose=0), axis=-1)
+        accuracy = float(np.mean(np.asarray(fe.class_labels)[pred] == labels[known])) if known.any() else 0.0
+        if accuracy < MODEL_SWAP["min_accuracy"]:
+            raise ValueError(f"validation accuracy {accuracy:.3f} < {MODEL_SWAP['min_accuracy']:.3f}")
+
+    info = {
+        "path": path,
+        "window_size": window_size,
+        "features": n_features,
+        "classes": list(fe.class_labels),
+        "unmapped_columns": len(unmapped),
+        "load_s": round(t_load - t0, 2),
+        "warmup_first_ms": round(times[0], 1),
+        "warmup_ms": round(times[-1], 1),
+        "accuracy": accuracy,
+        "ready_s": round(time.perf_counter() - t0, 2)
+    }
+    return ModelBundle(path, classifier.model_state(), fe, window_size, info)
+
+
+###############################################################################
+# ModelSwapper: replace the running model without reopening the camera.
+#
+# request(path) loads a model in a background thread (load_bundle: shape,
+# labels and feature_columns.json checks, warm-up, optional accuracy check on
+# a dataset). The inference thread calls apply_pending() between frames; the
+# swap only reassigns references (the classifier's model state, the
+# processor's feature extractor and window size), so it is atomic with
+# respect to frame processing and takes microseconds. It is deferred while a
+# gesture is being captured. The replaced model stays loaded for rollback().
+###############################################################################
+class ModelSwapper:
+    def __init__(self, classifier, processor, log=None):
+        self.classifier = classifier
+        self.processor = processor
+        self.log = log or (lambda message, **fields: None)
+        self.current = self._capture()
+        self.previous = None
+        self.pending = None
+        self.state = "idle"   # idle | loading | ready | failed
+        self.error = None
+        self.requested_at = None
+        self.last_swap = None
+        self._lock = threading.Lock()
+
+    def _capture(self):
+        return ModelBundle(self.classifier.model_path, self.classifier.model_state(),
+                           self.processor.feature_extractor, self.processor.sliding_window_size)
+
+    def request(self, path):
+        """Start loading the model at path in the background. False if a load is already running."""
+        with self._lock:
+            if self.state == "loading":
+                return False
+            self.state, self.error, self.requested_at = "loading", None, time.perf_counter()
+        threading.Thread(target=self._load, args=(path,), name="ModelLoader", daemon=True).start()
+        return True
+
+    def _load(self, path):
+        try:
+            bundle = load_bundle(path)
+        except Exception as e:
+            if DEBUG:
+                traceback.print_exc()
+            with self._lock:
+                self.state, self.error = "failed", str(e)
+            self.log(f"Model {path} rejected: {e}", model_swap={"path": path, "error": str(e)})
+            return
+        with self._lock:
+            self.pending, self.state = bundle, "ready"
+        i = bundle.info
+        self.log(f"Model {path} ready (load {i['load_s']:.1f} s, warm-up {i['warmup_first_ms']:.0f} -> {i['warmup_ms']:.0f} ms), swapping between frames",
+                 model_info=i)
+
+    def rollback(self):
+        """Queue the previously running model (still loaded) for swapping back. False if there is none."""
+        with self._lock:
+            if self.previous is None or self.state == "loading":
+                return False
+            self.pending, self.state = self.previous, "ready"
+            self.requested_at = time.perf_counter()
+        return True
+
+    def apply_pending(self, busy=False):
+        """
+        Swap in a loaded model, if any; called by the inference thread between
+        frames. busy defers the swap. Returns the swap record, or None.
+        """
+        if self.pending is None or busy:
+            return None
+        with self._lock:
+            bundle, self.pending = self.pending, None
+            self.state = "idle"
+        t0 = time.perf_counter()
+        old = self._capture()
+        self.classifier.set_model_state(bundle.classifier_state)
+        self.processor.feature_extractor = bundle.feature_extractor
+        self.processor.sliding_window_size = bundle.window_size
+        swap_ms = (time.perf_counter() - t0) * 1000
+        old.info = self.current.info
+        self.previous, self.current = old, bundle
+        self.last_swap = {
+            "path": bundle.path,
+            "previous": old.path,
+            "swap_ms": round(swap_ms, 3),
+            "request_to_live_s": round(time.perf_counter() - self.requested_at, 2)
+        }
+        self.log(f"Model swapped to {bundle.path} in {swap_ms:.2f} ms ({self.last_swap['request_to_live_s']:.1f} s after request)",
+                 model_swap=self.last_swap)
+        return self.last_swap
+
+    def status(self):
+        return {
+            "state": self.state,
+            "current": self.current.info,
+            "previous": self.previous.path if self.previous else None,
+            "error": self.error,
+            "last_swap": self.last_swap
+        }
@@ -0,0 +1,203 @@
+# runtime_config.py
+
+from config import (
+    DEBUG, READY_POSE_THRESHOLDS, CLASSIFICATION_THRESHOLDS, STAGE_THRESHOLDS,
+    PIPELINE_CONFIG_PATH, PIPELINE_CONFIG_POLL_S
+)
+import os
+import json
+import time
+from dataclasses import dataclass, fields, asdict
+
+
+###############################################################################
+# Pipeline configuration: typed, validated, immutable.
+#
+# One PipelineConfig holds every threshold GestureProcessor and
+# GestureClassifier use. Its defaults are the dicts in config.py; a JSON file
+# (PIPELINE_CONFIG_PATH) overrides any subset of them. ConfigWatcher reloads
+# that file when it changes; a valid file yields a new PipelineConfig with the
+# next version number, which InferenceThread hands to the processor and the
+# classifier between two frames (one reference assignment each). Events carry
+# the version they were produced under. An invalid file is rejected as a
+# whole and the running configuration is kept.
+#
+# Only settings the pipeline reads are part of the schema. The entries of
+# config.py's threshold dicts listed in NO_EFFECT (and MOTION_THRESHOLDS as a
+# whole) are not read by anything; setting them in the file is an error
+# rather than a silent no-op.
+###############################################################################
+@dataclass(frozen=True)
+class ReadyPoseConfig:
+    arm_extension_ratio: float
+    wrist_pelvis_angle: float
+    min_torso_arm_angle: float
+    max_torso_arm_angle: float
+    min_forward_dot: float
+
+
+@dataclass(frozen=True)
+class ClassificationConfig:
+    confidence_threshold: float
+    diversity_penalty: float
+    window_consistency: int
+
+
+@dataclass(frozen=True)
+class StageConfig:
+    ready_pose_frames: int
+    motion_detect_frames: int
+    max_capture_frames: int
+    min_velocity: float
+    velocity_spike_ratio: float
+    gesture_cooldown: float
+    ready_settle_s: float
+    ready_timeout_s: float
+
+
+SECTIONS = {
+    "ready_pose": (ReadyPoseConfig, READY_POSE_THRESHOLDS),
+    "classification": (ClassificationConfig, CLASSIFICATION_THRESHOLDS),
+    "stages": (StageConfig, STAGE_THRESHOLDS)
+}
+
+# Settings in config.py that nothing reads, per section (None: the whole section).
+NO_EFFECT = {
+    "ready_pose": ("ready_frames_required",),
+    "motion": None,
+    "stages": ("min_confidence", "high_confidence", "sliding_window_consistency")
+}
+
+# Allowed ranges; every other number must be >= 0.
+BOUNDS = {
+    "arm_extension_ratio": (0.0, 1.0),
+    "min_torso_arm_angle": (0.0, 180.0),
+    "max_torso_arm_angle": (0.0, 180.0),
+    "min_forward_dot": (-1.0, 1.0),
+    "confidence_threshold": (0.0, 1.0),
+    "diversity_penalty": (0.0, 1.0),
+    "window_consistency": (1, 5),
+    "ready_pose_frames": (1, None),
+    "motion_detect_frames": (1, None),
+    "max_capture_frames": (1, None)
+}
+
+
+def _check_value(section, name, typ, value, errors):
+    if typ is int:
+        ok = isinstance(value, int) and not isinstance(value, bool)
+    else:
+        ok = isinstance(value, (int, float)) and not isinstance(value, bool)
+        value = float(value) if ok else value
+    if not ok:
+        errors.append(f"{section}.{name}: expected {typ.__name__}, got {value!r}")
+        return value
+    lo, hi = BOUNDS.get(name, (0, None))
+    if (lo is not None and value < lo) or (hi is not None and value > hi):
+        errors.append(f"{section}.{name}: {value} outside [{lo}, {hi if hi is not None else 'inf'}]")
+    return value
+
+
+def _build_section(section, values, errors):
+    cls, _ = SECTIONS[section]
+    known = {f.name: f.type for f in fields(cls)}
+    for name in values:
+        if name not in known:
+            errors.append(f"{section}.{name}: unknown setting")
+    missing = [n for n in known if n not in values]
+    if missing:
+        errors.append(f"{section}: missing {', '.join(missing)}")
+        return None
+    return cls(**{n: _check_value(section, n, t, values[n], errors) for n, t in known.items()})
+
+
+@dataclass(frozen=True)
+class PipelineConfig:
+    ready_pose: ReadyPoseConfig
+    classification: ClassificationConfig
+    stages: StageConfig
+    version: int = 0
+    source: str = "config.py"
+
+    @classmethod
+    def from_overrides(cls, overrides=None, version=0, source="config.py"):
+        """
+        Defaults from config.py with overrides ({section: {name: value}})
+        applied. Raises ValueError listing every invalid setting.
+        """
+        overrides = overrides or {}
+        errors = []
+        if not isinstance(overrides, dict):
+            raise ValueError("pipeline config must be a JSON object")
+        for section in overrides:
+            if section in NO_EFFECT and NO_EFFECT[section] is None:
+                errors.append(f"{section}: has no effect (not read by the pipeline)")
+            elif section not in SECTIONS:
+                errors.append(f"{section}: unknown section (expected {', '.join(SECTIONS)})")
+            elif not isinstance(overrides[section], dict):
+                errors.append(f"{section}: expected an object")
+        parts = {}
+        for section, (_, defaults) in SECTIONS.items():
+            dead = NO_EFFECT.get(section) or ()
+            values = {k: v for k, v in defaults.items() if k not in dead}
+            if isinstance(overrides.get(section), dict):
+                for name, value in overrides[section].items():
+                    if name in dead:
+                        errors.append(f"{section}.{name}: has no effect (not read by the pipeline)")
+                    else:
+                        values[name] = value
+            parts[section] = _build_section(section, values, errors)
+        if not errors:
+            rp, st = parts["ready_pose"], parts["stages"]
+            if rp.min_torso_arm_angle >= rp.max_torso_arm_angle:
+                errors.append("ready_pose: min_torso_arm_angle must be below max_torso_arm_angle")
+            if st.ready_settle_s >= st.ready_timeout_s:
+                errors.append("stages: ready_settle_s must be below ready_timeout_s")
+        if errors:
+            raise ValueError("; ".join(errors))
+        return cls(version=version, source=source, **parts)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class ConfigWatcher:
+    """
+    Watches a pipeline config file (modification time, checked at most every
+    poll_s seconds). poll() returns a new PipelineConfig when the file changed
+    and is valid, None otherwise, and raises ValueError when it changed but is
+    invalid. A deleted file reverts to the config.py defaults.
+    """
+    def __init__(self, path=PIPELINE_CONFIG_PATH, poll_s=PIPELINE_CONFIG_POLL_S):
+        self.path = path
+        self.poll_s = poll_s
+        self.current = PipelineConfig.from_overrides()
+        self.mtime = None
+        self.error = None
+        self.next_check = 0.0
+
+    def poll(self, now=None):
+        now = time.time() if now is None else now
+        if now < self.next_check:
+            return None
+        self.next_check = now + self.poll_s
+        mtime = os.path.getmtime(self.path) if self.path and os.path.exists(self.path) else None
+        if mtime == self.mtime:
+            return None
+        self.mtime = mtime
+        try:
+            if mtime is None:
+                overrides, source = {}, "config.py"
+            else:
+                with open(self.path, "r") as f:
+                    overrides, source = json.load(f), self.path
+            cfg = PipelineConfig.from_overrides(overrides, self.current.version + 1, source)
+        except (OSError, ValueError) as e:
+            self.error = str(e)
+            raise ValueError(self.error)
+        self.error = None
+        self.current = cfg
+        return cfg
+
+    def status(self):
+        return {"version": self.current.version, "source": self.current.source, "error": self.error}
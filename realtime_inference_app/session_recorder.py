@@ -0,0 +1,301 @@
+# session_recorder.py
+
+from config import (
+    DEBUG, FEATURE_DIM, SESSION_RECORDER
+)
+import os
+import json
+import time
+import zlib
+import queue
+import bisect
+import threading
+import traceback
+import numpy as np
+
+from body_data import NUM_KEYPOINTS
+
+
+###############################################################################
+# SessionRecorder: what the realtime app sees in production, kept for
+# retraining and analysis (SESSION_RECORDER in config.py, off by default).
+#
+# Per processed frame with a tracked body: frame index, camera timestamp, the
+# BODY_38 keypoints, confidences and ids of the first `bodies` bodies, and the
+# 70-D feature frame GestureProcessor computed (NaN when it computed none).
+# Besides frames: state-machine transitions (with the processor event of that
+# frame) and classifier results with their class probabilities.
+#
+# frame() / transition() / prediction() only copy into a preallocated chunk
+# of chunk_frames frames (a few microseconds). A full chunk goes to a writer
+# thread, which compresses it (pack_chunk) and appends it to
+# <dir>/session_<start>.chunks, then appends one JSON line to
+# session_<start>.index.jsonl: byte offset, length and the frame / time range
+# of the chunk. Both files are append-only; a chunk without its index line
+# (crash mid-write) is ignored by SessionReader. At most `buffers` chunks
+# exist; while all of them wait for the writer, frames are dropped and
+# counted rather than queued, so memory stays bounded.
+#
+#   reader = SessionReader("sessions/session_20250101_120000")
+#   chunk = reader.chunk_at(t)   # arrays of the chunk recorded at camera time t
+###############################################################################
+def pack_chunk(arrays, level):
+    """
+    Chunk bytes: 4-byte header length, JSON header [(name, dtype, shape)],
+    then the raw arrays in that order as one zlib stream. zlib works on the
+    array memory directly and releases the GIL while it compresses, so the
+    writer barely competes with the inference thread.
+    """
+    header = json.dumps([(k, a.dtype.str, a.shape) for k, a in arrays.items()]).encode()
+    z = zlib.compressobj(level)
+    parts = [len(header).to_bytes(4, "little"), header]
+    parts += [z.compress(np.ascontiguousarray(a).data.cast("B")) for a in arrays.values() if a.size]
+    parts.append(z.flush())
+    return b"".join(parts)
+
+
+def unpack_chunk(blob):
+    n = int.from_bytes(blob[:4], "little")
+    raw = zlib.decompress(blob[4 + n:])
+    out, pos = {}, 0
+    for name, dtype, shape in json.loads(blob[4:4 + n]):
+        dt = np.dtype(dtype)
+        size = int(np.prod(shape)) * dt.itemsize
+        out[name] = np.frombuffer(raw, dtype=dt, count=int(np.prod(shape)), offset=pos).reshape(shape)
+        pos += size
+    return out
+
+
+class _Chunk:
+    def __init__(self, frames, bodies, feature_dim):
+        self.frame = np.zeros(frames, dtype=np.int64)
+        self.ts = np.zeros(frames, dtype=np.float64)
+        self.n_bodies = np.zeros(frames, dtype=np.int8)
+        self.ids = np.full((frames, bodies), -1, dtype=np.int64)
+        self.keypoints = np.zeros((frames, bodies, NUM_KEYPOINTS, 3), dtype=np.float32)
+        self.confidences = np.zeros((frames, bodies, NUM_KEYPOINTS), dtype=np.float32)
+        self.features = np.full((frames, feature_dim), np.nan, dtype=np.float32)
+        self.transitions = []   # (frame, ts, from_state, to_state, event)
+        self.predictions = []   # (frame, ts, kind, class_idx, confidence, tier, probabilities)
+        self.count = 0
+
+    def reset(self):
+        self.count = 0
+        self.transitions = []
+        self.predictions = []
+
+    def arrays(self):
+        """The recorded part of the chunk as a dict of arrays (what SessionReader.chunk returns)."""
+        n = self.count
+        out = {"frame": self.frame[:n], "ts": self.ts[:n], "n_bodies": self.n_bodies[:n], "ids": self.ids[:n],
+               "keypoints": self.keypoints[:n], "confidences": self.confidences[:n], "features": self.features[:n]}
+        tr = self.transitions
+        out["transition_frame"] = np.array([t[0] for t in tr], dtype=np.int64)
+        out["transition_ts"] = np.array([t[1] for t in tr], dtype=np.float64)
+        out["transition_from"] = np.array([t[2] or "" for t in tr], dtype=str)
+        out["transition_to"] = np.array([t[3] or "" for t in tr], dtype=str)
+        out["transition_event"] = np.array([t[4] or "" for t in tr], dtype=str)
+        pr = self.predictions
+        width = max((len(p[6]) for p in pr if p[6] is not None), default=0)
+        probs = np.full((len(pr), width), np.nan, dtype=np.float32)
+        for i, p in enumerate(pr):
+            if p[6] is not None:
+                probs[i, :len(p[6])] = p[6]
+        out["prediction_frame"] = np.array([p[0] for p in pr], dtype=np.int64)
+        out["prediction_ts"] = np.array([p[1] for p in pr], dtype=np.float64)
+        out["prediction_kind"] = np.array([p[2] for p in pr], dtype=str)
+        out["prediction_class"] = np.array([-1 if p[3] is None else p[3] for p in pr], dtype=np.int64)
+        out["prediction_confidence"] = np.array([p[4] for p in pr], dtype=np.float32)
+        out["prediction_tier"] = np.array([p[5] or "" for p in pr], dtype=str)
+        out["prediction_probabilities"] = probs
+        return out
+
+
+class SessionRecorder:
+    def __init__(self, directory=SESSION_RECORDER["dir"], bodies=SESSION_RECORDER["bodies"],
+                 chunk_frames=SESSION_RECORDER["chunk_frames"], buffers=SESSION_RECORDER["buffers"],
+                 compress_level=SESSION_RECORDER["compress_level"], feature_dim=FEATURE_DIM):
+        self.directory = directory
+        self.bodies = bodies
+        self.chunk_frames = chunk_frames
+        self.compress_level = compress_level
+        self.feature_dim = feature_dim
+        self._free = queue.Queue()
+        for _ in range(max(2, buffers)):
+            self._free.put(_Chunk(chunk_frames, bodies, feature_dim))
+        self._full = queue.Queue()
+        self._cur = None
+        self._state = None
+        self._writer = None
+        self.path = None
+        self.frames = 0
+        self.dropped = 0
+        self.chunks = 0
+        self.bytes = 0
+        self.error = None
+
+    def start(self, meta=None):
+        """Open a new session; meta (model, labels, ...) goes to session_<start>.json. Returns the path prefix."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, time.strftime("session_%Y%m%d_%H%M%S"))
+        info = {"started": time.time(), "bodies": self.bodies, "chunk_frames": self.chunk_frames,
+                "feature_dim": self.feature_dim, "num_keypoints": NUM_KEYPOINTS}
+        info.update(meta or {})
+        with open(self.path + ".json", "w") as f:
+            json.dump(info, f, indent=2, default=str)
+        self._cur = self._free.get_nowait()
+        self._writer = threading.Thread(target=self._run, name="SessionRecorder", daemon=True)
+        self._writer.start()
+        return self.path
+
+    # ------------------------------------------------------------ hot path
+
+    def _chunk(self):
+        # The chunk being filled; None while every chunk waits for the writer.
+        if self._cur is None:
+            try:
+                self._cur = self._free.get_nowait()
+            except queue.Empty:
+                return None
+        return self._cur
+
+    def _hand_over(self):
+        self._full.put(self._cur)
+        self._cur = None
+
+    def frame(self, index, ts, body_data, features=None, state=None, event=None):
+        """Record one processed frame from a BodyDataBuffer (after filtering)."""
+        if state is not None and state != self._state:
+            self.transition(index, ts, self._state, state, event)
+        n = min(body_data.count, self.bodies)
+        if n == 0:
+            return
+        c = self._chunk()
+        if c is None:
+            self.dropped += 1
+            return
+        i = c.count
+        c.frame[i] = index
+        c.ts[i] = ts
+        c.n_bodies[i] = n
+        c.ids[i, :n] = body_data.ids[:n]
+        c.ids[i, n:] = -1
+        c.keypoints[i, :n] = body_data.keypoints[:n]
+        c.keypoints[i, n:] = 0.0
+        c.confidences[i, :n] = body_data.confidences[:n]
+        c.confidences[i, n:] = 0.0
+        if features is None:
+            c.features[i] = np.nan
+        else:
+            c.features[i] = features
+        c.count = i + 1
+        self.frames += 1
+        if c.count == self.chunk_frames:
+            self._hand_over()
+
+    def transition(self, index, ts, old, new, event=None):
+        self._state = new
+        c = self._chunk()
+        if c is not None:
+            c.transitions.append((index, ts, old, new, event))
+
+    def prediction(self, index, ts, kind, probabilities, class_idx, confidence, tier=None):
+        """A classifier result; kind e.g. "final", "early", "window"."""
+        c = self._chunk()
+        if c is not None:
+            p = None if probabilities is None else np.array(probabilities, dtype=np.float32)
+            c.predictions.append((index, ts, kind, class_idx, float(confidence or 0.0), tier, p))
+
+    # ------------------------------------------------------------ writer
+
+    def _run(self):
+        try:
+            with open(self.path + ".chunks", "ab") as data, open(self.path + ".index.jsonl", "a") as index:
+                while True:
+                    c = self._full.get()
+                    if c is None:
+                        break
+                    if c.count or c.transitions or c.predictions:
+                        self._write(c, data, index)
+                    c.reset()
+                    self._free.put(c)
+        except Exception as e:
+            self.error = e
+            if DEBUG:
+                traceback.print_exc()
+
+    def _write(self, c, data, index):
+        blob = pack_chunk(c.arrays(), self.compress_level)
+        offset = data.tell()
+        data.write(blob)
+        data.flush()
+        n = c.count
+        entry = {"chunk": self.chunks, "offset": offset, "length": len(blob), "crc32": zlib.crc32(blob),
+                 "frames": n, "first_frame": int(c.frame[0]) if n else None,
+                 "last_frame": int(c.frame[n - 1]) if n else None,
+                 "t0": float(c.ts[0]) if n else None, "t1": float(c.ts[n - 1]) if n else None,
+                 "transitions": len(c.transitions), "predictions": len(c.predictions)}
+        index.write(json.dumps(entry) + "\n")
+        index.flush()
+        self.chunks += 1
+        self.bytes += len(blob)
+
+    def stop(self, timeout=5.0):
+        """Write the partial chunk and wait for the writer."""
+        if self._writer is None:
+            return
+        if self._cur is not None:
+            self._hand_over()
+        self._full.put(None)
+        self._writer.join(timeout=timeout)
+        self._writer = None
+
+    def stats(self):
+        return {"path": self.path, "frames": self.frames, "dropped": self.dropped, "chunks": self.chunks,
+                "bytes": self.bytes, "error": str(self.error) if self.error else None}
+
+
+class SessionReader:
+    """Random access to a recorded session through its chunk index."""
+
+    def __init__(self, path):
+        self.path = path[:-len(".chunks")] if path.endswith(".chunks") else path
+        self.meta = {}
+        if os.path.exists(self.path + ".json"):
+            with open(self.path + ".json") as f:
+                self.meta = json.load(f)
+        self.index = []
+        with open(self.path + ".index.jsonl") as f:
+            for line in f:
+                try:
+                    self.index.append(json.loads(line))
+                except ValueError:
+                    break  # index line cut by a crash
+        # Start time of each chunk; chunks without frames inherit the previous one.
+        self._starts, last = [], -np.inf
+        for e in self.index:
+            last = e["t0"] if e["t0"] is not None else last
+            self._starts.append(last)
+
+    def __len__(self):
+        return len(self.index)
+
+    def chunk(self, k):
+        """Arrays of chunk k (see _Chunk.arrays)."""
+        e = self.index[k]
+        with open(self.path + ".chunks", "rb") as f:
+            f.seek(e["offset"])
+            blob = f.read(e["length"])
+        if zlib.crc32(blob) != e["crc32"]:
+            raise ValueError(f"chunk {k} of {self.path} is corrupt")
+        return unpack_chunk(blob)
+
+    def chunk_at(self, t):
+        """Arrays of the chunk holding camera time t (the last one starting at or before t)."""
+        return self.chunk(max(0, bisect.bisect_right(self._starts, t) - 1))
+
+    def chunks_between(self, t0=-np.inf, t1=np.inf):
+        """Chunks overlapping [t0, t1], in order."""
+        for k, e in enumerate(self.index):
+            if e["t0"] is None or (e["t1"] >= t0 and e["t0"] <= t1):
+                yield self.chunk(k)
@@ -0,0 +1,130 @@
+# skeleton_overlay.py
+
+from config import (
+    DEBUG, SKELETON_PAIRS_BODY_38, MAX_TRACKED_BODIES
+)
+import numpy as np
+import cv2
+
+from body_data import NUM_KEYPOINTS
+
+BONES = np.asarray(SKELETON_PAIRS_BODY_38, dtype=np.intp)
+SHIFT = 4  # fractional bits of the point coordinates (sub-pixel lines)
+
+
+###############################################################################
+# SkeletonOverlay: camera preview with every tracked body's skeleton.
+#
+# render() resizes the camera image straight into a preview buffer at display
+# resolution (allocated once, reused every frame), draws the static layers
+# over it and then the skeletons. Keypoints of all bodies are projected to
+# display pixels in one vectorized step: the SDK's 2D keypoints scaled, or the
+# 3D keypoints through the camera intrinsics for bodies without them. All
+# bones are drawn with one cv2.polylines call and all joints with a second
+# one (zero-length segments, which OpenCV draws as round dots). A static
+# layer (guides, labels: anything that only depends on the display size) is
+# drawn once by its callback and then copied in through its cached mask.
+###############################################################################
+class SkeletonOverlay:
+    def __init__(self, scale, bone_color=(0, 255, 255), joint_color=(0, 0, 255),
+                 thickness=1, joint_size=3, line_type=cv2.LINE_8, max_bodies=MAX_TRACKED_BODIES):
+        self.scale = scale
+        self.bone_color = bone_color
+        self.joint_color = joint_color
+        self.thickness = thickness
+        self.joint_size = joint_size
+        self.line_type = line_type  # LINE_AA looks smoother but costs about twice as much
+        self.intrinsics = None   # (fx, fy, cx, cy) at camera resolution
+        self.buffer = None       # display-resolution BGR preview
+        self.rgb = None          # same, RGB, for Tk
+        self.bodies_drawn = 0
+        self._layers = {}        # key -> draw(img, scale)
+        self._cache = {}         # key -> (flat pixel indices, pixel values)
+        self._uv = np.zeros((max_bodies, NUM_KEYPOINTS, 2), dtype=np.float32)
+        self._ok = np.zeros((max_bodies, NUM_KEYPOINTS), dtype=bool)
+        self._joints = np.zeros((max_bodies * NUM_KEYPOINTS, 2, 2), dtype=np.int32)
+
+    def set_intrinsics(self, fx, fy, cx, cy):
+        self.intrinsics = (float(fx), float(fy), float(cx), float(cy))
+
+    def add_static_layer(self, key, draw):
+        """draw(img, scale) paints on a black display-size image; black pixels stay transparent."""
+        self._layers[key] = draw
+        self._cache.pop(key, None)
+
+    def remove_static_layer(self, key):
+        self._layers.pop(key, None)
+        self._cache.pop(key, None)
+
+    def _prepare(self, frame):
+        h, w = frame.shape[:2]
+        size = (max(1, int(w * self.scale)), max(1, int(h * self.scale)))
+        if self.buffer is None or (self.buffer.shape[1], self.buffer.shape[0]) != size:
+            self.buffer = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+            self.rgb = np.zeros_like(self.buffer)
+            self._cache.clear()
+        cv2.resize(frame, size, dst=self.buffer)
+        return size[0] / w, size[1] / h
+
+    def _composite_layers(self):
+        flat = self.buffer.reshape(-1, 3)
+        for key, draw in self._layers.items():
+            cached = self._cache.get(key)
+            if cached is None:
+                img = np.zeros_like(self.buffer)
+                draw(img, self.scale)
+                idx = np.flatnonzero(img.any(axis=2))
+                cached = self._cache[key] = (idx, img.reshape(-1, 3)[idx])
+            flat[cached[0]] = cached[1]
+
+    def project(self, body_data, sx, sy):
+        """Display pixel coordinates (n, 38, 2) and visibility (n, 38) of all bodies."""
+        n = body_data.count
+        uv, ok = self._uv[:n], self._ok[:n]
+        np.multiply(body_data.keypoints_2d[:n], (sx, sy), out=uv)
+        ok[:] = body_data.valid[:n]
+        no2d = ~body_data.has_2d[:n]
+        if no2d.any():
+            if self.intrinsics is None:
+                ok[no2d] = False
+            else:
+                fx, fy, cx, cy = self.intrinsics
+                kp = body_data.keypoints[:n][no2d]
+                z = kp[..., 2]
+                front = z > 1e-6
+                z = np.where(front, z, 1.0)
+                uv[no2d] = np.stack([(fx * kp[..., 0] / z + cx) * sx, (fy * kp[..., 1] / z + cy) * sy], axis=-1)
+                ok[no2d] &= front
+        h, w = self.buffer.shape[:2]
+        ok &= np.isfinite(uv).all(axis=2)
+        ok &= (uv[..., 0] >= 0) & (uv[..., 0] < w) & (uv[..., 1] >= 0) & (uv[..., 1] < h)
+        return uv, ok
+
+    def render(self, frame, body_data=None):
+        """The preview buffer: frame at display resolution, static layers, skeletons."""
+        sx, sy = self._prepare(frame)
+        if self._layers:
+            self._composite_layers()
+        self.bodies_drawn = 0
+        if body_data is None or body_data.count == 0:
+            return self.buffer
+        uv, ok = self.project(body_data, sx, sy)
+        pts = np.rint(uv * (1 << SHIFT)).astype(np.int32)
+        bone_ok = ok[:, BONES[:, 0]] & ok[:, BONES[:, 1]]
+        bones = pts[:, BONES][bone_ok]              # (k, 2, 2) segments
+        if len(bones):
+            # polylines takes a sequence of point arrays; the views cost nothing.
+            cv2.polylines(self.buffer, list(bones), False, self.bone_color, self.thickness, self.line_type, SHIFT)
+        m = int(ok.sum())
+        if m:
+            joints = self._joints[:m]
+            joints[:, 0] = pts[ok]
+            joints[:, 1] = joints[:, 0]
+            cv2.polylines(self.buffer, list(joints), False, self.joint_color, self.joint_size, self.line_type, SHIFT)
+        self.bodies_drawn = int(ok.any(axis=1).sum())
+        return self.buffer
+
+    def to_rgb(self):
+        """The preview buffer converted to RGB into a second reused buffer."""
+        cv2.cvtColor(self.buffer, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        return self.rgb
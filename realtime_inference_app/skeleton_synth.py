@@ -0,0 +1,252 @@
+# skeleton_synth.py
+
+from config import (
+    DEBUG, CAMERA_FPS, MAX_TRACKED_BODIES
+)
+import numpy as np
+
+from body_data import NUM_KEYPOINTS
+
+# Arm direction at the end of each swipe as (yaw, pitch) in degrees, seen by
+# the camera: yaw towards +x, pitch upwards. Every swipe starts with the arm
+# pointing at the camera (the ready pose).
+SWIPES = {
+    "left_swipe": (-50.0, 0.0),
+    "right_swipe": (50.0, 0.0),
+    "up_swipe": (0.0, 40.0),
+    "down_swipe": (0.0, -40.0)
+}
+KINDS = ("left_swipe", "right_swipe", "up_swipe", "down_swipe", "idle", "noise")
+
+# Standing pose relative to the pelvis, camera frame (x right, y down, z away
+# from the camera), metres. The person faces the camera, so their left side
+# is at +x. Elbows, wrists and hand tips are placed from the arm direction.
+REST_POSE = np.array([
+    [0.0, 0.0, 0.0], [0.0, -0.10, 0.0], [0.0, -0.25, 0.0], [0.0, -0.40, 0.0],     # pelvis, spine 1-3
+    [0.0, -0.50, 0.0], [0.0, -0.62, -0.08],                                      # neck, nose
+    [0.03, -0.66, -0.07], [-0.03, -0.66, -0.07], [0.07, -0.64, 0.0], [-0.07, -0.64, 0.0],  # eyes, ears
+    [0.05, -0.45, 0.0], [-0.05, -0.45, 0.0], [0.18, -0.45, 0.0], [-0.18, -0.45, 0.0],      # clavicles, shoulders
+    [0.20, -0.17, 0.0], [-0.20, -0.17, 0.0], [0.20, 0.09, 0.0], [-0.20, 0.09, 0.0],        # elbows, wrists
+    [0.10, 0.05, 0.0], [-0.10, 0.05, 0.0], [0.10, 0.50, 0.0], [-0.10, 0.50, 0.0],          # hips, knees
+    [0.10, 0.92, 0.0], [-0.10, 0.92, 0.0], [0.10, 0.98, -0.15], [-0.10, 0.98, -0.15],      # ankles, big toes
+    [0.14, 0.98, -0.12], [-0.14, 0.98, -0.12], [0.10, 0.98, 0.05], [-0.10, 0.98, 0.05],    # small toes, heels
+    [0.17, 0.17, -0.03], [-0.17, 0.17, -0.03], [0.20, 0.17, 0.0], [-0.20, 0.17, 0.0],      # thumb, index tips
+    [0.20, 0.18, 0.0], [-0.20, 0.18, 0.0], [0.22, 0.16, 0.0], [-0.22, 0.16, 0.0]           # middle, pinky tips
+], dtype=np.float32)
+# Shoulder, elbow, wrist and hand tips of the left (0) and right (1) arm.
+ARM_JOINTS = (
+    (12, 14, 16, [30, 32, 34, 36]),
+    (13, 15, 17, [31, 33, 35, 37])
+)
+# Hand tips around the point one hand length past the wrist.
+HAND_TIPS = np.array([
+    [[-0.03, 0.0, 0.0], [0.0, 0.0, 0.0], [0.0, 0.01, 0.0], [0.02, 0.0, 0.0]],
+    [[0.03, 0.0, 0.0], [0.0, 0.0, 0.0], [0.0, 0.01, 0.0], [-0.02, 0.0, 0.0]]
+], dtype=np.float32)
+DOWN = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+UPPER_ARM = 0.28
+FOREARM = 0.26
+HAND = 0.08
+ELBOW_BEND = 0.2
+N_CYCLES = 64  # motion cycles drawn per body, then repeated
+# 1080p camera for keypoint_2d
+INTRINSICS = (1400.0, 1400.0, 960.0, 540.0)
+
+
+def _smoothstep(x):
+    x = np.clip(x, 0.0, 1.0)
+    return x * x * (3.0 - 2.0 * x)
+
+
+def _normalize(v):
+    return v / np.linalg.norm(v, axis=-1, keepdims=True)
+
+
+class _SyntheticBody:
+    def __init__(self, body_id, keypoint, keypoint_confidence, keypoint_2d):
+        self.id = body_id
+        self.keypoint = keypoint
+        self.keypoint_confidence = keypoint_confidence
+        self.keypoint_2d = keypoint_2d
+
+
+class _SyntheticBodies:
+    def __init__(self, body_list):
+        self.is_new = True
+        self.body_list = body_list
+
+
+###############################################################################
+# Procedural BODY_38 skeletons for load and scale testing.
+#
+# SyntheticSkeletons animates any number of people standing in front of the
+# camera. Each one repeats motion cycles of cycle_s seconds whose kind is
+# drawn at random: a swipe (arms down, the arm raised to the ready pose,
+# held, swiped, held, lowered), idle (arms down, swaying) or noise (the arm
+# wandering half-raised without a gesture). The default ready_s ends the
+# hold just after GestureProcessor's ready_settle_s, so the swipe is what it
+# captures rather than the jitter of the held arm. Positions are in the camera
+# frame of ZedFrameSource (x right, y down, z away from the camera), in
+# metres times unit (1000 for the millimetres ZedFrameSource reports); swipe
+# directions are as seen by the camera.
+#
+# Calling it with (frame index, timestamp) returns an sl.Bodies-like object
+# (is_new, body_list of bodies with id, keypoint, keypoint_confidence and
+# keypoint_2d), so it is a bodies_fn for SyntheticFrameSource:
+#
+#   synth = SyntheticSkeletons(n_bodies=10, fps=120, seed=0)
+#   source = synth.source(n_frames=1200)
+#
+# As with sl.Bodies, the same objects are refreshed in place every frame and
+# nothing is allocated per frame apart from the random draws. Every keypoint
+# gets Gaussian jitter, single keypoints drop out (NaN, confidence 0) and
+# whole bodies drop out of body_list for a frame. schedule() gives the
+# cycles performed, as ground truth.
+###############################################################################
+class SyntheticSkeletons:
+    RAISE_S = 0.3   # raising or lowering the arm
+    HOLD_S = 0.2    # arm held at the end of the swipe
+
+    def __init__(self, n_bodies=MAX_TRACKED_BODIES, fps=CAMERA_FPS, kinds=KINDS, idle_s=1.0, ready_s=0.9,
+                 swipe_s=0.35, jitter=0.002, dropout=0.01, body_dropout=0.0, left_handed=0.0, unit=1.0,
+                 seed=None):
+        unknown = [k for k in kinds if k not in SWIPES and k not in ("idle", "noise")]
+        if unknown:
+            raise ValueError(f"unknown motion kind(s): {', '.join(unknown)}")
+        self.n_bodies = n_bodies
+        self.fps = fps
+        self.kinds = tuple(kinds)
+        self.idle_s = idle_s
+        self.ready_s = ready_s
+        self.swipe_s = swipe_s
+        self.jitter = jitter
+        self.dropout = dropout
+        self.body_dropout = body_dropout
+        self.unit = unit
+        self.swipe_start = idle_s + self.RAISE_S + ready_s
+        self.lower_start = self.swipe_start + swipe_s + self.HOLD_S
+        self.cycle_s = self.lower_start + self.RAISE_S
+        self.rng = np.random.default_rng(seed)
+        rng = self.rng
+        n = n_bodies
+
+        # Per kind: end angles of the swipe, and whether it is a swipe / noise.
+        self._end = np.radians(np.array([SWIPES.get(k, (0.0, 0.0)) for k in self.kinds], dtype=np.float32))
+        self._is_swipe = np.array([k in SWIPES for k in self.kinds])
+        self._is_noise = np.array([k == "noise" for k in self.kinds])
+
+        # Per body: build, place in the room, phase, sway and gesturing arm.
+        self.size = rng.uniform(0.9, 1.1, n).astype(np.float32)
+        pos = np.stack([np.linspace(-1.0, 1.0, n) + rng.normal(0.0, 0.1, n), rng.uniform(0.0, 0.2, n),
+                        rng.uniform(2.5, 4.5, n)], axis=-1).astype(np.float32)
+        self.rest = REST_POSE[None] * self.size[:, None, None] + pos[:, None, :]
+        self.offset = rng.uniform(0.0, self.cycle_s, n)
+        self.sway_freq = rng.uniform(0.15, 0.35, (n, 1))
+        self.sway_phase = rng.uniform(0.0, 2 * np.pi, (n, 2))
+        self.arm = np.where(rng.random(n) < left_handed, 0, 1)
+        self.kind_table = rng.integers(len(self.kinds), size=(n, N_CYCLES))
+        # Noise cycles: raise harmonic, yaw/pitch frequencies (Hz) and phases.
+        self.noise_k = rng.integers(1, 3, (n, N_CYCLES))
+        self.noise_freq = rng.uniform(0.6, 1.5, (n, N_CYCLES, 2))
+        self.noise_phase = rng.uniform(0.0, 2 * np.pi, (n, N_CYCLES, 2))
+
+        self._rows = np.arange(n)
+        self._kp = np.zeros((n, NUM_KEYPOINTS, 3), dtype=np.float32)
+        self._dirs = np.zeros((n, 2, 3), dtype=np.float32)
+        self.keypoints = np.zeros((n, NUM_KEYPOINTS, 3), dtype=np.float32)
+        self.confidences = np.zeros((n, NUM_KEYPOINTS), dtype=np.float32)
+        self.keypoints_2d = np.zeros((n, NUM_KEYPOINTS, 2), dtype=np.float32)
+        self.bodies = [_SyntheticBody(i, self.keypoints[i], self.confidences[i], self.keypoints_2d[i])
+                       for i in range(n)]
+        self._frame = _SyntheticBodies(list(self.bodies))
+
+    def __call__(self, index, timestamp):
+        return self.frame(timestamp)
+
+    def source(self, n_frames=None, **kwargs):
+        """A SyntheticFrameSource at this generator's frame rate."""
+        from frame_source import SyntheticFrameSource
+        return SyntheticFrameSource(fps=self.fps, bodies_fn=self, n_frames=n_frames, **kwargs)
+
+    def _cycle(self, t):
+        tb = t + self.offset
+        cycle = np.floor(tb / self.cycle_s).astype(np.intp)
+        return cycle % N_CYCLES, tb - cycle * self.cycle_s
+
+    def kind(self, t):
+        """Motion kind of every body at time t."""
+        c, _ = self._cycle(t)
+        return [self.kinds[k] for k in self.kind_table[self._rows, c]]
+
+    def schedule(self, t0, t1):
+        """(body, start time, kind) of every cycle starting in [t0, t1), in time order."""
+        out = []
+        for b in range(self.n_bodies):
+            k = int(np.ceil((t0 + self.offset[b]) / self.cycle_s))
+            while k * self.cycle_s - self.offset[b] < t1:
+                out.append((b, float(k * self.cycle_s - self.offset[b]), self.kinds[self.kind_table[b, k % N_CYCLES]]))
+                k += 1
+        return sorted(out, key=lambda e: e[1])
+
+    def arm_directions(self, t):
+        """(n_bodies, 3) unit direction of the gesturing arm at time t."""
+        c, u = self._cycle(t)
+        kind = self.kind_table[self._rows, c]
+        swipe, noise = self._is_swipe[kind], self._is_noise[kind]
+
+        # Swipes: raise, hold, swipe from straight ahead to the end angles, lower.
+        raised = _smoothstep((u - self.idle_s) / self.RAISE_S) - _smoothstep((u - self.lower_start) / self.RAISE_S)
+        s = _smoothstep((u - self.swipe_start) / self.swipe_s)
+        yaw, pitch = self._end[kind, 0] * s, self._end[kind, 1] * s
+
+        # Noise: the arm half raised and lowered again, wandering sideways and up/down.
+        k = self.noise_k[self._rows, c]
+        w = np.sin(2 * np.pi * self.noise_freq[self._rows, c] * u[:, None] + self.noise_phase[self._rows, c])
+        raised = np.where(noise, 0.4 * (1.0 - np.cos(2 * np.pi * k * u / self.cycle_s)), np.where(swipe, raised, 0.0))
+        yaw = np.where(noise, np.radians(40.0) * w[:, 0], yaw)
+        pitch = np.where(noise, np.radians(25.0) * w[:, 1], pitch)
+
+        cp = np.cos(pitch)
+        ahead = np.stack([np.sin(yaw) * cp, -np.sin(pitch), -np.cos(yaw) * cp], axis=-1)
+        return _normalize((1.0 - raised)[:, None] * DOWN + raised[:, None] * ahead)
+
+    def pose(self, t):
+        """(n_bodies, 38, 3) keypoints at time t (seconds), metres, without jitter or dropouts."""
+        kp = self._kp
+        sway = 0.02 * np.sin(2 * np.pi * self.sway_freq * t + self.sway_phase)  # (n, 2): x and z
+        kp[:] = self.rest
+        kp[:, :, 0] += sway[:, :1]
+        kp[:, :, 2] += sway[:, 1:]
+        dirs = self._dirs
+        dirs[:] = _normalize(DOWN + 0.05 * np.array([1.0, 0.0, 0.0], dtype=np.float32) * sway[:, None, :1])
+        dirs[self._rows, self.arm] = self.arm_directions(t)
+        size = self.size[:, None]
+        for side, (s, e, w, tips) in enumerate(ARM_JOINTS):
+            d = dirs[:, side]
+            kp[:, e] = kp[:, s] + UPPER_ARM * size * _normalize(d + ELBOW_BEND * DOWN)
+            kp[:, w] = kp[:, e] + FOREARM * size * d
+            kp[:, tips] = (kp[:, w] + HAND * size * d)[:, None] + HAND_TIPS[side]
+        return kp
+
+    def frame(self, t):
+        """The bodies at time t, with jitter and dropouts."""
+        rng = self.rng
+        kp = self.pose(t)
+        n = self.n_bodies
+        if self.jitter:
+            kp += rng.normal(0.0, self.jitter, kp.shape).astype(np.float32)
+        fx, fy, cx, cy = INTRINSICS
+        z = kp[:, :, 2]
+        self.keypoints_2d[:, :, 0] = fx * kp[:, :, 0] / z + cx
+        self.keypoints_2d[:, :, 1] = fy * kp[:, :, 1] / z + cy
+        np.multiply(kp, self.unit, out=self.keypoints)
+        self.confidences[:] = rng.uniform(60.0, 99.0, (n, NUM_KEYPOINTS))
+        if self.dropout:
+            lost = rng.random((n, NUM_KEYPOINTS)) < self.dropout
+            self.keypoints[lost] = np.nan
+            self.keypoints_2d[lost] = -1.0
+            self.confidences[lost] = 0.0
+        if self.body_dropout:
+            present = rng.random(n) >= self.body_dropout
+            self._frame.body_list = [b for b, p in zip(self.bodies, present) if p]
+        return self._frame
@@ -0,0 +1,67 @@
+# swipe_rules.py
+#
+# Geometric swipe pre-classifier, the first tier of GestureClassifier's
+# cascade. Only needs numpy (no config import) so ai_training/cascade_eval.py
+# can use the exact same rules on the recorded dataset.
+
+import numpy as np
+
+AXES = ["x", "y", "z"]
+
+
+def wrist_columns(feature_columns):
+    """Indices of rel_15_{x,y,z} and rel_17_{x,y,z} in a feature vector, or None."""
+    try:
+        cols = list(feature_columns)
+        return (np.array([cols.index(f"rel_15_{ax}") for ax in AXES], dtype=np.intp),
+                np.array([cols.index(f"rel_17_{ax}") for ax in AXES], dtype=np.intp))
+    except (ValueError, TypeError):
+        return None
+
+
+def direction_table(directions, class_labels):
+    """
+    (3, 2) class index per movement axis and sign ([axis, 0] negative,
+    [axis, 1] positive) from a {"+x": label, ...} map; -1 where unmapped.
+    """
+    table = np.full((3, 2), -1, dtype=np.intp)
+    for key, label in directions.items():
+        if label in class_labels:
+            table[AXES.index(key[1]), int(key[0] == "+")] = list(class_labels).index(label)
+    return table
+
+
+def swipe_geometry(windows, cols):
+    """
+    Movement of the wrist across (N, T, F) feature windows, as in the
+    notebook's extract_directional_features: the start->end vector (N, 3),
+    its length relative to the arm length, directional_clarity and
+    angle_from_horizontal (degrees).
+    """
+    elbow_cols, wrist_cols = cols
+    wrist = windows[:, :, wrist_cols]
+    elbow = windows[:, :, elbow_cols]
+    move = wrist[:, -1] - wrist[:, 0]
+    arm = np.mean(np.linalg.norm(elbow, axis=-1) + np.linalg.norm(wrist - elbow, axis=-1), axis=1)
+    dist = np.linalg.norm(move, axis=-1)
+    travel = np.where(arm > 1e-6, dist / np.where(arm > 1e-6, arm, 1.0), 0.0)
+    a = np.abs(move)
+    clarity = np.max(a, axis=-1) / (np.sum(a, axis=-1) + 1e-6)
+    angle = np.degrees(np.arctan2(move[:, 1], np.sqrt(move[:, 0]**2 + move[:, 2]**2)))
+    return move, travel, clarity, angle
+
+
+def classify_swipes(windows, cols, table, rules):
+    """
+    Rule-based labels for (N, T, F) windows: class index per window, or -1
+    where the movement is not clear enough and the model has to decide.
+    """
+    windows = np.asarray(windows, dtype=np.float32)
+    move, travel, clarity, angle = swipe_geometry(windows, cols)
+    axis = np.argmax(np.abs(move), axis=-1)
+    positive = (move[np.arange(len(move)), axis] > 0).astype(np.intp)
+    aligned = np.where(axis == 1,
+                       np.abs(angle) >= rules["vertical_angle"],
+                       np.abs(angle) <= rules["horizontal_angle"])
+    clear = (travel >= rules["min_travel"]) & (clarity >= rules["min_clarity"]) & aligned
+    return np.where(clear, table[axis, positive], -1)
@@ -0,0 +1,168 @@
+# tracer.py
+
+from config import (
+    DEBUG, TRACE_ENABLED, TRACE_BUFFER_SIZE, TRACE_SPIKE_MS, TRACE_DIR
+)
+import os
+import gc
+import time
+import json
+import threading
+import functools
+import traceback
+from collections import deque
+
+
+###############################################################################
+# Tracer: opt-in span recorder for the per-frame pipeline.
+#
+# Spans are kept in a fixed-size ring buffer (oldest spans fall off) and are
+# written out as Chrome trace-event JSON, which chrome://tracing and
+# https://ui.perfetto.dev open directly. A dump happens on demand (dump()) or
+# automatically when a root "frame" span exceeds TRACE_SPIKE_MS.
+# Garbage collections are recorded as spans too, since they are a common
+# cause of the stalls we are hunting.
+###############################################################################
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "root", "start")
+
+    def __init__(self, tracer, name, args=None, root=False):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.root = root
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        self.tracer._record(self.name, self.start, end - self.start, self.args)
+        if self.root:
+            self.tracer._check_spike(self.name, (end - self.start) / 1e6)
+        return False
+
+
+class Tracer:
+    def __init__(self, enabled=TRACE_ENABLED, buffer_size=TRACE_BUFFER_SIZE,
+                 spike_ms=TRACE_SPIKE_MS, out_dir=TRACE_DIR):
+        self.enabled = False
+        self.events = deque(maxlen=buffer_size)
+        self.spike_ms = spike_ms
+        self.out_dir = out_dir
+        self.min_spike_interval = 5.0  # seconds between automatic dumps
+        self.last_spike_dump = 0.0
+        self.dump_count = 0
+        self.thread_names = {}
+        self.pid = os.getpid()
+        self._gc_start = None
+        if enabled:
+            self.enable()
+
+    def enable(self):
+        if not self.enabled:
+            self.enabled = True
+            gc.callbacks.append(self._on_gc)
+
+    def disable(self):
+        if self.enabled:
+            self.enabled = False
+            if self._on_gc in gc.callbacks:
+                gc.callbacks.remove(self._on_gc)
+
+    def span(self, name, root=False, **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args or None, root)
+
+    def _record(self, name, start_ns, dur_ns, args):
+        tid = threading.get_ident()
+        if tid not in self.thread_names:
+            self.thread_names[tid] = threading.current_thread().name
+        # deque.append is atomic, so no lock is needed on the hot path
+        self.events.append((name, start_ns, dur_ns, tid, args))
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self._gc_start = time.perf_counter_ns()
+        elif phase == "stop" and self._gc_start is not None:
+            dur = time.perf_counter_ns() - self._gc_start
+            self._record(f"gc.gen{info.get('generation', '?')}", self._gc_start, dur,
+                         {"collected": info.get("collected", 0)})
+            self._gc_start = None
+
+    def _check_spike(self, name, dur_ms):
+        if dur_ms < self.spike_ms:
+            return
+        now = time.time()
+        if now - self.last_spike_dump < self.min_spike_interval:
+            return
+        self.last_spike_dump = now
+        self.dump(reason=f"spike_{name}_{dur_ms:.0f}ms", background=True)
+
+    def to_trace_events(self, events=None):
+        events = list(self.events) if events is None else events
+        out = []
+        for tid, tname in list(self.thread_names.items()):
+            out.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                        "args": {"name": tname}})
+        for name, start_ns, dur_ns, tid, args in events:
+            ev = {"name": name, "ph": "X", "pid": self.pid, "tid": tid,
+                  "ts": start_ns / 1000.0, "dur": dur_ns / 1000.0}
+            if args:
+                ev["args"] = args
+            out.append(ev)
+        return {"traceEvents": out, "displayTimeUnit": "ms"}
+
+    def dump(self, path=None, reason="manual", background=False):
+        events = list(self.events)
+        if path is None:
+            self.dump_count += 1
+            stamp = time.strftime("%Y%m%d_%H%M%S")
+            path = os.path.join(self.out_dir, f"trace_{stamp}_{self.dump_count:03d}_{reason}.json")
+        if background:
+            threading.Thread(target=self._write, args=(path, events), daemon=True,
+                             name="TraceDump").start()
+        else:
+            self._write(path, events)
+        return path
+
+    def _write(self, path, events):
+        try:
+            d = os.path.dirname(path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(self.to_trace_events(events), f)
+        except:
+            if DEBUG:
+                traceback.print_exc()
+
+
+tracer = Tracer()
+
+
+def traced(name):
+    """Decorator that records each call of the wrapped function as a span."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            with _Span(tracer, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco